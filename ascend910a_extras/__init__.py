@@ -1,29 +1,37 @@
 import ctypes
+import importlib
 import os
 import pathlib
+import threading
 
-import torch
-
+# nothing native is loaded at import, the block manager, the weight loader and the cpu
+# reference work without torch_npu and CANN. load_native() runs on the first device op.
 opp_path = pathlib.Path(__file__).parent / "opp_install" / "vendors" / "customize"
-lib_path = (
-    pathlib.Path(__file__).parent
-    / "opp_install"
-    / "vendors"
-    / "customize"
-    / "op_api"
-    / "lib"
-    / "libcust_opapi.so"
-)
+lib_path = opp_path / "op_api" / "lib" / "libcust_opapi.so"
 
-assert lib_path.exists(), f"lib_path: {lib_path} not found"
-ctypes.CDLL(str(lib_path))
+_native = None
+_native_lock = threading.Lock()
 
-# add opp_path to ASCEND_CUSTOM_OPP_PATH
-if "ASCEND_CUSTOM_OPP_PATH" not in os.environ:
-    os.environ["ASCEND_CUSTOM_OPP_PATH"] = str(opp_path)
-else:
-    os.environ["ASCEND_CUSTOM_OPP_PATH"] = (
-        f"{opp_path}:{os.environ['ASCEND_CUSTOM_OPP_PATH']}"
-    )
 
-# print(f"ASCEND_CUSTOM_OPP_PATH: {os.environ['ASCEND_CUSTOM_OPP_PATH']}")
+def load_native():
+    """Loads torch_npu, the custom op library and the C extension once, returns the extension."""
+    global _native
+    if _native is not None:
+        return _native
+    with _native_lock:
+        if _native is not None:
+            return _native
+        if not lib_path.exists():
+            raise FileNotFoundError(f"lib_path: {lib_path} not found")
+        # add opp_path to ASCEND_CUSTOM_OPP_PATH
+        if "ASCEND_CUSTOM_OPP_PATH" not in os.environ:
+            os.environ["ASCEND_CUSTOM_OPP_PATH"] = str(opp_path)
+        else:
+            os.environ["ASCEND_CUSTOM_OPP_PATH"] = (
+                f"{opp_path}:{os.environ['ASCEND_CUSTOM_OPP_PATH']}"
+            )
+        importlib.import_module("torch")
+        ctypes.CDLL(str(lib_path))
+        importlib.import_module("torch_npu")
+        _native = importlib.import_module("ascend910a_extras.ascend910a_extras_C")
+    return _native
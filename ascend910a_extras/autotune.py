@@ -0,0 +1,216 @@
+# Persistent autotuner of the tiling choices of the vector ops.
+#
+#   python -m ascend910a_extras.autotune tune --ops swiglu add_rms_norm
+#   python -m ascend910a_extras.autotune show
+#
+# A config is the tiling the host would otherwise pick by itself (block_size of the ub blocks,
+# core_num of the launch), it reaches the host tiling as op attrs where 0 means the default.
+# tune() times every valid config of an (op, shape bucket) through the bench harness and keeps
+# the fastest in a json cache, ops.swiglu and ops.add_rms_norm look it up when they are called
+# without an explicit config. num_tokens is bucketed to the next power of two, dim is exact.
+#
+# The cache is ASCEND910A_EXTRAS_TUNING_CACHE or ~/.cache/ascend910a_extras/tuning.json,
+# entries are per platform profile so one file can serve several devices. It is read on the first
+# lookup and each shape's config is remembered, autotune.reset() rereads it.
+import argparse
+import itertools
+import json
+import os
+from pathlib import Path
+
+from ascend910a_extras.roofline import DEFAULT_PROFILE, Platform
+
+CACHE_ENV = "ASCEND910A_EXTRAS_TUNING_CACHE"
+DEFAULT_CACHE = Path.home() / ".cache" / "ascend910a_extras" / "tuning.json"
+DEFAULT_CONFIG = {"block_size": 0, "core_num": 0}
+
+# same limits as the host tiling
+BLOCK_SIZES = [16, 32, 64, 128, 256, 512, 1024, 2048, 4096]
+MAX_CORE_NUM = 65535
+
+
+def bucket(num_tokens: int, dim: int) -> dict:
+    return dict(num_tokens=1 << max(0, num_tokens - 1).bit_length(), dim=dim)
+
+
+def _swiglu_valid(num_tokens: int, dim: int, block_size: int, core_num: int) -> bool:
+    # the kernel has no tail block
+    return dim % block_size == 0
+
+
+def _add_rms_norm_valid(
+    num_tokens: int, dim: int, block_size: int, core_num: int
+) -> bool:
+    return block_size <= max(16, dim)
+
+
+# op -> validity of a config for a shape
+TUNABLE = {
+    "swiglu": _swiglu_valid,
+    "add_rms_norm": _add_rms_norm_valid,
+}
+
+
+def search_space(
+    op: str, num_tokens: int, dim: int, platform: Platform | None = None
+) -> list[dict]:
+    # all valid configs of a shape, the default first
+    if op not in TUNABLE:
+        raise ValueError(f"{op} is not tunable, tunable: {', '.join(TUNABLE)}")
+    platform = platform or Platform.load()
+    # one token per core by default, or a few rows per core
+    core_nums = [0] + [
+        n
+        for n in sorted({platform.aiv_num // 2, platform.aiv_num, 2 * platform.aiv_num})
+        if 0 < n < min(num_tokens, MAX_CORE_NUM)
+    ]
+    valid = TUNABLE[op]
+    return [DEFAULT_CONFIG] + [
+        dict(block_size=b, core_num=c)
+        for b, c in itertools.product(BLOCK_SIZES, core_nums)
+        if valid(num_tokens, dim, b, c) and (b, c) != (64, 0)
+    ]
+
+
+def _key(op: str, shape: dict) -> str:
+    return op + "[" + ",".join(f"{k}={v}" for k, v in shape.items()) + "]"
+
+
+def cache_path() -> Path:
+    return Path(os.environ.get(CACHE_ENV, DEFAULT_CACHE))
+
+
+class TuningCache:
+    def __init__(self, path: str | Path | None = None):
+        self.path = Path(path) if path else cache_path()
+        # platform -> key -> {"config": ..., "time": ...}
+        self.entries: dict[str, dict[str, dict]] = {}
+        if self.path.exists():
+            self.entries = json.loads(self.path.read_text())
+
+    def get(self, op: str, platform: str = DEFAULT_PROFILE, **shape) -> dict | None:
+        entry = self.entries.get(platform, {}).get(_key(op, bucket(**shape)))
+        return None if entry is None else entry["config"]
+
+    def put(
+        self,
+        op: str,
+        config: dict,
+        time: float,
+        platform: str = DEFAULT_PROFILE,
+        **shape,
+    ) -> None:
+        key = _key(op, bucket(**shape))
+        self.entries.setdefault(platform, {})[key] = {
+            "config": dict(config),
+            "time": time,
+        }
+
+    def save(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(self.entries, indent=2, sort_keys=True) + "\n")
+        tmp.replace(self.path)
+
+
+# loaded on the first lookup from the cache_path() of that time, dropped by tune() and reset()
+_cache: TuningCache | None = None
+# (op, platform, *shape) -> config, lookup runs on every op call without an explicit config,
+# keyed by the shape itself so a hit does not even compute the bucket
+_resolved: dict[tuple, dict] = {}
+
+
+def reset() -> None:
+    # forget the loaded cache, the next lookup reads cache_path() again
+    global _cache
+    _cache = None
+    _resolved.clear()
+
+
+def lookup(op: str, platform: str = DEFAULT_PROFILE, **shape) -> dict:
+    # the tuned config of a shape, DEFAULT_CONFIG if it was never tuned
+    global _cache
+    key = (op, platform, *shape.items())
+    config = _resolved.get(key)
+    if config is None:
+        if _cache is None:
+            _cache = TuningCache()
+        config = _cache.get(op, platform, **shape) or DEFAULT_CONFIG
+        _resolved[key] = config
+    return config
+
+
+def tune(
+    ops: list[str] | None = None,
+    shapes: list[dict] | None = None,
+    backend: str = "npu",
+    num_iter: int = 20,
+    num_warmup: int = 5,
+    profile: str = DEFAULT_PROFILE,
+    cache: TuningCache | None = None,
+    verbose: bool = False,
+) -> TuningCache:
+    # shapes default to the bench sweeps of each op, the winners are saved to the cache
+    from ascend910a_extras.bench.runner import run_case
+    from ascend910a_extras.bench.sweeps import SWEEPS, get_backend
+
+    b = get_backend(backend)
+    platform = Platform.load(profile)
+    cache = cache or TuningCache()
+    for op in ops or list(TUNABLE):
+        if op not in TUNABLE:
+            raise ValueError(f"{op} is not tunable, tunable: {', '.join(TUNABLE)}")
+        buckets = {_key(op, bucket(**s)): bucket(**s) for s in shapes or SWEEPS[op][0]}
+        for shape in buckets.values():
+            results = [
+                run_case(b, op, shape, num_iter, num_warmup, platform, config)
+                for config in search_space(op, platform=platform, **shape)
+            ]
+            best = min(results, key=lambda r: r.time_min)
+            cache.put(op, best.extra, best.time_min, platform.name, **shape)
+            if verbose:
+                default = results[0].time_min
+                print(
+                    f"{_key(op, shape):<40} {best.extra} {best.time_min * 1e6:10.2f} us ({default / best.time_min:.2f}x over default, {len(results)} configs)",
+                    flush=True,
+                )
+    cache.save()
+    reset()
+    return cache
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m ascend910a_extras.autotune")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("tune", help="tune and save to the cache")
+    p.add_argument(
+        "--ops", nargs="*", default=None, help=f"default all: {' '.join(TUNABLE)}"
+    )
+    p.add_argument("--backend", default="npu", choices=["npu", "ref"])
+    p.add_argument("--num-iter", type=int, default=20)
+    p.add_argument("--num-warmup", type=int, default=5)
+    p.add_argument("--profile", default=DEFAULT_PROFILE)
+    sub.add_parser("show", help="print the cache")
+    args = parser.parse_args(argv)
+    if args.cmd == "tune":
+        tune(
+            args.ops,
+            backend=args.backend,
+            num_iter=args.num_iter,
+            num_warmup=args.num_warmup,
+            profile=args.profile,
+            verbose=True,
+        )
+        print(f"saved {cache_path()}")
+        return
+    cache = TuningCache()
+    print(f"{cache.path}")
+    for platform, entries in cache.entries.items():
+        for key, entry in entries.items():
+            print(
+                f"{platform:<12} {key:<40} {entry['config']} {entry['time'] * 1e6:10.2f} us"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,24 @@
+# Benchmark harness of the custom ops.
+#
+#   python -m ascend910a_extras.bench run --backend npu --out results.json
+#   python -m ascend910a_extras.bench compare baseline.json results.json --threshold 0.1
+from ascend910a_extras.bench.results import (
+    Comparison,
+    Result,
+    compare,
+    load,
+    load_csv,
+    unmatched,
+    write,
+    write_csv,
+    write_json,
+)
+from ascend910a_extras.bench.runner import run, run_case
+from ascend910a_extras.bench.sweeps import SWEEPS, get_backend, sweep
+from ascend910a_extras.bench.timer import (
+    EventTimer,
+    Timing,
+    WallTimer,
+    do_bench,
+    get_timer,
+)
@@ -0,0 +1,93 @@
+import argparse
+import platform
+import sys
+
+import torch
+
+from ascend910a_extras.bench.results import (
+    compare,
+    format_table,
+    load,
+    unmatched,
+    write,
+)
+from ascend910a_extras.bench.runner import run
+from ascend910a_extras.bench.sweeps import SWEEPS
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m ascend910a_extras.bench")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    p = sub.add_parser("run", help="run the shape sweeps")
+    p.add_argument("--backend", default="npu", choices=["npu", "ref"])
+    p.add_argument(
+        "--ops", nargs="*", default=None, help=f"default all: {' '.join(SWEEPS)}"
+    )
+    p.add_argument("--num-iter", type=int, default=10)
+    p.add_argument("--num-warmup", type=int, default=10)
+    p.add_argument(
+        "--max-shapes", type=int, default=0, help="first shapes of each sweep, 0 = all"
+    )
+    p.add_argument("--out", default=None, help="*.json or *.csv")
+    p.add_argument(
+        "--profile", default=None, help="platform profile for percent-of-roofline"
+    )
+
+    p = sub.add_parser("compare", help="flag regressions against a baseline")
+    p.add_argument("baseline")
+    p.add_argument("current")
+    p.add_argument(
+        "--threshold", type=float, default=0.1, help="allowed slowdown, 0.1 = 10%%"
+    )
+
+    sub.add_parser("list", help="list the sweeps")
+
+    args = parser.parse_args(argv)
+    if args.cmd == "list":
+        for op, (shapes, _) in SWEEPS.items():
+            print(f"{op}: {len(shapes)} shapes")
+        return 0
+    if args.cmd == "run":
+        results = run(
+            args.ops,
+            args.backend,
+            args.num_iter,
+            args.num_warmup,
+            args.max_shapes,
+            verbose=True,
+            profile=args.profile,
+        )
+        if args.out:
+            meta = {
+                "backend": args.backend,
+                "torch": torch.__version__,
+                "host": platform.node(),
+            }
+            write(results, args.out, meta)
+        return 0
+
+    try:
+        baseline, current = load(args.baseline), load(args.current)
+        rows, regressed = compare(baseline, current, args.threshold)
+    except ValueError as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 2
+    missing, new = unmatched(baseline, current)
+    print(format_table(rows, args.threshold))
+    for key in new:
+        print(f"new, not in the baseline: {key}")
+    for key in missing:
+        print(f"MISSING, in the baseline but not run: {key}")
+    status = 0
+    if regressed:
+        print(f"{len(regressed)} regression(s) over {args.threshold:.0%}")
+        status = 1
+    if missing:
+        print(f"{len(missing)} baseline case(s) missing")
+        status = 1
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
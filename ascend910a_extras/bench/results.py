@@ -0,0 +1,135 @@
+# Benchmark results, JSON/CSV output and regression comparison against a baseline.
+import csv
+import json
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+
+
+@dataclass
+class Result:
+    op: str
+    backend: str
+    shape: dict
+    # seconds per call
+    time_min: float
+    time_median: float
+    tflops: float
+    gb_s: float
+    # lower bound time of ascend910a_extras.roofline over time_min, in percent
+    roofline_pct: float = 0.0
+    num_iter: int = 0
+    extra: dict = field(default_factory=dict)
+
+    @property
+    def key(self) -> str:
+        return self.op + "[" + ",".join(f"{k}={v}" for k, v in self.shape.items()) + "]"
+
+
+def write_json(
+    results: list[Result], path: str | Path, meta: dict | None = None
+) -> None:
+    data = {"meta": meta or {}, "results": [asdict(r) for r in results]}
+    Path(path).write_text(json.dumps(data, indent=2))
+
+
+# key is for reading, shape and extra are json so load reads the file back
+CSV_COLUMNS = ["key", "op", "backend", "shape", "time_min", "time_median", "tflops"]
+CSV_COLUMNS += ["gb_s", "roofline_pct", "num_iter", "extra"]
+CSV_TYPES = {"time_min": float, "time_median": float, "tflops": float, "gb_s": float}
+CSV_TYPES.update(roofline_pct=float, num_iter=int, shape=json.loads, extra=json.loads)
+
+
+def write_csv(results: list[Result], path: str | Path) -> None:
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(CSV_COLUMNS)
+        for r in results:
+            row = [r.key]
+            for c in CSV_COLUMNS[1:]:
+                value = getattr(r, c)
+                row.append(json.dumps(value) if isinstance(value, dict) else value)
+            writer.writerow(row)
+
+
+def load_csv(path: str | Path) -> list[Result]:
+    with open(path, newline="") as f:
+        rows = list(csv.DictReader(f))
+    results = []
+    for row in rows:
+        missing = [c for c in CSV_COLUMNS if c not in row]
+        if missing:
+            raise ValueError(f"{path} has no {missing} columns, not a results csv")
+        values = {c: CSV_TYPES.get(c, str)(row[c]) for c in CSV_COLUMNS[1:]}
+        results.append(Result(**values))
+    return results
+
+
+def write(results: list[Result], path: str | Path, meta: dict | None = None) -> None:
+    # the format follows the suffix
+    if str(path).endswith(".csv"):
+        write_csv(results, path)
+    else:
+        write_json(results, path, meta)
+
+
+def load(path: str | Path) -> list[Result]:
+    # the format follows the suffix, as in write
+    if str(path).endswith(".csv"):
+        return load_csv(path)
+    try:
+        data = json.loads(Path(path).read_text())
+        return [Result(**r) for r in data["results"]]
+    except (ValueError, KeyError, TypeError) as e:
+        raise ValueError(f"{path} is not a results json: {e}") from e
+
+
+@dataclass
+class Comparison:
+    key: str
+    baseline: float
+    current: float
+
+    @property
+    def ratio(self) -> float:
+        return self.current / self.baseline if self.baseline > 0 else float("inf")
+
+
+def compare(
+    baseline: list[Result], current: list[Result], threshold: float = 0.1
+) -> tuple[list[Comparison], list[Comparison]]:
+    # compares the min time of the cases in both runs, returns (all, regressed)
+    # a case regresses when it is more than threshold slower than the baseline
+    backends = {r.backend for r in baseline}, {r.backend for r in current}
+    if backends[0] and backends[1] and backends[0] != backends[1]:
+        raise ValueError(
+            f"baseline backend {sorted(backends[0])} is not current {sorted(backends[1])}"
+        )
+    base = {r.key: r for r in baseline}
+    rows = [
+        Comparison(r.key, base[r.key].time_min, r.time_min)
+        for r in current
+        if r.key in base
+    ]
+    regressed = [c for c in rows if c.ratio > 1 + threshold]
+    return rows, regressed
+
+
+def unmatched(
+    baseline: list[Result], current: list[Result]
+) -> tuple[list[str], list[str]]:
+    # (missing, new): keys of the baseline not run now, keys run now not in the baseline
+    base = {r.key for r in baseline}
+    keys = {r.key for r in current}
+    missing = [r.key for r in baseline if r.key not in keys]
+    new = [r.key for r in current if r.key not in base]
+    return missing, new
+
+
+def format_table(rows: list[Comparison], threshold: float) -> str:
+    lines = [f"{'case':<60} {'baseline(us)':>12} {'current(us)':>12} {'ratio':>7}"]
+    for c in rows:
+        flag = "  REGRESSION" if c.ratio > 1 + threshold else ""
+        lines.append(
+            f"{c.key:<60} {c.baseline * 1e6:>12.2f} {c.current * 1e6:>12.2f} {c.ratio:>7.3f}{flag}"
+        )
+    return "\n".join(lines)
@@ -0,0 +1,70 @@
+import torch
+
+from ascend910a_extras.bench.results import Result
+from ascend910a_extras.bench.sweeps import SWEEPS, Backend, get_backend
+from ascend910a_extras.bench.timer import do_bench, get_timer
+from ascend910a_extras.roofline import COSTS, Platform
+
+
+def run_case(
+    backend: Backend,
+    op: str,
+    shape: dict,
+    num_iter: int = 10,
+    num_warmup: int = 10,
+    platform: Platform | None = None,
+    config: dict | None = None,
+) -> Result:
+    # config: tiling args of a tunable op, kept in Result.extra
+    _, make = SWEEPS[op]
+    torch.manual_seed(0)
+    fn = make(backend, **shape, **(config or {}))
+    timing = do_bench(fn, num_iter, num_warmup, get_timer(backend.device))
+    cost = COSTS[op](**shape)
+    platform = platform or Platform.load()
+    return Result(
+        op=op,
+        backend=backend.name,
+        shape=shape,
+        time_min=timing.min,
+        time_median=timing.median,
+        tflops=cost.flops / timing.min / 1e12,
+        gb_s=cost.bytes / timing.min / 1e9,
+        roofline_pct=100.0 * cost.time(platform) / timing.min,
+        num_iter=num_iter,
+        extra=dict(config or {}),
+    )
+
+
+def run(
+    ops: list[str] | None = None,
+    backend: str = "npu",
+    num_iter: int = 10,
+    num_warmup: int = 10,
+    max_shapes: int = 0,
+    verbose: bool = False,
+    profile: str | None = None,
+) -> list[Result]:
+    # runs the sweeps of ops (all by default), max_shapes > 0 keeps the first shapes of each sweep
+    # percent-of-roofline is against the device itself on npu, else against the saved profile
+    b = get_backend(backend)
+    if profile is None and b.name == "npu":
+        platform = Platform.from_device()
+    else:
+        platform = Platform.load(profile) if profile else Platform.load()
+    results = []
+    for op in ops or list(SWEEPS):
+        if op not in SWEEPS:
+            raise ValueError(f"no sweep for {op}, available: {', '.join(SWEEPS)}")
+        shapes, _ = SWEEPS[op]
+        if max_shapes > 0:
+            shapes = shapes[:max_shapes]
+        for shape in shapes:
+            r = run_case(b, op, shape, num_iter, num_warmup, platform)
+            if verbose:
+                print(
+                    f"{r.key:<60} {r.time_min * 1e6:10.2f} us {r.tflops:8.3f} TFLOPS {r.gb_s:8.2f} GB/s {r.roofline_pct:6.1f}% of roofline",
+                    flush=True,
+                )
+            results.append(r)
+    return results
@@ -0,0 +1,149 @@
+# Shape sweeps of the benchmarked ops.
+#
+# A sweep is registered with @sweep(op, shapes), its function takes a backend and one shape
+# and returns fn, which runs the op once on inputs made in advance. Sweeps of tunable ops also
+# take the tiling config as keyword args, see ascend910a_extras.autotune. The shape keys are the
+# arguments of the op's cost in ascend910a_extras.roofline, which gives the flops and bytes
+# of the case. The "npu" backend runs ascend910a_extras.ops,
+# "ref" runs ascend910a_extras.ref on cpu so the harness itself can be tested without a device.
+import math
+from dataclasses import dataclass
+from typing import Callable
+
+import torch
+
+import ascend910a_extras.ref as ref
+from ascend910a_extras.kv_cache import BlockManager, KVCacheLayout
+
+SWEEPS: dict[str, tuple[list[dict], Callable]] = {}
+
+
+def sweep(op: str, shapes: list[dict]):
+    def register(make: Callable) -> Callable:
+        SWEEPS[op] = (shapes, make)
+        return make
+
+    return register
+
+
+@dataclass
+class Backend:
+    name: str
+    device: str
+    ops: object
+
+
+def get_backend(name: str) -> Backend:
+    if name == "npu":
+        import torch_npu
+
+        import ascend910a_extras.ops as ops
+
+        return Backend(name, "npu", ops)
+    if name == "ref":
+        return Backend(name, "cpu", ref)
+    raise ValueError(f"unknown backend {name}, expected npu or ref")
+
+
+def randn(*shape, device, dtype=torch.float16):
+    return torch.randn(*shape, dtype=dtype).to(device)
+
+
+@sweep(
+    "add_rms_norm",
+    [dict(num_tokens=n, dim=d) for n in [1, 64, 1024] for d in [1024, 4096]],
+)
+def add_rms_norm(backend: Backend, num_tokens: int, dim: int, **config):
+    x = randn(num_tokens, dim, device=backend.device)
+    residual = randn(num_tokens, dim, device=backend.device)
+    weight = randn(dim, device=backend.device)
+    return lambda: backend.ops.add_rms_norm(x, residual, weight, 1e-6, **config)
+
+
+@sweep(
+    "swiglu",
+    [dict(num_tokens=n, dim=d) for n in [1, 64, 1024] for d in [768, 3072]],
+)
+def swiglu(backend: Backend, num_tokens: int, dim: int, **config):
+    x = randn(num_tokens, 2 * dim, device=backend.device)
+    return lambda: backend.ops.swiglu(x, **config)
+
+
+@sweep(
+    "weight_quant_matmul",
+    [dict(m=m, n=4096, k=4096) for m in [1, 16, 128]],
+)
+def weight_quant_matmul(backend: Backend, m: int, n: int, k: int):
+    x = randn(m, k, device=backend.device)
+    w = torch.randint(-127, 128, (n, k), dtype=torch.int8).to(backend.device)
+    scale = (torch.rand(1, n) / 127).to(torch.float16).to(backend.device)
+    return lambda: backend.ops.weight_quant_matmul(x, w, scale)
+
+
+@sweep(
+    "grouped_matmul",
+    [
+        dict(num_tokens=t, dim=2048, inner_dim=768, num_experts=e)
+        for t, e in [(256, 8), (2048, 64)]
+    ],
+)
+def grouped_matmul(
+    backend: Backend, num_tokens: int, dim: int, inner_dim: int, num_experts: int
+):
+    x = randn(num_tokens, dim, device=backend.device)
+    w = randn(num_experts, inner_dim, dim, device=backend.device).transpose(1, 2)
+    counts = torch.full((num_experts,), num_tokens // num_experts)
+    counts[-1] += num_tokens - counts.sum()
+    group_list = counts.cumsum(dim=0).to(backend.device)
+    return lambda: backend.ops.grouped_matmul(x, w, group_list)
+
+
+@sweep(
+    "paged_attention",
+    [
+        dict(bs=bs, num_heads=32, num_kv_heads=8, head_dim=128, context_len=n)
+        for bs in [1, 16]
+        for n in [128, 2048]
+    ],
+)
+def paged_attention(
+    backend: Backend,
+    bs: int,
+    num_heads: int,
+    num_kv_heads: int,
+    head_dim: int,
+    context_len: int,
+):
+    page_size = 128
+    num_pages = bs * math.ceil(context_len / page_size)
+    layout = KVCacheLayout(1, num_kv_heads, head_dim, page_size, num_pages=num_pages)
+    manager = BlockManager(layout)
+    for seq_id in range(bs):
+        manager.append_slots(seq_id, context_len)
+    key_cache = randn(*layout.cache_shape, device=backend.device)
+    value_cache = randn(*layout.cache_shape, device=backend.device)
+    q = randn(bs, num_heads, head_dim, device=backend.device)
+    block_tables = manager.get_block_tables(list(range(bs)), device=backend.device)
+    context_lens = manager.get_context_lens(list(range(bs)), device=backend.device)
+    return lambda: backend.ops.paged_attention(
+        q, key_cache, value_cache, block_tables, context_lens
+    )
+
+
+@sweep(
+    "copy_blocks",
+    [
+        dict(num_layers=l, num_pairs=p, page_bytes=8 * 128 * 128 * 2)
+        for l in [1, 36]
+        for p in [1, 64]
+    ],
+)
+def copy_blocks(backend: Backend, num_layers: int, num_pairs: int, page_bytes: int):
+    # pages of 128 fp16 tokens
+    shape = (2 * num_pairs, page_bytes // (128 * 16 * 2), 128, 16)
+    key_caches = [randn(*shape, device=backend.device) for _ in range(num_layers)]
+    value_caches = [randn(*shape, device=backend.device) for _ in range(num_layers)]
+    mapping = torch.stack(
+        [torch.arange(num_pairs), torch.arange(num_pairs) + num_pairs], dim=1
+    ).to(backend.device)
+    return lambda: backend.ops.copy_blocks(key_caches, value_caches, mapping)
@@ -0,0 +1,63 @@
+# Timers of the benchmark harness: device events on npu, wall-clock on cpu.
+import statistics
+import time
+from dataclasses import dataclass
+from typing import Callable
+
+import torch
+
+
+class WallTimer:
+    # host wall-clock, for the cpu reference backend
+    def start(self) -> None:
+        self.t0 = time.perf_counter()
+
+    def stop(self) -> float:
+        return time.perf_counter() - self.t0
+
+
+class EventTimer:
+    # npu events around the kernels queued between start and stop
+    def __init__(self):
+        import torch_npu
+
+        self.start_event = torch.npu.Event(enable_timing=True)
+        self.end_event = torch.npu.Event(enable_timing=True)
+
+    def start(self) -> None:
+        self.start_event.record()
+
+    def stop(self) -> float:
+        self.end_event.record()
+        torch.npu.synchronize()
+        return self.start_event.elapsed_time(self.end_event) / 1000
+
+
+def get_timer(device: str):
+    return EventTimer() if str(device).startswith("npu") else WallTimer()
+
+
+@dataclass
+class Timing:
+    # seconds per call
+    min: float
+    median: float
+    mean: float
+    num_iter: int
+
+
+def do_bench(
+    fn: Callable[[], object], num_iter: int = 10, num_warmup: int = 10, timer=None
+) -> Timing:
+    timer = timer if timer is not None else WallTimer()
+    times = []
+    with torch.no_grad():
+        for i in range(num_warmup + num_iter):
+            timer.start()
+            fn()
+            t = timer.stop()
+            if i >= num_warmup:
+                times.append(t)
+    return Timing(
+        min(times), statistics.median(times), statistics.mean(times), num_iter
+    )
@@ -0,0 +1,745 @@
+# Differential fuzzing of the custom ops against the CPU references.
+#
+#   python -m ascend910a_extras.fuzz --num-cases 200
+#   python -m ascend910a_extras.fuzz --ops paged_attention --backend ref --seed 3
+#
+# A fuzzer is registered with @fuzzer(op, dims), dims gives the legal values of every shape
+# key, (min, max, step) or a list of choices simplest first, and valid() the constraints across
+# keys that the host tiling and the ffi checks enforce. Like a bench sweep its function takes a
+# backend and one shape and returns fn, which runs the op on inputs made from the torch seed and
+# returns the outputs, the caches for the in-place ops. A case runs on the reference and on the
+# backend from the same seed, the outputs must match within the tolerance of their dtype.
+#
+# Failing cases are shrunk, one shape key at a time, to the smallest shape that still fails and
+# appended to the corpus, ASCEND910A_EXTRAS_FUZZ_CORPUS or ~/.cache/ascend910a_extras/fuzz_corpus.jsonl,
+# which is replayed before the random cases of every run.
+#
+# Without a device the backend is the reference itself evaluated in fp32 ("ref"), so the
+# sampling, the references on odd shapes and the tolerances are fuzzed on cpu as well.
+# rope has no reference and is not fuzzed.
+import argparse
+import json
+import math
+import os
+import random
+import sys
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Callable
+
+import torch
+
+import ascend910a_extras.ref as ref
+from ascend910a_extras.bench.sweeps import Backend, get_backend, randn
+from ascend910a_extras.kv_cache import BlockManager, KVCacheLayout
+
+CORPUS_ENV = "ASCEND910A_EXTRAS_FUZZ_CORPUS"
+DEFAULT_CORPUS = Path.home() / ".cache" / "ascend910a_extras" / "fuzz_corpus.jsonl"
+
+# (atol, rtol) of an output dtype, integer outputs must match up to Fuzzer.int_atol
+TOLERANCES = {
+    torch.float16: (1e-2, 1e-2),
+    torch.bfloat16: (3e-2, 3e-2),
+    torch.float32: (1e-3, 1e-3),
+}
+
+
+@dataclass
+class Fuzzer:
+    op: str
+    dims: dict
+    make: Callable
+    valid: Callable[..., bool]
+    # multiplies TOLERANCES
+    tol: float = 1.0
+    int_atol: int = 0
+
+    def sample(self, rng: random.Random, max_tries: int = 1000) -> dict:
+        for _ in range(max_tries):
+            shape = {k: _sample_dim(rng, d) for k, d in self.dims.items()}
+            if self.valid(**shape):
+                return shape
+        raise RuntimeError(f"no valid shape of {self.op} in {max_tries} tries")
+
+    def smaller(self, key: str, value: int) -> list[int]:
+        # candidates of the shrinker, smallest first
+        d = self.dims[key]
+        if isinstance(d, list):
+            return d[: d.index(value)] if value in d else []
+        lo, _, step = d
+        candidates = [lo, lo + (value // 2 - lo) // step * step, value - step]
+        return sorted({c for c in candidates if lo <= c < value})
+
+
+FUZZERS: dict[str, Fuzzer] = {}
+
+
+def fuzzer(
+    op: str,
+    dims: dict,
+    valid: Callable[..., bool] | None = None,
+    tol: float = 1.0,
+    int_atol: int = 0,
+):
+    def register(make: Callable) -> Callable:
+        FUZZERS[op] = Fuzzer(op, dims, make, valid or (lambda **_: True), tol, int_atol)
+        return make
+
+    return register
+
+
+def _sample_dim(rng: random.Random, d):
+    if isinstance(d, list):
+        return rng.choice(d)
+    lo, hi, step = d
+    # the bounds and the first step often, otherwise log-uniform
+    if rng.random() < 0.25:
+        return rng.choice([lo, min(lo + step, hi), hi])
+    v = math.exp(rng.uniform(math.log(lo + 1), math.log(hi + 1))) - 1
+    return min(hi, max(lo, lo + round((v - lo) / step) * step))
+
+
+@dataclass
+class Case:
+    op: str
+    shape: dict
+    seed: int
+
+    @property
+    def key(self) -> str:
+        shape = ",".join(f"{k}={v}" for k, v in self.shape.items())
+        return f"{self.op}[{shape}]@{self.seed}"
+
+
+@dataclass
+class Failure:
+    case: Case
+    error: str
+    # the shrunk case, case itself if shrinking was off
+    minimal: Case
+
+
+class _Upcast:
+    # ref with its fp16 tensor args upcast to fp32, in-place updates are copied back
+    def __init__(self, ops):
+        self.ops = ops
+
+    def __getattr__(self, name: str):
+        fn = getattr(self.ops, name)
+
+        def call(*args, **kwargs):
+            upcast = []
+
+            def up(x):
+                if isinstance(x, list):
+                    return [up(t) for t in x]
+                if isinstance(x, torch.Tensor) and x.dtype == torch.float16:
+                    upcast.append((x, x.float()))
+                    return upcast[-1][1]
+                return x
+
+            out = fn(*[up(a) for a in args], **{k: up(v) for k, v in kwargs.items()})
+            for x, x32 in upcast:
+                x.copy_(x32)
+            return out
+
+        return call
+
+
+def get_fuzz_backend(name: str = "auto") -> Backend:
+    # auto: the device if there is one, else the fp32 reference
+    if name == "auto":
+        try:
+            import torch_npu
+
+            name = "npu" if torch.npu.is_available() else "ref"
+        except ImportError:
+            name = "ref"
+    if name == "ref":
+        return Backend("ref", "cpu", _Upcast(ref))
+    return get_backend(name)
+
+
+def _flatten(out) -> list:
+    if isinstance(out, (tuple, list)):
+        return [t for o in out for t in _flatten(o)]
+    return [] if out is None else [out]
+
+
+def compare(f: Fuzzer, actual, expected) -> str | None:
+    actual, expected = _flatten(actual), _flatten(expected)
+    if len(actual) != len(expected):
+        return f"{len(actual)} outputs, expected {len(expected)}"
+    for i, (a, e) in enumerate(zip(actual, expected)):
+        a = a.cpu()
+        if a.shape != e.shape:
+            return f"output {i}: shape {tuple(a.shape)}, expected {tuple(e.shape)}"
+        if e.is_floating_point():
+            atol, rtol = TOLERANCES[e.dtype]
+            atol, rtol = atol * f.tol, rtol * f.tol
+        else:
+            atol, rtol = f.int_atol, 0
+        try:
+            torch.testing.assert_close(
+                a.to(e.dtype), e, atol=atol, rtol=rtol, equal_nan=True
+            )
+        except AssertionError as err:
+            return f"output {i}: " + " ".join(str(err).split())
+    return None
+
+
+def check(case: Case, backend: Backend) -> str | None:
+    # None if the backend matches the reference on case, else what went wrong
+    f = FUZZERS[case.op]
+    try:
+        torch.manual_seed(case.seed)
+        expected = f.make(Backend("ref", "cpu", ref), **case.shape)()
+    except Exception as e:
+        return f"ref raised {type(e).__name__}: {e}"
+    try:
+        torch.manual_seed(case.seed)
+        actual = f.make(backend, **case.shape)()
+    except Exception as e:
+        return f"{backend.name} raised {type(e).__name__}: {e}"
+    return compare(f, actual, expected)
+
+
+def shrink(case: Case, backend: Backend, max_checks: int = 200) -> Case:
+    # greedy: take the first smaller value of any key that still fails until none does
+    f = FUZZERS[case.op]
+    num_checks = 0
+    improved = True
+    while improved and num_checks < max_checks:
+        improved = False
+        for key in f.dims:
+            for v in f.smaller(key, case.shape[key]):
+                shape = {**case.shape, key: v}
+                if not f.valid(**shape):
+                    continue
+                num_checks += 1
+                candidate = Case(case.op, shape, case.seed)
+                if check(candidate, backend) is not None:
+                    case, improved = candidate, True
+                    break
+            if improved:
+                break
+    return case
+
+
+def corpus_path() -> Path:
+    return Path(os.environ.get(CORPUS_ENV, DEFAULT_CORPUS))
+
+
+class Corpus:
+    # one json line per failing case, the minimal one
+    def __init__(self, path: str | Path | None = None):
+        self.path = Path(path) if path else corpus_path()
+        self.entries: list[dict] = []
+        if self.path.exists():
+            for line in self.path.read_text().splitlines():
+                if line.strip():
+                    self.entries.append(json.loads(line))
+
+    def cases(self, ops: list[str] | None = None) -> list[Case]:
+        cases = [Case(e["op"], e["shape"], e["seed"]) for e in self.entries]
+        return [c for c in cases if c.op in FUZZERS and (ops is None or c.op in ops)]
+
+    def add(self, case: Case, backend: str, error: str) -> bool:
+        if any(c.key == case.key for c in self.cases()):
+            return False
+        entry = {**asdict(case), "backend": backend, "error": error}
+        self.entries.append(entry)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, "a") as f:
+            f.write(json.dumps(entry) + "\n")
+        return True
+
+
+def fuzz(
+    ops: list[str] | None = None,
+    num_cases: int = 100,
+    backend: str | Backend = "auto",
+    seed: int = 0,
+    corpus: Corpus | None = None,
+    shrink_failures: bool = True,
+    verbose: bool = False,
+) -> list[Failure]:
+    # replays the corpus, then num_cases random cases round-robin over ops (all by default)
+    b = backend if isinstance(backend, Backend) else get_fuzz_backend(backend)
+    corpus = corpus or Corpus()
+    ops = ops or list(FUZZERS)
+    for op in ops:
+        if op not in FUZZERS:
+            raise ValueError(f"no fuzzer for {op}, available: {', '.join(FUZZERS)}")
+    rng = random.Random(seed)
+    cases = corpus.cases(ops) + [
+        Case(op, FUZZERS[op].sample(rng), rng.randrange(2**31))
+        for op in (ops[i % len(ops)] for i in range(num_cases))
+    ]
+    failures = []
+    for case in cases:
+        error = check(case, b)
+        if verbose:
+            print(f"{'FAIL' if error else 'ok':<4} {case.key}", flush=True)
+        if error is None:
+            continue
+        minimal = shrink(case, b) if shrink_failures else case
+        if minimal is not case:
+            error = check(minimal, b) or error
+        corpus.add(minimal, b.name, error)
+        failures.append(Failure(case, error, minimal))
+        if verbose:
+            print(f"     minimal {minimal.key}: {error}", flush=True)
+    return failures
+
+
+@fuzzer(
+    "swiglu",
+    dict(
+        num_tokens=(1, 4096, 1),
+        dim=(64, 8192, 64),
+        block_size=[0, 16, 32, 64, 128, 256, 512, 1024, 2048, 4096],
+    ),
+    valid=lambda num_tokens, dim, block_size: block_size == 0 or dim % block_size == 0,
+)
+def swiglu(backend: Backend, num_tokens: int, dim: int, block_size: int):
+    x = randn(num_tokens, 2 * dim, device=backend.device)
+    return lambda: backend.ops.swiglu(x, block_size=block_size, core_num=0)
+
+
+@fuzzer(
+    "add_rms_norm",
+    dict(
+        num_tokens=(1, 4096, 1),
+        dim=(64, 8192, 64),
+        block_size=[0, 16, 32, 64, 128, 256, 512, 1024, 2048, 4096],
+    ),
+)
+def add_rms_norm(backend: Backend, num_tokens: int, dim: int, block_size: int):
+    x = randn(num_tokens, dim, device=backend.device)
+    residual = randn(num_tokens, dim, device=backend.device)
+    weight = randn(dim, device=backend.device)
+    return lambda: backend.ops.add_rms_norm(
+        x, residual, weight, 1e-6, block_size=block_size, core_num=0
+    )
+
+
+def _matmul_fits(m: int, k: int, n: int, num_experts: int = 1) -> bool:
+    # keeps the cpu reference within seconds
+    return m * k * n <= 2**31 and num_experts * k * n <= 2**26
+
+
+def _quant_weight(*shape, device):
+    return torch.randint(-127, 128, shape, dtype=torch.int8).to(device)
+
+
+def _quant_scale(*shape, device):
+    return (torch.rand(*shape) / 127 + 1e-4).to(torch.float16).to(device)
+
+
+@fuzzer(
+    "weight_quant_matmul",
+    dict(
+        m=(1, 1024, 1),
+        n=(64, 4096, 64),
+        k=(64, 4096, 64),
+        group_size=[64, 128, 256, 512, 1024, 2048, 4096],
+    ),
+    valid=lambda m, n, k, group_size: k % group_size == 0 and _matmul_fits(m, k, n),
+    # fp16 outputs of dot products up to 4096 long
+    tol=4.0,
+)
+def weight_quant_matmul(backend: Backend, m: int, n: int, k: int, group_size: int):
+    x = randn(m, k, device=backend.device)
+    w = _quant_weight(n, k, device=backend.device)
+    scale = _quant_scale(k // group_size, n, device=backend.device)
+    return lambda: backend.ops.weight_quant_matmul(x, w, scale)
+
+
+def _group_list(num_tokens: int, num_experts: int, device):
+    # cumulative counts, some experts get no token
+    ids = torch.randint(0, num_experts, (num_tokens,))
+    counts = torch.bincount(ids, minlength=num_experts)
+    return counts.cumsum(dim=0).to(device)
+
+
+@fuzzer(
+    "grouped_matmul",
+    dict(
+        num_tokens=(1, 2048, 1),
+        dim=(64, 4096, 64),
+        inner_dim=(64, 4096, 64),
+        num_experts=(1, 64, 1),
+    ),
+    valid=lambda num_tokens, dim, inner_dim, num_experts: _matmul_fits(
+        num_tokens, dim, inner_dim, num_experts
+    ),
+    # fp16 outputs of dot products up to 4096 long
+    tol=4.0,
+)
+def grouped_matmul(
+    backend: Backend, num_tokens: int, dim: int, inner_dim: int, num_experts: int
+):
+    x = randn(num_tokens, dim, device=backend.device)
+    w = randn(num_experts, inner_dim, dim, device=backend.device).transpose(1, 2)
+    group_list = _group_list(num_tokens, num_experts, backend.device)
+    return lambda: backend.ops.grouped_matmul(x, w, group_list)
+
+
+@fuzzer(
+    "weight_quant_grouped_matmul",
+    dict(
+        num_tokens=(1, 2048, 1),
+        dim=(64, 4096, 64),
+        inner_dim=(64, 4096, 64),
+        num_experts=(1, 64, 1),
+        group_size=[64, 128, 256, 512, 1024, 2048, 4096],
+    ),
+    valid=lambda num_tokens, dim, inner_dim, num_experts, group_size: dim % group_size
+    == 0
+    and _matmul_fits(num_tokens, dim, inner_dim, num_experts),
+    # fp16 outputs of dot products up to 4096 long
+    tol=4.0,
+)
+def weight_quant_grouped_matmul(
+    backend: Backend,
+    num_tokens: int,
+    dim: int,
+    inner_dim: int,
+    num_experts: int,
+    group_size: int,
+):
+    x = randn(num_tokens, dim, device=backend.device)
+    w = _quant_weight(num_experts, inner_dim, dim, device=backend.device)
+    scale = _quant_scale(
+        num_experts, dim // group_size, inner_dim, device=backend.device
+    )
+    group_list = _group_list(num_tokens, num_experts, backend.device)
+    return lambda: backend.ops.weight_quant_grouped_matmul(x, w, scale, group_list)
+
+
+def _kv_cache(num_pages, num_kv_heads, head_dim, page_size, kv_quant, device):
+    # (cache, scale), random contents so untouched pages are checked too
+    layout = KVCacheLayout(1, num_kv_heads, head_dim, page_size, num_pages=num_pages)
+    if kv_quant:
+        cache = _quant_weight(*layout.cache_shape, device=device)
+        # dequantized values in about [-4, 4], like the fp16 cache
+        scale = _quant_scale(*layout.scale_shape, device=device) * 4
+        return cache, scale
+    return randn(*layout.cache_shape, device=device), None
+
+
+@fuzzer(
+    "reshape_and_cache",
+    dict(
+        num_tokens=(1, 1024, 1),
+        num_kv_heads=(1, 16, 1),
+        head_dim=(16, 256, 16),
+        page_size=(16, 256, 16),
+        num_pages=(1, 64, 1),
+        kv_quant=[0, 1],
+        key_only=[0, 1],
+        skipped_slots=[0, 1],
+    ),
+    valid=lambda num_tokens, num_pages, page_size, **_: num_tokens
+    <= num_pages * page_size,
+    # the int8 rounding may differ by one
+    int_atol=1,
+)
+def reshape_and_cache(
+    backend: Backend,
+    num_tokens: int,
+    num_kv_heads: int,
+    head_dim: int,
+    page_size: int,
+    num_pages: int,
+    kv_quant: int,
+    key_only: int,
+    skipped_slots: int,
+):
+    device = backend.device
+    key = randn(num_tokens, num_kv_heads, head_dim, device=device)
+    value = (
+        None if key_only else randn(num_tokens, num_kv_heads, head_dim, device=device)
+    )
+    k_cache, k_scale = _kv_cache(
+        num_pages, num_kv_heads, head_dim, page_size, kv_quant, device
+    )
+    v_cache, v_scale = (None, None)
+    if not key_only:
+        v_cache, v_scale = _kv_cache(
+            num_pages, num_kv_heads, head_dim, page_size, kv_quant, device
+        )
+    # distinct slots, skipped ones are out of range
+    slots = torch.randperm(num_pages * page_size)[:num_tokens].to(torch.int32)
+    if skipped_slots:
+        slots[torch.rand(num_tokens) < 0.25] = -1
+    slots = slots.to(device)
+
+    def run():
+        backend.ops.reshape_and_cache(
+            key, value, k_cache, v_cache, slots, k_scale, v_scale
+        )
+        return [k_cache, v_cache, k_scale, v_scale]
+
+    return run
+
+
+@fuzzer(
+    "copy_blocks",
+    dict(
+        num_layers=(1, 8, 1),
+        num_pairs=(1, 32, 1),
+        nh16=(1, 64, 1),
+        page_size=(16, 256, 16),
+        kv_quant=[0, 1],
+    ),
+)
+def copy_blocks(
+    backend: Backend,
+    num_layers: int,
+    num_pairs: int,
+    nh16: int,
+    page_size: int,
+    kv_quant: int,
+):
+    # dst pages are never a src, the scales have one head per 8 nh16
+    num_pages = 2 * num_pairs + 1
+    shape = (num_pages, nh16, page_size, 16)
+    caches = [
+        (
+            _quant_weight(*shape, device=backend.device)
+            if kv_quant
+            else randn(*shape, device=backend.device)
+        )
+        for _ in range(2 * num_layers)
+    ]
+    scales = None
+    if kv_quant:
+        scales = [
+            _quant_scale(num_pages, max(1, nh16 // 8), page_size, device=backend.device)
+            for _ in range(2 * num_layers)
+        ]
+    pages = torch.randperm(num_pages)
+    mapping = torch.stack([pages[:num_pairs], pages[num_pairs : 2 * num_pairs]], dim=1)
+    mapping = mapping.to(backend.device)
+
+    def run():
+        key_scales = scales[:num_layers] if scales else None
+        value_scales = scales[num_layers:] if scales else None
+        backend.ops.copy_blocks(
+            caches[:num_layers], caches[num_layers:], mapping, key_scales, value_scales
+        )
+        return caches + (scales or [])
+
+    return run
+
+
+def _paged_attention_valid(
+    num_query_tokens: int,
+    max_context_len: int,
+    page_size: int,
+    head_dim: int,
+    num_kv_heads: int,
+    group_size: int,
+    **_,
+) -> bool:
+    # same page limit as the host tiling, num_heads is kept to what models use
+    return (
+        num_query_tokens <= max_context_len
+        and page_size * head_dim <= 128 * 128
+        and num_kv_heads * group_size <= 128
+    )
+
+
+@fuzzer(
+    "paged_attention",
+    dict(
+        bs=(1, 8, 1),
+        num_query_tokens=(1, 4, 1),
+        num_kv_heads=(1, 8, 1),
+        group_size=(1, 64, 1),
+        head_dim=(16, 256, 16),
+        page_size=(16, 256, 16),
+        max_context_len=(1, 2048, 1),
+        kv_quant=[0, 1],
+        alibi=[0, 1],
+        window_size=(0, 2048, 1),
+    ),
+    valid=lambda **shape: _paged_attention_valid(**shape),
+    # fp16 probabilities and int8 kv
+    tol=2.0,
+)
+def paged_attention(
+    backend: Backend,
+    bs: int,
+    num_query_tokens: int,
+    num_kv_heads: int,
+    group_size: int,
+    head_dim: int,
+    page_size: int,
+    max_context_len: int,
+    kv_quant: int,
+    alibi: int,
+    window_size: int,
+):
+    device = backend.device
+    num_heads = num_kv_heads * group_size
+    context_lens = torch.randint(num_query_tokens, max_context_len + 1, (bs,))
+    context_lens[0] = max_context_len
+    num_pages = sum(math.ceil(int(n) / page_size) for n in context_lens) + 1
+    layout = KVCacheLayout(1, num_kv_heads, head_dim, page_size, num_pages=num_pages)
+    manager = BlockManager(layout)
+    # pages are handed out in a random order
+    manager.free_pages = torch.randperm(num_pages).tolist()
+    for seq_id, n in enumerate(context_lens.tolist()):
+        manager.append_slots(seq_id, n)
+    k_cache, k_scale = _kv_cache(
+        num_pages, num_kv_heads, head_dim, page_size, kv_quant, device
+    )
+    v_cache, v_scale = _kv_cache(
+        num_pages, num_kv_heads, head_dim, page_size, kv_quant, device
+    )
+    q = randn(bs * num_query_tokens, num_heads, head_dim, device=device)
+    slopes = ref.alibi_slopes(num_heads).to(device) if alibi else None
+    block_tables = manager.get_block_tables(list(range(bs)), device=device)
+    context_lens = context_lens.to(torch.int32).to(device)
+    return lambda: backend.ops.paged_attention(
+        q,
+        k_cache,
+        v_cache,
+        block_tables,
+        context_lens,
+        k_scale,
+        v_scale,
+        alibi_slopes=slopes,
+        window_size=window_size,
+    )
+
+
+@fuzzer(
+    "moe_gating_topk",
+    dict(
+        num_tokens=(1, 2048, 1),
+        num_experts=(1, 1024, 1),
+        top_k=(1, 8, 1),
+        renormalize=[1, 0],
+    ),
+    valid=lambda num_tokens, num_experts, top_k, renormalize: top_k <= num_experts,
+)
+def moe_gating_topk(
+    backend: Backend, num_tokens: int, num_experts: int, top_k: int, renormalize: int
+):
+    logits = randn(num_tokens, num_experts, device=backend.device)
+    return lambda: backend.ops.moe_gating_topk(logits, top_k, bool(renormalize))
+
+
+@fuzzer(
+    "moe_permute",
+    dict(
+        num_tokens=(1, 2048, 1),
+        top_k=(1, 8, 1),
+        num_experts=(1, 1024, 1),
+        hidden=(16, 4096, 16),
+        dropped=[0, 1],
+    ),
+    valid=lambda num_tokens, hidden, top_k, **_: num_tokens * top_k * hidden <= 2**26,
+)
+def moe_permute(
+    backend: Backend,
+    num_tokens: int,
+    top_k: int,
+    num_experts: int,
+    hidden: int,
+    dropped: int,
+):
+    # dropped: some ids are out of range, e.g. experts of another rank
+    x = randn(num_tokens, hidden, device=backend.device)
+    high = 2 * num_experts if dropped else num_experts
+    topk_ids = torch.randint(-1 if dropped else 0, high, (num_tokens, top_k))
+    topk_ids = topk_ids.to(torch.int32).to(backend.device)
+    return lambda: backend.ops.moe_permute(x, topk_ids, num_experts)
+
+
+@fuzzer(
+    "moe_unpermute",
+    dict(
+        num_tokens=(1, 2048, 1),
+        top_k=(1, 8, 1),
+        hidden=(16, 4096, 16),
+        dropped=[0, 1],
+    ),
+    valid=lambda num_tokens, hidden, top_k, **_: num_tokens * top_k * hidden <= 2**26,
+)
+def moe_unpermute(
+    backend: Backend, num_tokens: int, top_k: int, hidden: int, dropped: int
+):
+    num_rows = num_tokens * top_k
+    y = randn(num_rows, hidden, device=backend.device)
+    expanded_row_idx = torch.randperm(num_rows).to(torch.int32)
+    if dropped:
+        expanded_row_idx[torch.rand(num_rows) < 0.25] = -1
+    expanded_row_idx = expanded_row_idx.to(backend.device)
+    topk_weights = torch.rand(num_tokens, top_k).to(backend.device)
+    return lambda: backend.ops.moe_unpermute(y, expanded_row_idx, topk_weights)
+
+
+@fuzzer(
+    "sampling",
+    dict(
+        bs=(1, 64, 1),
+        vocab=(64, 32768, 64),
+        penalty_tokens=(0, 64, 1),
+    ),
+    valid=lambda bs, vocab, penalty_tokens: bs * vocab <= 2**21,
+)
+def sampling(backend: Backend, bs: int, vocab: int, penalty_tokens: int):
+    # every row has its own mix of greedy, top_k, top_p and temperature
+    device = backend.device
+    logits = (randn(bs, vocab, device="cpu") * 4).to(device)
+    temperature = torch.where(torch.rand(bs) < 0.2, 0.0, torch.rand(bs) * 1.5 + 0.1)
+    top_k = torch.where(torch.rand(bs) < 0.5, 0, torch.randint(1, vocab + 1, (bs,))).to(
+        torch.int32
+    )
+    top_p = torch.where(torch.rand(bs) < 0.5, 1.0, torch.rand(bs) * 0.9 + 0.1)
+    repetition_penalty = torch.rand(bs) + 1.0
+    uniform = torch.rand(bs)
+    penalty_token_ids = None
+    if penalty_tokens:
+        penalty_token_ids = torch.randint(-1, vocab, (bs, penalty_tokens)).to(
+            torch.int32
+        )
+        penalty_token_ids = penalty_token_ids.to(device)
+    args = [temperature, top_k, top_p, repetition_penalty, uniform]
+    args = [a.to(device) for a in args]
+    return lambda: backend.ops.sampling(logits, *args, penalty_token_ids)
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m ascend910a_extras.fuzz")
+    parser.add_argument(
+        "--ops", nargs="*", default=None, help=f"default all: {' '.join(FUZZERS)}"
+    )
+    parser.add_argument("--num-cases", type=int, default=100)
+    parser.add_argument("--backend", default="auto", choices=["auto", "npu", "ref"])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--corpus", default=None, help=f"default {corpus_path()}")
+    parser.add_argument("--no-shrink", action="store_true")
+    args = parser.parse_args(argv)
+    failures = fuzz(
+        args.ops,
+        args.num_cases,
+        args.backend,
+        args.seed,
+        Corpus(args.corpus),
+        shrink_failures=not args.no_shrink,
+        verbose=True,
+    )
+    if failures:
+        print(f"{len(failures)} failure(s), minimal cases saved to the corpus")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
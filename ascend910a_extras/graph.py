@@ -1 +1,371 @@
-from ascend910a_extras.ascend910a_extras_C.graph import *
+# The ATB graph classes of the C extension, and the per-node report of instrumented graphs.
+#
+# Graph.instrument = True before building wraps every node between two device events:
+#
+#   g = graph.Graph(config)
+#   g.instrument = True
+#   g.build_model(num_split)
+#   ...ctx.setup(g, ...) and some ctx.run(g, workspace)
+#   rows = graph.node_report(g.node_stats())
+#   print(graph.format_report(rows))
+#   print(graph.format_report(graph.aggregate(rows, "role")))
+#
+# Node names come from the node registry of GraphBuilder (Graph.nodes()): the layer and block
+# scope of the node and its kind, e.g. layers.3.attn.linear_0 is the qkv projection of layer 3.
+# The report functions only take the dicts of Graph.node_stats(), so a run can be saved as json
+# and looked at elsewhere:
+#
+#   python -m ascend910a_extras.graph report node_stats.json --by op_type
+#
+# Without instrument the splits are still timed by ascend910a_extras.profile as graph.<split>.
+#
+# Graph.export() gives the built ops as data (per op its tensor counts, per node its kind, params,
+# tensor ids and input reshapes) and Graph.load() creates the ops from it without building them.
+# cached_graph keeps them on disk, keyed by the GraphConfig, the build, the library version and
+# the built extension (a rebuild is a miss):
+#
+#   g = graph.cached_graph(config, "model", num_split)   # build_model(num_split) the first time
+#
+# The cache is ASCEND910A_EXTRAS_GRAPH_CACHE or ~/.cache/ascend910a_extras/graphs, one zlib
+# compressed json per graph. A file that does not load is rebuilt and overwritten.
+#
+# GraphConfig.fused_layers builds each decoder layer from 5 nodes instead of about 15, with the
+# same weights. launch_count(g.export()) counts the nodes a decode step runs, per split and layer.
+import argparse
+import hashlib
+import importlib.metadata
+import importlib.util
+import json
+import os
+import re
+import sys
+import tempfile
+import zlib
+from pathlib import Path
+
+from ascend910a_extras import load_native
+
+LAYER_PATTERN = re.compile(r"^layers\.(\d+)\.")
+KEYS = ["op_type", "role", "layer", "split"]
+
+# bumped when the file layout changes, the node kinds are versioned by the extension
+FORMAT_VERSION = 1
+CACHE_ENV = "ASCEND910A_EXTRAS_GRAPH_CACHE"
+DEFAULT_CACHE = Path.home() / ".cache" / "ascend910a_extras" / "graphs"
+CONFIG_FIELDS = [
+    "batch_size",
+    "hidden_size",
+    "num_heads",
+    "num_kv_heads",
+    "intermediate_size",
+    "num_layers",
+    "rms_norm_eps",
+    "weight_quant",
+    "num_experts",
+    "num_experts_per_tok",
+    "norm_topk_prob",
+    "shared_expert_intermediate_size",
+    "sampling",
+    "tie_word_embeddings",
+    "num_speculative_tokens",
+    "fused_layers",
+]
+NODE_KEYS = ["name", "kind", "params", "inputs", "outputs", "reshapes"]
+SPLIT_KEYS = ["name", "input_num", "in_tensor_num", "out_tensor_num"]
+SPLIT_KEYS += ["internal_tensor_num", "nodes"]
+
+
+# the ATB graph classes of the C extension, loaded on first use
+def __getattr__(name: str):
+    if name.startswith("__"):
+        raise AttributeError(name)
+    return getattr(load_native().graph, name)
+
+
+def _native():
+    return load_native().graph
+
+
+def role(name: str) -> str:
+    # the node name without its layer, the same node of every layer has the same role
+    return LAYER_PATTERN.sub("", name)
+
+
+def layer(name: str) -> str:
+    m = LAYER_PATTERN.match(name)
+    return f"layers.{m.group(1)}" if m else "-"
+
+
+def format_shapes(in_shapes: list, out_shapes: list) -> str:
+    def fmt(shapes):
+        return ",".join("[" + "x".join(str(d) for d in s) + "]" for s in shapes)
+
+    return f"{fmt(in_shapes)}->{fmt(out_shapes)}"
+
+
+def node_report(stats: list[dict]) -> list[dict]:
+    """One row per node in execution order with the device us per call and the share of the total."""
+    total_ns = sum(s["device_ns"] / s["calls"] for s in stats if s["calls"])
+    rows = []
+    for s in stats:
+        ns = s["device_ns"] / s["calls"] if s["calls"] else 0.0
+        rows.append(
+            {
+                "split": s["split"],
+                "name": s["name"],
+                "op_type": s["op_type"],
+                "role": role(s["name"]),
+                "layer": layer(s["name"]),
+                "shapes": format_shapes(s["in_shapes"], s["out_shapes"]),
+                "calls": s["calls"],
+                "us": ns / 1e3,
+                "share": ns / total_ns if total_ns else 0.0,
+                "out_bytes": s["out_bytes"],
+                "workspace_bytes": s["workspace_bytes"],
+            }
+        )
+    return rows
+
+
+def aggregate(rows: list[dict], by: str = "op_type") -> list[dict]:
+    """Rows of node_report summed per op_type, role, layer or split, the most expensive first."""
+    if by not in KEYS:
+        raise ValueError(f"by must be one of {KEYS}, got {by!r}")
+    groups = {}
+    for row in rows:
+        if row[by] not in groups:
+            groups[row[by]] = {"name": row[by], "nodes": 0, "us": 0.0, "share": 0.0}
+            groups[row[by]].update(out_bytes=0, workspace_bytes=0)
+        g = groups[row[by]]
+        g["nodes"] += 1
+        g["us"] += row["us"]
+        g["share"] += row["share"]
+        # outputs summed as if all alive at once, the nodes share one workspace
+        g["out_bytes"] += row["out_bytes"]
+        g["workspace_bytes"] = max(g["workspace_bytes"], row["workspace_bytes"])
+    return sorted(groups.values(), key=lambda g: -g["us"])
+
+
+def format_report(rows: list[dict]) -> str:
+    # node_report rows get their op type and shapes, aggregate rows their node count
+    per_node = bool(rows) and "shapes" in rows[0]
+    width = max([len(row["name"]) for row in rows] + [4])
+    header = f"{'name':<{width}}"
+    header += f" {'op_type':<24}" if per_node else f" {'nodes':>6}"
+    header += f" {'us':>10} {'share':>7} {'out_bytes':>12} {'workspace':>12}"
+    if per_node:
+        header += "  shapes"
+    lines = [header]
+    for row in rows:
+        line = f"{row['name']:<{width}}"
+        line += f" {row['op_type']:<24}" if per_node else f" {row['nodes']:>6}"
+        line += f" {row['us']:>10.2f} {row['share']:>7.1%}"
+        line += f" {row['out_bytes']:>12} {row['workspace_bytes']:>12}"
+        if per_node:
+            line += f"  {row['shapes']}"
+        lines.append(line)
+    total = sum(row["us"] for row in rows)
+    pad = 24 if per_node else 6
+    lines.append(f"{'total':<{width}} {'':<{pad}} {total:>10.2f}")
+    return "\n".join(lines)
+
+
+def config_dict(config) -> dict:
+    return {name: getattr(config, name) for name in CONFIG_FIELDS}
+
+
+def library_version() -> str:
+    try:
+        return importlib.metadata.version("ascend910a_extras")
+    except importlib.metadata.PackageNotFoundError:
+        return "unknown"
+
+
+def extension_path() -> str:
+    # the built C extension, found without loading it
+    spec = importlib.util.find_spec("ascend910a_extras.ascend910a_extras_C")
+    return spec.origin if spec is not None and spec.origin else ""
+
+
+def extension_identity() -> str:
+    # a rebuild changes the GraphBuilder wiring without a new package version, size and mtime
+    # of the shared object stand in for a digest of it
+    path = extension_path()
+    if not path or not os.path.isfile(path):
+        return ""
+    stat = os.stat(path)
+    return f"{stat.st_size}:{stat.st_mtime_ns}"
+
+
+def cache_key(config, build: str = "model", args: tuple = ()) -> str:
+    """The file name of a graph: the config, build_<build>(*args) and the versions."""
+    key = {
+        "config": config_dict(config),
+        "build": build,
+        "args": list(args),
+        "format": FORMAT_VERSION,
+        "library": library_version(),
+        "extension": extension_identity(),
+    }
+    data = json.dumps(key, sort_keys=True).encode()
+    return f"{build}-{hashlib.sha256(data).hexdigest()[:16]}"
+
+
+def cache_dir() -> Path:
+    return Path(os.environ.get(CACHE_ENV, DEFAULT_CACHE))
+
+
+def _expect(value, kind: type, what: str) -> None:
+    # json of the wrong shape is a bad file like any other, not a KeyError deep in the caller
+    if not isinstance(value, kind) or (kind is int and isinstance(value, bool)):
+        raise ValueError(f"{what} must be {kind.__name__}, got {type(value).__name__}")
+
+
+def validate(graph_desc: dict) -> None:
+    # the checks Graph.load would fail later on, with the node at fault
+    _expect(graph_desc, dict, "graph")
+    if "splits" not in graph_desc:
+        raise ValueError("graph has no splits")
+    _expect(graph_desc["splits"], list, "splits")
+    for split in graph_desc["splits"]:
+        _expect(split, dict, "split")
+        missing = [key for key in SPLIT_KEYS if key not in split]
+        if missing:
+            raise ValueError(f"split {split.get('name')} has no {missing}")
+        for key in [
+            "input_num",
+            "in_tensor_num",
+            "out_tensor_num",
+            "internal_tensor_num",
+        ]:
+            _expect(split[key], int, f"{key} of split {split['name']}")
+        _expect(split["nodes"], list, f"nodes of split {split['name']}")
+        num = split["in_tensor_num"] + split["out_tensor_num"]
+        num += split["internal_tensor_num"]
+        written = set(range(split["in_tensor_num"]))
+        for node in split["nodes"]:
+            _expect(node, dict, f"node of split {split['name']}")
+            missing = [key for key in NODE_KEYS if key not in node]
+            if missing:
+                raise ValueError(f"node {node.get('name')} has no {missing}")
+            where = f"node {node['name']} of {split['name']}"
+            _expect(node["name"], str, f"name of {where}")
+            _expect(node["kind"], str, f"kind of {where}")
+            _expect(node["params"], dict, f"params of {where}")
+            _expect(node["reshapes"], list, f"reshapes of {where}")
+            for key in ["inputs", "outputs"]:
+                _expect(node[key], list, f"{key} of {where}")
+                for i in node[key]:
+                    _expect(i, int, f"tensor of {where}")
+            for i in node["inputs"] + node["outputs"]:
+                if not 0 <= i < num:
+                    raise ValueError(f"{where} uses tensor {i} of {num}")
+            unwritten = [i for i in node["inputs"] if i not in written]
+            if unwritten:
+                raise ValueError(f"{where} reads {unwritten} before they are written")
+            if node["reshapes"] and len(node["reshapes"]) != len(node["inputs"]):
+                raise ValueError(f"{where} has reshapes for some of its inputs")
+            written.update(node["outputs"])
+
+
+def launch_count(graph_desc: dict) -> dict:
+    """Kernel launches of one run of every split, one per node: in total, per split and per layer."""
+    splits = {}
+    layers = {}
+    for split in graph_desc["splits"]:
+        splits[split["name"]] = len(split["nodes"])
+        for node in split["nodes"]:
+            name = layer(node["name"])
+            if name != "-":
+                layers[name] = layers.get(name, 0) + 1
+    return {"step": sum(splits.values()), "splits": splits, "layers": layers}
+
+
+def dumps(graph, build: str = "model", args: tuple = ()) -> bytes:
+    """A built Graph as a compact file, Graph.export() with the config and versions."""
+    data = {
+        "format": FORMAT_VERSION,
+        "library": library_version(),
+        "build": build,
+        "args": list(args),
+        "config": config_dict(graph.config),
+        "graph": graph.export(),
+    }
+    text = json.dumps(data, sort_keys=True, separators=(",", ":"))
+    return zlib.compress(text.encode(), 6)
+
+
+def loads(data: bytes) -> dict:
+    try:
+        saved = json.loads(zlib.decompress(data))
+    except (zlib.error, ValueError) as e:
+        raise ValueError(f"not a serialized graph: {e}") from e
+    _expect(saved, dict, "a serialized graph")
+    if saved.get("format") != FORMAT_VERSION:
+        raise ValueError(
+            f"format must be {FORMAT_VERSION}, got {saved.get('format')!r}"
+        )
+    missing = [key for key in ["config", "graph"] if key not in saved]
+    if missing:
+        raise ValueError(f"serialized graph has no {missing}")
+    _expect(saved["config"], dict, "config")
+    validate(saved["graph"])
+    return saved
+
+
+def cached_graph(config, build: str = "model", *args, path: str | Path | None = None):
+    """Graph(config) with build_<build>(*args), loaded from the cache once it was built."""
+    native = _native()
+    path = (
+        Path(path) if path else cache_dir() / f"{cache_key(config, build, args)}.graph"
+    )
+    if path.exists():
+        g = native.Graph(config)
+        try:
+            saved = loads(path.read_bytes())
+            if saved["config"] != config_dict(config):
+                raise ValueError(f"{path} is a graph of another config")
+            g.load(saved["graph"])
+            return g
+        except (ValueError, RuntimeError):
+            # stale or broken, e.g. the node kinds of another extension version
+            pass
+    g = native.Graph(config)
+    getattr(g, f"build_{build}")(*args)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # a temp file per process, processes starting on the same config each replace the file whole
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(dumps(g, build, args))
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+    return g
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m ascend910a_extras.graph")
+    sub = parser.add_subparsers(dest="command", required=True)
+    report = sub.add_parser(
+        "report", help="per-node report of saved Graph.node_stats()"
+    )
+    report.add_argument("stats", help="json list of Graph.node_stats()")
+    report.add_argument("--by", choices=KEYS, default=None, help="aggregate the nodes")
+    report.add_argument("--top", type=int, default=0, help="only the N most expensive")
+    args = parser.parse_args(argv)
+
+    with open(args.stats) as f:
+        rows = node_report(json.load(f))
+    if args.by:
+        rows = aggregate(rows, args.by)
+    elif args.top:
+        rows = sorted(rows, key=lambda row: -row["us"])
+    if args.top:
+        rows = rows[: args.top]
+    print(format_report(rows))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
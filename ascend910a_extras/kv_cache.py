@@ -0,0 +1,179 @@
+# Paged kv cache layout and host-side page allocation.
+#
+#   kv_cache: [num_pages, num_kv_heads * head_dim // 16, page_size, 16]
+#   scale:    [num_pages, num_kv_heads, page_size] fp16, only for the int8 cache
+#
+# The page id in block_tables and slot // page_size in slot_indices index the first dim of both.
+# With a sliding window, leading pages that left the window are freed and their block_tables
+# entries are left as FREED_PAGE, paged_attention never reads them.
+import math
+from dataclasses import dataclass
+
+import torch
+
+FREED_PAGE = -1
+
+
+def num_freeable_pages(context_len: int, window_size: int, page_size: int) -> int:
+    # leading pages no future query can see, the next query is at position >= context_len - 1
+    if window_size <= 0:
+        return 0
+    return max(0, context_len - window_size) // page_size
+
+
+@dataclass
+class KVCacheLayout:
+    num_layers: int
+    num_kv_heads: int
+    head_dim: int
+    page_size: int = 128
+    num_pages: int = 0
+    dtype: torch.dtype = torch.float16
+
+    @property
+    def kv_quant(self) -> bool:
+        return self.dtype == torch.int8
+
+    @property
+    def cache_shape(self) -> tuple[int, int, int, int]:
+        return (
+            self.num_pages,
+            self.num_kv_heads * self.head_dim // 16,
+            self.page_size,
+            16,
+        )
+
+    @property
+    def scale_shape(self) -> tuple[int, int, int]:
+        return (self.num_pages, self.num_kv_heads, self.page_size)
+
+    @property
+    def bytes_per_page(self) -> int:
+        # k and v of all layers, including the scales of the int8 cache
+        elems = self.num_kv_heads * self.head_dim * self.page_size
+        nbytes = elems * torch.tensor([], dtype=self.dtype).element_size()
+        if self.kv_quant:
+            nbytes += self.num_kv_heads * self.page_size * 2
+        return 2 * self.num_layers * nbytes
+
+    def num_pages_for(self, memory_bytes: int) -> int:
+        return memory_bytes // self.bytes_per_page
+
+    def allocate(self, device="npu") -> list[tuple]:
+        # one (key_cache, value_cache, key_scale, value_scale) per layer, scales are None for fp16
+        caches = []
+        for _ in range(self.num_layers):
+            k = torch.zeros(self.cache_shape, dtype=self.dtype, device=device)
+            v = torch.zeros(self.cache_shape, dtype=self.dtype, device=device)
+            k_scale, v_scale = None, None
+            if self.kv_quant:
+                k_scale = torch.ones(
+                    self.scale_shape, dtype=torch.float16, device=device
+                )
+                v_scale = torch.ones(
+                    self.scale_shape, dtype=torch.float16, device=device
+                )
+            caches.append((k, v, k_scale, v_scale))
+        return caches
+
+
+class BlockManager:
+    def __init__(self, layout: KVCacheLayout):
+        assert layout.num_pages > 0, "layout.num_pages must be set"
+        self.layout = layout
+        self.page_size = layout.page_size
+        # pop from the end, so low page ids are used first
+        self.free_pages = list(range(layout.num_pages - 1, -1, -1))
+        self.block_tables: dict[int, list[int]] = {}
+        self.context_lens: dict[int, int] = {}
+
+    @property
+    def num_free_pages(self) -> int:
+        return len(self.free_pages)
+
+    def num_pages_needed(self, seq_id: int, num_tokens: int) -> int:
+        context_len = self.context_lens.get(seq_id, 0)
+        num_pages = len(self.block_tables.get(seq_id, []))
+        return max(
+            0, math.ceil((context_len + num_tokens) / self.page_size) - num_pages
+        )
+
+    def can_append(self, seq_id: int, num_tokens: int = 1) -> bool:
+        return self.num_pages_needed(seq_id, num_tokens) <= self.num_free_pages
+
+    def append_slots(self, seq_id: int, num_tokens: int = 1) -> list[int]:
+        # reserve num_tokens more slots for seq_id, returns their slot indices
+        num_pages = self.num_pages_needed(seq_id, num_tokens)
+        if num_pages > self.num_free_pages:
+            raise RuntimeError(
+                f"out of kv cache pages: need {num_pages}, free {self.num_free_pages}"
+            )
+        table = self.block_tables.setdefault(seq_id, [])
+        for _ in range(num_pages):
+            table.append(self.free_pages.pop())
+        start = self.context_lens.get(seq_id, 0)
+        self.context_lens[seq_id] = start + num_tokens
+        return [
+            table[i // self.page_size] * self.page_size + i % self.page_size
+            for i in range(start, start + num_tokens)
+        ]
+
+    def free(self, seq_id: int) -> None:
+        table = self.block_tables.pop(seq_id, [])
+        self.free_pages.extend(p for p in reversed(table) if p != FREED_PAGE)
+        self.context_lens.pop(seq_id, None)
+
+    def fork(self, seq_id: int, new_seq_id: int) -> list[tuple[int, int]]:
+        # new_seq_id gets a copy of the pages of seq_id, returns the (src, dst) pairs for copy_blocks
+        table = self.block_tables[seq_id]
+        pages = [p for p in table if p != FREED_PAGE]
+        if len(pages) > self.num_free_pages:
+            raise RuntimeError(
+                f"out of kv cache pages: need {len(pages)}, free {self.num_free_pages}"
+            )
+        new_table, mapping = [], []
+        for p in table:
+            if p == FREED_PAGE:
+                new_table.append(FREED_PAGE)
+                continue
+            new_page = self.free_pages.pop()
+            new_table.append(new_page)
+            mapping.append((p, new_page))
+        self.block_tables[new_seq_id] = new_table
+        self.context_lens[new_seq_id] = self.context_lens[seq_id]
+        return mapping
+
+    def rollback(self, seq_id: int, num_tokens: int) -> list[int]:
+        # drop the last num_tokens slots of seq_id, e.g. rejected draft tokens, returns the freed pages
+        context_len = self.context_lens[seq_id]
+        assert 0 <= num_tokens <= context_len, "cannot roll back past the start"
+        context_len -= num_tokens
+        table = self.block_tables[seq_id]
+        n = math.ceil(context_len / self.page_size)
+        freed = [p for p in table[n:] if p != FREED_PAGE]
+        del table[n:]
+        self.free_pages.extend(reversed(freed))
+        self.context_lens[seq_id] = context_len
+        return freed
+
+    def free_window_pages(self, seq_id: int, window_size: int) -> list[int]:
+        # reclaim the pages of seq_id that left the sliding window, returns them
+        table = self.block_tables[seq_id]
+        n = num_freeable_pages(self.context_lens[seq_id], window_size, self.page_size)
+        freed = [p for p in table[:n] if p != FREED_PAGE]
+        table[:n] = [FREED_PAGE] * n
+        self.free_pages.extend(reversed(freed))
+        return freed
+
+    def get_block_tables(self, seq_ids: list[int], device="npu") -> torch.Tensor:
+        # [bs, max_page_num_per_seq] int32, padded with 0, freed pages are 0 as well
+        tables = [self.block_tables[seq_id] for seq_id in seq_ids]
+        max_pages = max(1, max(len(t) for t in tables))
+        out = torch.zeros(len(tables), max_pages, dtype=torch.int32)
+        for i, t in enumerate(tables):
+            out[i, : len(t)] = torch.tensor(t, dtype=torch.int32).clamp(min=0)
+        return out.to(device)
+
+    def get_context_lens(self, seq_ids: list[int], device="npu") -> torch.Tensor:
+        lens = [self.context_lens[seq_id] for seq_id in seq_ids]
+        return torch.tensor(lens, dtype=torch.int32, device=device)
@@ -0,0 +1,384 @@
+# Static memory plan of the decode graph: the weights, the bytes of a kv page, the intermediates
+# and workspace of each split of Graph.build_model, and how many tokens of kv cache fit in what
+# is left of the HBM. Pure python, so capacity planning and CI run without a device:
+#
+#   python -m ascend910a_extras.memory --model qwen3-8b --batch-size 1 16 64 --num-split 1 4
+#   python -m ascend910a_extras.memory --model qwen3-8b --kv-dtype int8 --calibration calib.json
+#   python -m ascend910a_extras.memory --model tiny --batch-size 1 8 32 --calibrate calib.json  # on a device
+#
+# The intermediates are the internal tensors GraphBuilder makes for the nodes of a split, fp16
+# activations and 4 byte indices. ATB keeps them in the workspace of the split and reuses the
+# memory between layers, so the raw workspace estimate is the largest layer (or the embedding,
+# or the norm and lm head). The workspaces of the nodes themselves are not known without a
+# device: calibrate() runs Context.setup on the device for some batch sizes and fits
+# workspace = scale * estimate + offset over the measured Context.workspace_sizes.
+import argparse
+import json
+import math
+import sys
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+
+import torch
+
+from ascend910a_extras.kv_cache import KVCacheLayout
+from ascend910a_extras.roofline import DEFAULT_PROFILE, Platform
+from ascend910a_extras.serve_bench import MODELS, ModelConfig
+
+ACT_BYTES = 2
+INDEX_BYTES = 4
+GiB = 1 << 30
+MiB = 1 << 20
+
+
+@dataclass
+class Calibration:
+    # workspace = scale * estimated bytes + offset, the identity until calibrated on a device
+    scale: float = 1.0
+    offset: int = 0
+    # the (estimate, measured) bytes of every split it was fitted on
+    points: list = field(default_factory=list)
+    source: str = ""
+
+    def workspace(self, estimate: int) -> int:
+        return max(0, math.ceil(self.scale * estimate + self.offset))
+
+    @classmethod
+    def fit(cls, points: list, source: str = "") -> "Calibration":
+        # least squares, a single size only gets a scale
+        xs = [x for x, _ in points]
+        ys = [y for _, y in points]
+        n = len(points)
+        mean_x, mean_y = sum(xs) / n, sum(ys) / n
+        var = sum((x - mean_x) ** 2 for x in xs)
+        if var == 0:
+            return cls(mean_y / mean_x if mean_x else 1.0, 0, points, source)
+        scale = sum((x - mean_x) * (y - mean_y) for x, y in points) / var
+        return cls(scale, round(mean_y - scale * mean_x), points, source)
+
+    def save(self, path: str | Path) -> None:
+        Path(path).write_text(json.dumps(asdict(self), indent=2) + "\n")
+
+    @classmethod
+    def load(cls, path: str | Path) -> "Calibration":
+        return cls(**json.loads(Path(path).read_text()))
+
+
+def _linear_bytes(n: int, k: int, model: ModelConfig, dtype_bytes: int) -> int:
+    # w [n, k], int8 plus fp16 scales [k / group_size, n] with weight_quant
+    if not model.weight_quant:
+        return n * k * dtype_bytes
+    num_groups = k // model.group_size if model.group_size > 0 else 1
+    return n * k + num_groups * n * 2
+
+
+def weight_bytes(model: ModelConfig, dtype: torch.dtype = torch.float16) -> int:
+    """Bytes of the weights Graph.build_model takes, in the layout of serve_bench.random_weights."""
+    dtype_bytes = torch.tensor([], dtype=dtype).element_size()
+    h, d = model.hidden_size, model.head_dim
+    q_size, kv_size = model.num_heads * d, model.num_kv_heads * d
+
+    def linear(n, k):
+        return _linear_bytes(n, k, model, dtype_bytes)
+
+    def mlp(inner):
+        return linear(2 * inner, h) + linear(h, inner)
+
+    layer = (2 * h + 2 * d) * dtype_bytes
+    layer += linear(q_size + 2 * kv_size, h) + linear(h, q_size)
+    if model.num_experts > 0:
+        e, inner = model.num_experts, model.intermediate_size
+        layer += e * h * dtype_bytes
+        layer += e * (linear(2 * inner, h) + linear(h, inner))
+        if model.shared_expert_intermediate_size > 0:
+            layer += mlp(model.shared_expert_intermediate_size)
+    else:
+        layer += mlp(model.intermediate_size)
+    total = model.vocab_size * h * dtype_bytes + model.num_layers * layer
+    total += h * dtype_bytes
+    if not model.tie_word_embeddings:
+        total += model.vocab_size * h * dtype_bytes
+    return total
+
+
+def layer_intermediates(model: ModelConfig, num_tokens: int) -> dict[str, int]:
+    # the internal tensors of one decoder layer, by the node making them
+    t, h, d = num_tokens, model.hidden_size, model.head_dim
+    q_size, kv_size = model.num_heads * d, model.num_kv_heads * d
+
+    def mlp(prefix, inner, rows):
+        return {
+            f"{prefix}gate_up_proj": rows * 2 * inner * ACT_BYTES,
+            f"{prefix}swiglu": rows * inner * ACT_BYTES,
+            f"{prefix}down_proj": rows * h * ACT_BYTES,
+        }
+
+    out = {
+        # add and norm outputs of the input and post attention norms
+        "input_layernorm": 2 * t * h * ACT_BYTES,
+        "qkv_proj": t * (q_size + 2 * kv_size) * ACT_BYTES,
+        "split": t * (q_size + 2 * kv_size) * ACT_BYTES,
+        "qk_norm": t * (q_size + kv_size) * ACT_BYTES,
+        "rope": t * (q_size + kv_size) * ACT_BYTES,
+        "paged_attention": t * q_size * ACT_BYTES,
+        "o_proj": t * h * ACT_BYTES,
+        "post_attention_layernorm": 2 * t * h * ACT_BYTES,
+    }
+    if model.num_experts > 0:
+        e, k = model.num_experts, model.num_experts_per_tok
+        out["router"] = t * e * ACT_BYTES
+        out["moe_gating_topk"] = 2 * t * k * INDEX_BYTES
+        # permuted rows, expanded row index and the int64 group list
+        out["moe_permute"] = t * k * h * ACT_BYTES + t * k * INDEX_BYTES + e * 8
+        out.update(mlp("experts.", model.intermediate_size, t * k))
+        out["moe_unpermute"] = t * h * ACT_BYTES
+        if model.shared_expert_intermediate_size > 0:
+            out.update(mlp("shared.", model.shared_expert_intermediate_size, t))
+            out["shared_expert_add"] = t * h * ACT_BYTES
+    else:
+        out.update(mlp("", model.intermediate_size, t))
+    return out
+
+
+def split_layers(num_layers: int, num_split: int) -> list[tuple[int, int]]:
+    # the [start, end) layers of each split, as Graph.build_model cuts them
+    if not 1 <= num_split <= num_layers:
+        raise ValueError(f"num_split must be in [1, {num_layers}], got {num_split}")
+    per_split = math.ceil(num_layers / num_split)
+    return [
+        (start, min(start + per_split, num_layers))
+        for start in range(0, num_layers, per_split)
+    ]
+
+
+@dataclass
+class SplitPlan:
+    start_layer: int
+    end_layer: int
+    # internal tensors of the split without any reuse, an upper bound
+    intermediate_bytes: int
+    # the largest layer (or embedding, or norm and lm head) of the split, before calibration
+    estimate_bytes: int
+    workspace_bytes: int
+
+
+@dataclass
+class MemoryPlan:
+    batch_size: int
+    num_split: int
+    hbm_bytes: int
+    # hbm_bytes times the utilization, the rest is left to the runtime
+    usable_bytes: int
+    weight_bytes: int
+    # cos/sin caches and the hidden states and residual Context.setup keeps between splits
+    fixed_bytes: int
+    # one workspace of the size of the largest split is shared by all of them
+    workspace_bytes: int
+    kv_bytes_per_page: int
+    page_size: int
+    num_pages: int
+    splits: list[SplitPlan]
+
+    @property
+    def max_tokens(self) -> int:
+        """Tokens of kv cache that fit, over all concurrent sequences."""
+        return self.num_pages * self.page_size
+
+    def max_sequences(self, context_len: int) -> int:
+        # sequences of context_len tokens that fit at once, each holds whole pages
+        return self.num_pages // math.ceil(context_len / self.page_size)
+
+    def to_dict(self) -> dict:
+        return {**asdict(self), "max_tokens": self.max_tokens}
+
+
+def plan(
+    model: ModelConfig,
+    batch_size: int,
+    num_split: int = 1,
+    page_size: int = 128,
+    kv_dtype: torch.dtype = torch.float16,
+    hbm_bytes: int | None = None,
+    utilization: float = 0.9,
+    calibration: Calibration | None = None,
+    num_speculative_tokens: int = 0,
+    sampling: bool = True,
+) -> MemoryPlan:
+    """The memory of Graph.build_model(num_split) and the kv pages that fit beside it."""
+    calibration = calibration or Calibration()
+    if hbm_bytes is None:
+        hbm_bytes = Platform.load(DEFAULT_PROFILE).mem_size["hbm"]
+    t, h = batch_size * (num_speculative_tokens + 1), model.hidden_size
+    layer = sum(layer_intermediates(model, t).values())
+    embedding = t * h * ACT_BYTES
+    post = 2 * t * h * ACT_BYTES
+    if sampling:
+        # logits, then the token ids
+        post += t * model.vocab_size * ACT_BYTES + t * INDEX_BYTES
+
+    splits = []
+    ranges = split_layers(model.num_layers, num_split)
+    for i, (start, end) in enumerate(ranges):
+        stages = [layer]
+        if i == 0:
+            stages.append(embedding)
+        if i == len(ranges) - 1:
+            stages.append(post)
+        estimate = max(stages)
+        splits.append(
+            SplitPlan(
+                start,
+                end,
+                sum(stages) + (end - start - 1) * layer,
+                estimate,
+                calibration.workspace(estimate),
+            )
+        )
+
+    fixed = 2 * model.max_position_embeddings * (model.head_dim // 2) * ACT_BYTES
+    fixed += (len(ranges) - 1) * 2 * t * h * ACT_BYTES
+    workspace = max(s.workspace_bytes for s in splits)
+    weights = weight_bytes(model)
+    layout = KVCacheLayout(
+        model.num_layers, model.num_kv_heads, model.head_dim, page_size, dtype=kv_dtype
+    )
+    usable = int(hbm_bytes * utilization)
+    free = usable - weights - fixed - workspace
+    return MemoryPlan(
+        batch_size=batch_size,
+        num_split=len(ranges),
+        hbm_bytes=hbm_bytes,
+        usable_bytes=usable,
+        weight_bytes=weights,
+        fixed_bytes=fixed,
+        workspace_bytes=workspace,
+        kv_bytes_per_page=layout.bytes_per_page,
+        page_size=page_size,
+        num_pages=max(0, layout.num_pages_for(free)),
+        splits=splits,
+    )
+
+
+def calibrate(
+    model: ModelConfig,
+    batch_sizes: list[int],
+    num_splits: list[int] = (1,),
+    page_size: int = 128,
+) -> Calibration:
+    """Fits the workspace estimate to Context.setup of the real graph, needs a device."""
+    from ascend910a_extras.kv_cache import BlockManager
+    from ascend910a_extras.serve_bench import (
+        PAD_SEQ,
+        GraphExecutor,
+        Request,
+        prepare_inputs,
+        random_weights,
+    )
+
+    weights = random_weights(model)
+    points = []
+    for batch_size in batch_sizes:
+        for num_split in num_splits:
+            # one page per sequence and one for the padding rows
+            layout = model.kv_layout(batch_size + 1, page_size)
+            executor = GraphExecutor(model, batch_size, layout, weights, num_split)
+            manager = BlockManager(layout)
+            manager.append_slots(PAD_SEQ)
+            batch = [Request(i, 0.0, 1, 1) for i in range(batch_size)]
+            for r in batch:
+                manager.append_slots(r.id, r.context_len)
+            inputs = prepare_inputs(
+                manager, batch, batch_size, 1, torch.Generator(), executor.device
+            )
+            executor.step(inputs)
+            estimated = plan(model, batch_size, num_split, page_size).splits
+            measured = executor.ctx.workspace_sizes
+            points += [[s.estimate_bytes, m] for s, m in zip(estimated, measured)]
+    return Calibration.fit(points, source=f"Context.setup, batch sizes {batch_sizes}")
+
+
+def format_plans(plans: list[MemoryPlan]) -> str:
+    header = f"{'bs':>5} {'split':>5} {'weights GiB':>12} {'workspace MiB':>14}"
+    header += f" {'fixed MiB':>10} {'page KiB':>9} {'pages':>8} {'max tokens':>11}"
+    lines = [header]
+    for p in plans:
+        line = f"{p.batch_size:>5} {p.num_split:>5} {p.weight_bytes / GiB:>12.2f}"
+        line += f" {p.workspace_bytes / MiB:>14.1f} {p.fixed_bytes / MiB:>10.1f}"
+        line += (
+            f" {p.kv_bytes_per_page / 1024:>9.0f} {p.num_pages:>8} {p.max_tokens:>11}"
+        )
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def _parse_value(v: str):
+    if v in ("True", "False"):
+        return v == "True"
+    try:
+        return int(v)
+    except ValueError:
+        return float(v)
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m ascend910a_extras.memory")
+    parser.add_argument(
+        "overrides", nargs="*", help="key=value overrides of the model config"
+    )
+    parser.add_argument("--model", default="qwen3-8b", choices=list(MODELS))
+    parser.add_argument("--batch-size", type=int, nargs="+", default=[16])
+    parser.add_argument("--num-split", type=int, nargs="+", default=[1])
+    parser.add_argument("--page-size", type=int, default=128)
+    parser.add_argument("--kv-dtype", default="float16", choices=["float16", "int8"])
+    parser.add_argument(
+        "--hbm-gb", type=float, default=None, help="default the hbm of --profile"
+    )
+    parser.add_argument("--profile", default=DEFAULT_PROFILE)
+    parser.add_argument("--utilization", type=float, default=0.9)
+    parser.add_argument("--calibration", default=None, help="json of --calibrate")
+    parser.add_argument(
+        "--calibrate", default=None, help="fit on the device and save the json here"
+    )
+    parser.add_argument("--out", default=None, help="json of the plans")
+    args = parser.parse_args(argv)
+
+    overrides = {
+        k: _parse_value(v) for k, v in (s.split("=", 1) for s in args.overrides)
+    }
+    model = ModelConfig(**{**asdict(MODELS[args.model]), **overrides})
+    if args.calibrate:
+        calibration = calibrate(model, args.batch_size, args.num_split, args.page_size)
+        calibration.save(args.calibrate)
+        print(f"scale {calibration.scale:.3f} offset {calibration.offset} bytes")
+        print(f"saved {args.calibrate}")
+        return 0
+
+    calibration = Calibration.load(args.calibration) if args.calibration else None
+    if args.hbm_gb is not None:
+        hbm_bytes = int(args.hbm_gb * GiB)
+    else:
+        hbm_bytes = Platform.load(args.profile).mem_size["hbm"]
+    plans = [
+        plan(
+            model,
+            batch_size,
+            num_split,
+            args.page_size,
+            getattr(torch, args.kv_dtype),
+            hbm_bytes,
+            args.utilization,
+            calibration,
+        )
+        for batch_size in args.batch_size
+        for num_split in args.num_split
+    ]
+    print(format_plans(plans))
+    if args.out:
+        data = {"model": asdict(model), "plans": [p.to_dict() for p in plans]}
+        Path(args.out).write_text(json.dumps(data, indent=2) + "\n")
+        print(f"saved {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,7 +1,23 @@
+import functools
+
 import torch
-import torch_npu
 
-import ascend910a_extras.ascend910a_extras_C as _C
+from ascend910a_extras import autotune, load_native
+
+
+class _Native:
+    # the C extension, loaded by the first op that runs
+    def __getattr__(self, name: str):
+        return getattr(load_native(), name)
+
+
+_C = _Native()
+
+
+@functools.lru_cache(maxsize=None)
+def _none(device: torch.device, dtype: torch.dtype) -> torch.Tensor:
+    # the empty tensor passed for an absent optional input, made once per device and dtype
+    return torch.empty(0, device=device, dtype=dtype)
 
 
 def rope(
@@ -10,24 +26,120 @@ def rope(
     position_ids: torch.Tensor,
     cos_cache: torch.Tensor,
     sin_cache: torch.Tensor,
+    *,
+    out: tuple[torch.Tensor, torch.Tensor] | None = None,
+) -> tuple[torch.Tensor, torch.Tensor]:
+    # out: (out_q, out_k) written instead of new tensors, may be (q, k)
+    if out is None:
+        return tuple(_C.ops.rope(q, k, position_ids, cos_cache, sin_cache))
+    _C.ops.rope_out(q, k, position_ids, cos_cache, sin_cache, *out)
+    return out
+
+
+def rope_(
+    q: torch.Tensor,
+    k: torch.Tensor,
+    position_ids: torch.Tensor,
+    cos_cache: torch.Tensor,
+    sin_cache: torch.Tensor,
 ) -> tuple[torch.Tensor, torch.Tensor]:
-    return _C.ops.rope(q, k, position_ids, cos_cache, sin_cache)
+    return rope(q, k, position_ids, cos_cache, sin_cache, out=(q, k))
 
 
-def swiglu(x: torch.Tensor) -> torch.Tensor:
-    return _C.ops.swiglu(x)
+def swiglu(
+    x: torch.Tensor,
+    block_size: int | None = None,
+    core_num: int | None = None,
+    *,
+    out: torch.Tensor | None = None,
+) -> torch.Tensor:
+    # block_size/core_num: tiling, None looks up the tuning cache, 0 = the host default
+    if block_size is None or core_num is None:
+        config = autotune.lookup("swiglu", num_tokens=x.shape[0], dim=x.shape[1] // 2)
+        block_size = config["block_size"] if block_size is None else block_size
+        core_num = config["core_num"] if core_num is None else core_num
+    if out is None:
+        return _C.ops.swiglu(x, block_size, core_num)
+    _C.ops.swiglu_out(x, block_size, core_num, out)
+    return out
 
 
 def grouped_matmul(
-    x: torch.Tensor, w: torch.Tensor, group_list: torch.Tensor
+    x: torch.Tensor,
+    w: torch.Tensor,
+    group_list: torch.Tensor,
+    *,
+    out: torch.Tensor | None = None,
 ) -> torch.Tensor:
-    return _C.ops.grouped_matmul(x, w, group_list)
+    if out is None:
+        return _C.ops.grouped_matmul(x, w, group_list)
+    _C.ops.grouped_matmul_out(x, w, group_list, out)
+    return out
+
+
+def weight_quant_matmul(
+    x: torch.Tensor,
+    w: torch.Tensor,
+    scale: torch.Tensor,
+    *,
+    out: torch.Tensor | None = None,
+) -> torch.Tensor:
+    # x: [num_tokens, dim], w: [inner_dim, dim] int8, scale: [dim // group_size, inner_dim]
+    if out is None:
+        return _C.ops.weight_quant_matmul(x, w, scale)
+    _C.ops.weight_quant_matmul_out(x, w, scale, out)
+    return out
+
+
+def weight_quant_grouped_matmul(
+    x: torch.Tensor,
+    w: torch.Tensor,
+    scale: torch.Tensor,
+    group_list: torch.Tensor,
+    *,
+    out: torch.Tensor | None = None,
+) -> torch.Tensor:
+    # w: [num_exports, inner_dim, dim] int8, scale: [num_exports, dim // group_size, inner_dim]
+    if out is None:
+        return _C.ops.weight_quant_grouped_matmul(x, w, scale, group_list)
+    _C.ops.weight_quant_grouped_matmul_out(x, w, scale, group_list, out)
+    return out
 
 
 def add_rms_norm(
-    x: torch.Tensor, residual: torch.Tensor, weight: torch.Tensor, epsilon: float = 1e-5
+    x: torch.Tensor,
+    residual: torch.Tensor,
+    weight: torch.Tensor,
+    epsilon: float = 1e-5,
+    block_size: int | None = None,
+    core_num: int | None = None,
+    *,
+    out: tuple[torch.Tensor, torch.Tensor] | None = None,
+) -> tuple[torch.Tensor, torch.Tensor]:
+    # block_size/core_num: tiling, None looks up the tuning cache, 0 = the host default
+    # out: (y, residual_out) written instead of new tensors, may be (x, residual)
+    if block_size is None or core_num is None:
+        config = autotune.lookup("add_rms_norm", num_tokens=x.shape[0], dim=x.shape[1])
+        block_size = config["block_size"] if block_size is None else block_size
+        core_num = config["core_num"] if core_num is None else core_num
+    if out is None:
+        return _C.ops.add_rms_norm(x, residual, weight, epsilon, block_size, core_num)
+    _C.ops.add_rms_norm_out(x, residual, weight, epsilon, block_size, core_num, *out)
+    return out
+
+
+def add_rms_norm_(
+    x: torch.Tensor,
+    residual: torch.Tensor,
+    weight: torch.Tensor,
+    epsilon: float = 1e-5,
+    block_size: int | None = None,
+    core_num: int | None = None,
 ) -> tuple[torch.Tensor, torch.Tensor]:
-    return _C.ops.add_rms_norm(x, residual, weight, epsilon)
+    # x becomes rms_norm(x + residual) * weight and residual becomes x + residual
+    return add_rms_norm(
+        x, residual, weight, epsilon, block_size, core_num, out=(x, residual)
+    )
 
 
 def reshape_and_cache(
@@ -36,17 +148,45 @@ def reshape_and_cache(
     key_cache: torch.Tensor,
     value_cache: torch.Tensor,
     slot_indices: torch.Tensor,
+    key_scale: torch.Tensor | None = None,
+    value_scale: torch.Tensor | None = None,
 ) -> None:
+    # int8 key_cache/value_cache are quantized on write,
+    # key_scale/value_scale: [num_pages, num_kv_heads, page_size] fp16
     if value is None:
-        value = torch.empty(0, device=key.device, dtype=key.dtype)
+        value = _none(key.device, key.dtype)
     if value_cache is None:
-        value_cache = torch.empty(0, device=key_cache.device, dtype=key_cache.dtype)
-    return _C.ops.reshape_and_cache(key, value, key_cache, value_cache, slot_indices)
+        value_cache = _none(key_cache.device, key_cache.dtype)
+    if key_scale is None:
+        key_scale = _none(key.device, key.dtype)
+    if value_scale is None:
+        value_scale = _none(key.device, key.dtype)
+    return _C.ops.reshape_and_cache(
+        key, value, key_cache, value_cache, slot_indices, key_scale, value_scale
+    )
+
+
+def copy_blocks(
+    key_caches: list[torch.Tensor],
+    value_caches: list[torch.Tensor],
+    block_mapping: torch.Tensor,
+    key_scales: list[torch.Tensor] | None = None,
+    value_scales: list[torch.Tensor] | None = None,
+) -> None:
+    # block_mapping: [num_pairs, 2] (src page, dst page), copies the pages of all layers in place,
+    # a dst page must not be the src of another pair
+    # the scales of the int8 cache have a different page size and take a second launch
+    _C.ops.copy_blocks(key_caches, value_caches, block_mapping)
+    if key_scales is not None and value_scales is not None:
+        _C.ops.copy_blocks(key_scales, value_scales, block_mapping)
 
 
-def print_info():
+def print_info() -> dict:
+    # aic_num, aiv_num, cube_freq_mhz, mem_size and mem_bw of l0_a/l0_b/l0_c/l1/l2/ub/hbm
+    # torch.npu only exists once load_native() has imported torch_npu
+    native = load_native()
     device_id = torch.npu.current_device()
-    _C.print_info(device_id)
+    return native.print_info(device_id)
 
 
 def paged_attention(
@@ -55,5 +195,161 @@ def paged_attention(
     value_cache: torch.Tensor,
     block_tables: torch.Tensor,
     context_lens: torch.Tensor,
+    key_scale: torch.Tensor | None = None,
+    value_scale: torch.Tensor | None = None,
+    alibi_slopes: torch.Tensor | None = None,
+    window_size: int = 0,
+    *,
+    out: torch.Tensor | None = None,
+) -> torch.Tensor:
+    # alibi_slopes: [num_heads] fp32, window_size: attend to the last window_size tokens, 0 = all
+    # q may hold bs * num_query_tokens rows, the last positions of each sequence attending causally
+    if key_scale is None:
+        key_scale = _none(q.device, q.dtype)
+    if value_scale is None:
+        value_scale = _none(q.device, q.dtype)
+    if alibi_slopes is None:
+        alibi_slopes = _none(q.device, torch.float32)
+    args = [q, key_cache, value_cache, block_tables, context_lens]
+    args += [key_scale, value_scale, alibi_slopes, window_size]
+    if out is None:
+        return _C.ops.paged_attention(*args)
+    _C.ops.paged_attention_out(*args, out)
+    return out
+
+
+def moe_gating_topk(
+    logits: torch.Tensor,
+    top_k: int,
+    renormalize: bool = True,
+    *,
+    out: tuple[torch.Tensor, torch.Tensor] | None = None,
+) -> tuple[torch.Tensor, torch.Tensor]:
+    # softmax over experts, then top_k, returns topk_weights [num_tokens, top_k] fp32
+    # and topk_ids [num_tokens, top_k] int32
+    if out is None:
+        return _C.ops.moe_gating_topk(logits, top_k, renormalize)
+    _C.ops.moe_gating_topk_out(logits, top_k, renormalize, *out)
+    return out
+
+
+def moe_permute(
+    x: torch.Tensor,
+    topk_ids: torch.Tensor,
+    num_experts: int,
+    *,
+    out: tuple[torch.Tensor, torch.Tensor, torch.Tensor] | None = None,
+) -> tuple[torch.Tensor, torch.Tensor, torch.Tensor]:
+    # returns permuted_x [num_tokens * top_k, hidden] sorted by expert,
+    # expanded_row_idx [num_tokens * top_k] int32 and cumulative group_list [num_experts] int64,
+    # ready for grouped_matmul
+    if out is None:
+        return _C.ops.moe_permute(x, topk_ids, num_experts)
+    _C.ops.moe_permute_out(x, topk_ids, num_experts, *out)
+    return out
+
+
+def moe_unpermute(
+    y: torch.Tensor,
+    expanded_row_idx: torch.Tensor,
+    topk_weights: torch.Tensor,
+    *,
+    out: torch.Tensor | None = None,
+) -> torch.Tensor:
+    if out is None:
+        return _C.ops.moe_unpermute(y, expanded_row_idx, topk_weights)
+    _C.ops.moe_unpermute_out(y, expanded_row_idx, topk_weights, out)
+    return out
+
+
+def sampling(
+    logits: torch.Tensor,
+    temperature: torch.Tensor,
+    top_k: torch.Tensor,
+    top_p: torch.Tensor,
+    repetition_penalty: torch.Tensor,
+    uniform: torch.Tensor,
+    penalty_token_ids: torch.Tensor | None = None,
+    *,
+    out: torch.Tensor | None = None,
 ) -> torch.Tensor:
-    return _C.ops.paged_attention(q, key_cache, value_cache, block_tables, context_lens)
+    # logits: [bs, vocab] fp16, temperature/top_p/repetition_penalty/uniform: [bs] fp32,
+    # top_k: [bs] int32, penalty_token_ids: [bs, n] int32 padded with -1, returns [bs] int32
+    if penalty_token_ids is None:
+        penalty_token_ids = _none(logits.device, torch.int32)
+    args = [logits, temperature, top_k, top_p, repetition_penalty, uniform]
+    if out is None:
+        return _C.ops.sampling(*args, penalty_token_ids)
+    _C.ops.sampling_out(*args, penalty_token_ids, out)
+    return out
+
+
+# torch.library schemas of the ops above, torch.ops.ascend910a_extras.<op>[.out] runs them on
+# npu tensors; the alias annotations tell torch.compile and functionalization what is written
+SCHEMAS = {
+    "rope": "(Tensor q, Tensor k, Tensor position_ids, Tensor cos_cache, Tensor sin_cache) -> (Tensor, Tensor)",
+    "rope.out": "(Tensor q, Tensor k, Tensor position_ids, Tensor cos_cache, Tensor sin_cache, *, Tensor(a!) out_q, Tensor(b!) out_k) -> (Tensor(a!), Tensor(b!))",
+    "rope_": "(Tensor(a!) q, Tensor(b!) k, Tensor position_ids, Tensor cos_cache, Tensor sin_cache) -> (Tensor(a!), Tensor(b!))",
+    "swiglu": "(Tensor x, int? block_size=None, int? core_num=None) -> Tensor",
+    "swiglu.out": "(Tensor x, int? block_size=None, int? core_num=None, *, Tensor(a!) out) -> Tensor(a!)",
+    "grouped_matmul": "(Tensor x, Tensor w, Tensor group_list) -> Tensor",
+    "grouped_matmul.out": "(Tensor x, Tensor w, Tensor group_list, *, Tensor(a!) out) -> Tensor(a!)",
+    "weight_quant_matmul": "(Tensor x, Tensor w, Tensor scale) -> Tensor",
+    "weight_quant_matmul.out": "(Tensor x, Tensor w, Tensor scale, *, Tensor(a!) out) -> Tensor(a!)",
+    "weight_quant_grouped_matmul": "(Tensor x, Tensor w, Tensor scale, Tensor group_list) -> Tensor",
+    "weight_quant_grouped_matmul.out": "(Tensor x, Tensor w, Tensor scale, Tensor group_list, *, Tensor(a!) out) -> Tensor(a!)",
+    "add_rms_norm": "(Tensor x, Tensor residual, Tensor weight, float epsilon=1e-05, int? block_size=None, int? core_num=None) -> (Tensor, Tensor)",
+    "add_rms_norm.out": "(Tensor x, Tensor residual, Tensor weight, float epsilon=1e-05, int? block_size=None, int? core_num=None, *, Tensor(a!) out, Tensor(b!) residual_out) -> (Tensor(a!), Tensor(b!))",
+    "add_rms_norm_": "(Tensor(a!) x, Tensor(b!) residual, Tensor weight, float epsilon=1e-05, int? block_size=None, int? core_num=None) -> (Tensor(a!), Tensor(b!))",
+    "reshape_and_cache": "(Tensor key, Tensor? value, Tensor(a!) key_cache, Tensor(b!)? value_cache, Tensor slot_indices, Tensor(c!)? key_scale=None, Tensor(d!)? value_scale=None) -> ()",
+    "copy_blocks": "(Tensor(a!)[] key_caches, Tensor(b!)[] value_caches, Tensor block_mapping, Tensor(c!)[]? key_scales=None, Tensor(d!)[]? value_scales=None) -> ()",
+    "paged_attention": "(Tensor q, Tensor key_cache, Tensor value_cache, Tensor block_tables, Tensor context_lens, Tensor? key_scale=None, Tensor? value_scale=None, Tensor? alibi_slopes=None, int window_size=0) -> Tensor",
+    "paged_attention.out": "(Tensor q, Tensor key_cache, Tensor value_cache, Tensor block_tables, Tensor context_lens, Tensor? key_scale=None, Tensor? value_scale=None, Tensor? alibi_slopes=None, int window_size=0, *, Tensor(a!) out) -> Tensor(a!)",
+    "moe_gating_topk": "(Tensor logits, int top_k, bool renormalize=True) -> (Tensor, Tensor)",
+    "moe_gating_topk.out": "(Tensor logits, int top_k, bool renormalize=True, *, Tensor(a!) topk_weights, Tensor(b!) topk_ids) -> (Tensor(a!), Tensor(b!))",
+    "moe_permute": "(Tensor x, Tensor topk_ids, int num_experts) -> (Tensor, Tensor, Tensor)",
+    "moe_permute.out": "(Tensor x, Tensor topk_ids, int num_experts, *, Tensor(a!) permuted_x, Tensor(b!) expanded_row_idx, Tensor(c!) group_list) -> (Tensor(a!), Tensor(b!), Tensor(c!))",
+    "moe_unpermute": "(Tensor y, Tensor expanded_row_idx, Tensor topk_weights) -> Tensor",
+    "moe_unpermute.out": "(Tensor y, Tensor expanded_row_idx, Tensor topk_weights, *, Tensor(a!) out) -> Tensor(a!)",
+    "sampling": "(Tensor logits, Tensor temperature, Tensor top_k, Tensor top_p, Tensor repetition_penalty, Tensor uniform, Tensor? penalty_token_ids=None) -> Tensor",
+    "sampling.out": "(Tensor logits, Tensor temperature, Tensor top_k, Tensor top_p, Tensor repetition_penalty, Tensor uniform, Tensor? penalty_token_ids=None, *, Tensor(a!) out) -> Tensor(a!)",
+}
+
+
+def _out_impl(fn, *names: str):
+    # the .out overload passes the outputs as keyword arguments, fn takes them as out=
+    def impl(*args, **kwargs):
+        outs = tuple(kwargs.pop(name) for name in names)
+        return fn(*args, **kwargs, out=outs if len(outs) > 1 else outs[0])
+
+    return impl
+
+
+_OUT_NAMES = {
+    "rope": ["out_q", "out_k"],
+    "add_rms_norm": ["out", "residual_out"],
+    "moe_gating_topk": ["topk_weights", "topk_ids"],
+    "moe_permute": ["permuted_x", "expanded_row_idx", "group_list"],
+}
+
+
+def _call(op: str, *args, **kwargs):
+    return globals()[op](*args, **kwargs)
+
+
+def _register() -> torch.library.Library:
+    lib = torch.library.Library("ascend910a_extras", "DEF")
+    for name, args in SCHEMAS.items():
+        op, _, overload = name.partition(".")
+        lib.define(name + args)
+        # looked up per call, so a reloaded module's functions are the ones that run
+        fn = functools.partial(_call, op)
+        if overload == "out":
+            fn = _out_impl(fn, *_OUT_NAMES.get(op, ["out"]))
+        lib.impl(name, fn, "PrivateUse1")
+    return lib
+
+
+# the namespace can only be defined once per process, a reload keeps the first import's _lib
+if not hasattr(torch.ops.ascend910a_extras, "rope"):
+    _lib = _register()
@@ -0,0 +1,90 @@
+# Per-op counters of the ffi ops in ascend910a_extras.ops: calls, host time spent making the acl
+# tensors, in GetWorkspaceSize and in the launch, and optionally the device time between two
+# events around the launch.
+#
+#   with profile.profiled("device"):
+#       for _ in range(steps):
+#           decode_step()
+#   print(profile.format_table(profile.snapshot()))
+#
+# The mode is off by default and then costs one relaxed atomic load per op. The counters can
+# also be compiled out entirely with PROFILE_OPS=0 at build time.
+# Device times are collected as the events complete, so snapshot() waits for the queued ops.
+# Native log output goes through set_log_level, or ASCEND910A_EXTRAS_LOG_LEVEL=debug at startup.
+import contextlib
+
+from ascend910a_extras import load_native
+
+MODES = ["off", "host", "device"]
+LOG_LEVELS = ["error", "warn", "info", "debug"]
+PHASES = ["create", "workspace", "launch"]
+
+
+def _native():
+    return load_native().profile
+
+
+def compiled() -> bool:
+    """Whether the extension was built with the counters (PROFILE_OPS=1)."""
+    return _native().compiled
+
+
+def set_mode(mode: str) -> None:
+    if mode not in MODES:
+        raise ValueError(f"mode must be one of {MODES}, got {mode!r}")
+    _native().set_mode(MODES.index(mode))
+
+
+def get_mode() -> str:
+    return MODES[_native().get_mode()]
+
+
+def set_log_level(level: str) -> None:
+    if level not in LOG_LEVELS:
+        raise ValueError(f"level must be one of {LOG_LEVELS}, got {level!r}")
+    _native().set_log_level(LOG_LEVELS.index(level))
+
+
+def get_log_level() -> str:
+    return LOG_LEVELS[_native().get_log_level()]
+
+
+def snapshot() -> dict[str, dict]:
+    """Counters per op called since the last reset, with host_ns the sum of the phases."""
+    stats = _native().snapshot()
+    for s in stats.values():
+        s["host_ns"] = sum(s[f"{phase}_ns"] for phase in PHASES)
+    return stats
+
+
+def reset() -> None:
+    _native().reset()
+
+
+@contextlib.contextmanager
+def profiled(mode: str = "host"):
+    # zeroes the counters, profiles the block and restores the previous mode
+    previous = get_mode()
+    reset()
+    set_mode(mode)
+    try:
+        yield
+    finally:
+        set_mode(previous)
+
+
+def format_table(stats: dict[str, dict]) -> str:
+    # us per call of each phase, ops by total host time
+    header = f"{'op':<28} {'calls':>8}"
+    header += "".join(f" {name + ' us':>13}" for name in PHASES + ["host", "device"])
+    lines = [header]
+    for name, s in sorted(stats.items(), key=lambda kv: -kv[1]["host_ns"]):
+        row = f"{name:<28} {s['calls']:>8}"
+        for phase in PHASES + ["host"]:
+            row += f" {s[f'{phase}_ns'] / s['calls'] / 1e3:>13.2f}"
+        if s["device_calls"]:
+            row += f" {s['device_ns'] / s['device_calls'] / 1e3:>13.2f}"
+        else:
+            row += f" {'-':>13}"
+        lines.append(row)
+    return "\n".join(lines)
@@ -0,0 +1,116 @@
+# Offline W8A16 quantization of safetensors checkpoints.
+#
+#   python -m ascend910a_extras.quantize --src /data/models/Qwen/Qwen3-8B --dst /data/models/Qwen/Qwen3-8B-W8A16
+#
+# Every matched `*.weight` of shape [out, in] is replaced by an int8 tensor of the same shape and
+# gets a `*.weight_scale` fp16 tensor of shape [in // group_size, out], the layout expected by
+# ops.weight_quant_matmul / ops.weight_quant_grouped_matmul.
+import argparse
+import json
+import re
+import shutil
+from pathlib import Path
+
+import torch
+
+DEFAULT_PATTERN = (
+    r"\.(q_proj|k_proj|v_proj|o_proj|gate_proj|up_proj|down_proj)\.weight$"
+)
+SCALE_SUFFIX = "_scale"
+
+
+def quantize_weight(
+    w: torch.Tensor, group_size: int = 0
+) -> tuple[torch.Tensor, torch.Tensor]:
+    # symmetric int8, group_size <= 0 means one scale per output channel
+    n, k = w.shape[-2:]
+    if group_size <= 0:
+        group_size = k
+    assert k % group_size == 0, f"k={k} is not divisible by group_size={group_size}"
+    num_groups = k // group_size
+
+    w_f32 = w.float().reshape(*w.shape[:-1], num_groups, group_size)
+    absmax = w_f32.abs().amax(dim=-1)
+    # round the scale to fp16 first so dequantization on device sees the same value
+    scale = (absmax / 127.0).clamp(min=torch.finfo(torch.float16).tiny)
+    scale = scale.to(torch.float16)
+    q = torch.round(w_f32 / scale.float().unsqueeze(-1)).clamp(-127, 127)
+    q = q.to(torch.int8).reshape(w.shape)
+    return q, scale.transpose(-1, -2).contiguous()
+
+
+def quantize_state_dict(
+    state_dict: dict[str, torch.Tensor],
+    group_size: int = 0,
+    pattern: str = DEFAULT_PATTERN,
+) -> dict[str, torch.Tensor]:
+    regex = re.compile(pattern)
+    out = {}
+    for name, tensor in state_dict.items():
+        if regex.search(name) and tensor.dim() >= 2:
+            q, scale = quantize_weight(tensor, group_size)
+            out[name] = q
+            out[name + SCALE_SUFFIX] = scale
+        else:
+            out[name] = tensor
+    return out
+
+
+def quantize_checkpoint(
+    src: Path, dst: Path, group_size: int = 0, pattern: str = DEFAULT_PATTERN
+) -> None:
+    from safetensors import safe_open
+    from safetensors.torch import save_file
+
+    src, dst = Path(src), Path(dst)
+    dst.mkdir(parents=True, exist_ok=True)
+    shards = sorted(src.glob("*.safetensors"))
+    assert len(shards) > 0, f"no safetensors found in {src}"
+
+    weight_map = {}
+    total_size = 0
+    # one shard at a time, so peak memory is bounded by the largest shard
+    for shard in shards:
+        with safe_open(shard, framework="pt", device="cpu") as f:
+            state_dict = {name: f.get_tensor(name) for name in f.keys()}
+            metadata = f.metadata()
+        state_dict = quantize_state_dict(state_dict, group_size, pattern)
+        save_file(state_dict, dst / shard.name, metadata=metadata)
+        for name, tensor in state_dict.items():
+            weight_map[name] = shard.name
+            total_size += tensor.numel() * tensor.element_size()
+        print(f"quantized {shard.name}: {len(state_dict)} tensors", flush=True)
+
+    for path in src.iterdir():
+        if path.is_file() and path.suffix != ".safetensors":
+            shutil.copy(path, dst / path.name)
+    index = {"metadata": {"total_size": total_size}, "weight_map": weight_map}
+    with open(dst / "model.safetensors.index.json", "w") as f:
+        json.dump(index, f, indent=2)
+    with open(dst / "quantization_config.json", "w") as f:
+        json.dump(
+            {
+                "method": "w8a16",
+                "group_size": group_size,
+                "pattern": pattern,
+                "scale_suffix": SCALE_SUFFIX,
+            },
+            f,
+            indent=2,
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="W8A16 weight-only quantization")
+    parser.add_argument("--src", type=Path, required=True)
+    parser.add_argument("--dst", type=Path, required=True)
+    parser.add_argument(
+        "--group-size", type=int, default=0, help="0 means per output channel"
+    )
+    parser.add_argument("--pattern", type=str, default=DEFAULT_PATTERN)
+    args = parser.parse_args()
+    quantize_checkpoint(args.src, args.dst, args.group_size, args.pattern)
+
+
+if __name__ == "__main__":
+    main()
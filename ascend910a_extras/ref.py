@@ -0,0 +1,367 @@
+# CPU references of the custom ops, only depend on torch.
+import math
+
+import torch
+
+
+def swiglu(
+    x: torch.Tensor, block_size: int | None = None, core_num: int | None = None
+) -> torch.Tensor:
+    # x: [num_tokens, 2 * dim] -> silu(x[:, :dim]) * x[:, dim:], the tiling args are ignored
+    x0, x1 = x.float().chunk(2, dim=-1)
+    return (torch.nn.functional.silu(x0) * x1).to(x.dtype)
+
+
+def add_rms_norm(
+    x: torch.Tensor,
+    residual: torch.Tensor,
+    weight: torch.Tensor,
+    epsilon: float = 1e-5,
+    block_size: int | None = None,
+    core_num: int | None = None,
+) -> tuple[torch.Tensor, torch.Tensor]:
+    # returns rms_norm(x + residual) * weight and x + residual, the tiling args are ignored
+    y = x.float() + residual.float()
+    rms = torch.rsqrt(y.pow(2).mean(dim=-1, keepdim=True) + epsilon)
+    return (y * rms * weight.float()).to(x.dtype), y.to(x.dtype)
+
+
+def rope(
+    q: torch.Tensor,
+    k: torch.Tensor,
+    position_ids: torch.Tensor,
+    cos_cache: torch.Tensor,
+    sin_cache: torch.Tensor,
+) -> tuple[torch.Tensor, torch.Tensor]:
+    # q, k: [num_tokens, num_heads, head_dim], cos/sin_cache: [max_position, head_dim // 2],
+    # rotate half: [x0 * cos - x1 * sin, x1 * cos + x0 * sin], in the dtype of q
+    pos = position_ids.long()
+    cos = cos_cache[pos].unsqueeze(1).to(q.dtype)
+    sin = sin_cache[pos].unsqueeze(1).to(q.dtype)
+
+    def rotate(x):
+        x0, x1 = x.chunk(2, dim=-1)
+        return torch.cat([x0 * cos - x1 * sin, x1 * cos + x0 * sin], dim=-1)
+
+    return rotate(q), rotate(k)
+
+
+def dequantize_weight(w: torch.Tensor, scale: torch.Tensor) -> torch.Tensor:
+    # w: [..., n, k] int8, scale: [..., k // group_size, n] -> [..., n, k] fp16
+    k = w.shape[-1]
+    group_size = k // scale.shape[-2]
+    s = scale.transpose(-1, -2).float().repeat_interleave(group_size, dim=-1)
+    return (w.float() * s).to(scale.dtype)
+
+
+def weight_quant_matmul(
+    x: torch.Tensor, w: torch.Tensor, scale: torch.Tensor
+) -> torch.Tensor:
+    w_dq = dequantize_weight(w, scale)
+    return torch.matmul(x.float(), w_dq.float().T).to(x.dtype)
+
+
+def grouped_matmul(
+    x: torch.Tensor, w: torch.Tensor, group_list: torch.Tensor
+) -> torch.Tensor:
+    # w: [num_exports, dim, inner_dim], group_list: cumulative token counts
+    y = torch.zeros(x.shape[0], w.shape[2], dtype=x.dtype, device=x.device)
+    ends = group_list.tolist()
+    starts = [0] + ends[:-1]
+    for ei, (start, end) in enumerate(zip(starts, ends)):
+        if end > start:
+            y[start:end] = torch.matmul(x[start:end].float(), w[ei].float()).to(x.dtype)
+    return y
+
+
+def weight_quant_grouped_matmul(
+    x: torch.Tensor, w: torch.Tensor, scale: torch.Tensor, group_list: torch.Tensor
+) -> torch.Tensor:
+    # w: [num_exports, inner_dim, dim] int8
+    w_dq = dequantize_weight(w, scale)
+    return grouped_matmul(x, w_dq.transpose(1, 2), group_list)
+
+
+# kv_cache: [num_pages, num_kv_heads * head_dim // 16, page_size, 16]
+# int8 kv_cache scales: [num_pages, num_kv_heads, page_size], one per token per head
+
+
+def quantize_kv(x: torch.Tensor) -> tuple[torch.Tensor, torch.Tensor]:
+    # x: [..., head_dim] -> int8 [..., head_dim], scale [...] fp16
+    absmax = x.float().abs().amax(dim=-1)
+    scale = torch.where(absmax > 0, absmax / 127.0, 1.0).to(torch.float16)
+    q = torch.round(x.float() / scale.float().unsqueeze(-1)).clamp(-127, 127)
+    return q.to(torch.int8), scale
+
+
+def dequantize_kv_cache(cache: torch.Tensor, scale: torch.Tensor) -> torch.Tensor:
+    # cache: int8 [num_pages, nh16, page_size, 16], scale: [num_pages, num_kv_heads, page_size]
+    num_kv_heads = scale.shape[1]
+    s = scale.float().repeat_interleave(cache.shape[1] // num_kv_heads, dim=1)
+    return (cache.float() * s.unsqueeze(-1)).to(scale.dtype)
+
+
+def reshape_and_cache(
+    key: torch.Tensor,
+    value: torch.Tensor | None,
+    key_cache: torch.Tensor,
+    value_cache: torch.Tensor | None,
+    slot_indices: torch.Tensor,
+    key_scale: torch.Tensor | None = None,
+    value_scale: torch.Tensor | None = None,
+) -> None:
+    # key/value: [num_tokens, num_kv_heads, head_dim], updates the caches in place
+    num_pages, nh16, page_size, _ = key_cache.shape
+    slots = slot_indices.long()
+    # out of range slots are skipped, same as the kernel
+    valid = (slots >= 0) & (slots < num_pages * page_size)
+    slots = slots[valid]
+    pages, offsets = slots // page_size, slots % page_size
+
+    def write(x, cache, scale):
+        x = x[valid]
+        if cache.dtype == torch.int8:
+            x, s = quantize_kv(x)
+            scale[pages, :, offsets] = s.to(scale.dtype)
+        cache[pages, :, offsets] = x.reshape(x.shape[0], nh16, 16).to(cache.dtype)
+
+    write(key, key_cache, key_scale)
+    if value is not None and value_cache is not None:
+        write(value, value_cache, value_scale)
+
+
+def copy_blocks(
+    key_caches: list[torch.Tensor],
+    value_caches: list[torch.Tensor],
+    block_mapping: torch.Tensor,
+    key_scales: list[torch.Tensor] | None = None,
+    value_scales: list[torch.Tensor] | None = None,
+) -> None:
+    # block_mapping: [num_pairs, 2] (src page, dst page), pages are the first dim of every cache
+    src, dst = block_mapping.long().cpu().unbind(dim=1)
+    caches = key_caches + value_caches
+    if key_scales is not None and value_scales is not None:
+        caches += key_scales + value_scales
+    for cache in caches:
+        cache[dst.to(cache.device)] = cache[src.to(cache.device)]
+
+
+def gather_kv(
+    cache: torch.Tensor,
+    block_table: torch.Tensor,
+    seq_len: int,
+    num_kv_heads: int,
+    scale: torch.Tensor | None = None,
+) -> torch.Tensor:
+    # -> [seq_len, num_kv_heads, head_dim] of one sequence
+    page_size = cache.shape[2]
+    pages = block_table[: (seq_len + page_size - 1) // page_size].long()
+    kv = cache[pages]
+    if scale is not None:
+        kv = dequantize_kv_cache(kv, scale[pages])
+    kv = kv.permute(0, 2, 1, 3).reshape(pages.numel() * page_size, num_kv_heads, -1)
+    return kv[:seq_len]
+
+
+def paged_attention(
+    q: torch.Tensor,
+    key_cache: torch.Tensor,
+    value_cache: torch.Tensor,
+    block_tables: torch.Tensor,
+    context_lens: torch.Tensor,
+    key_scale: torch.Tensor | None = None,
+    value_scale: torch.Tensor | None = None,
+    alibi_slopes: torch.Tensor | None = None,
+    window_size: int = 0,
+) -> torch.Tensor:
+    # q: [bs * num_query_tokens, num_heads, head_dim], the query rows of a sequence are its last
+    # num_query_tokens positions and each row attends causally, num_query_tokens is 1 for decode
+    num_rows, num_heads, head_dim = q.shape
+    bs = block_tables.shape[0]
+    assert num_rows % bs == 0, "q rows must be a multiple of the batch size"
+    num_query_tokens = num_rows // bs
+    num_kv_heads = key_cache.shape[1] * 16 // head_dim
+    group_size = num_heads // num_kv_heads
+    o = torch.empty_like(q)
+    for r in range(num_rows):
+        b = r // num_query_tokens
+        seq_len = int(context_lens[b]) - (num_query_tokens - 1 - r % num_query_tokens)
+        k = gather_kv(key_cache, block_tables[b], seq_len, num_kv_heads, key_scale)
+        v = gather_kv(value_cache, block_tables[b], seq_len, num_kv_heads, value_scale)
+        # [num_kv_heads, group_size, head_dim] x [num_kv_heads, seq_len, head_dim]
+        qb = q[r].float().reshape(num_kv_heads, group_size, head_dim)
+        s = torch.matmul(qb, k.float().permute(1, 2, 0)) / head_dim**0.5
+        pos = torch.arange(seq_len, dtype=torch.float32) - (seq_len - 1)
+        if alibi_slopes is not None:
+            slopes = alibi_slopes.float().reshape(num_kv_heads, group_size, 1)
+            s = s + slopes * pos
+        if window_size > 0:
+            s = s.masked_fill(pos <= -window_size, float("-inf"))
+        p = torch.softmax(s, dim=-1)
+        ob = torch.matmul(p, v.float().transpose(0, 1))
+        o[r] = ob.reshape(num_heads, head_dim).to(q.dtype)
+    return o
+
+
+def alibi_slopes(num_heads: int) -> torch.Tensor:
+    # slopes of the ALiBi paper, [num_heads] fp32
+    n = 2 ** math.floor(math.log2(num_heads))
+    slopes = [2 ** (-8 * (i + 1) / n) for i in range(n)]
+    if n < num_heads:
+        extra = [2 ** (-4 * (2 * i + 1) / n) for i in range(num_heads - n)]
+        slopes += extra
+    return torch.tensor(slopes, dtype=torch.float32)
+
+
+def moe_gating_topk(
+    logits: torch.Tensor, top_k: int, renormalize: bool = True
+) -> tuple[torch.Tensor, torch.Tensor]:
+    # ties go to the lower expert id, like the kernel's argmax
+    probs = torch.softmax(logits.float(), dim=-1)
+    weights, ids = torch.sort(probs, dim=-1, descending=True, stable=True)
+    weights, ids = weights[:, :top_k], ids[:, :top_k].to(torch.int32)
+    if renormalize:
+        weights = weights / weights.sum(dim=-1, keepdim=True)
+    return weights, ids
+
+
+def moe_permute(
+    x: torch.Tensor, topk_ids: torch.Tensor, num_experts: int
+) -> tuple[torch.Tensor, torch.Tensor, torch.Tensor]:
+    # stable sort of the flattened topk_ids, ids outside [0, num_experts) are dropped:
+    # their expanded_row_idx is -1 and the trailing rows of permuted_x are left zero
+    top_k = topk_ids.shape[1]
+    ids = topk_ids.flatten().long()
+    valid = (ids >= 0) & (ids < num_experts)
+    order = torch.sort(torch.where(valid, ids, num_experts), stable=True).indices
+    num_valid = int(valid.sum())
+    expanded_row_idx = torch.full_like(ids, -1, dtype=torch.int32)
+    expanded_row_idx[order[:num_valid]] = torch.arange(num_valid, dtype=torch.int32)
+    permuted_x = torch.zeros(ids.numel(), x.shape[1], dtype=x.dtype)
+    permuted_x[:num_valid] = x[order[:num_valid] // top_k]
+    group_list = torch.bincount(ids[valid], minlength=num_experts).cumsum(0)
+    return permuted_x, expanded_row_idx, group_list
+
+
+def moe_unpermute(
+    y: torch.Tensor, expanded_row_idx: torch.Tensor, topk_weights: torch.Tensor
+) -> torch.Tensor:
+    num_tokens, top_k = topk_weights.shape
+    idx = expanded_row_idx.long().view(num_tokens, top_k)
+    rows = y.float()[idx.clamp(min=0)]
+    w = torch.where(idx >= 0, topk_weights.float(), 0.0)
+    return (rows * w.unsqueeze(-1)).sum(dim=1).to(y.dtype)
+
+
+def apply_repetition_penalty(
+    logits: torch.Tensor, penalty_token_ids: torch.Tensor, penalty: torch.Tensor
+) -> torch.Tensor:
+    # penalty_token_ids: [bs, n] padded with -1, repeated ids are penalized once
+    logits = logits.float().clone()
+    for b in range(logits.shape[0]):
+        ids = penalty_token_ids[b].long()
+        ids = ids[ids >= 0]
+        x = logits[b, ids]
+        p = float(penalty[b])
+        logits[b, ids] = torch.where(x < 0, x * p, x / p)
+    return logits
+
+
+def sampling(
+    logits: torch.Tensor,
+    temperature: torch.Tensor,
+    top_k: torch.Tensor,
+    top_p: torch.Tensor,
+    repetition_penalty: torch.Tensor,
+    uniform: torch.Tensor | None = None,
+    penalty_token_ids: torch.Tensor | None = None,
+    seed: int = 0,
+) -> torch.Tensor:
+    # logits: [bs, vocab], per sequence temperature, top_k (<= 0: off), top_p, repetition_penalty
+    # temperature <= 0 or top_k == 1 is greedy, otherwise the token is drawn by inverting the cdf
+    # of the filtered probs in vocab order at uniform, which is drawn from seed if not given
+    bs, vocab = logits.shape
+    if uniform is None:
+        generator = torch.Generator().manual_seed(seed)
+        uniform = torch.rand(bs, generator=generator)
+    if penalty_token_ids is not None:
+        logits = apply_repetition_penalty(logits, penalty_token_ids, repetition_penalty)
+    token_ids = torch.empty(bs, dtype=torch.int32)
+    for b in range(bs):
+        l = logits[b].float()
+        k = int(top_k[b])
+        if float(temperature[b]) <= 0 or k == 1:
+            token_ids[b] = int(torch.argmax(l))
+            continue
+        l = l * (1.0 / float(temperature[b]))
+        p = torch.exp(l - l.max())
+        sorted_l = torch.sort(l, descending=True).values
+        # ties at a threshold are kept
+        threshold = sorted_l[k - 1] if 0 < k < vocab else sorted_l[-1]
+        if float(top_p[b]) < 1:
+            mass = torch.exp(sorted_l[sorted_l >= threshold] - l.max()).cumsum(0)
+            i = int((mass < float(top_p[b]) * mass[-1]).sum())
+            threshold = max(threshold, sorted_l[i])
+        cdf = torch.where(l >= threshold, p, 0.0).cumsum(0)
+        i = int((cdf <= float(uniform[b]) * cdf[-1]).sum())
+        token_ids[b] = i if i < vocab else int(torch.argmax(l))
+    return token_ids
+
+
+# fused decode layer ops, GraphConfig.fused_layers. Rounded to fp16 where the kernels write to gm.
+
+
+def _rms_norm(x: torch.Tensor, weight: torch.Tensor, epsilon: float) -> torch.Tensor:
+    # fp32 in and out, the per head norm FusedQkvEx does in ub
+    rms = torch.rsqrt(x.pow(2).mean(dim=-1, keepdim=True) + epsilon)
+    return x * rms * weight.float()
+
+
+def fused_qkv(
+    x: torch.Tensor,
+    norm_weight: torch.Tensor,
+    weight: torch.Tensor,
+    q_norm_weight: torch.Tensor,
+    k_norm_weight: torch.Tensor,
+    position_ids: torch.Tensor,
+    cos_cache: torch.Tensor,
+    sin_cache: torch.Tensor,
+    slot_mapping: torch.Tensor,
+    key_cache: torch.Tensor,
+    value_cache: torch.Tensor,
+    residual: torch.Tensor | None = None,
+    epsilon: float = 1e-6,
+) -> tuple[torch.Tensor, torch.Tensor]:
+    # returns q [num_tokens, num_heads, head_dim] and x + residual (x without residual),
+    # k and v go to the caches in place
+    num_tokens = x.shape[0]
+    head_dim = q_norm_weight.shape[0]
+    num_kv_heads = key_cache.shape[1] * 16 // head_dim
+    num_heads = weight.shape[0] // head_dim - 2 * num_kv_heads
+    if residual is None:
+        residual = torch.zeros_like(x)
+    h, residual_output = add_rms_norm(x, residual, norm_weight, epsilon)
+    qkv = torch.matmul(h.float(), weight.float().T).to(x.dtype)
+    qkv = qkv.view(num_tokens, num_heads + 2 * num_kv_heads, head_dim)
+    q, k, v = qkv.split([num_heads, num_kv_heads, num_kv_heads], dim=1)
+    q = _rms_norm(q.float(), q_norm_weight, epsilon)
+    k = _rms_norm(k.float(), k_norm_weight, epsilon)
+    q, k = rope(q, k, position_ids, cos_cache.float(), sin_cache.float())
+    reshape_and_cache(k.to(x.dtype), v, key_cache, value_cache, slot_mapping)
+    return q.to(x.dtype), residual_output
+
+
+def mat_mul_add(
+    x: torch.Tensor, w: torch.Tensor, residual: torch.Tensor
+) -> torch.Tensor:
+    # x @ w.T + residual, w: [inner_dim, dim]
+    y = torch.matmul(x.float(), w.float().T).to(x.dtype)
+    return (y.float() + residual.float()).to(x.dtype)
+
+
+def fused_gate_up(
+    x: torch.Tensor, norm_weight: torch.Tensor, w: torch.Tensor, epsilon: float = 1e-6
+) -> torch.Tensor:
+    # swiglu(rms_norm(x) @ w.T), w: [2 * intermediate_size, hidden_size] gate rows then up rows
+    h, _ = add_rms_norm(x, torch.zeros_like(x), norm_weight, epsilon)
+    return swiglu(torch.matmul(h.float(), w.float().T).to(x.dtype))
@@ -0,0 +1,292 @@
+# Analytical roofline of the custom ops.
+#
+#   python -m ascend910a_extras.roofline paged_attention bs=16 num_heads=32 num_kv_heads=8 head_dim=128 context_len=2048
+#   python -m ascend910a_extras.roofline --save-profile my_device   # on a device, saves profiles/my_device.json
+#
+# A Platform holds the peak figures, read from the device through ops.print_info or from a saved
+# profile so predictions also run on machines without a device. Every op of ops.py has a cost
+# function of its shapes giving its flops and the hbm bytes it has to move at least; the lower
+# bound time is max(flops / peak of the unit doing them, bytes / hbm bandwidth).
+import argparse
+import json
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Callable
+
+PROFILE_DIR = Path(__file__).parent / "profiles"
+DEFAULT_PROFILE = "ascend910a"
+
+# fp16 ops per cycle per core
+CUBE_OPS_PER_CYCLE = 16 * 16 * 16 * 2
+VECTOR_OPS_PER_CYCLE = 128
+
+
+@dataclass
+class Platform:
+    name: str
+    aic_num: int
+    aiv_num: int
+    freq_mhz: int
+    # from the profile or given by the caller, the reported mem_bw has no documented unit
+    hbm_gb_s: float
+    mem_size: dict = field(default_factory=dict)
+    # as reported by the platform, not used by the model
+    mem_bw: dict = field(default_factory=dict)
+    source: str = ""
+
+    @property
+    def cube_tflops(self) -> float:
+        return self.aic_num * CUBE_OPS_PER_CYCLE * self.freq_mhz * 1e6 / 1e12
+
+    @property
+    def vector_tflops(self) -> float:
+        return self.aiv_num * VECTOR_OPS_PER_CYCLE * self.freq_mhz * 1e6 / 1e12
+
+    def save(self, path: str | Path) -> None:
+        Path(path).write_text(json.dumps(asdict(self), indent=2) + "\n")
+
+    @classmethod
+    def load(cls, name_or_path: str = DEFAULT_PROFILE) -> "Platform":
+        # a profile name under profiles/ or a json path
+        path = Path(name_or_path)
+        if not path.suffix:
+            path = PROFILE_DIR / f"{name_or_path}.json"
+        return cls(**json.loads(path.read_text()))
+
+    @classmethod
+    def from_device(cls, name: str = "device", hbm_gb_s: float = 0.0) -> "Platform":
+        # the device gives the cores, clock and memory sizes, the hbm bandwidth is hbm_gb_s or the
+        # default profile's and the frequency falls back to it
+        import ascend910a_extras.ops as ops
+
+        info = ops.print_info()
+        default = cls.load(DEFAULT_PROFILE)
+        return cls(
+            name=name,
+            aic_num=info["aic_num"],
+            aiv_num=info["aiv_num"],
+            freq_mhz=info["cube_freq_mhz"] or default.freq_mhz,
+            hbm_gb_s=hbm_gb_s or default.hbm_gb_s,
+            mem_size=dict(info["mem_size"]),
+            mem_bw=dict(info["mem_bw"]),
+            source="ops.print_info",
+        )
+
+
+@dataclass
+class Cost:
+    flops: int
+    bytes: int
+    # unit doing the flops, cube or vector
+    unit: str = "vector"
+
+    def compute_time(self, platform: Platform) -> float:
+        peak = platform.cube_tflops if self.unit == "cube" else platform.vector_tflops
+        return self.flops / (peak * 1e12)
+
+    def memory_time(self, platform: Platform) -> float:
+        return self.bytes / (platform.hbm_gb_s * 1e9)
+
+    def time(self, platform: Platform) -> float:
+        return max(self.compute_time(platform), self.memory_time(platform))
+
+    def bound(self, platform: Platform) -> str:
+        if self.compute_time(platform) >= self.memory_time(platform):
+            return "compute"
+        return "memory"
+
+
+COSTS: dict[str, Callable[..., Cost]] = {}
+
+
+def cost(op: str):
+    def register(fn: Callable[..., Cost]) -> Callable[..., Cost]:
+        COSTS[op] = fn
+        return fn
+
+    return register
+
+
+# the in-place variants move the same bytes
+@cost("rope")
+@cost("rope_")
+def rope(num_tokens: int, num_heads: int, num_kv_heads: int, head_dim: int) -> Cost:
+    n = num_tokens * (num_heads + num_kv_heads) * head_dim
+    # q, k in and out, one cos/sin row per token
+    return Cost(3 * n, 2 * n * 2 + 2 * num_tokens * head_dim * 2)
+
+
+@cost("swiglu")
+def swiglu(num_tokens: int, dim: int) -> Cost:
+    n = num_tokens * dim
+    return Cost(4 * n, 3 * n * 2)
+
+
+@cost("add_rms_norm")
+@cost("add_rms_norm_")
+def add_rms_norm(num_tokens: int, dim: int) -> Cost:
+    n = num_tokens * dim
+    return Cost(4 * n, 4 * n * 2 + dim * 2)
+
+
+@cost("weight_quant_matmul")
+def weight_quant_matmul(m: int, n: int, k: int, group_size: int = 0) -> Cost:
+    num_groups = k // group_size if group_size > 0 else 1
+    nbytes = m * k * 2 + n * k + num_groups * n * 2 + m * n * 2
+    return Cost(2 * m * n * k, nbytes, "cube")
+
+
+@cost("grouped_matmul")
+def grouped_matmul(num_tokens: int, dim: int, inner_dim: int, num_experts: int) -> Cost:
+    nbytes = (
+        num_tokens * dim + num_experts * dim * inner_dim + num_tokens * inner_dim
+    ) * 2
+    return Cost(2 * num_tokens * dim * inner_dim, nbytes, "cube")
+
+
+@cost("weight_quant_grouped_matmul")
+def weight_quant_grouped_matmul(
+    num_tokens: int, dim: int, inner_dim: int, num_experts: int, group_size: int = 0
+) -> Cost:
+    num_groups = dim // group_size if group_size > 0 else 1
+    nbytes = (num_tokens * dim + num_tokens * inner_dim) * 2
+    nbytes += num_experts * (dim * inner_dim + num_groups * inner_dim * 2)
+    return Cost(2 * num_tokens * dim * inner_dim, nbytes, "cube")
+
+
+@cost("reshape_and_cache")
+def reshape_and_cache(
+    num_tokens: int, num_kv_heads: int, head_dim: int, kv_quant: bool = False
+) -> Cost:
+    n = 2 * num_tokens * num_kv_heads * head_dim
+    if kv_quant:
+        # absmax, scale and round per element, one fp16 scale per token per head
+        return Cost(3 * n, n * 2 + n + 2 * num_tokens * num_kv_heads * 2)
+    return Cost(0, n * 2 * 2)
+
+
+@cost("paged_attention")
+def paged_attention(
+    bs: int,
+    num_heads: int,
+    num_kv_heads: int,
+    head_dim: int,
+    context_len: int,
+    num_query_tokens: int = 1,
+    kv_quant: bool = False,
+) -> Cost:
+    rows = bs * num_query_tokens
+    flops = 4 * rows * num_heads * head_dim * context_len
+    # the kv of a sequence is read once, even by several query rows
+    kv_elems = 2 * bs * context_len * num_kv_heads * head_dim
+    nbytes = kv_elems * (1 if kv_quant else 2) + 2 * rows * num_heads * head_dim * 2
+    if kv_quant:
+        nbytes += 2 * bs * context_len * num_kv_heads * 2
+    return Cost(flops, nbytes, "cube")
+
+
+@cost("moe_gating_topk")
+def moe_gating_topk(num_tokens: int, num_experts: int, top_k: int) -> Cost:
+    # softmax, then one max reduction per selected expert
+    flops = num_tokens * num_experts * (4 + top_k)
+    return Cost(flops, num_tokens * num_experts * 2 + num_tokens * top_k * 8)
+
+
+@cost("moe_permute")
+def moe_permute(num_tokens: int, hidden: int, top_k: int) -> Cost:
+    rows = num_tokens * top_k
+    return Cost(0, num_tokens * hidden * 2 + rows * hidden * 2 + rows * 8)
+
+
+@cost("moe_unpermute")
+def moe_unpermute(num_tokens: int, hidden: int, top_k: int) -> Cost:
+    rows = num_tokens * top_k
+    nbytes = rows * hidden * 2 + num_tokens * hidden * 2 + rows * 8
+    return Cost(2 * rows * hidden, nbytes)
+
+
+@cost("sampling")
+def sampling(bs: int, vocab_size: int) -> Cost:
+    n = bs * vocab_size
+    # logits in, fp32 probabilities through the workspace, a few passes for the thresholds
+    return Cost(8 * n, n * 2 + 2 * n * 4)
+
+
+@cost("copy_blocks")
+def copy_blocks(num_layers: int, num_pairs: int, page_bytes: int) -> Cost:
+    return Cost(0, 2 * 2 * num_layers * num_pairs * page_bytes)
+
+
+@dataclass
+class Prediction:
+    op: str
+    flops: int
+    bytes: int
+    time: float
+    bound: str
+
+    @property
+    def tflops(self) -> float:
+        return self.flops / self.time / 1e12 if self.time > 0 else 0.0
+
+    @property
+    def gb_s(self) -> float:
+        return self.bytes / self.time / 1e9 if self.time > 0 else 0.0
+
+
+def predict(op: str, platform: Platform | None = None, **shape) -> Prediction:
+    platform = platform or Platform.load()
+    c = COSTS[op](**shape)
+    return Prediction(op, c.flops, c.bytes, c.time(platform), c.bound(platform))
+
+
+def percent_of_roofline(
+    op: str, measured_time: float, platform: Platform | None = None, **shape
+) -> float:
+    # 100 means the kernel runs at the lower bound
+    return 100.0 * predict(op, platform, **shape).time / measured_time
+
+
+def _parse_value(v: str):
+    if v in ("True", "False"):
+        return v == "True"
+    return int(v)
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m ascend910a_extras.roofline")
+    parser.add_argument("op", nargs="?", choices=list(COSTS))
+    parser.add_argument("shape", nargs="*", help="key=value")
+    parser.add_argument("--profile", default=DEFAULT_PROFILE)
+    parser.add_argument(
+        "--save-profile",
+        default=None,
+        help="read the device and save it under this name",
+    )
+    parser.add_argument(
+        "--hbm-gb-s",
+        type=float,
+        default=0.0,
+        help="hbm bandwidth of the saved profile, default that of the default profile",
+    )
+    args = parser.parse_args(argv)
+    if args.save_profile:
+        platform = Platform.from_device(args.save_profile, args.hbm_gb_s)
+        platform.save(PROFILE_DIR / f"{args.save_profile}.json")
+        print(f"saved {PROFILE_DIR / args.save_profile}.json")
+        return
+    platform = Platform.load(args.profile)
+    if args.op is None:
+        print(
+            f"{platform.name}: cube {platform.cube_tflops:.1f} TFLOPS, vector {platform.vector_tflops:.1f} TFLOPS, hbm {platform.hbm_gb_s:.0f} GB/s"
+        )
+        return
+    shape = {k: _parse_value(v) for k, v in (s.split("=", 1) for s in args.shape)}
+    p = predict(args.op, platform, **shape)
+    print(
+        f"{args.op}: {p.flops / 1e9:.3f} GFLOP, {p.bytes / 1e6:.3f} MB, >= {p.time * 1e6:.2f} us ({p.bound} bound)"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,715 @@
+# End-to-end serving benchmark of the decode graph.
+#
+#   python -m ascend910a_extras.serve_bench --executor sim --batch-size 1 8 32 --prompt-len 512 2048
+#   python -m ascend910a_extras.serve_bench --executor graph --batch-size 16 --rate 4 --out serve.json
+#   python -m ascend910a_extras.serve_bench --executor sim num_layers=2 hidden_size=1024
+#
+# Requests arrive as a poisson process, a continuous batching scheduler admits them fcfs while kv
+# pages are free, preempts the newest running request when a decode step runs out of pages, builds
+# the inputs of Graph.build_model (padded to the batch size of the graph) and hands them to an
+# executor. GraphExecutor runs the real graph with sampling on a device, SimulatedExecutor returns
+# random tokens and the roofline time of the kernels of the step, so the host side can be profiled
+# and regression-tested on cpu.
+#
+# The graph only has the decode path: prompts are not run through the model, their kv slots are
+# allocated at admission and hold whatever the cache holds, the first token comes from the first
+# decode step. The clock advances by the measured host time of every stage plus the simulated
+# device time, the step reads the token ids back, so host and device do not overlap.
+import argparse
+import itertools
+import json
+import math
+import random
+import time
+from collections import deque
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+
+import torch
+
+from ascend910a_extras.kv_cache import BlockManager, KVCacheLayout
+from ascend910a_extras.roofline import COSTS, DEFAULT_PROFILE, Cost, Platform
+
+ACL_FORMAT_FRACTAL_NZ = 29
+# the padding rows of a step write and read this sequence
+PAD_SEQ = -1
+PERCENTILES = (50, 90, 99)
+
+
+@dataclass
+class ModelConfig:
+    # the fields of graph.GraphConfig that do not depend on the batch, plus the vocab
+    hidden_size: int = 4096
+    num_heads: int = 32
+    num_kv_heads: int = 8
+    intermediate_size: int = 12288
+    num_layers: int = 36
+    vocab_size: int = 151936
+    rms_norm_eps: float = 1e-6
+    weight_quant: bool = False
+    group_size: int = 0
+    num_experts: int = 0
+    num_experts_per_tok: int = 8
+    norm_topk_prob: bool = True
+    shared_expert_intermediate_size: int = 0
+    tie_word_embeddings: bool = False
+    max_position_embeddings: int = 40960
+    rope_theta: float = 1000000.0
+
+    @property
+    def head_dim(self) -> int:
+        return self.hidden_size // self.num_heads
+
+    def kv_layout(self, num_pages: int, page_size: int = 128) -> KVCacheLayout:
+        return KVCacheLayout(
+            self.num_layers, self.num_kv_heads, self.head_dim, page_size, num_pages
+        )
+
+    @classmethod
+    def from_graph_config(
+        cls, config, vocab_size: int, group_size: int = 0, **kwargs
+    ) -> "ModelConfig":
+        # the model of a graph.GraphConfig, which has no vocab or quantization group size
+        fields = [
+            "hidden_size",
+            "num_heads",
+            "num_kv_heads",
+            "intermediate_size",
+            "num_layers",
+            "rms_norm_eps",
+            "weight_quant",
+            "num_experts",
+            "num_experts_per_tok",
+            "norm_topk_prob",
+            "shared_expert_intermediate_size",
+            "tie_word_embeddings",
+        ]
+        values = {name: getattr(config, name) for name in fields}
+        return cls(vocab_size=vocab_size, group_size=group_size, **values, **kwargs)
+
+    def graph_config(self, batch_size: int):
+        import ascend910a_extras.graph as graph
+
+        config = graph.GraphConfig()
+        config.batch_size = batch_size
+        config.hidden_size = self.hidden_size
+        config.num_heads = self.num_heads
+        config.num_kv_heads = self.num_kv_heads
+        config.intermediate_size = self.intermediate_size
+        config.num_layers = self.num_layers
+        config.rms_norm_eps = self.rms_norm_eps
+        config.weight_quant = self.weight_quant
+        config.num_experts = self.num_experts
+        config.num_experts_per_tok = self.num_experts_per_tok
+        config.norm_topk_prob = self.norm_topk_prob
+        config.shared_expert_intermediate_size = self.shared_expert_intermediate_size
+        config.sampling = True
+        config.tie_word_embeddings = self.tie_word_embeddings
+        return config
+
+
+MODELS = {
+    "qwen3-8b": ModelConfig(),
+    "tiny": ModelConfig(
+        hidden_size=256,
+        num_heads=2,
+        num_kv_heads=1,
+        intermediate_size=512,
+        num_layers=2,
+        vocab_size=1024,
+    ),
+}
+
+
+@dataclass
+class Request:
+    id: int
+    # seconds since the start of the run
+    arrival: float
+    prompt_len: int
+    max_new_tokens: int
+    temperature: float = 1.0
+    top_k: int = 0
+    top_p: float = 1.0
+    repetition_penalty: float = 1.0
+    # filled in by the run
+    tokens: list[int] = field(default_factory=list)
+    token_times: list[float] = field(default_factory=list)
+    num_preempted: int = 0
+
+    @property
+    def done(self) -> bool:
+        return len(self.tokens) >= self.max_new_tokens
+
+    @property
+    def context_len(self) -> int:
+        # tokens in the kv cache once the last generated token is fed
+        return self.prompt_len + len(self.tokens)
+
+    @property
+    def ttft(self) -> float:
+        return self.token_times[0] - self.arrival
+
+    @property
+    def itl(self) -> list[float]:
+        return [b - a for a, b in zip(self.token_times, self.token_times[1:])]
+
+
+def poisson_requests(
+    num_requests: int,
+    rate: float = math.inf,
+    prompt_len: int | tuple[int, int] = 512,
+    output_len: int | tuple[int, int] = 128,
+    seed: int = 0,
+    **sampling,
+) -> list[Request]:
+    # rate in requests per second, inf: all arrive at 0, lengths are fixed or uniform in [lo, hi]
+    rng = random.Random(seed)
+
+    def draw(n):
+        return rng.randint(*n) if isinstance(n, tuple) else n
+
+    requests, t = [], 0.0
+    for i in range(num_requests):
+        if rate != math.inf:
+            t += rng.expovariate(rate)
+        requests.append(Request(i, t, draw(prompt_len), draw(output_len), **sampling))
+    return requests
+
+
+def _linear(m: int, n: int, k: int, model: ModelConfig, quant: bool = True) -> Cost:
+    # x [m, k] @ w.T, w [n, k], the router is never quantized
+    if quant and model.weight_quant:
+        return COSTS["weight_quant_matmul"](m, n, k, model.group_size)
+    return Cost(2 * m * n * k, (m * k + n * k + m * n) * 2, "cube")
+
+
+def step_kernels(
+    model: ModelConfig, context_lens: list[int], kv_quant: bool = False
+) -> list[tuple[str, Cost]]:
+    # the kernels of one decode step of Graph.build_model with sampling, one row per sequence
+    # the q/k norms count as add_rms_norm, which moves a bit more
+    m = len(context_lens)
+    h, d = model.hidden_size, model.head_dim
+    q_size, kv_size = model.num_heads * d, model.num_kv_heads * d
+    attn = Cost(0, 0, "cube")
+    for context_len in context_lens:
+        c = COSTS["paged_attention"](
+            1, model.num_heads, model.num_kv_heads, d, context_len, kv_quant=kv_quant
+        )
+        attn = Cost(attn.flops + c.flops, attn.bytes + c.bytes, "cube")
+
+    def mlp(inner: int) -> list[tuple[str, Cost]]:
+        return [
+            ("gate_up_proj", _linear(m, 2 * inner, h, model)),
+            ("swiglu", COSTS["swiglu"](m, inner)),
+            ("down_proj", _linear(m, h, inner, model)),
+        ]
+
+    layer = [
+        ("input_layernorm", COSTS["add_rms_norm"](m, h)),
+        ("qkv_proj", _linear(m, q_size + 2 * kv_size, h, model)),
+        ("q_norm", COSTS["add_rms_norm"](m * model.num_heads, d)),
+        ("k_norm", COSTS["add_rms_norm"](m * model.num_kv_heads, d)),
+        ("rope", COSTS["rope"](m, model.num_heads, model.num_kv_heads, d)),
+        ("reshape_and_cache", COSTS["reshape_and_cache"](m, model.num_kv_heads, d)),
+        ("paged_attention", attn),
+        ("o_proj", _linear(m, h, q_size, model)),
+        ("post_attention_layernorm", COSTS["add_rms_norm"](m, h)),
+    ]
+    if model.num_experts > 0:
+        e, k, inner = (
+            model.num_experts,
+            model.num_experts_per_tok,
+            model.intermediate_size,
+        )
+        grouped = (
+            "weight_quant_grouped_matmul" if model.weight_quant else "grouped_matmul"
+        )
+        extra = dict(group_size=model.group_size) if model.weight_quant else {}
+        layer += [
+            ("router", _linear(m, e, h, model, quant=False)),
+            ("moe_gating_topk", COSTS["moe_gating_topk"](m, e, k)),
+            ("moe_permute", COSTS["moe_permute"](m, h, k)),
+            ("gate_up_proj", COSTS[grouped](m * k, h, 2 * inner, e, **extra)),
+            ("swiglu", COSTS["swiglu"](m * k, inner)),
+            ("down_proj", COSTS[grouped](m * k, inner, h, e, **extra)),
+            ("moe_unpermute", COSTS["moe_unpermute"](m, h, k)),
+        ]
+        if model.shared_expert_intermediate_size > 0:
+            layer += mlp(model.shared_expert_intermediate_size)
+            layer.append(("shared_expert_add", Cost(m * h, 3 * m * h * 2)))
+    else:
+        layer += mlp(model.intermediate_size)
+    return [
+        ("embedding", Cost(0, 2 * m * h * 2)),
+        *layer * model.num_layers,
+        ("norm", COSTS["add_rms_norm"](m, h)),
+        ("lm_head", _linear(m, model.vocab_size, h, model, quant=False)),
+        ("sampling", COSTS["sampling"](m, model.vocab_size)),
+    ]
+
+
+class SimulatedExecutor:
+    # no device: random tokens, the step takes the roofline time of its kernels over efficiency
+    # plus launch_overhead per kernel
+    device = "cpu"
+
+    def __init__(
+        self,
+        model: ModelConfig,
+        batch_size: int,
+        layout: KVCacheLayout,
+        platform: Platform | None = None,
+        efficiency: float = 0.7,
+        launch_overhead: float = 5e-6,
+        seed: int = 0,
+    ):
+        self.model = model
+        self.batch_size = batch_size
+        self.layout = layout
+        self.platform = platform or Platform.load()
+        self.efficiency = efficiency
+        self.launch_overhead = launch_overhead
+        self.generator = torch.Generator().manual_seed(seed)
+
+    def step_time(self, context_lens: list[int]) -> float:
+        kernels = step_kernels(self.model, context_lens, self.layout.kv_quant)
+        t = sum(c.time(self.platform) for _, c in kernels) / self.efficiency
+        return t + self.launch_overhead * len(kernels)
+
+    def step(self, inputs: dict[str, torch.Tensor]) -> tuple[list[int], float]:
+        # returns the sampled token per row and the device time not measured by the caller
+        t = self.step_time(inputs["context_lens"].tolist())
+        token_ids = torch.randint(
+            0, self.model.vocab_size, (self.batch_size,), generator=self.generator
+        )
+        return token_ids.tolist(), t
+
+
+def random_weights(
+    model: ModelConfig, device="npu", dtype=torch.float16
+) -> list[torch.Tensor]:
+    # weights in the order Graph.build_model takes them, for throughput runs only
+    from ascend910a_extras.quantize import quantize_weight
+
+    h, d = model.hidden_size, model.head_dim
+    q_size, kv_size = model.num_heads * d, model.num_kv_heads * d
+
+    def w(*shape):
+        return (torch.randn(*shape, dtype=dtype) * 0.02).to(device)
+
+    def norm(n):
+        return torch.ones(n, dtype=dtype, device=device)
+
+    def linear(n, k):
+        if not model.weight_quant:
+            return [w(n, k)]
+        q, scale = quantize_weight(torch.randn(n, k) * 0.02, model.group_size)
+        return [q.to(device), scale.to(device)]
+
+    def grouped(n, k):
+        x = torch.randn(model.num_experts, n, k) * 0.02
+        if not model.weight_quant:
+            return [x.to(dtype).to(device)]
+        q, scale = quantize_weight(x, model.group_size)
+        return [q.to(device), scale.to(device)]
+
+    def mlp(inner):
+        return linear(2 * inner, h) + linear(h, inner)
+
+    weights = [w(model.vocab_size, h)]
+    for _ in range(model.num_layers):
+        weights.append(norm(h))
+        weights += linear(q_size + 2 * kv_size, h)
+        weights += [norm(d), norm(d)]
+        weights += linear(h, q_size)
+        weights.append(norm(h))
+        if model.num_experts > 0:
+            weights.append(w(model.num_experts, h))
+            weights += grouped(2 * model.intermediate_size, h)
+            weights += grouped(h, model.intermediate_size)
+            if model.shared_expert_intermediate_size > 0:
+                weights += mlp(model.shared_expert_intermediate_size)
+        else:
+            weights += mlp(model.intermediate_size)
+    weights.append(norm(h))
+    if not model.tie_word_embeddings:
+        weights.append(w(model.vocab_size, h))
+    return weights
+
+
+def rope_cache(
+    model: ModelConfig, device="npu", dtype=torch.float16
+) -> tuple[torch.Tensor, torch.Tensor]:
+    # cos, sin: [max_position_embeddings, head_dim // 2]
+    d = model.head_dim
+    inv_freq = 1.0 / (model.rope_theta ** (torch.arange(0, d, 2).float() / d))
+    t = torch.arange(model.max_position_embeddings, dtype=torch.float)
+    freqs = torch.outer(t, inv_freq)
+    return (
+        freqs.cos().to(dtype).contiguous().to(device),
+        freqs.sin().to(dtype).contiguous().to(device),
+    )
+
+
+class GraphExecutor:
+    # Graph.build_model with sampling on the device, the kv cache holds layout.num_pages pages
+    device = "npu"
+
+    def __init__(
+        self,
+        model: ModelConfig,
+        batch_size: int,
+        layout: KVCacheLayout,
+        weights: list[torch.Tensor] | None = None,
+        num_split: int = 1,
+    ):
+        import torch_npu
+
+        import ascend910a_extras.graph as graph
+
+        self.model = model
+        self.batch_size = batch_size
+        self.layout = layout
+        self.graph = graph.Graph(model.graph_config(batch_size))
+        self.graph.build_model(num_split)
+        self.ctx = graph.Context()
+        caches = layout.allocate(self.device)
+        self.key_caches = [
+            torch_npu.npu_format_cast(k, ACL_FORMAT_FRACTAL_NZ) for k, *_ in caches
+        ]
+        self.value_caches = [
+            torch_npu.npu_format_cast(v, ACL_FORMAT_FRACTAL_NZ) for _, v, *_ in caches
+        ]
+        self.cos_cache, self.sin_cache = rope_cache(model, self.device)
+        self.weights = weights if weights is not None else random_weights(model)
+        self.out = torch.zeros(batch_size, dtype=torch.int32, device=self.device)
+        self.workspace = torch.empty(0, dtype=torch.uint8, device=self.device)
+
+    def step(self, inputs: dict[str, torch.Tensor]) -> tuple[list[int], float]:
+        workspace_size = self.ctx.setup(
+            self.graph,
+            inputs["token_ids"],
+            self.key_caches,
+            self.value_caches,
+            inputs["position_ids"],
+            inputs["slot_mapping"],
+            inputs["block_tables"],
+            inputs["context_lens"],
+            self.cos_cache,
+            self.sin_cache,
+            self.weights,
+            self.out,
+            inputs["sampling_inputs"],
+        )
+        if workspace_size > self.workspace.numel():
+            self.workspace = torch.empty(
+                workspace_size, dtype=torch.uint8, device=self.device
+            )
+        # a fresh setup every step, so the plain run is safe
+        self.ctx.run(self.graph, self.workspace)
+        # the copy back waits for the device, it is measured by the caller
+        return self.out.tolist(), 0.0
+
+
+def prepare_inputs(
+    manager: BlockManager,
+    batch: list[Request],
+    batch_size: int,
+    max_pages: int,
+    generator: torch.Generator,
+    device="npu",
+) -> dict[str, torch.Tensor]:
+    # appends one kv slot per request and builds the step inputs, rows past the batch are padding
+    # that attends to the one slot of PAD_SEQ and samples greedily
+    pad = batch_size - len(batch)
+    seq_ids = [r.id for r in batch] + [PAD_SEQ] * pad
+    token_ids, position_ids, slot_mapping = [], [], []
+    for r in batch:
+        position_ids.append(r.context_len)
+        slot_mapping += manager.append_slots(r.id)
+        # the last generated token, the prompt is not run, its last token is a stand-in
+        token_ids.append(r.tokens[-1] if r.tokens else 0)
+    pad_slot = manager.block_tables[PAD_SEQ][0] * manager.page_size
+    token_ids += [0] * pad
+    position_ids += [0] * pad
+    slot_mapping += [pad_slot] * pad
+
+    block_tables = torch.zeros(batch_size, max_pages, dtype=torch.int32)
+    tables = manager.get_block_tables(seq_ids, device="cpu")
+    block_tables[:, : tables.shape[1]] = tables
+
+    temperature = [r.temperature for r in batch] + [0.0] * pad
+    top_k = [r.top_k for r in batch] + [1] * pad
+    top_p = [r.top_p for r in batch] + [1.0] * pad
+    penalty = [r.repetition_penalty for r in batch] + [1.0] * pad
+    if any(p != 1.0 for p in penalty):
+        n = max(1, max(len(r.tokens) for r in batch))
+        penalty_token_ids = torch.full((batch_size, n), -1, dtype=torch.int32)
+        for i, r in enumerate(batch):
+            penalty_token_ids[i, : len(r.tokens)] = torch.tensor(
+                r.tokens, dtype=torch.int32
+            )
+    else:
+        penalty_token_ids = torch.empty(0, dtype=torch.int32)
+    sampling_inputs = [
+        torch.tensor(temperature, dtype=torch.float32),
+        torch.tensor(top_k, dtype=torch.int32),
+        torch.tensor(top_p, dtype=torch.float32),
+        torch.tensor(penalty, dtype=torch.float32),
+        torch.rand(batch_size, generator=generator),
+        penalty_token_ids,
+    ]
+    return {
+        "token_ids": torch.tensor(token_ids, dtype=torch.int32, device=device),
+        "position_ids": torch.tensor(position_ids, dtype=torch.int32, device=device),
+        "slot_mapping": torch.tensor(slot_mapping, dtype=torch.int32, device=device),
+        "block_tables": block_tables.to(device),
+        "context_lens": manager.get_context_lens(seq_ids, device=device),
+        "sampling_inputs": [x.to(device) for x in sampling_inputs],
+    }
+
+
+def percentiles(values: list[float], ps=PERCENTILES) -> dict[str, float]:
+    # mean and linearly interpolated percentiles, zeros when empty
+    out = {"mean": sum(values) / len(values) if values else 0.0}
+    s = sorted(values)
+    for p in ps:
+        if not s:
+            out[f"p{p}"] = 0.0
+            continue
+        x = (len(s) - 1) * p / 100
+        lo = int(x)
+        hi = min(lo + 1, len(s) - 1)
+        out[f"p{p}"] = s[lo] + (s[hi] - s[lo]) * (x - lo)
+    return out
+
+
+@dataclass
+class Report:
+    executor: str
+    batch_size: int
+    num_requests: int
+    prompt_len: float
+    output_tokens: int
+    # seconds of the clock from the first arrival to the last token
+    duration: float
+    num_steps: int
+    mean_batch: float
+    num_preempted: int
+    ttft: dict
+    itl: dict
+    e2e: dict
+    # seconds of the clock per stage: schedule, prepare, execute, postprocess, device (simulated)
+    stages: dict
+
+    @property
+    def throughput(self) -> float:
+        # generated tokens per second
+        return self.output_tokens / self.duration if self.duration > 0 else 0.0
+
+    @property
+    def request_throughput(self) -> float:
+        return self.num_requests / self.duration if self.duration > 0 else 0.0
+
+    def to_dict(self) -> dict:
+        d = asdict(self)
+        d["throughput"] = self.throughput
+        d["request_throughput"] = self.request_throughput
+        return d
+
+
+def serve(requests: list[Request], executor, seed: int = 0) -> Report:
+    # runs the requests to completion through the executor, fills their tokens and token times
+    manager = BlockManager(executor.layout)
+    manager.append_slots(PAD_SEQ)
+    max_len = max(r.prompt_len + r.max_new_tokens for r in requests)
+    max_pages = math.ceil(max_len / manager.page_size)
+    if max_pages > manager.layout.num_pages - 1:
+        raise ValueError(
+            f"a request of {max_len} tokens needs {max_pages} pages, the cache has {manager.layout.num_pages - 1}"
+        )
+    generator = torch.Generator().manual_seed(seed)
+    pending = deque(sorted(requests, key=lambda r: (r.arrival, r.id)))
+    waiting: deque[Request] = deque()
+    running: list[Request] = []
+    stages = dict.fromkeys(
+        ["schedule", "prepare", "execute", "postprocess", "device"], 0.0
+    )
+    now, num_steps, batch_rows, num_preempted = 0.0, 0, 0, 0
+
+    def preempt() -> None:
+        nonlocal num_preempted
+        # the newest request goes back to the front of the queue and keeps its tokens
+        r = running.pop()
+        manager.free(r.id)
+        r.num_preempted += 1
+        num_preempted += 1
+        waiting.appendleft(r)
+
+    while pending or waiting or running:
+        if not waiting and not running and pending[0].arrival > now:
+            now = pending[0].arrival
+
+        t0 = time.perf_counter()
+        while pending and pending[0].arrival <= now:
+            waiting.append(pending.popleft())
+        while waiting and len(running) < executor.batch_size:
+            r = waiting[0]
+            # the prompt and the generated tokens, plus the slot of the next step
+            if (
+                manager.num_pages_needed(r.id, r.context_len + 1)
+                > manager.num_free_pages
+            ):
+                break
+            manager.append_slots(r.id, r.context_len)
+            running.append(waiting.popleft())
+        while (
+            running
+            and sum(manager.num_pages_needed(r.id, 1) for r in running)
+            > manager.num_free_pages
+        ):
+            preempt()
+        if not running:
+            raise RuntimeError("no request fits in the kv cache")
+        t1 = time.perf_counter()
+        inputs = prepare_inputs(
+            manager,
+            running,
+            executor.batch_size,
+            max_pages,
+            generator,
+            executor.device,
+        )
+        t2 = time.perf_counter()
+        token_ids, device_time = executor.step(inputs)
+        t3 = time.perf_counter()
+        now += (t3 - t0) + device_time
+        for r, token in zip(running, token_ids):
+            r.tokens.append(token)
+            r.token_times.append(now)
+        batch_rows += len(running)
+        finished = [r for r in running if r.done]
+        for r in finished:
+            manager.free(r.id)
+        running = [r for r in running if not r.done]
+        t4 = time.perf_counter()
+        now += t4 - t3
+        num_steps += 1
+        for stage, t in zip(
+            ["schedule", "prepare", "execute", "postprocess", "device"],
+            [t1 - t0, t2 - t1, t3 - t2, t4 - t3, device_time],
+        ):
+            stages[stage] += t
+
+    start = min(r.arrival for r in requests)
+    return Report(
+        executor=type(executor).__name__,
+        batch_size=executor.batch_size,
+        num_requests=len(requests),
+        prompt_len=sum(r.prompt_len for r in requests) / len(requests),
+        output_tokens=sum(len(r.tokens) for r in requests),
+        duration=max(r.token_times[-1] for r in requests) - start,
+        num_steps=num_steps,
+        mean_batch=batch_rows / num_steps if num_steps else 0.0,
+        num_preempted=num_preempted,
+        ttft=percentiles([r.ttft for r in requests]),
+        itl=percentiles([t for r in requests for t in r.itl]),
+        e2e=percentiles([r.token_times[-1] - r.arrival for r in requests]),
+        stages=stages,
+    )
+
+
+def make_executor(
+    name: str,
+    model: ModelConfig,
+    batch_size: int,
+    num_pages: int,
+    page_size: int = 128,
+    profile: str = DEFAULT_PROFILE,
+):
+    layout = model.kv_layout(num_pages, page_size)
+    if name == "sim":
+        return SimulatedExecutor(model, batch_size, layout, Platform.load(profile))
+    if name == "graph":
+        return GraphExecutor(model, batch_size, layout)
+    raise ValueError(f"unknown executor {name}, expected sim or graph")
+
+
+def _parse_value(v: str):
+    if v in ("True", "False"):
+        return v == "True"
+    try:
+        return int(v)
+    except ValueError:
+        return float(v)
+
+
+def _fmt(d: dict) -> str:
+    return " ".join(f"{k} {v * 1e3:.2f}" for k, v in d.items())
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m ascend910a_extras.serve_bench")
+    parser.add_argument(
+        "overrides", nargs="*", help="key=value overrides of the model config"
+    )
+    parser.add_argument("--executor", default="sim", choices=["sim", "graph"])
+    parser.add_argument("--model", default="qwen3-8b", choices=list(MODELS))
+    parser.add_argument("--batch-size", type=int, nargs="+", default=[16])
+    parser.add_argument("--prompt-len", type=int, nargs="+", default=[512])
+    parser.add_argument("--output-len", type=int, default=128)
+    parser.add_argument("--num-requests", type=int, default=None, help="default 4x bs")
+    parser.add_argument(
+        "--rate", type=float, default=math.inf, help="requests per second"
+    )
+    parser.add_argument(
+        "--num-pages", type=int, default=None, help="default enough for the batch"
+    )
+    parser.add_argument("--page-size", type=int, default=128)
+    parser.add_argument("--profile", default=DEFAULT_PROFILE)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default=None, help="json report")
+    args = parser.parse_args(argv)
+
+    overrides = {
+        k: _parse_value(v) for k, v in (s.split("=", 1) for s in args.overrides)
+    }
+    model = ModelConfig(**{**asdict(MODELS[args.model]), **overrides})
+    reports = []
+    for batch_size, prompt_len in itertools.product(args.batch_size, args.prompt_len):
+        max_len = prompt_len + args.output_len
+        num_pages = (
+            args.num_pages or batch_size * math.ceil(max_len / args.page_size) + 1
+        )
+        executor = make_executor(
+            args.executor, model, batch_size, num_pages, args.page_size, args.profile
+        )
+        requests = poisson_requests(
+            args.num_requests or 4 * batch_size,
+            args.rate,
+            prompt_len,
+            args.output_len,
+            args.seed,
+        )
+        report = serve(requests, executor, args.seed)
+        reports.append(report)
+        print(
+            f"bs {batch_size:4d} prompt {prompt_len:6d}: {report.throughput:10.1f} tok/s, "
+            f"{report.request_throughput:.2f} req/s, mean batch {report.mean_batch:.1f}, "
+            f"preempted {report.num_preempted}",
+            flush=True,
+        )
+        print(f"  ttft ms: {_fmt(report.ttft)}")
+        print(f"  itl  ms: {_fmt(report.itl)}")
+        print(f"  time ms: {_fmt(report.stages)}")
+    if args.out:
+        data = {"model": asdict(model), "reports": [r.to_dict() for r in reports]}
+        Path(args.out).write_text(json.dumps(data, indent=2) + "\n")
+        print(f"saved {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
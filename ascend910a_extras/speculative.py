@@ -0,0 +1,64 @@
+# Host side of speculative decoding.
+#
+# A verify step feeds each sequence its last accepted token followed by k draft tokens, the
+# k + 1 rows are written to the kv cache and attend causally (paged_attention with
+# num_query_tokens = k + 1). Row i of the target then predicts the token after draft i - 1,
+# drafts are accepted while they match and the first mismatch is replaced by the target token,
+# so every step emits between 1 and k + 1 tokens. The kv slots of rejected drafts are rolled back.
+import torch
+
+from ascend910a_extras.kv_cache import BlockManager
+
+
+def verify_inputs(
+    manager: BlockManager,
+    seq_ids: list[int],
+    last_tokens: torch.Tensor,
+    draft_tokens: torch.Tensor,
+    device="npu",
+) -> dict[str, torch.Tensor]:
+    # last_tokens: [bs], draft_tokens: [bs, k] -> inputs of a verify step, rows are sequence major
+    bs, k = draft_tokens.shape
+    token_ids = torch.cat([last_tokens.reshape(bs, 1), draft_tokens], dim=1).reshape(-1)
+    position_ids, slot_mapping = [], []
+    for seq_id in seq_ids:
+        start = manager.context_lens.get(seq_id, 0)
+        slot_mapping += manager.append_slots(seq_id, k + 1)
+        position_ids += range(start, start + k + 1)
+    return {
+        "token_ids": token_ids.to(torch.int32).to(device),
+        "position_ids": torch.tensor(position_ids, dtype=torch.int32, device=device),
+        "slot_mapping": torch.tensor(slot_mapping, dtype=torch.int32, device=device),
+        "block_tables": manager.get_block_tables(seq_ids, device=device),
+        "context_lens": manager.get_context_lens(seq_ids, device=device),
+    }
+
+
+def accept_draft_tokens(
+    draft_tokens: torch.Tensor, target_tokens: torch.Tensor
+) -> tuple[torch.Tensor, list[list[int]]]:
+    # draft_tokens: [bs, k], target_tokens: [bs, k + 1] sampled from the verify logits
+    # returns num_accepted: [bs] and the tokens to emit per sequence, num_accepted + 1 each
+    draft_tokens = draft_tokens.cpu()
+    target_tokens = target_tokens.cpu()
+    match = (draft_tokens == target_tokens[:, :-1]).int()
+    # length of the matching prefix
+    num_accepted = match.cumprod(dim=1).sum(dim=1)
+    tokens = [
+        target_tokens[b, : int(n) + 1].tolist() for b, n in enumerate(num_accepted)
+    ]
+    return num_accepted, tokens
+
+
+def rollback_rejected(
+    manager: BlockManager,
+    seq_ids: list[int],
+    num_accepted: torch.Tensor,
+    num_speculative_tokens: int,
+) -> list[int]:
+    # keeps the last token and the accepted drafts of each sequence in the kv cache,
+    # the bonus token is fed by the next step, returns the freed pages
+    freed = []
+    for seq_id, n in zip(seq_ids, num_accepted.tolist()):
+        freed += manager.rollback(seq_id, num_speculative_tokens - n)
+    return freed
@@ -0,0 +1,488 @@
+# Analyzer of the chrome traces exported by torch_npu.profiler (prof.export_chrome_trace).
+#
+#   python -m ascend910a_extras.trace summary trace.json
+#   python -m ascend910a_extras.trace gaps trace.json --min-kernels 8
+#   python -m ascend910a_extras.trace diff before.json after.json
+#
+# The trace is streamed one event at a time, only the complete ("X") events and the flows are
+# kept, as small tuples. Device kernels are the complete events of the "Ascend Hardware"
+# process, host ranges the ones of every other process. A HostToDevice flow ties a kernel to
+# the host thread and time it was launched from: its node is the path of the host ranges
+# enclosing the launch, e.g. the ATB operation and its aclnn call, and its launch time tells
+# whether the device was already idle when the host got to it. A gap before such a kernel is
+# host-launch bound, runs of them are the launch-bound stretches of e.g. a decode step.
+#
+# Times are in us, like the trace.
+import argparse
+import bisect
+import gzip
+import json
+import re
+import sys
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Iterator, NamedTuple
+
+DEVICE_PROCESS = "Ascend Hardware"
+STEP_PATTERN = re.compile(r"ProfilerStep#\d+")
+
+
+def _open(path: str | Path):
+    if str(path).endswith(".gz"):
+        return gzip.open(path, "rt")
+    return open(path)
+
+
+class _Reader:
+    # incremental json values out of a text file, the buffer only holds the current value
+    def __init__(self, f, chunk_size: int):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def fill(self) -> bool:
+        if self.eof:
+            return False
+        chunk = self.f.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos :] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        # next non-whitespace char, "" at the end
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in " \t\r\n":
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self.fill():
+                return ""
+
+    def expect(self, chars: str) -> str:
+        c = self.peek()
+        if c == "" or c not in chars:
+            raise ValueError(f"malformed trace: expected one of {chars!r}, got {c!r}")
+        self.pos += 1
+        return c
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                v, end = self.decoder.raw_decode(self.buf, self.pos)
+                # a number may continue in the next chunk
+                if end < len(self.buf) or self.eof:
+                    self.pos = end
+                    return v
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self.fill()
+
+
+def iter_events(path: str | Path, chunk_size: int = 1 << 20) -> Iterator[dict]:
+    # the events of {"traceEvents": [...], ...} or of a bare [...] trace, one at a time
+    with _open(path) as f:
+        r = _Reader(f, chunk_size)
+        if r.expect("{[") == "{":
+            while True:
+                key = r.value()
+                r.expect(":")
+                if key == "traceEvents":
+                    break
+                r.value()
+                if r.expect(",}") == "}":
+                    return
+            r.expect("[")
+        if r.peek() == "]":
+            return
+        while True:
+            yield r.value()
+            if r.expect(",]") == "]":
+                return
+
+
+class Event(NamedTuple):
+    name: str
+    pid: int | str
+    tid: int | str
+    ts: float
+    dur: float
+
+    @property
+    def end(self) -> float:
+        return self.ts + self.dur
+
+
+class Kernel(NamedTuple):
+    name: str
+    pid: int | str
+    tid: int | str
+    ts: float
+    dur: float
+    # host time of the launch and path of the enclosing host ranges, if a flow links them
+    launch_ts: float | None
+    node: str
+
+    @property
+    def end(self) -> float:
+        return self.ts + self.dur
+
+
+@dataclass
+class Trace:
+    path: str
+    kernels: list[Kernel]
+    # ProfilerStep#N host ranges
+    steps: list[Event] = field(default_factory=list)
+    process_names: dict = field(default_factory=dict)
+
+
+def _enclosing(ranges: list[Event], queries: list[float]) -> list[list[str]]:
+    # names of the ranges enclosing each query time, outermost first, both sorted by time
+    out, stack, i = [], [], 0
+    for ts in queries:
+        while i < len(ranges) and ranges[i].ts <= ts:
+            while stack and stack[-1].end < ranges[i].ts:
+                stack.pop()
+            stack.append(ranges[i])
+            i += 1
+        while stack and stack[-1].end < ts:
+            stack.pop()
+        out.append([e.name for e in stack if e.end >= ts])
+    return out
+
+
+def load(
+    path: str | Path,
+    device_process: str = DEVICE_PROCESS,
+    node_depth: int = 2,
+    chunk_size: int = 1 << 20,
+) -> Trace:
+    # node_depth: innermost host ranges kept in Kernel.node
+    process_names, events, flows = {}, [], {}
+    for e in iter_events(path, chunk_size):
+        ph = e.get("ph")
+        if ph == "X":
+            events.append(
+                Event(
+                    e.get("name", ""),
+                    e.get("pid"),
+                    e.get("tid"),
+                    float(e["ts"]),
+                    float(e.get("dur", 0)),
+                )
+            )
+        elif ph in ("s", "f"):
+            ends = flows.setdefault((e.get("cat"), e.get("id")), {})
+            ends[ph] = (e.get("pid"), e.get("tid"), float(e["ts"]))
+        elif ph == "M" and e.get("name") == "process_name":
+            process_names[e.get("pid")] = e.get("args", {}).get("name", "")
+
+    device_pids = {p for p, n in process_names.items() if device_process in n}
+    device, host = {}, {}
+    for e in events:
+        (device if e.pid in device_pids else host).setdefault(
+            (e.pid, e.tid), []
+        ).append(e)
+    for ranges in [*device.values(), *host.values()]:
+        # outer ranges first when they start together
+        ranges.sort(key=lambda e: (e.ts, -e.dur))
+
+    # device kernel -> host launch (pid, tid, ts)
+    launches = {}
+    for ends in flows.values():
+        if "s" not in ends or "f" not in ends:
+            continue
+        pid, tid, ts = ends["f"]
+        kernels = device.get((pid, tid), [])
+        i = bisect.bisect_right(kernels, ts, key=lambda e: e.ts) - 1
+        if i >= 0 and kernels[i].ts <= ts <= kernels[i].end:
+            launches[kernels[i]] = ends["s"]
+
+    by_thread = {}
+    for k, (pid, tid, ts) in launches.items():
+        by_thread.setdefault((pid, tid), []).append((ts, k))
+    nodes = {}
+    for thread, items in by_thread.items():
+        items.sort(key=lambda x: x[0])
+        paths = _enclosing(host.get(thread, []), [ts for ts, _ in items])
+        for (ts, k), names in zip(items, paths):
+            nodes[k] = (ts, "/".join(names[-node_depth:]))
+
+    kernels = []
+    for e in (e for ranges in device.values() for e in ranges):
+        launch_ts, node = nodes.get(e, (None, ""))
+        kernels.append(Kernel(*e, launch_ts, node))
+    kernels.sort(key=lambda k: k.ts)
+    steps = sorted(
+        (
+            e
+            for ranges in host.values()
+            for e in ranges
+            if STEP_PATTERN.fullmatch(e.name)
+        ),
+        key=lambda e: e.ts,
+    )
+    return Trace(str(path), kernels, steps, process_names)
+
+
+@dataclass
+class Stat:
+    name: str
+    count: int = 0
+    total: float = 0.0
+    min: float = float("inf")
+    max: float = 0.0
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def add(self, dur: float) -> None:
+        self.count += 1
+        self.total += dur
+        self.min = min(self.min, dur)
+        self.max = max(self.max, dur)
+
+
+def _stats(kernels: list[Kernel], key) -> list[Stat]:
+    stats = {}
+    for k in kernels:
+        name = key(k)
+        stats.setdefault(name, Stat(name)).add(k.dur)
+    return sorted(stats.values(), key=lambda s: -s.total)
+
+
+def op_stats(trace: Trace) -> list[Stat]:
+    # device time per kernel name, largest first
+    return _stats(trace.kernels, lambda k: k.name)
+
+
+def node_stats(trace: Trace) -> list[Stat]:
+    # device time per launching host node, "" for kernels without a flow
+    return _stats(trace.kernels, lambda k: k.node)
+
+
+@dataclass
+class Gap:
+    # idle device time before kernel
+    kernel: Kernel
+    prev: Kernel
+    idle: float
+    # the kernel was launched after the device ran out of work
+    host_bound: bool
+
+
+@dataclass
+class Idle:
+    device: int | str
+    span: float
+    busy: float
+    gaps: list[Gap]
+
+    @property
+    def idle_fraction(self) -> float:
+        return 1.0 - self.busy / self.span if self.span > 0 else 0.0
+
+    @property
+    def host_bound_idle(self) -> float:
+        return sum(g.idle for g in self.gaps if g.host_bound)
+
+
+def _idle(device, kernels: list[Kernel]) -> Idle:
+    # kernels of one device in start order, streams overlap
+    gaps, busy, end, prev = [], 0.0, None, None
+    for k in kernels:
+        if end is not None and k.ts > end:
+            host_bound = k.launch_ts is not None and k.launch_ts >= end
+            gaps.append(Gap(k, prev, k.ts - end, host_bound))
+        if end is None or k.ts > end:
+            busy += k.dur
+        elif k.end > end:
+            busy += k.end - end
+        end = k.end if end is None else max(end, k.end)
+        prev = k
+    span = end - kernels[0].ts if kernels else 0.0
+    return Idle(device, span, busy, gaps)
+
+
+def idle(
+    trace: Trace, start: float | None = None, end: float | None = None
+) -> list[Idle]:
+    # per device, kernels launched (else started) in [start, end) only
+    def inside(k):
+        ts = k.launch_ts if k.launch_ts is not None else k.ts
+        return (start is None or ts >= start) and (end is None or ts < end)
+
+    devices = {}
+    for k in trace.kernels:
+        if inside(k):
+            devices.setdefault(k.pid, []).append(k)
+    return [_idle(d, ks) for d, ks in devices.items()]
+
+
+def step_idle(trace: Trace) -> list[tuple[str, list[Idle]]]:
+    return [(s.name, idle(trace, s.ts, s.end)) for s in trace.steps]
+
+
+@dataclass
+class Stretch:
+    device: int | str
+    kernels: list[Kernel]
+    idle: float
+
+    @property
+    def span(self) -> float:
+        return self.kernels[-1].end - self.kernels[0].ts
+
+    @property
+    def idle_fraction(self) -> float:
+        return self.idle / self.span if self.span > 0 else 0.0
+
+
+def launch_bound_stretches(
+    trace: Trace, min_kernels: int = 4, min_gap: float = 0.0
+) -> list[Stretch]:
+    # maximal runs of kernels each preceded by a host-bound gap over min_gap, most idle first
+    stretches = []
+    for d in idle(trace):
+        run, run_idle = [], 0.0
+        for g in d.gaps + [None]:
+            if g is not None and g.host_bound and g.idle > min_gap:
+                if run and run[-1] is g.prev:
+                    run.append(g.kernel)
+                    run_idle += g.idle
+                    continue
+                if len(run) >= min_kernels:
+                    stretches.append(Stretch(d.device, run, run_idle))
+                run, run_idle = [g.prev, g.kernel], g.idle
+                continue
+            if len(run) >= min_kernels:
+                stretches.append(Stretch(d.device, run, run_idle))
+            run, run_idle = [], 0.0
+    return sorted(stretches, key=lambda s: -s.idle)
+
+
+@dataclass
+class Diff:
+    name: str
+    a: Stat
+    b: Stat
+
+    @property
+    def delta(self) -> float:
+        return self.b.total - self.a.total
+
+    @property
+    def ratio(self) -> float:
+        return self.b.total / self.a.total if self.a.total > 0 else float("inf")
+
+
+def diff(a: Trace, b: Trace, by: str = "op") -> list[Diff]:
+    # per op (or node) device time of b against a, largest change first
+    stats = op_stats if by == "op" else node_stats
+    sa = {s.name: s for s in stats(a)}
+    sb = {s.name: s for s in stats(b)}
+    rows = [
+        Diff(name, sa.get(name, Stat(name)), sb.get(name, Stat(name)))
+        for name in {**sa, **sb}
+    ]
+    return sorted(rows, key=lambda r: -abs(r.delta))
+
+
+def format_stats(stats: list[Stat], top: int = 20) -> str:
+    total = sum(s.total for s in stats) or 1.0
+    lines = [
+        f"{'name':<60} {'count':>7} {'total us':>12} {'mean us':>10} {'max us':>10} {'%':>6}"
+    ]
+    for s in stats[:top]:
+        lines.append(
+            f"{s.name[:60]:<60} {s.count:>7} {s.total:>12.1f} {s.mean:>10.2f} {s.max:>10.2f} {100 * s.total / total:>6.1f}"
+        )
+    return "\n".join(lines)
+
+
+def format_idle(idles: list[Idle]) -> str:
+    return "\n".join(
+        f"device {d.device}: span {d.span:.1f} us, busy {d.busy:.1f} us, idle {100 * d.idle_fraction:.1f}%, "
+        f"{len(d.gaps)} gaps, host-launch bound {d.host_bound_idle:.1f} us"
+        for d in idles
+    )
+
+
+def format_stretches(stretches: list[Stretch], top: int = 10) -> str:
+    lines = []
+    for s in stretches[:top]:
+        lines.append(
+            f"device {s.device} @ {s.kernels[0].ts:.1f}: {len(s.kernels)} kernels over {s.span:.1f} us, "
+            f"idle {s.idle:.1f} us ({100 * s.idle_fraction:.1f}%), {s.kernels[0].name} .. {s.kernels[-1].name}"
+        )
+    return "\n".join(lines)
+
+
+def format_diff(rows: list[Diff], top: int = 20) -> str:
+    lines = [
+        f"{'name':<60} {'count':>13} {'total us':>25} {'delta us':>10} {'ratio':>7}"
+    ]
+    for r in rows[:top]:
+        lines.append(
+            f"{r.name[:60]:<60} {r.a.count:>6}/{r.b.count:<6} {r.a.total:>12.1f}/{r.b.total:<12.1f} {r.delta:>+10.1f} {r.ratio:>7.2f}"
+        )
+    return "\n".join(lines)
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m ascend910a_extras.trace")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("summary", help="device time per op and node, idle fractions")
+    p.add_argument("trace")
+    p.add_argument("--top", type=int, default=20)
+    p = sub.add_parser("gaps", help="host-launch bound stretches")
+    p.add_argument("trace")
+    p.add_argument("--min-kernels", type=int, default=4)
+    p.add_argument("--min-gap", type=float, default=0.0, help="us")
+    p.add_argument("--top", type=int, default=10)
+    p = sub.add_parser("diff", help="device time per op of two traces")
+    p.add_argument("a")
+    p.add_argument("b")
+    p.add_argument("--by", default="op", choices=["op", "node"])
+    p.add_argument("--top", type=int, default=20)
+    for p in sub.choices.values():
+        p.add_argument("--device-process", default=DEVICE_PROCESS)
+        p.add_argument("--node-depth", type=int, default=2)
+    args = parser.parse_args(argv)
+
+    def load_arg(path):
+        return load(path, args.device_process, args.node_depth)
+
+    if args.cmd == "diff":
+        print(format_diff(diff(load_arg(args.a), load_arg(args.b), args.by), args.top))
+        return 0
+    trace = load_arg(args.trace)
+    if not trace.kernels:
+        print(f"no kernels of a {args.device_process!r} process in {args.trace}")
+        return 1
+    if args.cmd == "summary":
+        print(format_stats(op_stats(trace), args.top))
+        print()
+        print(format_stats(node_stats(trace), args.top))
+        print()
+        print(format_idle(idle(trace)))
+        for name, idles in step_idle(trace):
+            print(f"{name}: {format_idle(idles)}")
+        return 0
+    stretches = launch_bound_stretches(trace, args.min_kernels, args.min_gap)
+    print(format_idle(idle(trace)))
+    print(format_stretches(stretches, args.top))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,3 +1,5 @@
+import json
+
 import ascend910a_extras.ops as ops
 
-ops.print_info()
+print(json.dumps(ops.print_info(), indent=2))
@@ -0,0 +1,114 @@
+import json
+
+import torch
+
+import ascend910a_extras.ref as ref
+from ascend910a_extras import autotune
+from ascend910a_extras.autotune import TuningCache, bucket, lookup, search_space, tune
+from ascend910a_extras.roofline import Platform
+
+
+def test_bucket():
+    assert bucket(1, 768) == dict(num_tokens=1, dim=768)
+    assert bucket(33, 768) == dict(num_tokens=64, dim=768)
+    assert bucket(64, 768) == dict(num_tokens=64, dim=768)
+
+
+def test_search_space():
+    platform = Platform.load()
+    space = search_space("swiglu", 1024, 768, platform)
+    assert space[0] == autotune.DEFAULT_CONFIG
+    assert all(768 % c["block_size"] == 0 for c in space[1:])
+    assert {c["block_size"] for c in space[1:]} == {16, 32, 64, 128, 256}
+    assert {c["core_num"] for c in space} == {
+        0,
+        platform.aiv_num // 2,
+        platform.aiv_num,
+        2 * platform.aiv_num,
+    }
+    assert len(space) == len({tuple(c.values()) for c in space})
+
+    # one token only runs on one core, add_rms_norm handles a tail block
+    space = search_space("add_rms_norm", 1, 1000, platform)
+    assert {c["core_num"] for c in space} == {0}
+    assert max(c["block_size"] for c in space) == 512
+
+
+def test_cache_roundtrip(tmp_path, monkeypatch):
+    path = tmp_path / "tuning.json"
+    monkeypatch.setenv(autotune.CACHE_ENV, str(path))
+    autotune.reset()
+    cache = TuningCache()
+    assert cache.get("swiglu", num_tokens=50, dim=768) is None
+    cache.put("swiglu", dict(block_size=128, core_num=32), 1e-5, num_tokens=64, dim=768)
+    cache.save()
+
+    assert TuningCache(path).get("swiglu", num_tokens=50, dim=768) == dict(
+        block_size=128, core_num=32
+    )
+    assert TuningCache(path).get("swiglu", "other", num_tokens=50, dim=768) is None
+    assert lookup("swiglu", num_tokens=33, dim=768) == dict(block_size=128, core_num=32)
+    assert lookup("swiglu", num_tokens=65, dim=768) == autotune.DEFAULT_CONFIG
+    assert lookup("add_rms_norm", num_tokens=64, dim=768) == autotune.DEFAULT_CONFIG
+
+
+def test_lookup_is_memoized(tmp_path, monkeypatch):
+    path = tmp_path / "tuning.json"
+    monkeypatch.setenv(autotune.CACHE_ENV, str(path))
+    autotune.reset()
+    assert lookup("swiglu", num_tokens=8, dim=768) == autotune.DEFAULT_CONFIG
+    # the file is read once, edits by another process are seen after reset()
+    cache = TuningCache(path)
+    cache.put("swiglu", dict(block_size=128, core_num=32), 1e-5, num_tokens=8, dim=768)
+    cache.save()
+    monkeypatch.setattr(autotune, "TuningCache", None)
+    assert lookup("swiglu", num_tokens=8, dim=768) == autotune.DEFAULT_CONFIG
+    assert lookup("swiglu", dim=768, num_tokens=8) == autotune.DEFAULT_CONFIG
+    monkeypatch.undo()
+    monkeypatch.setenv(autotune.CACHE_ENV, str(path))
+    autotune.reset()
+    assert lookup("swiglu", num_tokens=8, dim=768) == dict(block_size=128, core_num=32)
+    assert lookup("swiglu", num_tokens=8, dim=64) == autotune.DEFAULT_CONFIG
+
+
+def test_tune_ref_backend(tmp_path, monkeypatch):
+    monkeypatch.setenv(autotune.CACHE_ENV, str(tmp_path / "tuning.json"))
+    autotune.reset()
+    shapes = [dict(num_tokens=3, dim=64), dict(num_tokens=4, dim=64)]
+    cache = tune(["swiglu"], shapes, backend="ref", num_iter=1, num_warmup=0)
+    # both shapes fall in the same bucket
+    entries = json.loads((tmp_path / "tuning.json").read_text())["ascend910a"]
+    assert list(entries) == ["swiglu[num_tokens=4,dim=64]"]
+    config = lookup("swiglu", num_tokens=3, dim=64)
+    assert config == cache.get("swiglu", num_tokens=4, dim=64)
+    assert config in search_space("swiglu", 4, 64)
+
+    # the tiling does not change the result
+    x = torch.randn(3, 128, dtype=torch.float16)
+    torch.testing.assert_close(ref.swiglu(x, **config), ref.swiglu(x))
+
+
+if __name__ == "__main__":
+    import torch_npu
+
+    import ascend910a_extras.ops as ops
+
+    torch.manual_seed(0)
+    for num_tokens, dim in [(1, 768), (7, 1024), (100, 4096)]:
+        x = torch.randn(num_tokens, dim, dtype=torch.float16)
+        residual = torch.randn(num_tokens, dim, dtype=torch.float16)
+        weight = torch.randn(dim, dtype=torch.float16)
+        y_ref = ref.swiglu(x)
+        out_ref = ref.add_rms_norm(x, residual, weight, 1e-6)
+        for config in search_space("swiglu", num_tokens, dim // 2):
+            y = ops.swiglu(x.npu(), **config)
+            torch.npu.synchronize()
+            torch.testing.assert_close(y.cpu(), y_ref, atol=1e-2, rtol=1e-2)
+        for config in search_space("add_rms_norm", num_tokens, dim):
+            out = ops.add_rms_norm(
+                x.npu(), residual.npu(), weight.npu(), 1e-6, **config
+            )
+            torch.npu.synchronize()
+            for o, o_ref in zip(out, out_ref):
+                torch.testing.assert_close(o.cpu(), o_ref, atol=1e-2, rtol=1e-2)
+        print(f"PASS: tuned configs num_tokens={num_tokens} dim={dim}")
@@ -0,0 +1,85 @@
+import csv
+import dataclasses
+import json
+
+import pytest
+
+from ascend910a_extras.bench import SWEEPS, compare, load, run, unmatched, write
+from ascend910a_extras.bench.__main__ import main
+
+
+def test_run_ref_backend(tmp_path):
+    results = run(backend="ref", num_iter=2, num_warmup=1, max_shapes=1)
+    assert [r.op for r in results] == list(SWEEPS)
+    for r in results:
+        assert r.backend == "ref" and r.time_min > 0 and r.gb_s > 0
+        assert r.time_min <= r.time_median
+
+    write(results, tmp_path / "results.json", {"backend": "ref"})
+    write(results, tmp_path / "results.csv")
+    assert load(tmp_path / "results.json") == results
+    assert (
+        json.loads((tmp_path / "results.json").read_text())["meta"]["backend"] == "ref"
+    )
+    with open(tmp_path / "results.csv") as f:
+        rows = list(csv.reader(f))
+    assert len(rows) == len(results) + 1 and rows[1][0] == results[0].key
+    # a csv baseline reads back like the json one
+    assert load(tmp_path / "results.csv") == results
+    (tmp_path / "other.csv").write_text("a,b\n1,2\n")
+    with pytest.raises(ValueError, match="not a results csv"):
+        load(tmp_path / "other.csv")
+
+
+def test_compare(tmp_path):
+    results = run(["swiglu"], backend="ref", num_iter=1, num_warmup=0, max_shapes=2)
+    write(results, tmp_path / "baseline.json")
+    rows, regressed = compare(results, results)
+    assert len(rows) == 2 and regressed == []
+
+    slower = load(tmp_path / "baseline.json")
+    slower[1].time_min *= 1.5
+    write(slower, tmp_path / "current.json")
+    rows, regressed = compare(results, slower, threshold=0.2)
+    assert [c.key for c in regressed] == [results[1].key]
+    assert (
+        main(
+            ["compare", str(tmp_path / "baseline.json"), str(tmp_path / "current.json")]
+        )
+        == 1
+    )
+    assert (
+        main(
+            [
+                "compare",
+                str(tmp_path / "baseline.json"),
+                str(tmp_path / "baseline.json"),
+            ]
+        )
+        == 0
+    )
+
+
+def test_compare_unmatched(tmp_path, capsys):
+    results = run(["swiglu"], backend="ref", num_iter=1, num_warmup=0, max_shapes=2)
+    write(results, tmp_path / "baseline.csv")
+    write(results[1:], tmp_path / "current.csv")
+    assert unmatched(results, results[1:]) == ([results[0].key], [])
+    assert unmatched(results[1:], results) == ([], [results[0].key])
+    # a baseline case that did not run fails the comparison
+    baseline, current = str(tmp_path / "baseline.csv"), str(tmp_path / "current.csv")
+    assert main(["compare", baseline, current]) == 1
+    assert (
+        f"MISSING, in the baseline but not run: {results[0].key}"
+        in capsys.readouterr().out
+    )
+    # a new case is reported only
+    assert main(["compare", current, baseline]) == 0
+    assert f"new, not in the baseline: {results[0].key}" in capsys.readouterr().out
+
+    # runs of different backends are not comparable
+    npu = [dataclasses.replace(r, backend="npu") for r in results]
+    with pytest.raises(ValueError, match="backend"):
+        compare(npu, results)
+    write(npu, tmp_path / "npu.json")
+    assert main(["compare", str(tmp_path / "npu.json"), baseline]) == 2
@@ -0,0 +1,159 @@
+import os
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parents[1] / "csrc" / "opdev" / "cmake" / "util"))
+
+from ascendc_compile_cache import (  # noqa: E402
+    CompileCache,
+    cache_key,
+    key_inputs,
+    sync_tree,
+    toolkit_identity,
+)
+
+
+def make_tree(root: Path) -> dict:
+    (root / "op_kernel").mkdir()
+    (root / "op_host").mkdir()
+    (root / "autogen").mkdir()
+    (root / "include").mkdir()
+    files = {
+        "src": root / "op_kernel" / "foo_ex.cpp",
+        "core": root / "op_kernel" / "foo_core.h",
+        "common": root / "include" / "common.h",
+        "tiling": root / "op_host" / "foo_ex_tiling.h",
+        "other_tiling": root / "op_host" / "bar_ex_tiling.h",
+        "ini": root / "autogen" / "aic-ascend910-ops-info.ini",
+        "options": root / "autogen" / "custom_compile_options.ini",
+    }
+    files["src"].write_text(
+        '#include "kernel_operator.h"\n#include "foo_core.h"\nvoid foo() {}\n'
+    )
+    files["core"].write_text('#pragma once\n#include "common.h"\n')
+    files["common"].write_text("#define BLOCK 32\n")
+    files["tiling"].write_text("TILING_DATA_FIELD_DEF(uint32_t, n);\n")
+    files["other_tiling"].write_text("TILING_DATA_FIELD_DEF(uint32_t, m);\n")
+    files["ini"].write_text(
+        "[FooEx]\ninput0.dtype=float16\n[BarEx]\ninput0.dtype=float16\n"
+    )
+    files["options"].write_text("BarEx,ascend910,-O2\n")
+    return files
+
+
+def key(files: dict, compute_unit="ascend910", options=None) -> str:
+    options = options if options is not None else f"-I{files['common'].parent}"
+    inputs = key_inputs(
+        "FooEx", str(files["src"]), compute_unit, str(files["ini"]), options
+    )
+    return cache_key(inputs)
+
+
+def test_key_invalidation(tmp_path):
+    files = make_tree(tmp_path)
+    base = key(files)
+    assert key(files) == base
+    inputs = key_inputs(
+        "FooEx",
+        str(files["src"]),
+        "ascend910",
+        str(files["ini"]),
+        f"-I{files['common'].parent}",
+    )
+    # the header reached through -I is part of the key, the toolkit header is not found
+    assert set(inputs["sources"]) == {
+        "op_kernel/foo_ex.cpp",
+        "op_kernel/foo_core.h",
+        "include/common.h",
+    }
+
+    # inputs of other ops do not change the key
+    files["other_tiling"].write_text("changed\n")
+    files["ini"].write_text(
+        "[FooEx]\ninput0.dtype=float16\n[BarEx]\ninput0.dtype=float32\n"
+    )
+    files["options"].write_text("BarEx,ascend910,-O0\n")
+    assert key(files) == base
+
+    keys = {base}
+    for name, text in [
+        ("src", '#include "foo_core.h"\nvoid foo() { }\n'),
+        ("core", '#pragma once\n#include "common.h"\n// edit\n'),
+        ("common", "#define BLOCK 64\n"),
+        ("tiling", "TILING_DATA_FIELD_DEF(uint64_t, n);\n"),
+        ("ini", "[FooEx]\ninput0.dtype=float16,float32\n"),
+        ("options", "BarEx,ascend910,-O0\nALL,ascend910,-g;-O0\n"),
+    ]:
+        files[name].write_text(text)
+        keys.add(key(files))
+    keys.add(key(files, compute_unit="ascend910b"))
+    keys.add(key(files, options=""))
+    assert len(keys) == 9
+
+
+def test_key_changes_with_toolkit(tmp_path, monkeypatch):
+    files = make_tree(tmp_path)
+    toolkit = tmp_path / "ascend-toolkit" / "latest"
+    ccec = toolkit / "compiler" / "ccec_compiler" / "bin" / "ccec"
+    ccec.parent.mkdir(parents=True)
+    ccec.write_bytes(b"ccec 7.0")
+    (toolkit / "version.cfg").write_text("runtime_running_version=[7.0.0:7.0.0]\n")
+    monkeypatch.delenv("ASCEND_TOOLKIT_HOME", raising=False)
+    monkeypatch.setenv("ASCEND_HOME_PATH", str(toolkit))
+    assert set(toolkit_identity()) == {"version.cfg", "ccec"}
+    base = key(files)
+    assert key(files) == base
+
+    # an upgrade in place, the kernel sources are unchanged
+    (toolkit / "version.cfg").write_text("runtime_running_version=[8.0.0:8.0.0]\n")
+    upgraded = key(files)
+    assert upgraded != base
+    ccec.write_bytes(b"ccec 8.0.1")
+    assert key(files) != upgraded
+    # another toolkit, and none
+    monkeypatch.setenv("ASCEND_HOME_PATH", str(tmp_path / "missing"))
+    assert toolkit_identity() == {}
+    assert key(files) not in (base, upgraded)
+
+
+def test_store_restore(tmp_path):
+    cache = CompileCache(str(tmp_path / "cache"))
+    out = tmp_path / "out"
+    (out / "sub").mkdir(parents=True)
+    (out / "FooEx_0.o").write_bytes(b"\x7fELF0")
+    (out / "FooEx_0.json").write_text("{}")
+    (out / "sub" / "FooEx_1.o").write_bytes(b"\x7fELF1")
+    assert not cache.restore("ab" * 32, str(tmp_path / "restored"))
+    assert cache.store("ab" * 32, str(out), {"op_type": "FooEx"}) == 3
+
+    restored = tmp_path / "restored"
+    assert cache.restore("ab" * 32, str(restored))
+    assert (restored / "sub" / "FooEx_1.o").read_bytes() == b"\x7fELF1"
+    assert sorted(os.listdir(restored)) == ["FooEx_0.json", "FooEx_0.o", "sub"]
+
+    # a damaged entry is a miss
+    (Path(cache.entry("ab" * 32)) / "FooEx_0.o").write_bytes(b"truncated")
+    assert not cache.restore("ab" * 32, str(tmp_path / "again"))
+    # storing again replaces the entry
+    assert cache.store("ab" * 32, str(out)) == 3
+    assert cache.restore("ab" * 32, str(tmp_path / "again"))
+    assert cache.store("cd" * 32, str(tmp_path / "empty")) == 0
+
+
+def test_sync_tree(tmp_path):
+    src, dst = tmp_path / "src", tmp_path / "dst"
+    (src / "a" / "b").mkdir(parents=True)
+    (src / "x.so").write_bytes(b"1")
+    (src / "a" / "b" / "y.json").write_text("{}")
+    copied, removed = sync_tree(str(src), str(dst))
+    assert sorted(copied) == ["a/b/y.json", "x.so"] and removed == []
+
+    assert sync_tree(str(src), str(dst)) == ([], [])
+    (src / "x.so").write_bytes(b"2")
+    (src / "a" / "b" / "y.json").unlink()
+    (src / "a" / "b").rmdir()
+    (src / "z.o").write_bytes(b"3")
+    copied, removed = sync_tree(str(src), str(dst))
+    assert sorted(copied) == ["x.so", "z.o"] and removed == ["a/b/y.json"]
+    assert (dst / "x.so").read_bytes() == b"2"
+    assert not (dst / "a" / "b").exists()
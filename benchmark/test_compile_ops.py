@@ -0,0 +1,77 @@
+import os
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parents[1] / "csrc" / "opdev" / "cmake" / "util"))
+
+from ascendc_compile_ops import (  # noqa: E402
+    format_report,
+    op_report,
+    parse_ops,
+    run_jobs,
+    select_ops,
+)
+
+INI = """[RopeEx]
+opFile.value=rope_ex
+input0.name=q
+[PagedAttentionEx]
+opFile.value=paged_attention_ex
+[SwiGluEx]
+opFile.value=swi_glu_ex
+"""
+
+
+def test_select_ops(tmp_path):
+    ini = tmp_path / "aic-ascend910-ops-info.ini"
+    ini.write_text(INI)
+    ops = parse_ops(str(ini))
+    assert ops == [
+        ("RopeEx", "rope_ex"),
+        ("PagedAttentionEx", "paged_attention_ex"),
+        ("SwiGluEx", "swi_glu_ex"),
+    ]
+    assert select_ops(ops, "") == {"RopeEx", "PagedAttentionEx", "SwiGluEx"}
+    assert select_ops(ops, "rope_ex, PagedAttentionEx") == {
+        "RopeEx",
+        "PagedAttentionEx",
+    }
+    with pytest.raises(ValueError, match="unknown op rope,"):
+        select_ops(ops, "rope")
+
+
+def test_run_jobs_pool():
+    env = dict(os.environ)
+    jobs = [(f"Op{i % 2}", "/", ["sleep", "0.3"], env) for i in range(4)]
+    t0 = time.perf_counter()
+    results = run_jobs(jobs, 4)
+    # all variants of both ops ran at once
+    assert time.perf_counter() - t0 < 1.0
+    assert [r[0] for r in results] == ["Op0", "Op1", "Op0", "Op1"]
+    assert all(r[3] == 0 for r in results)
+
+    builds = {
+        op: {"op_file": op.lower(), "status": "compiled", "num_variants": 2}
+        for op in ["Op0", "Op1"]
+    }
+    builds["Op2"] = {"op_file": "op2", "status": "cached", "num_variants": 0}
+    for b in builds.values():
+        b["prepare"] = 0.1
+    ops = op_report(builds, results, t0)
+    assert 0.5 < ops["Op0"]["compile"] < 1.0 and ops["Op0"]["wall"] < 0.5
+    assert ops["Op2"]["compile"] == 0.0
+    text = format_report({"wall": 0.4, "jobs": 4, "ops": ops})
+    assert "2 compiled, 1 cached, 0 skipped" in text
+
+
+def test_run_jobs_stops_after_failure():
+    env = dict(os.environ)
+    jobs = [("Bad", "/", ["sh", "-c", "echo broken; exit 3"], env)]
+    jobs += [("Good", "/", ["true"], env) for _ in range(3)]
+    results = run_jobs(jobs, 1)
+    assert results[0][3] == 3 and results[0][4].strip() == "broken"
+    # the queued jobs are not started
+    assert [r[3] for r in results[1:]] == [None, None, None]
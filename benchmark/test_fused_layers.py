@@ -0,0 +1,327 @@
+import torch
+
+import ascend910a_extras.graph as graph
+import ascend910a_extras.ref as ref
+
+EPS = 1e-6
+# the scoped node kinds GraphBuilder emits per decoder layer, the first layer has no residual
+# and no add; the device run below checks them against a built graph
+UNFUSED_LAYER = ["add", "rmsnorm", "attn.linear", "attn.split", "attn.rmsnorm"]
+UNFUSED_LAYER += ["attn.rmsnorm", "attn.rope", "attn.reshape_and_cache"]
+UNFUSED_LAYER += ["attn.paged_attention", "attn.linear", "add", "rmsnorm"]
+UNFUSED_LAYER += ["mlp.linear", "mlp.swiglu", "mlp.linear"]
+FUSED_LAYER = ["attn.fused_qkv", "attn.paged_attention", "attn.linear_add"]
+FUSED_LAYER += ["mlp.fused_gate_up", "mlp.linear"]
+
+
+def layer_kinds(fused: bool, first: bool) -> list[str]:
+    if fused:
+        return FUSED_LAYER
+    return UNFUSED_LAYER[1:] if first else UNFUSED_LAYER
+
+
+def exported_layer_kinds(graph_desc: dict) -> dict:
+    # layers.N -> the scoped kinds of its nodes, from Graph.export()
+    layers = {}
+    for split in graph_desc["splits"]:
+        for node in split["nodes"]:
+            name = graph.layer(node["name"])
+            if name != "-":
+                scoped = node["name"][len(name) + 1 :].rsplit("_", 1)[0]
+                layers.setdefault(name, []).append(scoped)
+    return layers
+
+
+def test_launch_count_helper():
+    # only the counting over an export: without the extension there is no built graph here,
+    # the nodes build_model emits per layer are checked by the device run at the bottom
+    def split(name, nodes):
+        return {"name": name, "nodes": [{"name": n, "kind": "-"} for n in nodes]}
+
+    desc = {
+        "splits": [
+            split(
+                "split_0",
+                ["embedding_0", "layers.0.rmsnorm_0", "layers.0.attn.linear_0"],
+            ),
+            split(
+                "split_1",
+                ["layers.0.mlp.linear_0", "layers.1.add_0", "layers.10.add_0"],
+            ),
+            split(
+                "split_2", ["norm.add_0", "norm.rmsnorm_0", "lm_head_0", "sampling_0"]
+            ),
+        ]
+    }
+    launches = graph.launch_count(desc)
+    assert launches["step"] == 10
+    assert launches["splits"] == {"split_0": 3, "split_1": 3, "split_2": 4}
+    # a layer split across two graphs counts once, nodes outside the layers are not counted
+    assert launches["layers"] == {"layers.0": 3, "layers.1": 1, "layers.10": 1}
+    assert graph.launch_count({"splits": []}) == {"step": 0, "splits": {}, "layers": {}}
+
+
+def layer_inputs(num_tokens=3, hidden=128, num_heads=2, num_kv_heads=1, inter=128):
+    torch.manual_seed(0)
+    head_dim = hidden // num_heads
+    page_size, num_pages = 16, 4
+
+    def w(*shape):
+        return torch.randn(*shape, dtype=torch.float16) / shape[-1] ** 0.5
+
+    def norm(n):
+        return 1 + torch.randn(n, dtype=torch.float16) / 8
+
+    weights = [
+        norm(hidden),
+        w((num_heads + 2 * num_kv_heads) * head_dim, hidden),
+        norm(head_dim),
+        norm(head_dim),
+        w(hidden, hidden),
+        norm(hidden),
+        w(2 * inter, hidden),
+        w(hidden, inter),
+    ]
+    cache_shape = (num_pages, num_kv_heads * head_dim // 16, page_size, 16)
+    caches = torch.randn(2, *cache_shape, dtype=torch.float16)
+    # sequence b owns page b and is at position 5 + b
+    position_ids = torch.arange(num_tokens, dtype=torch.int32) + 5
+    slot_mapping = (
+        torch.arange(num_tokens, dtype=torch.int32) * page_size + position_ids
+    )
+    inv_freq = 1.0 / (1e4 ** (torch.arange(0, head_dim, 2).float() / head_dim))
+    freqs = torch.outer(torch.arange(64).float(), inv_freq)
+    return {
+        "x": torch.randn(num_tokens, hidden, dtype=torch.float16),
+        "residual": torch.randn(num_tokens, hidden, dtype=torch.float16),
+        "weights": weights,
+        "key_cache": caches[0],
+        "value_cache": caches[1],
+        "position_ids": position_ids,
+        "slot_mapping": slot_mapping,
+        "block_tables": torch.arange(num_tokens, dtype=torch.int32).unsqueeze(1),
+        "context_lens": position_ids + 1,
+        "cos_cache": freqs.cos().half(),
+        "sin_cache": freqs.sin().half(),
+        "num_heads": num_heads,
+    }
+
+
+def unfused_layer(inp, x, residual, key_cache, value_cache):
+    # the nodes of GraphBuilder::add_decoder_layer, one ref per node
+    norm_w, qkv_w, q_norm_w, k_norm_w, o_w, post_w, gate_up_w, down_w = inp["weights"]
+    num_tokens, head_dim = x.shape[0], q_norm_w.shape[0]
+    if residual is None:
+        residual = torch.zeros_like(x)
+    h, res = ref.add_rms_norm(x, residual, norm_w, EPS)
+    qkv = torch.matmul(h.float(), qkv_w.float().T).half()
+    qkv = qkv.view(num_tokens, -1, head_dim)
+    num_kv_heads = (qkv.shape[1] - inp["num_heads"]) // 2
+    q, k, v = qkv.split([inp["num_heads"], num_kv_heads, num_kv_heads], dim=1)
+    q, _ = ref.add_rms_norm(q, torch.zeros_like(q), q_norm_w, EPS)
+    k, _ = ref.add_rms_norm(k, torch.zeros_like(k), k_norm_w, EPS)
+    q, k = ref.rope(q, k, inp["position_ids"], inp["cos_cache"], inp["sin_cache"])
+    ref.reshape_and_cache(k, v, key_cache, value_cache, inp["slot_mapping"])
+    attn = ref.paged_attention(
+        q, key_cache, value_cache, inp["block_tables"], inp["context_lens"]
+    )
+    attn = torch.matmul(attn.view(num_tokens, -1).float(), o_w.float().T).half()
+    h, res = ref.add_rms_norm(attn, res, post_w, EPS)
+    gate_up = torch.matmul(h.float(), gate_up_w.float().T).half()
+    y = torch.matmul(ref.swiglu(gate_up).float(), down_w.float().T).half()
+    return y, res
+
+
+def fused_layer(inp, x, residual, key_cache, value_cache):
+    # the 5 nodes of GraphBuilder::add_fused_decoder_layer
+    norm_w, qkv_w, q_norm_w, k_norm_w, o_w, post_w, gate_up_w, down_w = inp["weights"]
+    q, res = ref.fused_qkv(
+        x,
+        norm_w,
+        qkv_w,
+        q_norm_w,
+        k_norm_w,
+        inp["position_ids"],
+        inp["cos_cache"],
+        inp["sin_cache"],
+        inp["slot_mapping"],
+        key_cache,
+        value_cache,
+        residual,
+        EPS,
+    )
+    attn = ref.paged_attention(
+        q, key_cache, value_cache, inp["block_tables"], inp["context_lens"]
+    )
+    h = ref.mat_mul_add(attn.view(x.shape[0], -1), o_w, res)
+    act = ref.fused_gate_up(h, post_w, gate_up_w, EPS)
+    y = torch.matmul(act.float(), down_w.float().T).half()
+    return y, h
+
+
+def test_fused_qkv():
+    inp = layer_inputs()
+    for residual in [inp["residual"], None]:
+        caches = [inp["key_cache"].clone(), inp["value_cache"].clone()]
+        ref_caches = [inp["key_cache"].clone(), inp["value_cache"].clone()]
+        norm_w, qkv_w, q_norm_w, k_norm_w = inp["weights"][:4]
+        args = [inp["position_ids"], inp["cos_cache"], inp["sin_cache"]]
+        args.append(inp["slot_mapping"])
+        q, res = ref.fused_qkv(
+            inp["x"], norm_w, qkv_w, q_norm_w, k_norm_w, *args, *caches, residual, EPS
+        )
+        expected_res = inp["x"] if residual is None else inp["x"] + residual
+        torch.testing.assert_close(res, expected_res, atol=1e-2, rtol=1e-3)
+
+        # the same as the unfused nodes, up to the fp16 rounding between them
+        num_tokens, head_dim = inp["x"].shape[0], q_norm_w.shape[0]
+        h, _ = ref.add_rms_norm(
+            inp["x"],
+            torch.zeros_like(inp["x"]) if residual is None else residual,
+            norm_w,
+            EPS,
+        )
+        qkv = torch.matmul(h.float(), qkv_w.float().T).half()
+        qkv = qkv.view(num_tokens, -1, head_dim)
+        q_ref, k_ref, v_ref = qkv.split([2, 1, 1], dim=1)
+        q_ref, _ = ref.add_rms_norm(q_ref, torch.zeros_like(q_ref), q_norm_w, EPS)
+        k_ref, _ = ref.add_rms_norm(k_ref, torch.zeros_like(k_ref), k_norm_w, EPS)
+        q_ref, k_ref = ref.rope(q_ref, k_ref, *args[:3])
+        ref.reshape_and_cache(k_ref, v_ref, *ref_caches, inp["slot_mapping"])
+        assert q.shape == (num_tokens, 2, head_dim)
+        torch.testing.assert_close(q, q_ref, atol=2e-2, rtol=2e-2)
+        torch.testing.assert_close(caches[0], ref_caches[0], atol=2e-2, rtol=2e-2)
+        assert torch.equal(caches[1], ref_caches[1])
+
+
+def test_fused_qkv_skips_padding():
+    inp = layer_inputs()
+    key_cache, value_cache = inp["key_cache"].clone(), inp["value_cache"].clone()
+    slot_mapping = inp["slot_mapping"].clone()
+    slot_mapping[1] = -1
+    args = inp["weights"][:4] + [inp["position_ids"], inp["cos_cache"]]
+    args += [inp["sin_cache"], slot_mapping, key_cache, value_cache]
+    q, _ = ref.fused_qkv(inp["x"], *args)
+    # padded rows still get their q, but leave the cache alone
+    assert torch.isfinite(q[1].float()).all()
+    page_size = key_cache.shape[2]
+    untouched = int(inp["slot_mapping"][1])
+    page, offset = untouched // page_size, untouched % page_size
+    assert torch.equal(key_cache[page, :, offset], inp["key_cache"][page, :, offset])
+    assert torch.equal(
+        value_cache[page, :, offset], inp["value_cache"][page, :, offset]
+    )
+
+
+def test_mat_mul_add_and_fused_gate_up():
+    torch.manual_seed(0)
+    x = torch.randn(4, 128, dtype=torch.float16)
+    w = torch.randn(64, 128, dtype=torch.float16) / 16
+    residual = torch.randn(4, 64, dtype=torch.float16)
+    y = ref.mat_mul_add(x, w, residual)
+    torch.testing.assert_close(
+        y.float(), x.float() @ w.float().T + residual.float(), atol=1e-2, rtol=1e-2
+    )
+
+    norm_w = torch.rand(128, dtype=torch.float16) + 0.5
+    gate_up = torch.randn(2 * 64, 128, dtype=torch.float16) / 16
+    act = ref.fused_gate_up(x, norm_w, gate_up, EPS)
+    h, _ = ref.add_rms_norm(x, torch.zeros_like(x), norm_w, EPS)
+    expected = ref.swiglu(torch.matmul(h.float(), gate_up.float().T).half())
+    assert act.shape == (4, 64)
+    torch.testing.assert_close(act, expected)
+
+
+def test_fused_layer_matches_unfused():
+    # two layers: the first without residual, the second on the outputs of the first
+    inp = layer_inputs()
+    unfused_caches = [inp["key_cache"].clone(), inp["value_cache"].clone()]
+    fused_caches = [inp["key_cache"].clone(), inp["value_cache"].clone()]
+    y, res = unfused_layer(inp, inp["x"], None, *unfused_caches)
+    fused_y, fused_res = fused_layer(inp, inp["x"], None, *fused_caches)
+    torch.testing.assert_close(fused_y, y, atol=2e-2, rtol=2e-2)
+    torch.testing.assert_close(fused_res, res, atol=2e-2, rtol=2e-2)
+
+    y, res = unfused_layer(inp, y, res, *unfused_caches)
+    fused_y, fused_res = fused_layer(inp, fused_y, fused_res, *fused_caches)
+    torch.testing.assert_close(fused_y, y, atol=3e-2, rtol=3e-2)
+    torch.testing.assert_close(fused_res, res, atol=3e-2, rtol=3e-2)
+    for cache, fused_cache in zip(unfused_caches, fused_caches):
+        torch.testing.assert_close(fused_cache, cache, atol=3e-2, rtol=3e-2)
+
+
+if __name__ == "__main__":
+    import torch_npu
+
+    from ascend910a_extras.serve_bench import (
+        ACL_FORMAT_FRACTAL_NZ,
+        MODELS,
+        random_weights,
+        rope_cache,
+    )
+
+    # the tiny model built both ways, on the same weights and inputs
+    model = MODELS["tiny"]
+    bs, page_size, num_pages = 4, 128, 8
+    torch.manual_seed(0)
+    weights = random_weights(model)
+    cos_cache, sin_cache = rope_cache(model)
+    token_ids = torch.randint(0, model.vocab_size, (bs,), dtype=torch.int32).npu()
+    position_ids = torch.tensor([3, 17, 100, 0], dtype=torch.int32).npu()
+    block_tables = torch.arange(bs, dtype=torch.int32).unsqueeze(1).npu()
+    slot_mapping = (block_tables[:, 0] * page_size + position_ids).int()
+    context_lens = (position_ids + 1).int()
+    layout = model.kv_layout(num_pages, page_size)
+    initial = layout.allocate("npu")
+    for k, v, *_ in initial:
+        k.normal_()
+        v.normal_()
+
+    outs = {}
+    for fused in [False, True]:
+        config = model.graph_config(bs)
+        config.sampling = False
+        config.fused_layers = fused
+        g = graph.Graph(config)
+        g.build_model(1)
+        desc = g.export()
+        launches = graph.launch_count(desc)
+        print(f"fused_layers={fused}: {launches}")
+        # the nodes GraphBuilder emits are the ones test_launch_count_helper counts
+        assert exported_layer_kinds(desc) == {
+            f"layers.{i}": layer_kinds(fused, i == 0) for i in range(model.num_layers)
+        }
+        if fused:
+            assert max(launches["layers"].values()) <= 5
+
+        key_caches = [
+            torch_npu.npu_format_cast(k.clone(), ACL_FORMAT_FRACTAL_NZ)
+            for k, *_ in initial
+        ]
+        value_caches = [
+            torch_npu.npu_format_cast(v.clone(), ACL_FORMAT_FRACTAL_NZ)
+            for _, v, *_ in initial
+        ]
+        # logits, there is no sampling
+        out = torch.zeros(bs, model.vocab_size, dtype=torch.float16).npu()
+        ctx = graph.Context()
+        workspace_size = ctx.setup(
+            g,
+            token_ids,
+            key_caches,
+            value_caches,
+            position_ids,
+            slot_mapping,
+            block_tables,
+            context_lens,
+            cos_cache,
+            sin_cache,
+            weights,
+            out,
+        )
+        workspace = torch.empty(max(workspace_size, 1), dtype=torch.uint8).npu()
+        ctx.run(g, workspace)
+        torch.npu.synchronize()
+        outs[fused] = out.cpu()
+    torch.testing.assert_close(outs[True], outs[False], atol=5e-2, rtol=5e-2)
+    print("PASS: fused_layers matches the unfused model")
@@ -0,0 +1,83 @@
+import random
+from types import SimpleNamespace
+
+import torch
+
+import ascend910a_extras.ref as ref
+from ascend910a_extras.bench.sweeps import Backend
+from ascend910a_extras.fuzz import (
+    FUZZERS,
+    Case,
+    Corpus,
+    check,
+    fuzz,
+    get_fuzz_backend,
+    shrink,
+)
+
+
+def test_sample_legal_shapes():
+    rng = random.Random(0)
+    for op, f in FUZZERS.items():
+        for _ in range(50):
+            shape = f.sample(rng)
+            assert f.valid(**shape), op
+            for key, d in f.dims.items():
+                if isinstance(d, list):
+                    assert shape[key] in d
+                else:
+                    lo, hi, step = d
+                    assert lo <= shape[key] <= hi and (shape[key] - lo) % step == 0
+    shape = FUZZERS["swiglu"].sample(rng)
+    assert shape["block_size"] == 0 or shape["dim"] % shape["block_size"] == 0
+
+
+def test_ref_vs_ref(tmp_path):
+    # the fp32 reference agrees with the fp16 one on every op within the tolerances
+    corpus = Corpus(tmp_path / "corpus.jsonl")
+    failures = fuzz(num_cases=2 * len(FUZZERS), backend="ref", seed=1, corpus=corpus)
+    assert failures == []
+    assert not (tmp_path / "corpus.jsonl").exists()
+
+
+def buggy_swiglu(x, block_size=None, core_num=None):
+    # wrong on tails of 3 or more tokens with dim > 64
+    y = ref.swiglu(x)
+    if x.shape[0] >= 3 and x.shape[1] > 128:
+        y[2:] += 1
+    return y
+
+
+def test_shrink_and_corpus(tmp_path):
+    backend = Backend("buggy", "cpu", SimpleNamespace(swiglu=buggy_swiglu))
+    case = Case("swiglu", dict(num_tokens=1000, dim=4096, block_size=512), seed=7)
+    assert check(case, backend) is not None
+    assert check(case, get_fuzz_backend("ref")) is None
+    minimal = shrink(case, backend)
+    assert minimal.shape == dict(num_tokens=3, dim=128, block_size=0)
+
+    corpus = Corpus(tmp_path / "corpus.jsonl")
+    failures = fuzz(["swiglu"], num_cases=20, backend=backend, seed=0, corpus=corpus)
+    assert failures and all(
+        f.minimal.shape["num_tokens"] == 3 and f.minimal.shape["dim"] == 128
+        for f in failures
+    )
+    # the minimal cases are saved once and replayed first
+    saved = Corpus(tmp_path / "corpus.jsonl").cases()
+    assert (
+        len(saved)
+        == len({c.key for c in saved})
+        == len({f.minimal.key for f in failures})
+    )
+    replayed = fuzz(["swiglu"], num_cases=0, backend=backend, corpus=corpus)
+    assert [f.case.key for f in replayed] == [c.key for c in saved]
+    assert fuzz(["swiglu"], num_cases=0, backend="ref", corpus=corpus) == []
+
+
+if __name__ == "__main__":
+    import torch_npu
+
+    from ascend910a_extras.fuzz import main
+
+    torch.manual_seed(0)
+    main(["--backend", "npu", "--num-cases", "500"])
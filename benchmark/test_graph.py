@@ -4,6 +4,7 @@ import torch
 import torch_npu
 
 import ascend910a_extras.graph as graph
+import ascend910a_extras.ref as ref
 
 device = "npu:0"
 torch.npu.set_device(device)
@@ -868,6 +869,80 @@ def test_mlp_atb():
     # prof(fn=lambda: fn(x, gate_up_proj_weight, down_proj_weight), trace_fn=f"mlp_bs{bs}_trace.json")
 
 
+def test_moe_layer_atb():
+    bs = 16
+    hidden_size = 2048
+    moe_intermediate_size = 768
+    num_experts = 128
+    top_k = 8
+    x = torch.randn(bs, hidden_size, dtype=torch.float16, device=device)
+    router_weight = torch.randn(
+        num_experts, hidden_size, dtype=torch.float16, device=device
+    )
+    gate_up_proj_weight = (
+        torch.randn(
+            num_experts,
+            moe_intermediate_size * 2,
+            hidden_size,
+            dtype=torch.float16,
+            device=device,
+        )
+        / 32
+    )
+    down_proj_weight = (
+        torch.randn(
+            num_experts,
+            hidden_size,
+            moe_intermediate_size,
+            dtype=torch.float16,
+            device=device,
+        )
+        / 32
+    )
+
+    config = graph.GraphConfig()
+    config.batch_size = bs
+    config.hidden_size = hidden_size
+    config.num_layers = 1
+    config.num_experts = num_experts
+    config.num_experts_per_tok = top_k
+
+    g = graph.Graph(config)
+    g.build_moe_layer()
+    ctx = graph.Context()
+
+    inputs = [x]
+    input_formats = [ACL_FORMAT_ND]
+    weights = [router_weight, gate_up_proj_weight, down_proj_weight]
+    _y = torch.zeros_like(x)
+    ctx.setup_fullgraph(g, inputs, input_formats, weights, [_y])
+
+    def fn_ref(x):
+        x = x.cpu()
+        logits = x @ router_weight.cpu().t()
+        topk_weights, topk_ids = ref.moe_gating_topk(logits, top_k)
+        permuted_x, expanded_row_idx, group_list = ref.moe_permute(
+            x, topk_ids, num_experts
+        )
+        y = ref.grouped_matmul(
+            permuted_x, gate_up_proj_weight.cpu().transpose(1, 2), group_list
+        )
+        y = swiglu(y)
+        y = ref.grouped_matmul(y, down_proj_weight.cpu().transpose(1, 2), group_list)
+        return ref.moe_unpermute(y, expanded_row_idx, topk_weights)
+
+    def fn():
+        ctx.run_with_dummy_setup(g)
+        return _y
+
+    y_ref = fn_ref(x)
+    y = fn().cpu()
+    print("y_ref", y_ref)
+    print("y", y)
+    torch.testing.assert_close(y_ref, y, atol=1e-2, rtol=1e-2)
+    print("test_moe_layer_atb passed")
+
+
 def test_rmsnorm():
     bs = 128
     hidden_size = 256
@@ -999,6 +1074,7 @@ def test_attn():
 
 
 # test_mlp_atb()
+# test_moe_layer_atb()
 # test_rmsnorm_atb()
 # test_rmsnorm_with_residual_atb()
 # test_attn_atb()
@@ -0,0 +1,241 @@
+import json
+import os
+import zlib
+from types import SimpleNamespace
+
+import pytest
+
+import ascend910a_extras.graph as graph
+
+
+def config(**kwargs):
+    # a stand-in of graph.GraphConfig, which needs the extension
+    fields = {name: 0 for name in graph.CONFIG_FIELDS}
+    fields.update(batch_size=4, hidden_size=64, intermediate_size=128)
+    fields.update(rms_norm_eps=1e-6, sampling=True)
+    fields.update(kwargs)
+    return SimpleNamespace(**fields)
+
+
+def mlp_desc() -> dict:
+    # what Graph.export() gives for build_mlp: x, gate_up, down -> y
+    nodes = [
+        ["mlp.linear_0", "linear", [0, 1], [4], {"trans_a": 0, "trans_b": 1}],
+        ["mlp.swiglu_0", "swiglu", [4], [5], {}],
+        ["mlp.linear_1", "linear", [5, 2], [3], {"trans_a": 0, "trans_b": 1}],
+    ]
+    return {
+        "version": 1,
+        "splits": [
+            {
+                "name": "mlp",
+                "input_num": 1,
+                "in_tensor_num": 3,
+                "out_tensor_num": 1,
+                "internal_tensor_num": 2,
+                "nodes": [
+                    {
+                        "name": name,
+                        "kind": kind,
+                        "params": params,
+                        "inputs": inputs,
+                        "outputs": outputs,
+                        "reshapes": [],
+                    }
+                    for name, kind, inputs, outputs, params in nodes
+                ],
+            }
+        ],
+    }
+
+
+class FakeGraph:
+    builds = 0
+    loads = 0
+
+    def __init__(self, config):
+        self.config = config
+        self.desc = None
+
+    def build_mlp(self):
+        FakeGraph.builds += 1
+        self.desc = mlp_desc()
+
+    def export(self):
+        return self.desc
+
+    def load(self, desc):
+        if desc["version"] != 1:
+            raise RuntimeError("graph version must be 1")
+        FakeGraph.loads += 1
+        self.desc = desc
+
+
+@pytest.fixture
+def fake_native(monkeypatch, tmp_path):
+    FakeGraph.builds = FakeGraph.loads = 0
+    monkeypatch.setattr(graph, "_native", lambda: SimpleNamespace(Graph=FakeGraph))
+    monkeypatch.setenv(graph.CACHE_ENV, str(tmp_path))
+    return FakeGraph
+
+
+def test_round_trip():
+    g = FakeGraph(config())
+    g.build_mlp()
+    data = graph.dumps(g, "mlp")
+    saved = graph.loads(data)
+    assert saved["graph"] == g.export()
+    assert saved["config"] == graph.config_dict(g.config)
+    assert saved["build"] == "mlp" and saved["args"] == []
+    assert saved["library"] == graph.library_version()
+
+    with pytest.raises(ValueError, match="not a serialized graph"):
+        graph.loads(b"garbage")
+    with pytest.raises(ValueError, match="format must be"):
+        graph.loads(zlib.compress(b'{"format": 0}'))
+    for text, match in [
+        (b"[]", "must be dict, got list"),
+        (b'{"format": 1}', r"has no \['config', 'graph'\]"),
+        (b'{"format": 1, "config": {}, "graph": {}}', "graph has no splits"),
+    ]:
+        with pytest.raises(ValueError, match=match):
+            graph.loads(zlib.compress(text))
+
+
+def test_validate():
+    graph.validate(mlp_desc())
+    desc = mlp_desc()
+    desc["splits"][0]["nodes"][1]["outputs"] = [6]
+    with pytest.raises(ValueError, match="uses tensor 6 of 6"):
+        graph.validate(desc)
+    desc = mlp_desc()
+    desc["splits"][0]["nodes"].pop(0)
+    with pytest.raises(ValueError, match=r"mlp.swiglu_0 of mlp reads \[4\]"):
+        graph.validate(desc)
+    desc = mlp_desc()
+    desc["splits"][0]["nodes"][0]["reshapes"] = [[64]]
+    with pytest.raises(ValueError, match="reshapes"):
+        graph.validate(desc)
+    desc = mlp_desc()
+    del desc["splits"][0]["nodes"][2]["kind"]
+    with pytest.raises(ValueError, match=r"mlp.linear_1 has no \['kind'\]"):
+        graph.validate(desc)
+    desc = mlp_desc()
+    desc["splits"][0]["nodes"][0]["inputs"] = 0
+    with pytest.raises(
+        ValueError, match="inputs of node mlp.linear_0 of mlp must be list"
+    ):
+        graph.validate(desc)
+
+
+def test_cache_key(monkeypatch):
+    key = graph.cache_key(config(), "model", (2,))
+    assert key.startswith("model-")
+    assert key == graph.cache_key(config(), "model", (2,))
+    assert key != graph.cache_key(config(batch_size=8), "model", (2,))
+    assert key != graph.cache_key(config(), "model", (4,))
+    monkeypatch.setattr(graph, "library_version", lambda: "0.0.0-other")
+    assert key != graph.cache_key(config(), "model", (2,))
+
+
+def test_cache_key_changes_with_extension(monkeypatch, tmp_path):
+    # a rebuilt extension with the same package version is another key
+    so = tmp_path / "ascend910a_extras_C.so"
+    so.write_bytes(b"\x7fELF built once")
+    monkeypatch.setattr(graph, "extension_path", lambda: str(so))
+    key = graph.cache_key(config(), "model", (2,))
+    assert key == graph.cache_key(config(), "model", (2,))
+    so.write_bytes(b"\x7fELF built again, new wiring")
+    assert key != graph.cache_key(config(), "model", (2,))
+    monkeypatch.setattr(graph, "extension_path", lambda: "")
+    assert graph.extension_identity() == ""
+
+
+def test_cached_graph(fake_native, tmp_path):
+    g = graph.cached_graph(config(), "mlp")
+    assert fake_native.builds == 1 and fake_native.loads == 0
+    (path,) = tmp_path.glob("mlp-*.graph")
+
+    # the second time it is loaded, not built
+    again = graph.cached_graph(config(), "mlp")
+    assert fake_native.builds == 1 and fake_native.loads == 1
+    assert again.export() == g.export()
+
+    # another config is another file
+    graph.cached_graph(config(batch_size=8), "mlp")
+    assert fake_native.builds == 2 and len(list(tmp_path.glob("*.graph"))) == 2
+
+
+def test_cached_graph_rebuilds(fake_native, tmp_path):
+    path = tmp_path / "mlp.graph"
+    graph.cached_graph(config(), "mlp", path=path)
+    # broken, cut short, a graph the extension refuses, another config
+    g = FakeGraph(config())
+    g.build_mlp()
+    other_version = mlp_desc()
+    other_version["version"] = 0
+    g_other = FakeGraph(config(batch_size=8))
+    g_other.build_mlp()
+    # json that is not the structure dumps writes
+    no_splits = json.loads(zlib.decompress(graph.dumps(g, "mlp")))
+    no_splits["graph"] = {}
+    bad_inputs = json.loads(zlib.decompress(graph.dumps(g, "mlp")))
+    bad_inputs["graph"]["splits"][0]["nodes"][0]["inputs"] = 0
+    malformed = [{"format": 1}, no_splits, bad_inputs, [1, 2]]
+    malformed.append({"format": 1, "config": graph.config_dict(g.config), "graph": []})
+    for data in [
+        *[zlib.compress(json.dumps(saved).encode()) for saved in malformed],
+        b"garbage",
+        graph.dumps(g, "mlp")[:10],
+        graph.dumps(SimpleNamespace(config=config(), export=lambda: other_version)),
+        graph.dumps(g_other, "mlp"),
+    ]:
+        path.write_bytes(data)
+        builds = fake_native.builds
+        graph.cached_graph(config(), "mlp", path=path)
+        assert fake_native.builds == builds + 1
+        # and the file is good again
+        assert graph.loads(path.read_bytes())["config"] == graph.config_dict(config())
+    assert not list(tmp_path.glob("*.tmp"))
+
+
+def test_cached_graph_concurrent_writers(fake_native, tmp_path, monkeypatch):
+    # two processes cold-starting on the same config: the second one writes and renames its
+    # file while the first is about to rename its own
+    path = tmp_path / "mlp.graph"
+    replace = os.replace
+    interleaved = []
+
+    def replace_after_other_writer(src, dst):
+        if not interleaved:
+            interleaved.append(src)
+            path.unlink(missing_ok=True)
+            graph.cached_graph(config(), "mlp", path=path)
+        replace(src, dst)
+
+    monkeypatch.setattr(os, "replace", replace_after_other_writer)
+    graph.cached_graph(config(), "mlp", path=path)
+    assert fake_native.builds == 2
+    assert graph.loads(path.read_bytes())["build"] == "mlp"
+    assert not list(tmp_path.glob("*.tmp"))
+
+
+if __name__ == "__main__":
+    import torch_npu
+
+    # build the tiny model, save it and load it into a new graph: same ops, same node names
+    config = graph.GraphConfig()
+    config.batch_size = 8
+    config.hidden_size = 256
+    config.num_heads = 4
+    config.num_kv_heads = 2
+    config.intermediate_size = 512
+    config.num_layers = 2
+    built = graph.Graph(config)
+    built.build_model(2)
+    saved = graph.loads(graph.dumps(built, "model", (2,)))
+    loaded = graph.Graph(config)
+    loaded.load(saved["graph"])
+    assert loaded.export() == built.export()
+    assert loaded.nodes() == built.nodes()
+    print(f"{len(loaded.nodes())} nodes, {len(graph.dumps(built))} bytes")
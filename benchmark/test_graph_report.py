@@ -0,0 +1,160 @@
+import json
+
+import pytest
+
+import ascend910a_extras.graph as graph
+
+
+def node(name, op_type, us, in_shapes, out_shapes, workspace=0, calls=4):
+    # one entry of Graph.node_stats()
+    out_bytes = sum(
+        2 * int.__mul__(*s[-2:]) if len(s) > 1 else 4 * s[0] for s in out_shapes
+    )
+    return {
+        "split": "split_0",
+        "name": name,
+        "op_type": op_type,
+        "in_shapes": in_shapes,
+        "out_shapes": out_shapes,
+        "out_bytes": out_bytes,
+        "workspace_bytes": workspace,
+        "calls": calls,
+        "device_ns": int(us * 1e3 * calls),
+    }
+
+
+def recorded_stats() -> list:
+    # a 2 layer decode step of batch 4, the times of a made up run
+    stats = [node("embedding_0", "GatherOperation", 5, [[1000, 64], [4]], [[4, 64]])]
+    for i in range(2):
+        p = f"layers.{i}."
+        stats += [
+            node(p + "rmsnorm_0", "RmsNormOperation", 4, [[4, 64], [64]], [[4, 64]]),
+            node(
+                p + "attn.linear_0",
+                "LinearOperation",
+                20,
+                [[4, 64], [96, 64]],
+                [[4, 96]],
+            ),
+            node(
+                p + "attn.rope_0", "RopeEx", 6, [[4, 2, 32], [4, 1, 32]], [[4, 2, 32]]
+            ),
+            node(
+                p + "attn.paged_attention_0",
+                "PagedAttentionOperation",
+                30,
+                [[4, 2, 32]],
+                [[4, 2, 32]],
+                4096,
+            ),
+            node(
+                p + "mlp.linear_0",
+                "LinearOperation",
+                40,
+                [[4, 64], [256, 64]],
+                [[4, 256]],
+            ),
+            node(p + "mlp.swiglu_0", "SwiGluEx", 5, [[4, 256]], [[4, 128]]),
+        ]
+    stats.append(
+        node("norm.rmsnorm_0", "RmsNormOperation", 4, [[4, 64], [64]], [[4, 64]])
+    )
+    return stats
+
+
+def test_node_report():
+    rows = graph.node_report(recorded_stats())
+    assert [row["name"] for row in rows[:3]] == [
+        "embedding_0",
+        "layers.0.rmsnorm_0",
+        "layers.0.attn.linear_0",
+    ]
+    linear = rows[2]
+    assert linear["role"] == "attn.linear_0" and linear["layer"] == "layers.0"
+    assert linear["shapes"] == "[4x64],[96x64]->[4x96]"
+    assert linear["us"] == pytest.approx(20)
+    assert rows[0]["layer"] == "-"
+    assert sum(row["share"] for row in rows) == pytest.approx(1)
+    # a node that never ran has no time
+    idle = graph.node_report([node("x_0", "X", 0, [], [], calls=0)])
+    assert idle[0]["us"] == 0 and idle[0]["share"] == 0
+
+
+def test_aggregate():
+    rows = graph.node_report(recorded_stats())
+    by_op = graph.aggregate(rows, "op_type")
+    assert by_op[0]["name"] == "LinearOperation"
+    assert by_op[0]["nodes"] == 4 and by_op[0]["us"] == pytest.approx(120)
+    by_role = {g["name"]: g for g in graph.aggregate(rows, "role")}
+    assert by_role["attn.paged_attention_0"]["nodes"] == 2
+    assert by_role["attn.paged_attention_0"]["workspace_bytes"] == 4096
+    by_layer = graph.aggregate(rows, "layer")
+    assert [g["name"] for g in by_layer] == ["layers.0", "layers.1", "-"]
+    assert sum(g["share"] for g in by_layer) == pytest.approx(1)
+    with pytest.raises(ValueError, match="by must be one of"):
+        graph.aggregate(rows, "shapes")
+
+
+def test_format_report(tmp_path, capsys):
+    rows = graph.node_report(recorded_stats())
+    lines = graph.format_report(rows).splitlines()
+    assert lines[0].split() == [
+        "name",
+        "op_type",
+        "us",
+        "share",
+        "out_bytes",
+        "workspace",
+        "shapes",
+    ]
+    assert lines[1].split()[:3] == ["embedding_0", "GatherOperation", "5.00"]
+    assert lines[-1].split() == ["total", "219.00"]
+
+    path = tmp_path / "node_stats.json"
+    path.write_text(json.dumps(recorded_stats()))
+    graph.main(["report", str(path), "--by", "role", "--top", "2"])
+    out = capsys.readouterr().out.splitlines()
+    assert out[0].split()[:2] == ["name", "nodes"]
+    assert [line.split()[0] for line in out[1:3]] == [
+        "mlp.linear_0",
+        "attn.paged_attention_0",
+    ]
+    assert len(out) == 4
+
+
+if __name__ == "__main__":
+    import torch
+    import torch_npu
+
+    import ascend910a_extras.profile as profile
+
+    # one instrumented mlp graph: every node is timed, the split by the profile counters
+    bs, hidden_size, intermediate_size = 16, 4096, 12288
+    config = graph.GraphConfig()
+    config.batch_size = bs
+    config.hidden_size = hidden_size
+    config.intermediate_size = intermediate_size
+    g = graph.Graph(config)
+    g.instrument = True
+    g.build_mlp()
+    print(json.dumps(g.nodes(), indent=1))
+    x = torch.randn(bs, hidden_size, dtype=torch.float16).npu()
+    gate_up = torch.randn(2 * intermediate_size, hidden_size, dtype=torch.float16).npu()
+    down = torch.randn(hidden_size, intermediate_size, dtype=torch.float16).npu()
+    y = torch.empty(bs, hidden_size, dtype=torch.float16).npu()
+    ctx = graph.Context()
+    workspace_size = ctx.setup_fullgraph(g, [x], [2], [gate_up, down], [y])
+    workspace = torch.empty(max(workspace_size, 1), dtype=torch.uint8).npu()
+    with profile.profiled("device"):
+        for _ in range(10):
+            ctx.run_with_dummy_setup(g, workspace)
+    print(profile.format_table(profile.snapshot()))
+    rows = graph.node_report(g.node_stats())
+    print(graph.format_report(rows))
+    assert [row["name"] for row in rows] == [
+        "mlp.linear_0",
+        "mlp.swiglu_0",
+        "mlp.linear_1",
+    ]
+    assert all(row["calls"] == 10 for row in rows)
@@ -0,0 +1,89 @@
+import json
+import subprocess
+import sys
+
+import pytest
+
+import ascend910a_extras
+
+PROBE = """
+import json, sys, time
+t0 = time.perf_counter()
+import ascend910a_extras
+t1 = time.perf_counter()
+for name in {modules}:
+    __import__(name)
+print(json.dumps({{
+    "package_s": t1 - t0,
+    "loaded": sorted(m for m in sys.modules if m.split(".")[0] in
+                     ("torch", "torch_npu", "ascend910a_extras")),
+}}))
+"""
+
+
+def probe(modules: list) -> dict:
+    out = subprocess.run(
+        [sys.executable, "-c", PROBE.format(modules=modules)],
+        stdout=subprocess.PIPE,
+        check=True,
+    )
+    return json.loads(out.stdout)
+
+
+def test_package_import_is_fast():
+    result = probe([])
+    # no torch, no CANN, a few milliseconds
+    assert result["loaded"] == ["ascend910a_extras"]
+    assert result["package_s"] < 0.05
+
+
+def test_no_native_until_used():
+    modules = ["ascend910a_extras.kv_cache", "ascend910a_extras.ref"]
+    modules += ["ascend910a_extras.ops", "ascend910a_extras.graph"]
+    modules += ["ascend910a_extras.speculative", "ascend910a_extras.serve_bench"]
+    modules += ["ascend910a_extras.profile", "ascend910a_extras.memory"]
+    loaded = probe(modules)["loaded"]
+    assert "torch" in loaded
+    assert "torch_npu" not in loaded
+    assert "ascend910a_extras.ascend910a_extras_C" not in loaded
+
+
+def test_load_native_missing(monkeypatch, tmp_path):
+    monkeypatch.setattr(ascend910a_extras, "lib_path", tmp_path / "libcust_opapi.so")
+    monkeypatch.setattr(ascend910a_extras, "_native", None)
+    with pytest.raises(FileNotFoundError, match="libcust_opapi.so"):
+        ascend910a_extras.load_native()
+
+
+def test_print_info_loads_native_first(monkeypatch):
+    import types
+
+    import torch
+
+    import ascend910a_extras.ops as ops
+
+    monkeypatch.delattr(torch, "npu", raising=False)
+    calls = []
+
+    def load_native():
+        # what importing torch_npu does to torch
+        calls.append("load_native")
+        monkeypatch.setattr(
+            torch, "npu", types.SimpleNamespace(current_device=lambda: 3), raising=False
+        )
+        return types.SimpleNamespace(print_info=lambda device_id: {"device": device_id})
+
+    monkeypatch.setattr(ops, "load_native", load_native)
+    assert ops.print_info() == {"device": 3}
+    assert calls == ["load_native"]
+
+
+if __name__ == "__main__":
+    import time
+
+    t0 = time.perf_counter()
+    ascend910a_extras.load_native()
+    import ascend910a_extras.ops as ops
+
+    ops.print_info()
+    print(f"load_native and first op {time.perf_counter() - t0:.3f} s")
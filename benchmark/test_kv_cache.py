@@ -0,0 +1,157 @@
+import torch
+
+import ascend910a_extras.ref as ref
+from ascend910a_extras.kv_cache import BlockManager, KVCacheLayout
+
+
+def make_cache(num_pages, num_kv_heads, head_dim, page_size, dtype):
+    shape = (num_pages, num_kv_heads * head_dim // 16, page_size, 16)
+    cache = torch.zeros(shape, dtype=dtype)
+    scale = torch.ones(num_pages, num_kv_heads, page_size, dtype=torch.float16)
+    return cache, scale
+
+
+def test_quantize_kv():
+    torch.manual_seed(0)
+    x = torch.randn(64, 8, 128, dtype=torch.float16)
+    q, scale = ref.quantize_kv(x)
+    assert q.dtype == torch.int8 and scale.shape == (64, 8)
+    x_dq = q.float() * scale.float().unsqueeze(-1)
+    # half a quantization step at most
+    assert ((x_dq - x.float()).abs() <= scale.float().unsqueeze(-1) * 0.5 + 1e-4).all()
+
+
+def test_reshape_and_cache_int8():
+    torch.manual_seed(0)
+    num_pages, num_kv_heads, head_dim, page_size = 8, 4, 128, 128
+    key = torch.randn(5, num_kv_heads, head_dim, dtype=torch.float16)
+    value = torch.randn(5, num_kv_heads, head_dim, dtype=torch.float16)
+    slots = torch.tensor([0, 7, 129, 513, 1023], dtype=torch.int32)
+
+    k_fp16, _ = make_cache(num_pages, num_kv_heads, head_dim, page_size, torch.float16)
+    v_fp16, _ = make_cache(num_pages, num_kv_heads, head_dim, page_size, torch.float16)
+    ref.reshape_and_cache(key, value, k_fp16, v_fp16, slots)
+
+    k_int8, k_scale = make_cache(
+        num_pages, num_kv_heads, head_dim, page_size, torch.int8
+    )
+    v_int8, v_scale = make_cache(
+        num_pages, num_kv_heads, head_dim, page_size, torch.int8
+    )
+    ref.reshape_and_cache(key, value, k_int8, v_int8, slots, k_scale, v_scale)
+
+    k_dq = ref.dequantize_kv_cache(k_int8, k_scale)
+    v_dq = ref.dequantize_kv_cache(v_int8, v_scale)
+    torch.testing.assert_close(k_dq, k_fp16, atol=2e-2, rtol=2e-2)
+    torch.testing.assert_close(v_dq, v_fp16, atol=2e-2, rtol=2e-2)
+
+
+def test_paged_attention_int8():
+    torch.manual_seed(0)
+    bs, num_heads, num_kv_heads, head_dim, page_size = 3, 32, 8, 128, 128
+    layout = KVCacheLayout(1, num_kv_heads, head_dim, page_size, num_pages=16)
+    manager = BlockManager(layout)
+    seq_lens = [1, 200, 513]
+    k_fp16, _ = make_cache(16, num_kv_heads, head_dim, page_size, torch.float16)
+    v_fp16, _ = make_cache(16, num_kv_heads, head_dim, page_size, torch.float16)
+    k_int8, k_scale = make_cache(16, num_kv_heads, head_dim, page_size, torch.int8)
+    v_int8, v_scale = make_cache(16, num_kv_heads, head_dim, page_size, torch.int8)
+    for seq_id, seq_len in enumerate(seq_lens):
+        slots = torch.tensor(manager.append_slots(seq_id, seq_len), dtype=torch.int32)
+        key = torch.randn(seq_len, num_kv_heads, head_dim, dtype=torch.float16)
+        value = torch.randn(seq_len, num_kv_heads, head_dim, dtype=torch.float16)
+        ref.reshape_and_cache(key, value, k_fp16, v_fp16, slots)
+        ref.reshape_and_cache(key, value, k_int8, v_int8, slots, k_scale, v_scale)
+
+    q = torch.randn(bs, num_heads, head_dim, dtype=torch.float16)
+    block_tables = manager.get_block_tables(list(range(bs)), device="cpu")
+    context_lens = manager.get_context_lens(list(range(bs)), device="cpu")
+    o = ref.paged_attention(q, k_fp16, v_fp16, block_tables, context_lens)
+    o_int8 = ref.paged_attention(
+        q, k_int8, v_int8, block_tables, context_lens, k_scale, v_scale
+    )
+    torch.testing.assert_close(o_int8, o, atol=2e-2, rtol=2e-2)
+
+
+def test_block_manager():
+    layout = KVCacheLayout(2, 8, 128, page_size=128, num_pages=4, dtype=torch.int8)
+    assert layout.scale_shape == (4, 8, 128)
+    # int8 page + fp16 scale per token per head, k and v, 2 layers
+    assert layout.bytes_per_page == 2 * 2 * (8 * 128 * 128 + 8 * 128 * 2)
+
+    manager = BlockManager(layout)
+    assert manager.append_slots(0, 130) == list(range(130))
+    assert manager.block_tables[0] == [0, 1]
+    assert manager.append_slots(1, 1) == [256]
+    assert manager.append_slots(0, 1) == [130]
+    assert not manager.can_append(1, 3 * 128)
+    manager.free(0)
+    assert manager.num_free_pages == 3
+    assert manager.append_slots(2, 1) == [0]
+
+
+def test_fork_copy_blocks():
+    torch.manual_seed(0)
+    num_layers, num_kv_heads, head_dim, page_size = 2, 4, 128, 16
+    layout = KVCacheLayout(num_layers, num_kv_heads, head_dim, page_size, num_pages=8)
+    manager = BlockManager(layout)
+    caches = [
+        make_cache(8, num_kv_heads, head_dim, page_size, torch.int8)
+        for _ in range(2 * num_layers)
+    ]
+    key_caches = [c.random_(-127, 128) for c, _ in caches[:num_layers]]
+    value_caches = [c.random_(-127, 128) for c, _ in caches[num_layers:]]
+    key_scales = [s.uniform_() for _, s in caches[:num_layers]]
+    value_scales = [s.uniform_() for _, s in caches[num_layers:]]
+
+    manager.append_slots(0, 40)
+    mapping = manager.fork(0, 1)
+    assert mapping == [(0, 3), (1, 4), (2, 5)]
+    assert manager.context_lens[1] == 40 and manager.num_free_pages == 2
+    before = [c.clone() for c in key_caches + value_caches + key_scales + value_scales]
+    ref.copy_blocks(
+        key_caches,
+        value_caches,
+        torch.tensor(mapping),
+        key_scales,
+        value_scales,
+    )
+    for x, x0 in zip(key_caches + value_caches + key_scales + value_scales, before):
+        torch.testing.assert_close(x[3:6], x0[0:3])
+        torch.testing.assert_close(x[:3], x0[:3])
+        torch.testing.assert_close(x[6:], x0[6:])
+
+    # the fork reads the same kv as its parent
+    block_tables = manager.get_block_tables([0, 1], device="cpu")
+    context_lens = manager.get_context_lens([0, 1], device="cpu")
+    q = torch.randn(1, 8, head_dim, dtype=torch.float16).repeat(2, 1, 1)
+    o = ref.paged_attention(
+        q,
+        key_caches[0],
+        value_caches[0],
+        block_tables,
+        context_lens,
+        key_scales[0],
+        value_scales[0],
+    )
+    torch.testing.assert_close(o[0], o[1])
+
+
+if __name__ == "__main__":
+    import torch_npu
+
+    import ascend910a_extras.ops as ops
+
+    torch.manual_seed(0)
+    shape = (64, 8 * 128 // 16, 128, 16)
+    key_caches = [torch.randn(shape, dtype=torch.float16) for _ in range(4)]
+    value_caches = [torch.randn(shape, dtype=torch.float16) for _ in range(4)]
+    mapping = torch.tensor([[0, 32], [5, 40], [6, 63], [7, 7]])
+    key_npu = [x.npu() for x in key_caches]
+    value_npu = [x.npu() for x in value_caches]
+    ref.copy_blocks(key_caches, value_caches, mapping)
+    ops.copy_blocks(key_npu, value_npu, mapping.npu())
+    torch.npu.synchronize()
+    for x, x_npu in zip(key_caches + value_caches, key_npu + value_npu):
+        torch.testing.assert_close(x_npu.cpu(), x)
+    print("PASS: copy_blocks")
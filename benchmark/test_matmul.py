@@ -1,6 +1,7 @@
 import torch
 
 import ascend910a_extras.ops as ops
+from ascend910a_extras.bench import EventTimer, do_bench
 
 REPEAT = 1
 
@@ -51,27 +52,7 @@ def print_m(d, m, n):
 torch.testing.assert_close(y_ref, y, atol=1e-3, rtol=1e-3)
 
 
-def do_bench(fn, num_iter=10, num_warmup=10):
-    import numpy as np
-
-    start = torch.npu.Event(enable_timing=True)
-    end = torch.npu.Event(enable_timing=True)
-    times = np.zeros(num_iter + num_warmup)
-
-    for i in range(num_iter + num_warmup):
-        with torch.no_grad():
-            start.record()
-            fn()
-            end.record()
-        torch.npu.synchronize()
-        times[i] = start.elapsed_time(end)
-
-    times = times[num_warmup:]
-    elapsed_time = np.amin(times) / 1000
-    return elapsed_time
-
-
-sec = do_bench(lambda: ops.matmul(x, w))
+sec = do_bench(lambda: ops.matmul(x, w), timer=EventTimer()).min
 flops = 2 * m * k * n * REPEAT
 tflops_s = flops / sec / 1e12
 gb = (m * k * 2 + n * k * 2 + m * n * 2) / 1e9
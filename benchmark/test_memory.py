@@ -0,0 +1,129 @@
+import json
+from dataclasses import asdict, replace
+from types import SimpleNamespace
+
+import pytest
+import torch
+
+from ascend910a_extras.memory import (
+    Calibration,
+    GiB,
+    layer_intermediates,
+    main,
+    plan,
+    split_layers,
+    weight_bytes,
+)
+from ascend910a_extras.serve_bench import MODELS, ModelConfig, random_weights
+
+TINY = MODELS["tiny"]
+
+
+def test_weight_bytes():
+    models = [
+        TINY,
+        replace(TINY, tie_word_embeddings=True),
+        replace(TINY, weight_quant=True, group_size=64),
+        replace(TINY, num_experts=4, shared_expert_intermediate_size=128),
+        replace(TINY, num_experts=4, weight_quant=True),
+    ]
+    for model in models:
+        weights = random_weights(model, device="cpu")
+        assert weight_bytes(model) == sum(w.numel() * w.element_size() for w in weights)
+    # about 16 GB for qwen3-8b in fp16
+    assert 15 * GiB < weight_bytes(MODELS["qwen3-8b"]) < 16 * GiB
+
+
+def test_split_layers():
+    assert split_layers(36, 1) == [(0, 36)]
+    assert split_layers(36, 4) == [(0, 9), (9, 18), (18, 27), (27, 36)]
+    assert split_layers(5, 2) == [(0, 3), (3, 5)]
+    with pytest.raises(ValueError, match="num_split"):
+        split_layers(2, 3)
+
+
+def test_plan():
+    model = MODELS["qwen3-8b"]
+    p = plan(model, 16, hbm_bytes=32 * GiB)
+    assert p.kv_bytes_per_page == model.kv_layout(0).bytes_per_page
+    free = p.usable_bytes - p.weight_bytes - p.fixed_bytes - p.workspace_bytes
+    assert p.num_pages == free // p.kv_bytes_per_page
+    assert p.max_tokens == p.num_pages * 128
+    assert p.max_sequences(2048) == p.num_pages // 16
+    # uncalibrated the workspace is the largest stage, here the logits of the lm head
+    assert p.workspace_bytes == p.splits[0].estimate_bytes
+    assert p.splits[0].estimate_bytes >= 16 * model.vocab_size * 2
+
+    split = plan(model, 16, num_split=4, hbm_bytes=32 * GiB)
+    assert [(s.start_layer, s.end_layer) for s in split.splits][-1] == (27, 36)
+    assert (
+        sum(s.intermediate_bytes for s in split.splits)
+        == p.splits[0].intermediate_bytes
+    )
+    # the hidden states and residual between the splits
+    assert split.fixed_bytes - p.fixed_bytes == 3 * 2 * 16 * model.hidden_size * 2
+    assert plan(model, 64, hbm_bytes=32 * GiB).num_pages < p.num_pages
+    int8 = plan(model, 16, kv_dtype=torch.int8, hbm_bytes=32 * GiB)
+    assert int8.num_pages > 1.9 * p.num_pages
+    # more weights than hbm
+    assert plan(model, 16, hbm_bytes=8 * GiB).num_pages == 0
+
+    moe = replace(TINY, num_experts=4)
+    assert "moe_permute" in layer_intermediates(moe, 8)
+    spec = plan(TINY, 4, num_speculative_tokens=3, sampling=False)
+    assert spec.splits[0].estimate_bytes == sum(layer_intermediates(TINY, 16).values())
+
+
+def test_calibration(tmp_path):
+    points = [[x, 3 * x + 1000] for x in [1 << 20, 4 << 20, 16 << 20]]
+    c = Calibration.fit(points, source="test")
+    assert c.scale == pytest.approx(3) and c.offset == 1000
+    assert c.workspace(2 << 20) == 6 * (1 << 20) + 1000
+    assert Calibration.fit([[100, 250]]).scale == 2.5
+    c.save(tmp_path / "calib.json")
+    assert Calibration.load(tmp_path / "calib.json") == c
+
+    p = plan(TINY, 8, calibration=c)
+    assert p.workspace_bytes == c.workspace(p.splits[0].estimate_bytes)
+
+
+def test_from_graph_config():
+    # a stand-in of graph.GraphConfig, which needs the extension
+    fields = asdict(TINY)
+    config = SimpleNamespace(batch_size=8, **fields)
+    del fields["vocab_size"], fields["group_size"]
+    model = ModelConfig.from_graph_config(config, TINY.vocab_size, rope_theta=1e4)
+    assert model == replace(TINY, rope_theta=1e4)
+
+
+def test_main(tmp_path, capsys):
+    calib = tmp_path / "calib.json"
+    Calibration(2.0, 4096).save(calib)
+    out = tmp_path / "plans.json"
+    args = ["--model", "tiny", "--batch-size", "1", "8", "--num-split", "1", "2"]
+    args += ["--hbm-gb", "1", "--calibration", str(calib), "--out", str(out)]
+    assert main(args) == 0
+    lines = capsys.readouterr().out.splitlines()
+    assert lines[0].split()[:2] == ["bs", "split"]
+    assert len(lines) == 1 + 4 + 1
+    data = json.loads(out.read_text())
+    assert [(p["batch_size"], p["num_split"]) for p in data["plans"]] == [
+        (1, 1),
+        (1, 2),
+        (8, 1),
+        (8, 2),
+    ]
+    assert data["plans"][0]["max_tokens"] > data["plans"][2]["max_tokens"]
+
+
+if __name__ == "__main__":
+    import torch_npu
+
+    from ascend910a_extras.memory import calibrate
+
+    # fit on the tiny model and check the measured workspaces against the fit
+    c = calibrate(TINY, [1, 8, 32], [1, 2])
+    print(c)
+    for x, y in c.points:
+        print(f"estimate {x:>12} measured {y:>12} fitted {c.workspace(x):>12}")
+        assert c.workspace(x) >= 0
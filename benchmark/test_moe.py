@@ -0,0 +1,94 @@
+import torch
+
+import ascend910a_extras.ref as ref
+
+
+def naive_moe(x, logits, w, top_k):
+    # one token at a time
+    probs = torch.softmax(logits.float(), dim=-1)
+    out = torch.zeros(x.shape[0], w.shape[2])
+    for t in range(x.shape[0]):
+        weights, ids = probs[t].topk(top_k)
+        weights = weights / weights.sum()
+        for weight, e in zip(weights, ids):
+            out[t] += weight * (x[t].float() @ w[e].float())
+    return out.to(x.dtype)
+
+
+def test_moe_gating_topk():
+    torch.manual_seed(0)
+    logits = torch.randn(33, 60, dtype=torch.float16)
+    weights, ids = ref.moe_gating_topk(logits, 6, renormalize=False)
+    probs = torch.softmax(logits.float(), dim=-1)
+    torch.testing.assert_close(weights, probs.topk(6).values)
+    assert ids.dtype == torch.int32 and (probs.gather(1, ids.long()) == weights).all()
+
+    weights, _ = ref.moe_gating_topk(logits, 6)
+    torch.testing.assert_close(weights.sum(dim=-1), torch.ones(33))
+    # ties go to the lower expert id
+    _, ids = ref.moe_gating_topk(torch.zeros(2, 8, dtype=torch.float16), 3)
+    assert ids.tolist() == [[0, 1, 2], [0, 1, 2]]
+
+
+def test_moe_permute():
+    x = torch.arange(4, dtype=torch.float16).unsqueeze(1).repeat(1, 16)
+    topk_ids = torch.tensor([[2, 0], [0, 5], [2, 1], [-1, 2]], dtype=torch.int32)
+    permuted_x, expanded_row_idx, group_list = ref.moe_permute(x, topk_ids, 4)
+    assert group_list.tolist() == [2, 3, 6, 6]
+    # stable within an expert, invalid ids are dropped
+    assert expanded_row_idx.tolist() == [3, 0, 1, -1, 4, 2, -1, 5]
+    assert permuted_x[:, 0].tolist() == [0, 1, 2, 0, 2, 3, 0, 0]
+
+
+def test_moe_layer():
+    torch.manual_seed(0)
+    num_tokens, hidden, inner_dim, num_experts, top_k = 37, 64, 32, 8, 2
+    x = torch.randn(num_tokens, hidden, dtype=torch.float16)
+    logits = torch.randn(num_tokens, num_experts, dtype=torch.float16)
+    w = torch.randn(num_experts, hidden, inner_dim, dtype=torch.float16) / 8
+
+    topk_weights, topk_ids = ref.moe_gating_topk(logits, top_k)
+    permuted_x, expanded_row_idx, group_list = ref.moe_permute(x, topk_ids, num_experts)
+    y = ref.grouped_matmul(permuted_x, w, group_list)
+    out = ref.moe_unpermute(y, expanded_row_idx, topk_weights)
+    torch.testing.assert_close(
+        out, naive_moe(x, logits, w, top_k), atol=1e-2, rtol=1e-2
+    )
+
+
+if __name__ == "__main__":
+    import torch_npu
+
+    import ascend910a_extras.ops as ops
+
+    torch.manual_seed(0)
+    for num_tokens, num_experts, top_k in [(1, 8, 2), (77, 60, 4), (1024, 128, 8)]:
+        hidden = 2048
+        x = torch.randn(num_tokens, hidden, dtype=torch.float16)
+        logits = torch.randn(num_tokens, num_experts, dtype=torch.float16)
+
+        weights_ref, ids_ref = ref.moe_gating_topk(logits, top_k)
+        weights, ids = ops.moe_gating_topk(logits.npu(), top_k)
+        torch.npu.synchronize()
+        torch.testing.assert_close(weights.cpu(), weights_ref, atol=1e-3, rtol=1e-3)
+        assert (ids.cpu() == ids_ref).all()
+        print(f"PASS: moe_gating_topk {num_tokens=} {num_experts=} {top_k=}")
+
+        permuted_ref, row_idx_ref, group_list_ref = ref.moe_permute(
+            x, ids_ref, num_experts
+        )
+        permuted_x, row_idx, group_list = ops.moe_permute(
+            x.npu(), ids_ref.npu(), num_experts
+        )
+        torch.npu.synchronize()
+        assert (group_list.cpu() == group_list_ref).all()
+        assert (row_idx.cpu() == row_idx_ref).all()
+        assert (permuted_x.cpu() == permuted_ref).all()
+        print(f"PASS: moe_permute {num_tokens=} {num_experts=} {top_k=}")
+
+        y = torch.randn(num_tokens * top_k, hidden, dtype=torch.float16)
+        out_ref = ref.moe_unpermute(y, row_idx_ref, weights_ref)
+        out = ops.moe_unpermute(y.npu(), row_idx_ref.npu(), weights_ref.npu())
+        torch.npu.synchronize()
+        torch.testing.assert_close(out.cpu(), out_ref, atol=1e-2, rtol=1e-2)
+        print(f"PASS: moe_unpermute {num_tokens=} {num_experts=} {top_k=}")
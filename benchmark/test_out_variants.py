@@ -0,0 +1,171 @@
+import ast
+import importlib
+from pathlib import Path
+
+import torch
+
+import ascend910a_extras.ops as ops
+
+LIB = torch.ops.ascend910a_extras
+
+
+def writes(schema) -> list[str]:
+    return [a.name for a in schema.arguments if a.alias_info and a.alias_info.is_write]
+
+
+def test_every_op_has_a_schema():
+    path = Path(ops.__file__)
+    tree = ast.parse(path.read_text())
+    names = {n.name for n in tree.body if isinstance(n, ast.FunctionDef)}
+    names = {n for n in names if not n.startswith("_")} - {"print_info"}
+    assert names == {name.partition(".")[0] for name in ops.SCHEMAS}
+    for name in names:
+        assert hasattr(LIB, name)
+
+
+def test_reload():
+    # the namespace is defined once per process, a second import must not redefine it
+    functional = LIB.rope.default._schema
+    importlib.reload(ops)
+    assert LIB.rope.default._schema == functional
+
+
+def test_out_variants():
+    for name in ops.SCHEMAS:
+        op, _, overload = name.partition(".")
+        functional = getattr(LIB, op).default._schema
+        if not functional.returns or op.endswith("_"):
+            continue
+        # every op that returns new tensors can write into given ones
+        assert overload or "out" in getattr(LIB, op).overloads(), op
+        if overload != "out":
+            continue
+        schema = getattr(LIB, op).out._schema
+        outs = [a for a in schema.arguments if a.kwarg_only]
+        assert writes(schema) == [a.name for a in outs]
+        assert len(outs) == len(functional.returns)
+        # the outputs are returned as aliases of the out arguments
+        assert [r.alias_info.before_set for r in schema.returns] == [
+            a.alias_info.before_set for a in outs
+        ]
+
+
+def test_in_place_variants():
+    assert writes(LIB.rope_.default._schema) == ["q", "k"]
+    assert writes(LIB.add_rms_norm_.default._schema) == ["x", "residual"]
+    assert writes(LIB.reshape_and_cache.default._schema) == [
+        "key_cache",
+        "value_cache",
+        "key_scale",
+        "value_scale",
+    ]
+    assert writes(LIB.copy_blocks.default._schema) == [
+        "key_caches",
+        "value_caches",
+        "key_scales",
+        "value_scales",
+    ]
+    # the functional ops write nothing
+    assert writes(LIB.rope.default._schema) == []
+    assert writes(LIB.paged_attention.default._schema) == []
+
+
+def decode_step_allocations(num_steps: int = 4) -> list[int]:
+    # one decoder layer and sampling on preallocated buffers with the out/in-place ops,
+    # returns the allocator calls of each step
+    from ascend910a_extras.kv_cache import BlockManager, KVCacheLayout
+    from ascend910a_extras.quantize import quantize_weight
+
+    device, dtype = "npu", torch.float16
+    bs, hidden, num_heads, num_kv_heads, head_dim = 8, 1024, 8, 2, 128
+    inner, vocab = 2048, 4096
+    layout = KVCacheLayout(1, num_kv_heads, head_dim, page_size=128, num_pages=16)
+    key_cache, value_cache, _, _ = layout.allocate(device)[0]
+    manager = BlockManager(layout)
+    slots = [manager.append_slots(i, 100)[-1] for i in range(bs)]
+    block_tables = manager.get_block_tables(list(range(bs)), device=device)
+    context_lens = manager.get_context_lens(list(range(bs)), device=device)
+    slot_indices = torch.tensor(slots, dtype=torch.int32, device=device)
+    position_ids = torch.full((bs,), 99, dtype=torch.int32, device=device)
+    cos = torch.randn(128, head_dim // 2, dtype=dtype).to(device)
+    sin = torch.randn(128, head_dim // 2, dtype=dtype).to(device)
+
+    def linear(n, k):
+        w_q, scale = quantize_weight(torch.randn(n, k, dtype=dtype) * 0.02)
+        return w_q.to(device), scale.to(device)
+
+    wq, wk, wv = (
+        linear(n * head_dim, hidden) for n in [num_heads] + 2 * [num_kv_heads]
+    )
+    wo, w_gate_up, w_down = (
+        linear(hidden, num_heads * head_dim),
+        linear(2 * inner, hidden),
+        linear(hidden, inner),
+    )
+    w_head = linear(vocab, hidden)
+    norm = torch.ones(hidden, dtype=dtype, device=device)
+
+    def buf(*shape, dtype=dtype):
+        return torch.empty(*shape, dtype=dtype, device=device)
+
+    x, residual = buf(bs, hidden), torch.randn(bs, hidden, dtype=dtype).to(device)
+    q, k, v = (
+        buf(bs, num_heads, head_dim),
+        buf(bs, num_kv_heads, head_dim),
+        buf(bs, num_kv_heads, head_dim),
+    )
+    attn, gate_up, act, logits = (
+        buf(bs, num_heads, head_dim),
+        buf(bs, 2 * inner),
+        buf(bs, inner),
+        buf(bs, vocab),
+    )
+    token_ids = buf(bs, dtype=torch.int32)
+    params = [
+        torch.ones(bs, device=device),
+        torch.zeros(bs, dtype=torch.int32, device=device),
+    ]
+    params += [
+        torch.ones(bs, device=device),
+        torch.ones(bs, device=device),
+        torch.rand(bs, device=device),
+    ]
+
+    def step():
+        x.normal_()
+        ops.add_rms_norm_(x, residual, norm)
+        ops.weight_quant_matmul(x, *wq, out=q.view(bs, -1))
+        ops.weight_quant_matmul(x, *wk, out=k.view(bs, -1))
+        ops.weight_quant_matmul(x, *wv, out=v.view(bs, -1))
+        ops.rope_(q, k, position_ids, cos, sin)
+        ops.reshape_and_cache(k, v, key_cache, value_cache, slot_indices)
+        ops.paged_attention(
+            q, key_cache, value_cache, block_tables, context_lens, out=attn
+        )
+        ops.weight_quant_matmul(attn.view(bs, -1), *wo, out=x)
+        ops.add_rms_norm_(x, residual, norm)
+        ops.weight_quant_matmul(x, *w_gate_up, out=gate_up)
+        ops.swiglu(gate_up, out=act)
+        ops.weight_quant_matmul(act, *w_down, out=x)
+        ops.weight_quant_matmul(x, *w_head, out=logits)
+        ops.sampling(logits, *params, out=token_ids)
+
+    counts = []
+    for _ in range(num_steps):
+        before = torch.npu.memory_stats().get("allocation.all.allocated", 0)
+        step()
+        torch.npu.synchronize()
+        counts.append(
+            torch.npu.memory_stats().get("allocation.all.allocated", 0) - before
+        )
+    return counts
+
+
+if __name__ == "__main__":
+    import torch_npu
+
+    counts = decode_step_allocations()
+    print(f"allocations per decode step: {counts}")
+    # the first step makes the workspace and the epsilon tensor, then nothing
+    assert counts[1:] == [0] * (len(counts) - 1), counts
+    print("PASS: zero allocations in steady state")
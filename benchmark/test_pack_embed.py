@@ -0,0 +1,73 @@
+import shutil
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parents[1] / "csrc" / "opdev" / "cmake" / "util"))
+
+from ascendc_pack_embed import embed_objects, embed_source, group_blobs  # noqa: E402
+
+MAIN = """#include <stdint.h>
+#include <stdio.h>
+extern uint8_t _binary_a_o_start, _binary_a_o_end;
+extern uint8_t _binary_b_o_start, _binary_b_o_end;
+extern uint8_t _binary_c_json_start, _binary_c_json_end;
+int main() {
+    printf("%d %d %d %d %.*s\\n",
+           (int)(&_binary_a_o_end - &_binary_a_o_start),
+           (int)(&_binary_c_json_end - &_binary_c_json_start),
+           &_binary_a_o_start == &_binary_b_o_start,
+           (int)((uintptr_t)&_binary_c_json_start % 16),
+           (int)(&_binary_c_json_end - &_binary_c_json_start), &_binary_c_json_start);
+    return 0;
+}
+"""
+
+
+def make_blobs(tmp_path: Path) -> list:
+    (tmp_path / "a.o").write_bytes(b"\x7fELF" + bytes(range(60)))
+    (tmp_path / "b.o").write_bytes(b"\x7fELF" + bytes(range(60)))
+    (tmp_path / 'c "1".json').write_text('{"k": 1}')
+    return [
+        ("_binary_a_o", str(tmp_path / "a.o")),
+        ("_binary_b_o", str(tmp_path / "b.o")),
+        ("_binary_c_json", str(tmp_path / 'c "1".json')),
+    ]
+
+
+def test_group_blobs(tmp_path):
+    entries = make_blobs(tmp_path)
+    groups = group_blobs(entries + [entries[0]])
+    # a.o and b.o have the same content and share one copy
+    assert [syms for _, syms in groups] == [
+        ["_binary_a_o", "_binary_b_o"],
+        ["_binary_c_json"],
+    ]
+    src = embed_source(groups)
+    assert src.count(".incbin") == 2
+    assert '.incbin "{}/c \\"1\\".json"'.format(tmp_path.resolve()) in src
+    with pytest.raises(ValueError, match="not a valid symbol"):
+        group_blobs([("_binary_a-b", entries[0][1])])
+
+
+@pytest.mark.skipif(shutil.which("cc") is None, reason="no C compiler")
+def test_embed_objects(tmp_path):
+    out = tmp_path / "out"
+    out.mkdir()
+    stats = embed_objects(make_blobs(tmp_path), str(out / "kernels_embed.o"), "cc")
+    assert stats == {
+        "symbols": 3,
+        "binaries": 2,
+        "bytes": 64 + 8,
+        "deduplicated_bytes": 64,
+    }
+    (tmp_path / "main.c").write_text(MAIN)
+    exe = tmp_path / "main"
+    subprocess.run(
+        ["cc", str(tmp_path / "main.c"), str(out / "kernels_embed.o"), "-o", str(exe)],
+        check=True,
+    )
+    result = subprocess.run([str(exe)], stdout=subprocess.PIPE, check=True)
+    assert result.stdout.decode() == '64 8 1 0 {"k": 1}\n'
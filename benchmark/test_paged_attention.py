@@ -0,0 +1,164 @@
+import math
+
+import torch
+
+import ascend910a_extras.ref as ref
+from ascend910a_extras.kv_cache import BlockManager, KVCacheLayout, num_freeable_pages
+
+
+def make_inputs(bs, num_kv_heads, group_size, head_dim, page_size, seq_lens, seed=0):
+    torch.manual_seed(seed)
+    num_pages = sum(math.ceil(n / page_size) for n in seq_lens) + 1
+    layout = KVCacheLayout(1, num_kv_heads, head_dim, page_size, num_pages=num_pages)
+    manager = BlockManager(layout)
+    key_cache = torch.randn(layout.cache_shape, dtype=torch.float16)
+    value_cache = torch.randn(layout.cache_shape, dtype=torch.float16)
+    for seq_id, seq_len in enumerate(seq_lens):
+        manager.append_slots(seq_id, seq_len)
+    q = torch.randn(bs, num_kv_heads * group_size, head_dim, dtype=torch.float16)
+    block_tables = manager.get_block_tables(list(range(bs)), device="cpu")
+    context_lens = manager.get_context_lens(list(range(bs)), device="cpu")
+    return (q, key_cache, value_cache, block_tables, context_lens), manager
+
+
+def naive_paged_attention(
+    q, key_cache, value_cache, block_tables, context_lens, alibi=None, window_size=0
+):
+    # one query head at a time
+    bs, num_heads, head_dim = q.shape
+    num_kv_heads = key_cache.shape[1] * 16 // head_dim
+    group_size = num_heads // num_kv_heads
+    o = torch.empty_like(q)
+    for b in range(bs):
+        seq_len = int(context_lens[b])
+        k = ref.gather_kv(key_cache, block_tables[b], seq_len, num_kv_heads)
+        v = ref.gather_kv(value_cache, block_tables[b], seq_len, num_kv_heads)
+        for h in range(num_heads):
+            kv_h = h // group_size
+            s = k[:, kv_h].float() @ q[b, h].float() / math.sqrt(head_dim)
+            for j in range(seq_len):
+                if alibi is not None:
+                    s[j] += alibi[h] * (j - seq_len + 1)
+                if window_size > 0 and j < seq_len - window_size:
+                    s[j] = float("-inf")
+            o[b, h] = (torch.softmax(s, dim=0) @ v[:, kv_h].float()).to(q.dtype)
+    return o
+
+
+def test_paged_attention_group_sizes():
+    seq_lens = [1, 17, 128, 300]
+    for group_size in range(1, 17):
+        inputs, _ = make_inputs(4, 2, group_size, 128, 128, seq_lens, seed=group_size)
+        o = ref.paged_attention(*inputs)
+        o_naive = naive_paged_attention(*inputs)
+        torch.testing.assert_close(o, o_naive, atol=1e-3, rtol=1e-3)
+
+
+def test_paged_attention_window_alibi():
+    seq_lens = [1, 100, 129, 700]
+    inputs, _ = make_inputs(4, 2, 4, 128, 128, seq_lens)
+    slopes = ref.alibi_slopes(8)
+    for window_size in [0, 1, 64, 128, 300]:
+        o = ref.paged_attention(*inputs, alibi_slopes=slopes, window_size=window_size)
+        o_naive = naive_paged_attention(*inputs, slopes, window_size)
+        torch.testing.assert_close(o, o_naive, atol=1e-3, rtol=1e-3)
+
+
+def test_paged_attention_multi_query():
+    # verify step: 4 query rows per sequence, each row sees the kv up to its own position
+    num_query_tokens = 4
+    seq_lens = [4, 17, 128, 300]
+    (_, key_cache, value_cache, block_tables, context_lens), _ = make_inputs(
+        4, 2, 4, 128, 128, seq_lens
+    )
+    q = torch.randn(4 * num_query_tokens, 8, 128, dtype=torch.float16)
+    rows = torch.arange(4 * num_query_tokens)
+    row_block_tables = block_tables[rows // num_query_tokens]
+    row_context_lens = context_lens[rows // num_query_tokens] - (
+        num_query_tokens - 1 - rows % num_query_tokens
+    ).to(torch.int32)
+    slopes = ref.alibi_slopes(8)
+    for window_size in [0, 2, 64]:
+        o = ref.paged_attention(
+            q,
+            key_cache,
+            value_cache,
+            block_tables,
+            context_lens,
+            alibi_slopes=slopes,
+            window_size=window_size,
+        )
+        o_naive = naive_paged_attention(
+            q,
+            key_cache,
+            value_cache,
+            row_block_tables,
+            row_context_lens,
+            slopes,
+            window_size,
+        )
+        torch.testing.assert_close(o, o_naive, atol=1e-3, rtol=1e-3)
+
+
+def test_free_window_pages():
+    window_size = 200
+    (q, key_cache, value_cache, _, _), manager = make_inputs(
+        2, 2, 4, 128, 128, [700, 50]
+    )
+    seq_ids = [0, 1]
+    block_tables = manager.get_block_tables(seq_ids, device="cpu")
+    context_lens = manager.get_context_lens(seq_ids, device="cpu")
+    o = ref.paged_attention(
+        q, key_cache, value_cache, block_tables, context_lens, window_size=window_size
+    )
+
+    assert num_freeable_pages(700, window_size, 128) == 3
+    freed = manager.free_window_pages(0, window_size)
+    assert len(freed) == 3 and manager.free_window_pages(1, window_size) == []
+    # freed pages may be reused by other sequences
+    key_cache[freed] = torch.randn_like(key_cache[freed])
+    block_tables = manager.get_block_tables(seq_ids, device="cpu")
+    o_freed = ref.paged_attention(
+        q, key_cache, value_cache, block_tables, context_lens, window_size=window_size
+    )
+    torch.testing.assert_close(o_freed, o)
+    manager.free(0)
+    assert manager.num_free_pages == manager.layout.num_pages - 1
+
+
+if __name__ == "__main__":
+    import torch_npu
+
+    import ascend910a_extras.ops as ops
+
+    seq_lens = [1, 17, 128, 300]
+    for group_size in [1, 2, 4, 7, 8, 12, 16, 32]:
+        inputs, _ = make_inputs(4, 8, group_size, 128, 128, seq_lens)
+        o_ref = ref.paged_attention(*inputs)
+        o = ops.paged_attention(*[x.npu() for x in inputs])
+        torch.npu.synchronize()
+        torch.testing.assert_close(o.cpu(), o_ref, atol=1e-2, rtol=1e-2)
+        print(f"PASS: paged_attention group_size={group_size}")
+
+    inputs, _ = make_inputs(4, 8, 4, 128, 128, [1, 100, 129, 700])
+    slopes = ref.alibi_slopes(32)
+    for window_size in [0, 64, 300]:
+        o_ref = ref.paged_attention(
+            *inputs, alibi_slopes=slopes, window_size=window_size
+        )
+        o = ops.paged_attention(
+            *[x.npu() for x in inputs],
+            alibi_slopes=slopes.npu(),
+            window_size=window_size,
+        )
+        torch.npu.synchronize()
+        torch.testing.assert_close(o.cpu(), o_ref, atol=1e-2, rtol=1e-2)
+        print(f"PASS: paged_attention alibi window_size={window_size}")
+
+    inputs, _ = make_inputs(4, 8, 4, 128, 128, [5, 100, 129, 700])
+    q = torch.randn(4 * 5, 32, 128, dtype=torch.float16)
+    o_ref = ref.paged_attention(q, *inputs[1:])
+    o = ops.paged_attention(q.npu(), *[x.npu() for x in inputs[1:]])
+    torch.npu.synchronize()
+    torch.testing.assert_close(o.cpu(), o_ref, atol=1e-2, rtol=1e-2)
+    print("PASS: paged_attention num_query_tokens=5")
@@ -0,0 +1,104 @@
+import pytest
+
+import ascend910a_extras.profile as profile
+
+
+class FakeNative:
+    # the counters of ascend910a_extras_C.profile, fed by hand
+    compiled = True
+
+    def __init__(self):
+        self.mode = 0
+        self.level = 1
+        self.stats = {}
+
+    def set_mode(self, mode):
+        self.mode = mode
+
+    def get_mode(self):
+        return self.mode
+
+    def set_log_level(self, level):
+        self.level = level
+
+    def get_log_level(self):
+        return self.level
+
+    def snapshot(self):
+        return {name: dict(s) for name, s in self.stats.items()}
+
+    def reset(self):
+        self.stats = {}
+
+
+@pytest.fixture
+def native(monkeypatch):
+    fake = FakeNative()
+    monkeypatch.setattr(profile, "_native", lambda: fake)
+    return fake
+
+
+def stats(calls, create, workspace, launch, device=0, device_calls=0):
+    return {
+        "calls": calls,
+        "create_ns": create,
+        "workspace_ns": workspace,
+        "launch_ns": launch,
+        "device_ns": device,
+        "device_calls": device_calls,
+    }
+
+
+def test_profiled(native):
+    native.stats["rope"] = stats(1, 1, 1, 1)
+    with profile.profiled("device"):
+        assert profile.get_mode() == "device"
+        assert native.stats == {}
+        native.stats["rope"] = stats(2, 3000, 1000, 6000, 8000, 2)
+    assert profile.get_mode() == "off"
+    snap = profile.snapshot()
+    assert snap["rope"]["host_ns"] == 10000
+    with pytest.raises(ValueError, match="mode must be one of"):
+        profile.set_mode("on")
+    profile.set_log_level("debug")
+    assert native.level == 3 and profile.get_log_level() == "debug"
+
+
+def test_format_table(native):
+    native.stats["rope"] = stats(2, 3000, 1000, 6000, 8000, 2)
+    native.stats["paged_attention"] = stats(1, 20000, 5000, 15000)
+    lines = profile.format_table(profile.snapshot()).splitlines()
+    assert lines[0].split()[:2] == ["op", "calls"]
+    # by total host time, us per call, no device time outside device mode
+    assert lines[1].split() == ["paged_attention", "1", "20.00", "5.00", "15.00"] + [
+        "40.00",
+        "-",
+    ]
+    assert lines[2].split() == ["rope", "2", "1.50", "0.50", "3.00", "5.00", "4.00"]
+
+
+if __name__ == "__main__":
+    import torch
+    import torch_npu
+
+    import ascend910a_extras.ops as ops
+
+    q = torch.randn(8, 32, 128, dtype=torch.float16).npu()
+    k = torch.randn(8, 8, 128, dtype=torch.float16).npu()
+    position_ids = torch.arange(8, dtype=torch.int32).npu()
+    cos = torch.randn(1024, 64, dtype=torch.float16).npu()
+    sin = torch.randn(1024, 64, dtype=torch.float16).npu()
+    x = torch.randn(8, 4096, dtype=torch.float16).npu()
+    ops.rope(q, k, position_ids, cos, sin)
+    for mode in ["off", "host", "device"]:
+        with profile.profiled(mode):
+            for _ in range(100):
+                ops.rope_(q, k, position_ids, cos, sin)
+                ops.swiglu(x)
+        snap = profile.snapshot()
+        print(f"mode {mode}\n{profile.format_table(snap)}")
+        if mode == "off":
+            assert snap == {}
+        else:
+            assert snap["rope"]["calls"] == 100 and snap["swiglu"]["calls"] == 100
+            assert (snap["rope"]["device_calls"] == 100) == (mode == "device")
@@ -1,6 +1,7 @@
 import torch
 
 import ascend910a_extras.ops as ops
+import ascend910a_extras.ref as ref
 
 
 def reference_reshape_and_cache(
@@ -82,3 +83,44 @@ if __name__ == "__main__":
         rtol=1e-6,
     )
     print("PASS: only key, key_cache matched, value_cache all zero.")
+
+    # int8 kv cache, quantized on write
+    key3 = torch.randn(num_tokens, num_kv_heads, head_size, dtype=torch.float16)
+    value3 = torch.randn(num_tokens, num_kv_heads, head_size, dtype=torch.float16)
+    key_cache_cpu3 = torch.zeros(num_blocks, block_size, nh16, 16, dtype=torch.int8)
+    value_cache_cpu3 = torch.zeros_like(key_cache_cpu3)
+    key_scale_cpu3 = torch.ones(num_blocks, num_kv_heads, nh16, dtype=torch.float16)
+    value_scale_cpu3 = torch.ones_like(key_scale_cpu3)
+    key_cache3_npu = torch.zeros_like(key_cache_cpu3, device="npu")
+    value_cache3_npu = torch.zeros_like(value_cache_cpu3, device="npu")
+    key_scale3_npu = torch.ones_like(key_scale_cpu3, device="npu")
+    value_scale3_npu = torch.ones_like(value_scale_cpu3, device="npu")
+    ref.reshape_and_cache(
+        key3,
+        value3,
+        key_cache_cpu3,
+        value_cache_cpu3,
+        slot_indices,
+        key_scale_cpu3,
+        value_scale_cpu3,
+    )
+    ops.reshape_and_cache(
+        key3.to("npu"),
+        value3.to("npu"),
+        key_cache3_npu,
+        value_cache3_npu,
+        slot_indices.to("npu"),
+        key_scale3_npu,
+        value_scale3_npu,
+    )
+    torch.npu.synchronize()
+    # rounding of .5 may differ by one step
+    torch.testing.assert_close(
+        key_cache3_npu.cpu().int(), key_cache_cpu3.int(), atol=1, rtol=0
+    )
+    torch.testing.assert_close(
+        value_cache3_npu.cpu().int(), value_cache_cpu3.int(), atol=1, rtol=0
+    )
+    torch.testing.assert_close(key_scale3_npu.cpu(), key_scale_cpu3)
+    torch.testing.assert_close(value_scale3_npu.cpu(), value_scale_cpu3)
+    print("PASS: int8 key_cache/value_cache and scales matched.")
@@ -0,0 +1,99 @@
+import ast
+from pathlib import Path
+
+import pytest
+
+import ascend910a_extras
+from ascend910a_extras.roofline import COSTS, Platform, percent_of_roofline, predict
+
+
+def test_every_op_has_a_cost():
+    # ops.py needs torch_npu, read its functions from the source
+    path = Path(ascend910a_extras.__file__).parent / "ops.py"
+    tree = ast.parse(path.read_text())
+    ops = [n.name for n in tree.body if isinstance(n, ast.FunctionDef)]
+    ops = [name for name in ops if not name.startswith("_")]
+    assert set(ops) - {"print_info"} <= set(COSTS)
+
+
+def test_saved_profile(tmp_path):
+    platform = Platform.load()
+    assert platform.name == "ascend910a" and platform.aic_num == 32
+    assert platform.cube_tflops == pytest.approx(262.144)
+    platform.save(tmp_path / "p.json")
+    assert Platform.load(str(tmp_path / "p.json")) == platform
+
+
+def test_from_device_keeps_profile_bandwidth(monkeypatch):
+    import ascend910a_extras.ops as ops
+
+    info = {"aic_num": 30, "aiv_num": 30, "cube_freq_mhz": 0}
+    info["mem_size"] = {"hbm": 1 << 35}
+    # a figure in some platform unit, not GB/s
+    info["mem_bw"] = {"hbm": 64}
+    monkeypatch.setattr(ops, "print_info", lambda: info)
+    platform = Platform.from_device()
+    assert platform.aic_num == 30 and platform.freq_mhz == Platform.load().freq_mhz
+    assert platform.hbm_gb_s == Platform.load().hbm_gb_s
+    assert platform.mem_bw == {"hbm": 64}
+    assert Platform.from_device(hbm_gb_s=1600.0).hbm_gb_s == 1600.0
+
+
+def test_predict():
+    platform = Platform.load()
+    # decode attention and gemv are memory bound, big gemm is compute bound
+    p = predict(
+        "paged_attention",
+        platform,
+        bs=16,
+        num_heads=32,
+        num_kv_heads=8,
+        head_dim=128,
+        context_len=2048,
+    )
+    assert p.bound == "memory"
+    assert p.time == pytest.approx(p.bytes / (platform.hbm_gb_s * 1e9))
+    assert (
+        predict("weight_quant_matmul", platform, m=1, n=4096, k=4096).bound == "memory"
+    )
+    p = predict(
+        "grouped_matmul",
+        platform,
+        num_tokens=8192,
+        dim=4096,
+        inner_dim=4096,
+        num_experts=1,
+    )
+    assert p.bound == "compute" and p.tflops == pytest.approx(platform.cube_tflops)
+    # int8 weights halve the weight traffic of a gemv
+    fp16 = predict(
+        "grouped_matmul",
+        platform,
+        num_tokens=1,
+        dim=4096,
+        inner_dim=4096,
+        num_experts=1,
+    )
+    int8 = predict(
+        "weight_quant_grouped_matmul",
+        platform,
+        num_tokens=1,
+        dim=4096,
+        inner_dim=4096,
+        num_experts=1,
+    )
+    assert int8.time < 0.6 * fp16.time
+    assert (
+        percent_of_roofline("swiglu", 2 * p.time, platform, num_tokens=8, dim=8) < 100
+    )
+    assert (
+        percent_of_roofline(
+            "copy_blocks",
+            fp16.time,
+            platform,
+            num_layers=1,
+            num_pairs=1,
+            page_bytes=1 << 20,
+        )
+        > 0
+    )
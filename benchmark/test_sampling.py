@@ -0,0 +1,115 @@
+import torch
+
+import ascend910a_extras.ref as ref
+
+
+def make_params(bs, temperature=1.0, top_k=0, top_p=1.0, repetition_penalty=1.0):
+    return (
+        torch.full((bs,), temperature),
+        torch.full((bs,), top_k, dtype=torch.int32),
+        torch.full((bs,), top_p),
+        torch.full((bs,), repetition_penalty),
+    )
+
+
+def naive_allowed(logits, temperature, top_k, top_p):
+    # tokens a sampler may return for one row, sorted probability order
+    probs = torch.softmax(logits.float() / temperature, dim=-1)
+    sorted_probs, sorted_ids = torch.sort(probs, descending=True)
+    if 0 < top_k < probs.numel():
+        keep = sorted_probs >= sorted_probs[top_k - 1]
+        sorted_probs, sorted_ids = sorted_probs[keep], sorted_ids[keep]
+    mass = sorted_probs.cumsum(0) / sorted_probs.sum()
+    n = min(int((mass < top_p).sum()) + 1, mass.numel())
+    return set(sorted_ids[sorted_probs >= sorted_probs[n - 1]].tolist())
+
+
+def test_greedy():
+    torch.manual_seed(0)
+    logits = torch.randn(8, 1024, dtype=torch.float16)
+    expected = logits.float().argmax(dim=-1).int()
+    ids = ref.sampling(logits, *make_params(8, temperature=0.0))
+    assert (ids == expected).all()
+    ids = ref.sampling(logits, *make_params(8, top_k=1))
+    assert (ids == expected).all()
+
+
+def test_seeded():
+    torch.manual_seed(0)
+    logits = torch.randn(16, 1024, dtype=torch.float16)
+    params = make_params(16, temperature=0.8, top_k=50, top_p=0.9)
+    ids = ref.sampling(logits, *params, seed=1)
+    assert (ref.sampling(logits, *params, seed=1) == ids).all()
+    assert (ref.sampling(logits, *params, seed=2) != ids).any()
+
+
+def test_top_k_top_p():
+    torch.manual_seed(0)
+    logits = torch.randn(64, 512, dtype=torch.float16) * 4
+    for top_k, top_p in [(0, 1.0), (5, 1.0), (0, 0.5), (20, 0.8), (512, 0.95)]:
+        ids = ref.sampling(logits, *make_params(64, 0.7, top_k, top_p), seed=top_k)
+        for b in range(64):
+            assert int(ids[b]) in naive_allowed(logits[b], 0.7, top_k, top_p)
+
+
+def test_distribution():
+    logits = torch.randn(64, dtype=torch.float16).repeat(20000, 1)
+    ids = ref.sampling(logits, *make_params(20000, top_k=8))
+    probs = torch.softmax(logits[0].float(), dim=-1)
+    top = probs.topk(8)
+    freq = torch.bincount(ids.long(), minlength=64).float() / 20000
+    others = torch.ones(64, dtype=torch.bool)
+    others[top.indices] = False
+    assert (freq[others] == 0).all()
+    torch.testing.assert_close(
+        freq[top.indices], top.values / top.values.sum(), atol=0.02, rtol=0
+    )
+
+
+def test_repetition_penalty():
+    logits = torch.zeros(1, 64, dtype=torch.float16)
+    logits[0, :4] = torch.tensor([2.0, -2.0, 1.0, 0.5])
+    penalty_token_ids = torch.tensor([[0, 1, 0, -1]], dtype=torch.int32)
+    penalized = ref.apply_repetition_penalty(
+        logits, penalty_token_ids, torch.tensor([2.0])
+    )
+    # repeated ids are penalized once
+    assert penalized[0, :4].tolist() == [1.0, -4.0, 1.0, 0.5]
+    ids = ref.sampling(
+        logits,
+        *make_params(1, temperature=0.0, repetition_penalty=4.0),
+        penalty_token_ids=penalty_token_ids,
+    )
+    assert ids.tolist() == [2]
+
+
+if __name__ == "__main__":
+    import torch_npu
+
+    import ascend910a_extras.ops as ops
+
+    torch.manual_seed(0)
+    bs, vocab = 32, 151936
+    logits = torch.randn(bs, vocab, dtype=torch.float16) * 3
+    penalty_token_ids = torch.randint(-1, vocab, (bs, 256), dtype=torch.int32)
+    uniform = torch.rand(bs)
+    for temperature, top_k, top_p, repetition_penalty in [
+        (0.0, 0, 1.0, 1.0),
+        (1.0, 0, 1.0, 1.0),
+        (0.7, 50, 1.0, 1.0),
+        (0.7, 0, 0.9, 1.0),
+        (0.6, 20, 0.95, 1.1),
+    ]:
+        params = make_params(bs, temperature, top_k, top_p, repetition_penalty)
+        ids_ref = ref.sampling(logits, *params, uniform, penalty_token_ids)
+        ids = ops.sampling(
+            logits.npu(),
+            *[x.npu() for x in params],
+            uniform.npu(),
+            penalty_token_ids.npu(),
+        )
+        torch.npu.synchronize()
+        # the cdf is summed in a different order, a draw right at a boundary may move one token
+        mismatch = int((ids.cpu() != ids_ref).sum())
+        assert mismatch <= 1, f"{mismatch=}"
+        print(f"PASS: sampling {temperature=} {top_k=} {top_p=} {repetition_penalty=}")
@@ -0,0 +1,96 @@
+import json
+import math
+from dataclasses import replace
+
+from ascend910a_extras.serve_bench import (
+    MODELS,
+    SimulatedExecutor,
+    main,
+    percentiles,
+    poisson_requests,
+    serve,
+    step_kernels,
+)
+
+TINY = MODELS["tiny"]
+
+
+def test_percentiles():
+    p = percentiles([4.0, 1.0, 3.0, 2.0, 5.0])
+    assert p == {"mean": 3.0, "p50": 3.0, "p90": 4.6, "p99": 4.96}
+    assert percentiles([])["p99"] == 0.0
+
+
+def test_poisson_requests():
+    requests = poisson_requests(100, rate=10.0, prompt_len=(8, 64), seed=3)
+    arrivals = [r.arrival for r in requests]
+    assert arrivals == sorted(arrivals) and arrivals[0] > 0
+    # about 10 per second
+    assert 5 < arrivals[-1] < 20
+    assert all(8 <= r.prompt_len <= 64 for r in requests)
+    again = poisson_requests(100, rate=10.0, prompt_len=(8, 64), seed=3)
+    assert [r.prompt_len for r in again] == [r.prompt_len for r in requests]
+    assert {r.arrival for r in poisson_requests(4)} == {0.0}
+
+
+def test_step_time():
+    sim = SimulatedExecutor(TINY, 8, TINY.kv_layout(16))
+    kernels = step_kernels(TINY, [1] * 8)
+    # embedding, 12 kernels per dense layer, final norm, lm head and sampling
+    assert len(kernels) == 1 + 12 * TINY.num_layers + 3
+    assert sim.step_time([1024] * 8) > sim.step_time([64] * 8)
+    assert sim.step_time([64] * 8) > sim.step_time([64] * 4)
+    moe = replace(TINY, num_experts=4)
+    assert len(step_kernels(moe, [1])) == 1 + 16 * TINY.num_layers + 3
+
+
+def test_serve_sim():
+    requests = poisson_requests(
+        12, rate=1000.0, prompt_len=(1, 300), output_len=(1, 20)
+    )
+    sim = SimulatedExecutor(TINY, 4, TINY.kv_layout(32, page_size=16))
+    report = serve(requests, sim)
+    assert all(len(r.tokens) == r.max_new_tokens for r in requests)
+    assert report.output_tokens == sum(r.max_new_tokens for r in requests)
+    assert 1 <= report.mean_batch <= 4
+    assert report.num_steps >= math.ceil(report.output_tokens / 4)
+    assert report.throughput > 0 and report.duration > 0
+    assert 0 < report.ttft["p50"] <= report.ttft["p99"]
+    assert report.itl["p50"] > 0
+    assert report.stages["device"] > 0
+    assert all(r.ttft >= 0 for r in requests)
+
+
+def test_serve_preempts():
+    # 4 long requests do not fit together, the newest ones are preempted and finish later
+    requests = poisson_requests(4, prompt_len=100, output_len=60)
+    sim = SimulatedExecutor(TINY, 4, TINY.kv_layout(25, page_size=16))
+    report = serve(requests, sim)
+    assert report.num_preempted > 0
+    assert all(len(r.tokens) == 60 for r in requests)
+    assert requests[0].num_preempted == 0
+
+
+def test_main(tmp_path, capsys):
+    out = tmp_path / "serve.json"
+    args = ["--model", "tiny", "--batch-size", "1", "4", "--prompt-len", "16", "64"]
+    args += ["--output-len", "8", "--rate", "100", "--out", str(out)]
+    assert main(args + ["num_layers=1"]) == 0
+    data = json.loads(out.read_text())
+    assert data["model"]["num_layers"] == 1
+    assert [(r["batch_size"], r["prompt_len"]) for r in data["reports"]] == [
+        (1, 16),
+        (1, 64),
+        (4, 16),
+        (4, 64),
+    ]
+    assert all(r["throughput"] > 0 for r in data["reports"])
+    assert "tok/s" in capsys.readouterr().out
+
+
+if __name__ == "__main__":
+    import torch_npu
+
+    # a 2 layer qwen3-8b on the device against the simulator
+    for executor in ["sim", "graph"]:
+        main(["--executor", executor, "--batch-size", "1", "8", "num_layers=2"])
@@ -0,0 +1,46 @@
+import torch
+
+from ascend910a_extras.kv_cache import BlockManager, KVCacheLayout
+from ascend910a_extras.speculative import (
+    accept_draft_tokens,
+    rollback_rejected,
+    verify_inputs,
+)
+
+
+def test_accept_draft_tokens():
+    draft = torch.tensor([[5, 6, 7], [5, 6, 7], [1, 2, 3]])
+    target = torch.tensor([[5, 6, 7, 8], [5, 9, 7, 8], [4, 2, 3, 0]])
+    num_accepted, tokens = accept_draft_tokens(draft, target)
+    assert num_accepted.tolist() == [3, 1, 0]
+    # accepted drafts and the bonus or corrected token
+    assert tokens == [[5, 6, 7, 8], [5, 9], [4]]
+
+
+def test_verify_and_rollback():
+    layout = KVCacheLayout(1, 2, 128, page_size=16, num_pages=8)
+    manager = BlockManager(layout)
+    manager.append_slots(0, 14)
+    manager.append_slots(1, 3)
+    k = 4
+    inputs = verify_inputs(
+        manager,
+        [0, 1],
+        torch.tensor([100, 200]),
+        torch.tensor([[1, 2, 3, 4], [5, 6, 7, 8]]),
+        device="cpu",
+    )
+    assert inputs["token_ids"].tolist() == [100, 1, 2, 3, 4, 200, 5, 6, 7, 8]
+    assert inputs["position_ids"].tolist() == list(range(14, 19)) + list(range(3, 8))
+    assert inputs["context_lens"].tolist() == [19, 8]
+    # seq 0 crossed into a second page
+    assert manager.block_tables[0] == [0, 2]
+    assert inputs["slot_mapping"][:5].tolist() == [14, 15, 32, 33, 34]
+
+    freed = rollback_rejected(manager, [0, 1], torch.tensor([1, 4]), k)
+    # seq 0 keeps 14 + 1 + 1 tokens, the second page is empty again
+    assert manager.context_lens == {0: 16, 1: 8}
+    assert freed == [2] and manager.block_tables[0] == [0]
+    assert manager.num_free_pages == 6
+    assert manager.append_slots(0, 1) == [32]
+    assert manager.rollback(1, 8) == [1] and manager.context_lens[1] == 0
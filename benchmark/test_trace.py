@@ -0,0 +1,180 @@
+import gzip
+import json
+
+from ascend910a_extras.trace import (
+    diff,
+    idle,
+    iter_events,
+    launch_bound_stretches,
+    load,
+    main,
+    node_stats,
+    op_stats,
+    step_idle,
+)
+
+HOST, DEVICE = 1, 2
+
+
+def make_trace(kernels, step=(0, 1000)):
+    # kernels: (name, device ts, dur, host launch ts or None), launched from a graph node range
+    events = [
+        {"ph": "M", "name": "process_name", "pid": HOST, "args": {"name": "Python"}},
+        {
+            "ph": "M",
+            "name": "process_name",
+            "pid": DEVICE,
+            "args": {"name": "Ascend Hardware"},
+        },
+        {
+            "ph": "X",
+            "name": "ProfilerStep#1",
+            "pid": HOST,
+            "tid": 7,
+            "ts": str(step[0]),
+            "dur": step[1] - step[0],
+        },
+    ]
+    for i, (name, ts, dur, launch_ts) in enumerate(kernels):
+        events.append(
+            {"ph": "X", "name": name, "pid": DEVICE, "tid": 0, "ts": ts, "dur": dur}
+        )
+        if launch_ts is None:
+            continue
+        events += [
+            {
+                "ph": "X",
+                "name": f"node_{name}",
+                "pid": HOST,
+                "tid": 7,
+                "ts": launch_ts - 2,
+                "dur": 4,
+            },
+            {
+                "ph": "X",
+                "name": f"aclnn{name}",
+                "pid": HOST,
+                "tid": 7,
+                "ts": launch_ts - 1,
+                "dur": 2,
+            },
+            {
+                "ph": "s",
+                "cat": "HostToDevice",
+                "id": i,
+                "pid": HOST,
+                "tid": 7,
+                "ts": launch_ts,
+            },
+            {
+                "ph": "f",
+                "cat": "HostToDevice",
+                "id": i,
+                "pid": DEVICE,
+                "tid": 0,
+                "ts": ts,
+                "bp": "e",
+            },
+        ]
+    return events
+
+
+# a device-bound start, then a launch-bound tail where each kernel is launched after the previous ended
+KERNELS = [
+    ("MatMul", 100, 50, 10),
+    ("SwiGluEx", 150, 10, 20),
+    ("MatMul", 160, 50, 30),
+    ("AddRMSNormEx", 220, 5, 215),
+    ("SwiGluEx", 235, 5, 230),
+    ("AddRMSNormEx", 250, 5, 245),
+    ("SwiGluEx", 265, 5, 260),
+    ("Cast", 300, 10, None),
+]
+
+
+def write(path, events, wrapped=True):
+    data = {"displayTimeUnit": "ms", "traceEvents": events, "deviceProperties": []}
+    text = json.dumps(data if wrapped else events, indent=1)
+    if str(path).endswith(".gz"):
+        with gzip.open(path, "wt") as f:
+            f.write(text)
+    else:
+        path.write_text(text)
+    return path
+
+
+def test_iter_events(tmp_path):
+    events = make_trace(KERNELS)
+    for name, wrapped in [("a.json", True), ("b.json", False), ("c.json.gz", True)]:
+        path = write(tmp_path / name, events, wrapped)
+        # values straddle the chunk boundaries
+        for chunk_size in [1, 7, 1 << 20]:
+            assert list(iter_events(path, chunk_size)) == events
+    path = tmp_path / "empty.json"
+    path.write_text('{"schemaVersion": 1, "traceEvents": []}')
+    assert list(iter_events(path)) == []
+
+
+def test_op_and_node_stats(tmp_path):
+    trace = load(write(tmp_path / "trace.json", make_trace(KERNELS)), chunk_size=64)
+    assert len(trace.kernels) == len(KERNELS)
+    stats = {s.name: s for s in op_stats(trace)}
+    assert stats["MatMul"].count == 2 and stats["MatMul"].total == 100
+    assert stats["SwiGluEx"].count == 3 and stats["SwiGluEx"].max == 10
+    assert op_stats(trace)[0].name == "MatMul"
+
+    nodes = {s.name: s for s in node_stats(trace)}
+    assert nodes["node_MatMul/aclnnMatMul"].count == 2
+    assert nodes["node_SwiGluEx/aclnnSwiGluEx"].count == 3
+    assert nodes[""].count == 1 and nodes[""].total == 10
+
+
+def test_idle_and_stretches(tmp_path):
+    trace = load(write(tmp_path / "trace.json", make_trace(KERNELS)))
+    (d,) = idle(trace)
+    assert d.span == 310 - 100
+    assert d.busy == 50 + 10 + 50 + 5 + 5 + 5 + 5 + 10
+    assert [g.idle for g in d.gaps] == [10, 10, 10, 10, 30]
+    # the Cast has no flow
+    assert [g.host_bound for g in d.gaps] == [True, True, True, True, False]
+    assert d.host_bound_idle == 40
+    assert abs(d.idle_fraction - 70 / 210) < 1e-9
+
+    (s,) = launch_bound_stretches(trace, min_kernels=4)
+    assert [k.name for k in s.kernels] == [
+        "MatMul",
+        "AddRMSNormEx",
+        "SwiGluEx",
+        "AddRMSNormEx",
+        "SwiGluEx",
+    ]
+    assert s.idle == 40 and s.span == 270 - 160
+    assert launch_bound_stretches(trace, min_kernels=6) == []
+    assert launch_bound_stretches(trace, min_gap=10) == []
+
+    ((name, (step,)),) = step_idle(trace)
+    assert name == "ProfilerStep#1" and len(step.gaps) == 5
+
+
+def test_diff(tmp_path, capsys):
+    a = write(tmp_path / "a.json", make_trace(KERNELS))
+    faster = [
+        (n, ts, dur // 2 if n == "MatMul" else dur, l) for n, ts, dur, l in KERNELS
+    ]
+    b = write(tmp_path / "b.json", make_trace(faster + [("Mul", 400, 1, None)]))
+    rows = diff(load(a), load(b))
+    assert rows[0].name == "MatMul" and rows[0].delta == -50 and rows[0].ratio == 0.5
+    assert {r.name: r.delta for r in rows}["Mul"] == 1
+    assert {r.name for r in rows} == {
+        "MatMul",
+        "SwiGluEx",
+        "AddRMSNormEx",
+        "Cast",
+        "Mul",
+    }
+
+    assert main(["diff", str(a), str(b), "--by", "node"]) == 0
+    assert main(["summary", str(a)]) == 0
+    assert main(["gaps", str(a), "--min-kernels", "3"]) == 0
+    out = capsys.readouterr().out
+    assert "ProfilerStep#1" in out and "node_MatMul/aclnnMatMul" in out
@@ -0,0 +1,49 @@
+import torch
+
+import ascend910a_extras.ops as ops
+import ascend910a_extras.ref as ref
+from ascend910a_extras.quantize import quantize_weight
+
+torch.manual_seed(0)
+
+device = "npu"
+dtype = torch.float16
+
+# dense, per-channel and group-wise
+num_tokens = 4
+dim = 4096
+inner_dim = 6144
+for group_size in [0, 128]:
+    x = torch.randn(num_tokens, dim, dtype=dtype)
+    w = torch.randn(inner_dim, dim, dtype=dtype) * 0.02
+    w_q, scale = quantize_weight(w, group_size)
+
+    y_ref = ref.weight_quant_matmul(x, w_q, scale)
+    y_fp16 = torch.matmul(x.float(), w.float().T).to(dtype)
+    print(f"{group_size=} quant error: {(y_ref - y_fp16).abs().max()}")
+
+    y = ops.weight_quant_matmul(x.to(device), w_q.to(device), scale.to(device)).cpu()
+    torch.testing.assert_close(y_ref, y, atol=1e-2, rtol=1e-2)
+    print(f"PASS: weight_quant_matmul {group_size=}")
+
+# grouped
+num_tokens = 1024
+dim = 2048
+inner_dim = 768
+num_exports = 16
+group_size = 128
+x = torch.randn(num_tokens, dim, dtype=dtype)
+w = torch.randn(num_exports, inner_dim, dim, dtype=dtype) * 0.02
+w_q, scale = quantize_weight(w, group_size)
+
+probs = torch.ones(num_exports, dtype=torch.float)
+sample = torch.multinomial(probs, num_samples=num_tokens, replacement=True)
+counts = torch.bincount(sample, minlength=num_exports)
+group_list = counts.cumsum(dim=0).to(dtype=torch.int64)
+
+y_ref = ref.weight_quant_grouped_matmul(x, w_q, scale, group_list)
+y = ops.weight_quant_grouped_matmul(
+    x.to(device), w_q.to(device), scale.to(device), group_list.to(device)
+).cpu()
+torch.testing.assert_close(y_ref, y, atol=1e-2, rtol=1e-2)
+print("PASS: weight_quant_grouped_matmul")
@@ -1,10 +1,23 @@
 #include <acl/acl.h>
 #include <atb/atb_infer.h>
 #include <atb/operation.h>
+#include <mutex>
 
 #include "aclnn_swi_glu_ex.h"
 #include "aclnn_rope_ex.h"
+#include "aclnn_weight_quant_mat_mul_ex.h"
+#include "aclnn_grouped_mat_mul_ex.h"
+#include "aclnn_weight_quant_grouped_mat_mul_ex.h"
+#include "aclnn_moe_gating_top_k_ex.h"
+#include "aclnn_moe_permute_ex.h"
+#include "aclnn_moe_unpermute_ex.h"
+#include "aclnn_sampling_ex.h"
+#include "aclnn_paged_attention_ex.h"
+#include "aclnn_fused_qkv_ex.h"
+#include "aclnn_mat_mul_add_ex.h"
+#include "aclnn_fused_gate_up_ex.h"
 #include "dbg/dbg.h"
+#include "profile.h"
 
 namespace native {
 
@@ -117,7 +130,7 @@ public:
 
 class SwiGluEx: public AclnnOp {
 public:
-  SwiGluEx(const std::string& name = "SwiGluEx"): AclnnOp(name) {}
+  SwiGluEx(const std::string& name = "SwiGluEx", int64_t block_size = 0, int64_t core_num = 0): AclnnOp(name), block_size(block_size), core_num(core_num) {}
   atb::Status InferShape(const atb::SVector<atb::TensorDesc> &in_tensor_descs, atb::SVector<atb::TensorDesc> &out_tensor_descs) const override {
     out_tensor_descs[0] = in_tensor_descs[0];
     out_tensor_descs[0].shape.dims[out_tensor_descs[0].shape.dimNum - 1] = out_tensor_descs[0].shape.dims[out_tensor_descs[0].shape.dimNum - 1] / 2;
@@ -131,7 +144,7 @@ public:
   }
 
   atb::Status SetAclnnWorkspaceAndExecutor() override {
-    if (aclnnSwiGluExGetWorkspaceSize(in_tensors[0]->acl_tensor, out_tensors[0]->acl_tensor, &workspace_size, &acl_executor) != ACL_SUCCESS) {
+    if (aclnnSwiGluExGetWorkspaceSize(in_tensors[0]->acl_tensor, block_size, core_num, out_tensors[0]->acl_tensor, &workspace_size, &acl_executor) != ACL_SUCCESS) {
       std::stringstream ss;
       ss << "Failed to get workspace size for SwiGluEx: " << aclGetRecentErrMsg();
       throw std::runtime_error(ss.str());
@@ -152,6 +165,10 @@ public:
     }
     return atb::NO_ERROR;
   }
+
+  // 0 = default tiling
+  int64_t block_size;
+  int64_t core_num;
 };
 
 class RopeEx: public AclnnOp {
@@ -195,4 +212,594 @@ public:
   }
 };
 
+class WeightQuantMatMulEx: public AclnnOp {
+public:
+  WeightQuantMatMulEx(const std::string& name = "WeightQuantMatMulEx"): AclnnOp(name) {}
+  atb::Status InferShape(const atb::SVector<atb::TensorDesc> &in_tensor_descs, atb::SVector<atb::TensorDesc> &out_tensor_descs) const override {
+    // x: [num_tokens, dim], w: [inner_dim, dim] int8 -> y: [num_tokens, inner_dim]
+    out_tensor_descs[0] = in_tensor_descs[0];
+    out_tensor_descs[0].shape.dims[1] = in_tensor_descs[1].shape.dims[0];
+    return atb::NO_ERROR;
+  }
+  uint32_t GetInputNum() const override {
+    // x, w, scale
+    return 3;
+  }
+  uint32_t GetOutputNum() const override {
+    return 1;
+  }
+
+  atb::Status SetAclnnWorkspaceAndExecutor() override {
+    if (aclnnWeightQuantMatMulExGetWorkspaceSize(in_tensors[0]->acl_tensor, in_tensors[1]->acl_tensor, in_tensors[2]->acl_tensor, out_tensors[0]->acl_tensor, &workspace_size, &acl_executor) != ACL_SUCCESS) {
+      std::stringstream ss;
+      ss << "Failed to get workspace size for WeightQuantMatMulEx: " << aclGetRecentErrMsg();
+      throw std::runtime_error(ss.str());
+    }
+    if (aclSetAclOpExecutorRepeatable(acl_executor) != ACL_SUCCESS) {
+      std::stringstream ss;
+      ss << "Failed to set ACL op executor repeatable for WeightQuantMatMulEx: " << aclGetRecentErrMsg();
+      throw std::runtime_error(ss.str());
+    }
+    return atb::NO_ERROR;
+  }
+
+  atb::Status ExecuteAclnnOp(uint8_t *workspace, aclrtStream stream) override {
+    if (aclnnWeightQuantMatMulEx(workspace, this->workspace_size, acl_executor, stream) != ACL_SUCCESS) {
+      std::stringstream ss;
+      ss << "Failed to execute WeightQuantMatMulEx: " << aclGetRecentErrMsg();
+      throw std::runtime_error(ss.str());
+    }
+    return atb::NO_ERROR;
+  }
+};
+
+class GroupedMatMulEx: public AclnnOp {
+public:
+  GroupedMatMulEx(const std::string& name = "GroupedMatMulEx"): AclnnOp(name) {}
+  atb::Status InferShape(const atb::SVector<atb::TensorDesc> &in_tensor_descs, atb::SVector<atb::TensorDesc> &out_tensor_descs) const override {
+    // x: [num_tokens, dim], w: [num_experts, inner_dim, dim] -> y: [num_tokens, inner_dim]
+    out_tensor_descs[0] = in_tensor_descs[0];
+    out_tensor_descs[0].shape.dims[1] = in_tensor_descs[1].shape.dims[1];
+    return atb::NO_ERROR;
+  }
+  uint32_t GetInputNum() const override {
+    // x, w, group_list
+    return 3;
+  }
+  uint32_t GetOutputNum() const override {
+    // y
+    return 1;
+  }
+
+  atb::Status SetAclnnWorkspaceAndExecutor() override {
+    if (aclnnGroupedMatMulExGetWorkspaceSize(in_tensors[0]->acl_tensor, in_tensors[1]->acl_tensor, in_tensors[2]->acl_tensor, out_tensors[0]->acl_tensor, &workspace_size, &acl_executor) != ACL_SUCCESS) {
+      std::stringstream ss;
+      ss << "Failed to get workspace size for GroupedMatMulEx: " << aclGetRecentErrMsg();
+      throw std::runtime_error(ss.str());
+    }
+    if (aclSetAclOpExecutorRepeatable(acl_executor) != ACL_SUCCESS) {
+      std::stringstream ss;
+      ss << "Failed to set ACL op executor repeatable for GroupedMatMulEx: " << aclGetRecentErrMsg();
+      throw std::runtime_error(ss.str());
+    }
+    return atb::NO_ERROR;
+  }
+
+  atb::Status ExecuteAclnnOp(uint8_t *workspace, aclrtStream stream) override {
+    if (aclnnGroupedMatMulEx(workspace, this->workspace_size, acl_executor, stream) != ACL_SUCCESS) {
+      std::stringstream ss;
+      ss << "Failed to execute GroupedMatMulEx: " << aclGetRecentErrMsg();
+      throw std::runtime_error(ss.str());
+    }
+    return atb::NO_ERROR;
+  }
+};
+
+class WeightQuantGroupedMatMulEx: public AclnnOp {
+public:
+  WeightQuantGroupedMatMulEx(const std::string& name = "WeightQuantGroupedMatMulEx"): AclnnOp(name) {}
+  atb::Status InferShape(const atb::SVector<atb::TensorDesc> &in_tensor_descs, atb::SVector<atb::TensorDesc> &out_tensor_descs) const override {
+    // x: [num_tokens, dim], w: [num_experts, inner_dim, dim] int8 -> y: [num_tokens, inner_dim]
+    out_tensor_descs[0] = in_tensor_descs[0];
+    out_tensor_descs[0].shape.dims[1] = in_tensor_descs[1].shape.dims[1];
+    return atb::NO_ERROR;
+  }
+  uint32_t GetInputNum() const override {
+    // x, w, scale, group_list
+    return 4;
+  }
+  uint32_t GetOutputNum() const override {
+    // y
+    return 1;
+  }
+
+  atb::Status SetAclnnWorkspaceAndExecutor() override {
+    if (aclnnWeightQuantGroupedMatMulExGetWorkspaceSize(in_tensors[0]->acl_tensor, in_tensors[1]->acl_tensor, in_tensors[2]->acl_tensor, in_tensors[3]->acl_tensor, out_tensors[0]->acl_tensor, &workspace_size, &acl_executor) != ACL_SUCCESS) {
+      std::stringstream ss;
+      ss << "Failed to get workspace size for WeightQuantGroupedMatMulEx: " << aclGetRecentErrMsg();
+      throw std::runtime_error(ss.str());
+    }
+    if (aclSetAclOpExecutorRepeatable(acl_executor) != ACL_SUCCESS) {
+      std::stringstream ss;
+      ss << "Failed to set ACL op executor repeatable for WeightQuantGroupedMatMulEx: " << aclGetRecentErrMsg();
+      throw std::runtime_error(ss.str());
+    }
+    return atb::NO_ERROR;
+  }
+
+  atb::Status ExecuteAclnnOp(uint8_t *workspace, aclrtStream stream) override {
+    if (aclnnWeightQuantGroupedMatMulEx(workspace, this->workspace_size, acl_executor, stream) != ACL_SUCCESS) {
+      std::stringstream ss;
+      ss << "Failed to execute WeightQuantGroupedMatMulEx: " << aclGetRecentErrMsg();
+      throw std::runtime_error(ss.str());
+    }
+    return atb::NO_ERROR;
+  }
+};
+
+class MoeGatingTopKEx: public AclnnOp {
+public:
+  MoeGatingTopKEx(int64_t top_k, bool renormalize, const std::string& name = "MoeGatingTopKEx"): AclnnOp(name), top_k(top_k), renormalize(renormalize) {}
+  atb::Status InferShape(const atb::SVector<atb::TensorDesc> &in_tensor_descs, atb::SVector<atb::TensorDesc> &out_tensor_descs) const override {
+    // logits: [num_tokens, num_experts] -> topk_weights: [num_tokens, top_k] fp32, topk_ids: [num_tokens, top_k] int32
+    out_tensor_descs[0] = in_tensor_descs[0];
+    out_tensor_descs[0].shape.dims[1] = top_k;
+    out_tensor_descs[0].dtype = ACL_FLOAT;
+    out_tensor_descs[1] = out_tensor_descs[0];
+    out_tensor_descs[1].dtype = ACL_INT32;
+    return atb::NO_ERROR;
+  }
+  uint32_t GetInputNum() const override {
+    // logits
+    return 1;
+  }
+  uint32_t GetOutputNum() const override {
+    // topk_weights, topk_ids
+    return 2;
+  }
+
+  atb::Status SetAclnnWorkspaceAndExecutor() override {
+    if (aclnnMoeGatingTopKExGetWorkspaceSize(in_tensors[0]->acl_tensor, top_k, renormalize, out_tensors[0]->acl_tensor, out_tensors[1]->acl_tensor, &workspace_size, &acl_executor) != ACL_SUCCESS) {
+      std::stringstream ss;
+      ss << "Failed to get workspace size for MoeGatingTopKEx: " << aclGetRecentErrMsg();
+      throw std::runtime_error(ss.str());
+    }
+    if (aclSetAclOpExecutorRepeatable(acl_executor) != ACL_SUCCESS) {
+      std::stringstream ss;
+      ss << "Failed to set ACL op executor repeatable for MoeGatingTopKEx: " << aclGetRecentErrMsg();
+      throw std::runtime_error(ss.str());
+    }
+    return atb::NO_ERROR;
+  }
+
+  atb::Status ExecuteAclnnOp(uint8_t *workspace, aclrtStream stream) override {
+    if (aclnnMoeGatingTopKEx(workspace, this->workspace_size, acl_executor, stream) != ACL_SUCCESS) {
+      std::stringstream ss;
+      ss << "Failed to execute MoeGatingTopKEx: " << aclGetRecentErrMsg();
+      throw std::runtime_error(ss.str());
+    }
+    return atb::NO_ERROR;
+  }
+
+  int64_t top_k;
+  bool renormalize;
+};
+
+class MoePermuteEx: public AclnnOp {
+public:
+  MoePermuteEx(int64_t num_experts, const std::string& name = "MoePermuteEx"): AclnnOp(name), num_experts(num_experts) {}
+  atb::Status InferShape(const atb::SVector<atb::TensorDesc> &in_tensor_descs, atb::SVector<atb::TensorDesc> &out_tensor_descs) const override {
+    // x: [num_tokens, hidden], topk_ids: [num_tokens, top_k]
+    int64_t num_rows = in_tensor_descs[0].shape.dims[0] * in_tensor_descs[1].shape.dims[1];
+    out_tensor_descs[0] = in_tensor_descs[0];
+    out_tensor_descs[0].shape.dims[0] = num_rows;
+    out_tensor_descs[1] = in_tensor_descs[1];
+    out_tensor_descs[1].shape.dimNum = 1;
+    out_tensor_descs[1].shape.dims[0] = num_rows;
+    out_tensor_descs[2] = out_tensor_descs[1];
+    out_tensor_descs[2].shape.dims[0] = num_experts;
+    out_tensor_descs[2].dtype = ACL_INT64;
+    return atb::NO_ERROR;
+  }
+  uint32_t GetInputNum() const override {
+    // x, topk_ids
+    return 2;
+  }
+  uint32_t GetOutputNum() const override {
+    // permuted_x, expanded_row_idx, group_list
+    return 3;
+  }
+
+  atb::Status SetAclnnWorkspaceAndExecutor() override {
+    if (aclnnMoePermuteExGetWorkspaceSize(in_tensors[0]->acl_tensor, in_tensors[1]->acl_tensor, num_experts, out_tensors[0]->acl_tensor, out_tensors[1]->acl_tensor, out_tensors[2]->acl_tensor, &workspace_size, &acl_executor) != ACL_SUCCESS) {
+      std::stringstream ss;
+      ss << "Failed to get workspace size for MoePermuteEx: " << aclGetRecentErrMsg();
+      throw std::runtime_error(ss.str());
+    }
+    if (aclSetAclOpExecutorRepeatable(acl_executor) != ACL_SUCCESS) {
+      std::stringstream ss;
+      ss << "Failed to set ACL op executor repeatable for MoePermuteEx: " << aclGetRecentErrMsg();
+      throw std::runtime_error(ss.str());
+    }
+    return atb::NO_ERROR;
+  }
+
+  atb::Status ExecuteAclnnOp(uint8_t *workspace, aclrtStream stream) override {
+    if (aclnnMoePermuteEx(workspace, this->workspace_size, acl_executor, stream) != ACL_SUCCESS) {
+      std::stringstream ss;
+      ss << "Failed to execute MoePermuteEx: " << aclGetRecentErrMsg();
+      throw std::runtime_error(ss.str());
+    }
+    return atb::NO_ERROR;
+  }
+
+  int64_t num_experts;
+};
+
+class MoeUnpermuteEx: public AclnnOp {
+public:
+  MoeUnpermuteEx(const std::string& name = "MoeUnpermuteEx"): AclnnOp(name) {}
+  atb::Status InferShape(const atb::SVector<atb::TensorDesc> &in_tensor_descs, atb::SVector<atb::TensorDesc> &out_tensor_descs) const override {
+    // y: [num_tokens * top_k, hidden], topk_weights: [num_tokens, top_k] -> out: [num_tokens, hidden]
+    out_tensor_descs[0] = in_tensor_descs[0];
+    out_tensor_descs[0].shape.dims[0] = in_tensor_descs[2].shape.dims[0];
+    return atb::NO_ERROR;
+  }
+  uint32_t GetInputNum() const override {
+    // y, expanded_row_idx, topk_weights
+    return 3;
+  }
+  uint32_t GetOutputNum() const override {
+    // out
+    return 1;
+  }
+
+  atb::Status SetAclnnWorkspaceAndExecutor() override {
+    if (aclnnMoeUnpermuteExGetWorkspaceSize(in_tensors[0]->acl_tensor, in_tensors[1]->acl_tensor, in_tensors[2]->acl_tensor, out_tensors[0]->acl_tensor, &workspace_size, &acl_executor) != ACL_SUCCESS) {
+      std::stringstream ss;
+      ss << "Failed to get workspace size for MoeUnpermuteEx: " << aclGetRecentErrMsg();
+      throw std::runtime_error(ss.str());
+    }
+    if (aclSetAclOpExecutorRepeatable(acl_executor) != ACL_SUCCESS) {
+      std::stringstream ss;
+      ss << "Failed to set ACL op executor repeatable for MoeUnpermuteEx: " << aclGetRecentErrMsg();
+      throw std::runtime_error(ss.str());
+    }
+    return atb::NO_ERROR;
+  }
+
+  atb::Status ExecuteAclnnOp(uint8_t *workspace, aclrtStream stream) override {
+    if (aclnnMoeUnpermuteEx(workspace, this->workspace_size, acl_executor, stream) != ACL_SUCCESS) {
+      std::stringstream ss;
+      ss << "Failed to execute MoeUnpermuteEx: " << aclGetRecentErrMsg();
+      throw std::runtime_error(ss.str());
+    }
+    return atb::NO_ERROR;
+  }
+};
+
+class SamplingEx: public AclnnOp {
+public:
+  SamplingEx(const std::string& name = "SamplingEx"): AclnnOp(name) {}
+  atb::Status InferShape(const atb::SVector<atb::TensorDesc> &in_tensor_descs, atb::SVector<atb::TensorDesc> &out_tensor_descs) const override {
+    // logits: [bs, vocab_size] -> token_ids: [bs] int32
+    out_tensor_descs[0] = in_tensor_descs[0];
+    out_tensor_descs[0].shape.dimNum = 1;
+    out_tensor_descs[0].dtype = ACL_INT32;
+    return atb::NO_ERROR;
+  }
+  uint32_t GetInputNum() const override {
+    // logits, temperature, top_k, top_p, repetition_penalty, uniform, penalty_token_ids
+    return 7;
+  }
+  uint32_t GetOutputNum() const override {
+    // token_ids
+    return 1;
+  }
+
+  atb::Status SetAclnnWorkspaceAndExecutor() override {
+    if (aclnnSamplingExGetWorkspaceSize(in_tensors[0]->acl_tensor, in_tensors[1]->acl_tensor, in_tensors[2]->acl_tensor, in_tensors[3]->acl_tensor, in_tensors[4]->acl_tensor, in_tensors[5]->acl_tensor, in_tensors[6]->acl_tensor, out_tensors[0]->acl_tensor, &workspace_size, &acl_executor) != ACL_SUCCESS) {
+      std::stringstream ss;
+      ss << "Failed to get workspace size for SamplingEx: " << aclGetRecentErrMsg();
+      throw std::runtime_error(ss.str());
+    }
+    if (aclSetAclOpExecutorRepeatable(acl_executor) != ACL_SUCCESS) {
+      std::stringstream ss;
+      ss << "Failed to set ACL op executor repeatable for SamplingEx: " << aclGetRecentErrMsg();
+      throw std::runtime_error(ss.str());
+    }
+    return atb::NO_ERROR;
+  }
+
+  atb::Status ExecuteAclnnOp(uint8_t *workspace, aclrtStream stream) override {
+    if (aclnnSamplingEx(workspace, this->workspace_size, acl_executor, stream) != ACL_SUCCESS) {
+      std::stringstream ss;
+      ss << "Failed to execute SamplingEx: " << aclGetRecentErrMsg();
+      throw std::runtime_error(ss.str());
+    }
+    return atb::NO_ERROR;
+  }
+};
+
+class PagedAttentionEx: public AclnnOp {
+public:
+  PagedAttentionEx(const std::string& name = "PagedAttentionEx"): AclnnOp(name) {}
+  atb::Status InferShape(const atb::SVector<atb::TensorDesc> &in_tensor_descs, atb::SVector<atb::TensorDesc> &out_tensor_descs) const override {
+    // q: [bs * num_query_tokens, num_heads, head_dim] -> y: same shape
+    out_tensor_descs[0] = in_tensor_descs[0];
+    return atb::NO_ERROR;
+  }
+  uint32_t GetInputNum() const override {
+    // q, key_cache, value_cache, block_tables, context_lens
+    return 5;
+  }
+  uint32_t GetOutputNum() const override {
+    // y
+    return 1;
+  }
+
+  atb::Status SetAclnnWorkspaceAndExecutor() override {
+    // fp16 cache only, no alibi and no sliding window
+    if (aclnnPagedAttentionExGetWorkspaceSize(in_tensors[0]->acl_tensor, in_tensors[1]->acl_tensor, in_tensors[2]->acl_tensor, in_tensors[3]->acl_tensor, in_tensors[4]->acl_tensor, nullptr, nullptr, nullptr, nullptr, out_tensors[0]->acl_tensor, &workspace_size, &acl_executor) != ACL_SUCCESS) {
+      std::stringstream ss;
+      ss << "Failed to get workspace size for PagedAttentionEx: " << aclGetRecentErrMsg();
+      throw std::runtime_error(ss.str());
+    }
+    if (aclSetAclOpExecutorRepeatable(acl_executor) != ACL_SUCCESS) {
+      std::stringstream ss;
+      ss << "Failed to set ACL op executor repeatable for PagedAttentionEx: " << aclGetRecentErrMsg();
+      throw std::runtime_error(ss.str());
+    }
+    return atb::NO_ERROR;
+  }
+
+  atb::Status ExecuteAclnnOp(uint8_t *workspace, aclrtStream stream) override {
+    if (aclnnPagedAttentionEx(workspace, this->workspace_size, acl_executor, stream) != ACL_SUCCESS) {
+      std::stringstream ss;
+      ss << "Failed to execute PagedAttentionEx: " << aclGetRecentErrMsg();
+      throw std::runtime_error(ss.str());
+    }
+    return atb::NO_ERROR;
+  }
+};
+
+class FusedQkvEx: public AclnnOp {
+public:
+  FusedQkvEx(float epsilon, bool has_residual, const std::string& name = "FusedQkvEx"): AclnnOp(name), epsilon(epsilon), has_residual(has_residual) {}
+  atb::Status InferShape(const atb::SVector<atb::TensorDesc> &in_tensor_descs, atb::SVector<atb::TensorDesc> &out_tensor_descs) const override {
+    // x: [bs, hidden_size], weight: [(num_heads + 2 * num_kv_heads) * head_dim, hidden_size],
+    // key_cache: [num_pages, num_kv_heads * head_dim / 16, page_size, 16]
+    // -> q: [bs, num_heads, head_dim], residual_output: [bs, hidden_size]
+    int64_t head_dim = in_tensor_descs[3].shape.dims[0];
+    int64_t num_kv_heads = in_tensor_descs[9].shape.dims[1] * 16 / head_dim;
+    out_tensor_descs[0] = in_tensor_descs[0];
+    out_tensor_descs[0].shape.dimNum = 3;
+    out_tensor_descs[0].shape.dims[1] = in_tensor_descs[2].shape.dims[0] / head_dim - 2 * num_kv_heads;
+    out_tensor_descs[0].shape.dims[2] = head_dim;
+    out_tensor_descs[1] = in_tensor_descs[0];
+    return atb::NO_ERROR;
+  }
+  uint32_t GetInputNum() const override {
+    // x, norm_weight, weight, q_norm_weight, k_norm_weight, position_ids, cos_cache, sin_cache,
+    // slot_mapping, key_cache, value_cache (written in place), residual unless the first layer
+    return has_residual ? 12 : 11;
+  }
+  uint32_t GetOutputNum() const override {
+    // q, residual_output
+    return 2;
+  }
+
+  atb::Status SetAclnnWorkspaceAndExecutor() override {
+    aclTensor* residual = has_residual ? in_tensors[11]->acl_tensor : nullptr;
+    if (aclnnFusedQkvExGetWorkspaceSize(in_tensors[0]->acl_tensor, in_tensors[1]->acl_tensor, in_tensors[2]->acl_tensor, in_tensors[3]->acl_tensor, in_tensors[4]->acl_tensor, in_tensors[5]->acl_tensor, in_tensors[6]->acl_tensor, in_tensors[7]->acl_tensor, in_tensors[8]->acl_tensor, in_tensors[9]->acl_tensor, in_tensors[10]->acl_tensor, residual, epsilon, out_tensors[0]->acl_tensor, out_tensors[1]->acl_tensor, &workspace_size, &acl_executor) != ACL_SUCCESS) {
+      std::stringstream ss;
+      ss << "Failed to get workspace size for FusedQkvEx: " << aclGetRecentErrMsg();
+      throw std::runtime_error(ss.str());
+    }
+    if (aclSetAclOpExecutorRepeatable(acl_executor) != ACL_SUCCESS) {
+      std::stringstream ss;
+      ss << "Failed to set ACL op executor repeatable for FusedQkvEx: " << aclGetRecentErrMsg();
+      throw std::runtime_error(ss.str());
+    }
+    return atb::NO_ERROR;
+  }
+
+  atb::Status ExecuteAclnnOp(uint8_t *workspace, aclrtStream stream) override {
+    if (aclnnFusedQkvEx(workspace, this->workspace_size, acl_executor, stream) != ACL_SUCCESS) {
+      std::stringstream ss;
+      ss << "Failed to execute FusedQkvEx: " << aclGetRecentErrMsg();
+      throw std::runtime_error(ss.str());
+    }
+    return atb::NO_ERROR;
+  }
+
+  float epsilon;
+  bool has_residual;
+};
+
+class MatMulAddEx: public AclnnOp {
+public:
+  MatMulAddEx(const std::string& name = "MatMulAddEx"): AclnnOp(name) {}
+  atb::Status InferShape(const atb::SVector<atb::TensorDesc> &in_tensor_descs, atb::SVector<atb::TensorDesc> &out_tensor_descs) const override {
+    // x: [num_tokens, dim], w: [inner_dim, dim], residual: [num_tokens, inner_dim] -> y: [num_tokens, inner_dim]
+    out_tensor_descs[0] = in_tensor_descs[2];
+    return atb::NO_ERROR;
+  }
+  uint32_t GetInputNum() const override {
+    // x, w, residual
+    return 3;
+  }
+  uint32_t GetOutputNum() const override {
+    return 1;
+  }
+
+  atb::Status SetAclnnWorkspaceAndExecutor() override {
+    if (aclnnMatMulAddExGetWorkspaceSize(in_tensors[0]->acl_tensor, in_tensors[1]->acl_tensor, in_tensors[2]->acl_tensor, out_tensors[0]->acl_tensor, &workspace_size, &acl_executor) != ACL_SUCCESS) {
+      std::stringstream ss;
+      ss << "Failed to get workspace size for MatMulAddEx: " << aclGetRecentErrMsg();
+      throw std::runtime_error(ss.str());
+    }
+    if (aclSetAclOpExecutorRepeatable(acl_executor) != ACL_SUCCESS) {
+      std::stringstream ss;
+      ss << "Failed to set ACL op executor repeatable for MatMulAddEx: " << aclGetRecentErrMsg();
+      throw std::runtime_error(ss.str());
+    }
+    return atb::NO_ERROR;
+  }
+
+  atb::Status ExecuteAclnnOp(uint8_t *workspace, aclrtStream stream) override {
+    if (aclnnMatMulAddEx(workspace, this->workspace_size, acl_executor, stream) != ACL_SUCCESS) {
+      std::stringstream ss;
+      ss << "Failed to execute MatMulAddEx: " << aclGetRecentErrMsg();
+      throw std::runtime_error(ss.str());
+    }
+    return atb::NO_ERROR;
+  }
+};
+
+class FusedGateUpEx: public AclnnOp {
+public:
+  FusedGateUpEx(float epsilon, const std::string& name = "FusedGateUpEx"): AclnnOp(name), epsilon(epsilon) {}
+  atb::Status InferShape(const atb::SVector<atb::TensorDesc> &in_tensor_descs, atb::SVector<atb::TensorDesc> &out_tensor_descs) const override {
+    // x: [num_tokens, hidden_size], w: [2 * intermediate_size, hidden_size] -> y: [num_tokens, intermediate_size]
+    out_tensor_descs[0] = in_tensor_descs[0];
+    out_tensor_descs[0].shape.dims[1] = in_tensor_descs[2].shape.dims[0] / 2;
+    return atb::NO_ERROR;
+  }
+  uint32_t GetInputNum() const override {
+    // x, norm_weight, w
+    return 3;
+  }
+  uint32_t GetOutputNum() const override {
+    return 1;
+  }
+
+  atb::Status SetAclnnWorkspaceAndExecutor() override {
+    if (aclnnFusedGateUpExGetWorkspaceSize(in_tensors[0]->acl_tensor, in_tensors[1]->acl_tensor, in_tensors[2]->acl_tensor, epsilon, out_tensors[0]->acl_tensor, &workspace_size, &acl_executor) != ACL_SUCCESS) {
+      std::stringstream ss;
+      ss << "Failed to get workspace size for FusedGateUpEx: " << aclGetRecentErrMsg();
+      throw std::runtime_error(ss.str());
+    }
+    if (aclSetAclOpExecutorRepeatable(acl_executor) != ACL_SUCCESS) {
+      std::stringstream ss;
+      ss << "Failed to set ACL op executor repeatable for FusedGateUpEx: " << aclGetRecentErrMsg();
+      throw std::runtime_error(ss.str());
+    }
+    return atb::NO_ERROR;
+  }
+
+  atb::Status ExecuteAclnnOp(uint8_t *workspace, aclrtStream stream) override {
+    if (aclnnFusedGateUpEx(workspace, this->workspace_size, acl_executor, stream) != ACL_SUCCESS) {
+      std::stringstream ss;
+      ss << "Failed to execute FusedGateUpEx: " << aclGetRecentErrMsg();
+      throw std::runtime_error(ss.str());
+    }
+    return atb::NO_ERROR;
+  }
+
+  float epsilon;
+};
+
+// what the instrumented run of a graph node saw: the shapes, output bytes and workspace of the
+// last Setup and the device time between events around each Execute
+struct NodeRecord {
+  std::string name;
+  std::string op_type;
+  std::string split;
+  std::vector<std::vector<int64_t>> in_shapes;
+  std::vector<std::vector<int64_t>> out_shapes;
+  uint64_t out_bytes = 0;
+  uint64_t workspace_size = 0;
+  uint64_t calls = 0;
+  uint64_t device_ns = 0;
+  std::vector<std::pair<aclrtEvent, aclrtEvent>> pending;
+  std::mutex mutex;
+
+  // with mutex held, wait = false stops at the first sample not done yet
+  void resolve(bool wait) {
+    size_t done = 0;
+    for (auto& [start, end]: pending) {
+      if (wait) {
+        aclrtSynchronizeEvent(end);
+      } else {
+        aclrtEventRecordedStatus status = ACL_EVENT_RECORDED_STATUS_NOT_READY;
+        if (aclrtQueryEventStatus(end, &status) != ACL_SUCCESS || status != ACL_EVENT_RECORDED_STATUS_COMPLETE) {
+          break;
+        }
+      }
+      float ms = 0;
+      if (aclrtEventElapsedTime(&ms, start, end) == ACL_SUCCESS) {
+        device_ns += (uint64_t)(ms * 1e6);
+        calls++;
+      }
+      release_event(start);
+      release_event(end);
+      done++;
+    }
+    pending.erase(pending.begin(), pending.begin() + done);
+  }
+};
+
+inline std::vector<std::vector<int64_t>> desc_shapes(const atb::SVector<atb::Tensor>& tensors) {
+  std::vector<std::vector<int64_t>> shapes;
+  for (auto& t: tensors) {
+    shapes.emplace_back(t.desc.shape.dims, t.desc.shape.dims + t.desc.shape.dimNum);
+  }
+  return shapes;
+}
+
+// runs a graph node between two events, Graph.instrument wraps every node in one. The wrapped
+// node runs as a plugin of the graph, so the times are per node but the graph may lose some of
+// the fusion of its built-in nodes.
+class TimedNode: public atb::Operation {
+public:
+  TimedNode(atb::Operation* op, std::shared_ptr<NodeRecord> record): op(op), record(record) {}
+
+  std::string GetName() const override {
+    return op->GetName();
+  }
+  atb::Status InferShape(const atb::SVector<atb::TensorDesc> &in_tensor_descs, atb::SVector<atb::TensorDesc> &out_tensor_descs) const override {
+    return op->InferShape(in_tensor_descs, out_tensor_descs);
+  }
+  uint32_t GetInputNum() const override {
+    return op->GetInputNum();
+  }
+  uint32_t GetOutputNum() const override {
+    return op->GetOutputNum();
+  }
+
+  atb::Status Setup(const atb::VariantPack &pack, uint64_t &workspace_size, atb::Context *ctx) override {
+    atb::Status status = op->Setup(pack, workspace_size, ctx);
+    std::lock_guard<std::mutex> lock(record->mutex);
+    record->in_shapes = desc_shapes(pack.inTensors);
+    record->out_shapes = desc_shapes(pack.outTensors);
+    record->out_bytes = 0;
+    for (auto& t: pack.outTensors) {
+      record->out_bytes += t.dataSize;
+    }
+    record->workspace_size = workspace_size;
+    return status;
+  }
+
+  atb::Status Execute(const atb::VariantPack &pack, uint8_t *workspace, uint64_t workspace_size, atb::Context *ctx) override {
+    aclrtStream stream = ctx->GetExecuteStream();
+    aclrtEvent start = acquire_event();
+    aclrtEvent end = acquire_event();
+    aclrtRecordEvent(start, stream);
+    atb::Status status = op->Execute(pack, workspace, workspace_size, ctx);
+    aclrtRecordEvent(end, stream);
+    std::lock_guard<std::mutex> lock(record->mutex);
+    record->pending.emplace_back(start, end);
+    // keep the finished ones from piling up over many steps
+    if (record->pending.size() > 64) {
+      record->resolve(false);
+    }
+    return status;
+  }
+
+  // FIXME: maybe memory leak, like the aclnn nodes
+  atb::Operation* op;
+  std::shared_ptr<NodeRecord> record;
+};
+
 }
@@ -1,6 +1,7 @@
 
 #include <vector>
 #include <map>
+#include <string>
 #include "graph/types.h"
 #include "ge/ge_api.h"
 #include "all_ops.h"
@@ -22,8 +23,10 @@ namespace native {
 
 extern void init_ffi_graph(py::module_ &&m);
 extern void init_ffi_ops(py::module_ &&m);
+extern void init_ffi_profile(py::module_ &&m);
 
-int print_info(int device_id) {
+// platform figures of the device, also printed; ascend910a_extras.roofline builds its profile from them
+py::dict print_info(int device_id) {
   fe::PlatFormInfos platform_infos;
   fe::PlatformInfoManager::GeInstance().GetRuntimePlatformInfosByDevice(device_id, platform_infos);
   uint32_t aic_num = platform_infos.GetCoreNumByType("aic");
@@ -47,15 +50,43 @@ int print_info(int device_id) {
   printf("L0_A: %ld, L0_B: %ld, L0_C: %ld, L1: %ld, L2: %ld, UB: %ld, HBM: %ld\n", l0_a_size, l0_b_size, l0_c_size, l1_size, l2_size, ub_size, hbm_size);
   printf("L0_A_BW: %ld, L0_B_BW: %ld, L0_C_BW: %ld, L1_BW: %ld, L2_BW: %ld, UB_BW: %ld, HBM_BW: %ld\n", l0_a_bw, l0_b_bw, l0_c_bw, l1_bw, l2_bw, ub_bw, hbm_bw);
   printf("AIC: %d, AIV: %d\n", aic_num, aiv_num);
-  return 0;
+  // cube/vector clock in MHz, empty on platforms that do not report it
+  std::string cube_freq;
+  platform_infos.GetPlatformRes("AICoreSpec", "cube_freq", cube_freq);
+  printf("CUBE_FREQ: %s\n", cube_freq.c_str());
+
+  py::dict mem_size;
+  mem_size["l0_a"] = l0_a_size;
+  mem_size["l0_b"] = l0_b_size;
+  mem_size["l0_c"] = l0_c_size;
+  mem_size["l1"] = l1_size;
+  mem_size["l2"] = l2_size;
+  mem_size["ub"] = ub_size;
+  mem_size["hbm"] = hbm_size;
+  py::dict mem_bw;
+  mem_bw["l0_a"] = l0_a_bw;
+  mem_bw["l0_b"] = l0_b_bw;
+  mem_bw["l0_c"] = l0_c_bw;
+  mem_bw["l1"] = l1_bw;
+  mem_bw["l2"] = l2_bw;
+  mem_bw["ub"] = ub_bw;
+  mem_bw["hbm"] = hbm_bw;
+  py::dict info;
+  info["aic_num"] = aic_num;
+  info["aiv_num"] = aiv_num;
+  info["cube_freq_mhz"] = cube_freq.empty() ? 0 : std::stoi(cube_freq);
+  info["mem_size"] = mem_size;
+  info["mem_bw"] = mem_bw;
+  return info;
 }
 
 
 }
 
 PYBIND11_MODULE(ascend910a_extras_C, m) {
-  m.def("print_info", &native::print_info, "Print info about the device");
+  m.def("print_info", &native::print_info, "Print info about the device and return it as a dict");
 
   native::init_ffi_ops(m.def_submodule("ops"));
   native::init_ffi_graph(m.def_submodule("graph"));
+  native::init_ffi_profile(m.def_submodule("profile"));
 }
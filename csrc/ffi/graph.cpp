@@ -15,6 +15,7 @@
 #include "adaptor.h"
 
 #include "dbg/dbg.h"
+#include "log.h"
 
 
 namespace py = pybind11;
@@ -29,16 +30,196 @@ struct GraphConfig {
   int intermediate_size = 12288;
   int num_layers = 1;
   float rms_norm_eps = 1e-6;
+  // W8A16: linear weights are int8 [out, in] followed by fp16 scales [in / group_size, out]
+  bool weight_quant = false;
+  // MoE: decoder layers use add_moe_layer instead of add_mlp when num_experts > 0
+  int num_experts = 0;
+  int num_experts_per_tok = 8;
+  bool norm_topk_prob = true;
+  // shared experts are a dense mlp added to the routed output, 0 = none
+  int shared_expert_intermediate_size = 0;
+  // build_model ends with the lm head and SamplingEx, and returns [num_tokens()] int32 token ids,
+  // the sampling inputs of setup then have num_tokens() rows as well
+  bool sampling = false;
+  // the lm head reuses the embedding weight
+  bool tie_word_embeddings = true;
+  // speculative decoding verify: each sequence feeds its last token and num_speculative_tokens draft tokens,
+  // token_ids/position_ids/slot_mapping have batch_size * (num_speculative_tokens + 1) rows and
+  // build_model returns logits of every row (or token ids with sampling), 0 = plain decode
+  int num_speculative_tokens = 0;
+  // decoder layers as 5 launches: FusedQkvEx (add+rmsnorm+qkv+q/k norm+rope+cache write), paged
+  // attention, MatMulAddEx (o proj+residual), FusedGateUpEx (rmsnorm+gate_up+swiglu), down proj.
+  // Same weights and results as the unfused layers, fp16 weights only.
+  bool fused_layers = false;
+
+  int num_tokens() const {
+    return batch_size * (num_speculative_tokens + 1);
+  }
 
   void display() {
-    printf("GraphConfig: batch_size=%d, hidden_size=%d, num_heads=%d, num_kv_heads=%d, intermediate_size=%d, num_layers=%d, rms_norm_eps=%f\n",
-      batch_size, hidden_size, num_heads, num_kv_heads, intermediate_size, num_layers, rms_norm_eps);
+    LOG_INFO("GraphConfig: batch_size=%d, hidden_size=%d, num_heads=%d, num_kv_heads=%d, intermediate_size=%d, num_layers=%d, rms_norm_eps=%f, weight_quant=%d, num_experts=%d, num_experts_per_tok=%d, norm_topk_prob=%d, shared_expert_intermediate_size=%d, sampling=%d, tie_word_embeddings=%d, num_speculative_tokens=%d, fused_layers=%d",
+      batch_size, hidden_size, num_heads, num_kv_heads, intermediate_size, num_layers, rms_norm_eps, weight_quant, num_experts, num_experts_per_tok, norm_topk_prob, shared_expert_intermediate_size, sampling, tie_word_embeddings, num_speculative_tokens, fused_layers);
   }
 };
 
+// the trailing dims a node input is viewed as: a [d0, ...] tensor becomes [d0, dims...], empty = as is
+using Reshape = std::vector<int64_t>;
+
+// a graph node as data, what GraphBuilder records and Graph.export/Graph.load round trip. The
+// kind picks the operation, see create_node_operation, params holds its parameters.
+struct NodeDesc {
+  std::string name;
+  std::string kind;
+  std::map<std::string, double> params;
+  std::vector<uint32_t> in_ids;
+  std::vector<uint32_t> out_ids;
+  // one per input or none
+  std::vector<Reshape> reshapes;
+};
+
+// one op of Graph: its atb graph with the tensor ids remapped to inputs, outputs, internals
+struct GraphDesc {
+  std::string name;
+  // inputs before the weights, the rest of the in tensors are weights
+  uint32_t input_num = 0;
+  uint32_t in_tensor_num = 0;
+  uint32_t out_tensor_num = 0;
+  uint32_t internal_tensor_num = 0;
+  std::vector<NodeDesc> nodes;
+};
+
+// bumped whenever a kind or its params change, serialized graphs of another version are rebuilt
+constexpr int kGraphDescVersion = 2;
+
+// node registry entry of a built graph: the scoped name (layers.3.attn.linear_0), the atb
+// operation name and the graph tensor ids of the node
+struct NodeInfo {
+  std::string name;
+  std::string op_type;
+  std::vector<uint32_t> in_ids;
+  std::vector<uint32_t> out_ids;
+};
+
+atb::ReshapeFunc make_reshape_func(const Reshape& dims) {
+  if (dims.empty()) {
+    return [](const atb::Dims& old_shape, atb::Dims& new_shape) {
+      new_shape = old_shape;
+    };
+  }
+  return [dims](const atb::Dims& old_shape, atb::Dims& new_shape) {
+    int64_t old_numel = 1;
+    int64_t numel = 1;
+    for (int i = 1; i < old_shape.dimNum; i++) {
+      old_numel *= old_shape.dims[i];
+    }
+    for (auto d: dims) {
+      numel *= d;
+    }
+    assert(old_numel == numel);
+    new_shape.dimNum = dims.size() + 1;
+    new_shape.dims[0] = old_shape.dims[0];
+    for (int i = 0; i < dims.size(); i++) {
+      new_shape.dims[i + 1] = dims[i];
+    }
+  };
+}
+
+atb::Operation* create_node_operation(const NodeDesc& desc) {
+  auto param = [&](const std::string& key) -> double {
+    auto it = desc.params.find(key);
+    if (it == desc.params.end()) {
+      throw std::runtime_error("node " + desc.name + " (" + desc.kind + ") has no param " + key);
+    }
+    return it->second;
+  };
+  const std::string& kind = desc.kind;
+  atb::Operation* op = nullptr;
+  // FIXME: maybe memory leak, the Ex nodes are never destroyed
+  if (kind == "embedding") {
+    atb::infer::GatherParam gather_param;
+    gather_param.axis = (int64_t)param("axis");
+    CHECK_ATB(atb::CreateOperation(gather_param, &op));
+  } else if ((kind == "linear" || kind == "lm_head") && param("weight_quant") != 0) {
+    // WeightQuantMatMulEx only supports x @ w.T with w: [out, in] int8
+    assert(param("trans_a") == 0 && param("trans_b") != 0);
+    op = new WeightQuantMatMulEx();
+  } else if (kind == "linear" || kind == "lm_head") {
+    atb::infer::LinearParam linear_param;
+    linear_param.transposeA = param("trans_a") != 0;
+    linear_param.transposeB = param("trans_b") != 0;
+    linear_param.hasBias = false;
+    linear_param.outDataType = ACL_DT_UNDEFINED;
+    CHECK_ATB(atb::CreateOperation(linear_param, &op));
+  } else if (kind == "sampling") {
+    op = new SamplingEx();
+  } else if (kind == "gating") {
+    op = new MoeGatingTopKEx((int64_t)param("top_k"), param("renormalize") != 0);
+  } else if (kind == "permute") {
+    op = new MoePermuteEx((int64_t)param("num_experts"));
+  } else if (kind == "unpermute") {
+    op = new MoeUnpermuteEx();
+  } else if (kind == "grouped_linear") {
+    if (param("weight_quant") != 0) {
+      op = new WeightQuantGroupedMatMulEx();
+    } else {
+      op = new GroupedMatMulEx();
+    }
+  } else if (kind == "add") {
+    atb::infer::ElewiseParam add_param;
+    add_param.elewiseType = atb::infer::ElewiseParam::ELEWISE_ADD;
+    CHECK_ATB(atb::CreateOperation(add_param, &op));
+  } else if (kind == "rope") {
+    op = new RopeEx();
+  } else if (kind == "reshape_and_cache") {
+    atb::infer::ReshapeAndCacheParam cache_param;
+    cache_param.compressType = atb::infer::ReshapeAndCacheParam::COMPRESS_TYPE_UNDEFINED;
+    // cache_param.kvCacheCfg = atb::infer::ReshapeAndCacheParam::K_CACHE_V_CACHE;
+    cache_param.kvCacheCfg = atb::infer::ReshapeAndCacheParam::K_CACHE_V_CACHE_NZ;
+    CHECK_ATB(atb::CreateOperation(cache_param, &op));
+  } else if (kind == "paged_attention" && param("ex") != 0) {
+    // several causal query rows per sequence, the ex kernel derives them from q rows / block_tables rows
+    op = new PagedAttentionEx();
+  } else if (kind == "paged_attention") {
+    atb::infer::PagedAttentionParam paged_attn_param;
+    paged_attn_param.headNum = (int32_t)param("num_heads");
+    paged_attn_param.qkScale = (float)param("qk_scale");
+    paged_attn_param.kvHeadNum = (int32_t)param("num_kv_heads");
+    CHECK_ATB(atb::CreateOperation(paged_attn_param, &op));
+  } else if (kind == "split") {
+    atb::infer::SplitParam split_param;
+    split_param.splitDim = (int32_t)param("dim");
+    split_param.splitNum = (int32_t)desc.out_ids.size();
+    atb::SVector<int> split_sizes;
+    for (int i = 0; i < desc.out_ids.size(); i++) {
+      split_sizes.push_back((int)param("size_" + std::to_string(i)));
+    }
+    split_param.splitSizes = split_sizes;
+    CHECK_ATB(atb::CreateOperation(split_param, &op));
+  } else if (kind == "rmsnorm") {
+    atb::infer::RmsNormParam rmsnorm_param;
+    rmsnorm_param.layerType = atb::infer::RmsNormParam::RMS_NORM_NORM;
+    rmsnorm_param.normParam.epsilon = (float)param("eps");
+    CHECK_ATB(atb::CreateOperation(rmsnorm_param, &op));
+  } else if (kind == "swiglu") {
+    op = new SwiGluEx();
+  } else if (kind == "fused_qkv") {
+    op = new FusedQkvEx((float)param("eps"), param("has_residual") != 0);
+  } else if (kind == "linear_add") {
+    op = new MatMulAddEx();
+  } else if (kind == "fused_gate_up") {
+    op = new FusedGateUpEx((float)param("eps"));
+  } else {
+    throw std::runtime_error("node " + desc.name + " has unknown kind " + kind);
+  }
+  assert(op != nullptr);
+  return op;
+}
+
 class GraphBuilder {
 public:
   GraphConfig config;
+  // wrap every node in a TimedNode
+  bool instrument;
 
   atb::GraphOpBuilder* builder;
   uint32_t tensor_num;
@@ -46,27 +227,52 @@ public:
   std::vector<uint32_t> internal_ids;
   std::vector<uint32_t> out_ids;
   std::map<uint32_t, uint32_t> id_map;
+  // set by add_embedding, the tied lm head reuses it
+  uint32_t vocab_weight = uint32_t(-1);
+  // the nodes as added, then the remapped graph build made of them
+  std::vector<NodeDesc> nodes;
+  GraphDesc desc;
+  // one per graph_param.nodes entry, and the records of the TimedNodes when instrumented
+  std::vector<NodeInfo> node_infos;
+  std::vector<std::shared_ptr<NodeRecord>> records;
+  std::string scope;
+  std::map<std::string, int> name_counts;
 
   atb::GraphParam graph_param;
-  atb::ReshapeFunc identity_reshape_func = [](const atb::Dims& old_shape, atb::Dims& new_shape) {
-    new_shape = old_shape;
+  Reshape identity_reshape;
+
+  // the nodes added while it lives are named <scope>.<kind>_<n>
+  struct Scope {
+    GraphBuilder& builder;
+    size_t size;
+    Scope(GraphBuilder& builder, const std::string& name) : builder(builder), size(builder.scope.size()) {
+      builder.scope += (builder.scope.empty() ? "" : ".") + name;
+    }
+    ~Scope() {
+      builder.scope.resize(size);
+    }
   };
 
-  GraphBuilder(GraphConfig config) : config(config) {
+  GraphBuilder(GraphConfig config, bool instrument = false) : config(config), instrument(instrument) {
     builder = nullptr;
     clear();
   }
 
+  ~GraphBuilder() {}
+
   void clear() {
-    if (builder) {
-      CHECK_ATB(atb::DestroyGraphOpBuilder(builder));
-      builder = nullptr;
-    }
     tensor_num = 0;
     in_ids.clear();
     internal_ids.clear();
     out_ids.clear();
     id_map.clear();
+    vocab_weight = uint32_t(-1);
+    nodes.clear();
+    desc = GraphDesc();
+    node_infos.clear();
+    records.clear();
+    scope.clear();
+    name_counts.clear();
     graph_param.nodes.clear();
     graph_param.inferShapeFunc = nullptr;
   }
@@ -103,30 +309,80 @@ public:
     }
     remap();
 
-    // create graph
-    graph_param.name = name;
-    graph_param.inTensorNum = in_ids.size();
-    graph_param.outTensorNum = out_ids.size();
-    graph_param.internalTensorNum = internal_ids.size();
+    GraphDesc graph_desc;
+    graph_desc.name = name;
+    graph_desc.input_num = input_num;
+    graph_desc.in_tensor_num = in_ids.size();
+    graph_desc.out_tensor_num = out_ids.size();
+    graph_desc.internal_tensor_num = internal_ids.size();
+    for (auto& node: nodes) {
+      for (auto& id: node.in_ids) {
+        id = id_map[id];
+      }
+      for (auto& id: node.out_ids) {
+        id = id_map[id];
+      }
+    }
+    graph_desc.nodes = nodes;
+
+    auto graph = create(graph_desc);
+    LOG_DBG(name, input_num, in_ids.size(), internal_ids.size(), out_ids.size());
+    CHECK_ATB(atb::DestroyGraphOpBuilder(builder));
+    return graph;
+  }
 
-    for (auto& node: graph_param.nodes) {
-      for (int i = 0; i < node.inTensorIds.size(); i++) {
-        node.inTensorIds[i] = id_map[node.inTensorIds[i]];
+  // the atb graph of a description, built above or loaded by Graph.load
+  atb::Operation* create(const GraphDesc& graph_desc) {
+    desc = graph_desc;
+    graph_param.name = desc.name;
+    graph_param.inTensorNum = desc.in_tensor_num;
+    graph_param.outTensorNum = desc.out_tensor_num;
+    graph_param.internalTensorNum = desc.internal_tensor_num;
+    graph_param.nodes.clear();
+    node_infos.clear();
+    records.clear();
+
+    for (auto& node_desc: desc.nodes) {
+      atb::Node node;
+      node.operation = create_node_operation(node_desc);
+      node.inTensorIds.assign(node_desc.in_ids.begin(), node_desc.in_ids.end());
+      node.outTensorIds.assign(node_desc.out_ids.begin(), node_desc.out_ids.end());
+      for (auto& reshape: node_desc.reshapes) {
+        node.inTensorReshapeFuncs.push_back(make_reshape_func(reshape));
       }
-      for (int i = 0; i < node.outTensorIds.size(); i++) {
-        node.outTensorIds[i] = id_map[node.outTensorIds[i]];
+      node_infos.push_back({node_desc.name, node.operation->GetName(), node_desc.in_ids, node_desc.out_ids});
+      if (instrument) {
+        auto record = std::make_shared<NodeRecord>();
+        record->name = node_desc.name;
+        record->op_type = node_infos.back().op_type;
+        record->split = desc.name;
+        // FIXME: maybe memory leak
+        node.operation = new TimedNode(node.operation, record);
+        records.push_back(record);
       }
+      graph_param.nodes.push_back(node);
     }
 
     atb::Operation* graph = nullptr;
     CHECK_ATB(atb::CreateOperation(graph_param, &graph));
     assert(graph != nullptr && "graph should not be nullptr");
-    dbg(name, input_num, in_ids.size(), internal_ids.size(), out_ids.size());
-    CHECK_ATB(atb::DestroyGraphOpBuilder(builder));
     return graph;
   }
 
 
+  void push_node(
+    const std::string& kind,
+    std::map<std::string, double> params,
+    std::vector<uint32_t> node_in_ids,
+    std::vector<uint32_t> node_out_ids,
+    std::vector<Reshape> reshapes = {}
+  ) {
+    assert(reshapes.empty() || reshapes.size() == node_in_ids.size());
+    std::string name = scope.empty() ? kind : scope + "." + kind;
+    name += "_" + std::to_string(name_counts[name]++);
+    nodes.push_back({name, kind, std::move(params), std::move(node_in_ids), std::move(node_out_ids), std::move(reshapes)});
+  }
+
   void remap() {
     uint32_t in_tensor_id = 0;
     for (auto& id: in_ids) {
@@ -154,58 +410,241 @@ public:
     uint32_t cos_cache,
     uint32_t sin_cache
   ) {
+    if (config.fused_layers) {
+      return add_fused_decoder_layer(
+        x, residual, key_cache, value_cache, position_ids, slot_mapping, block_tables, context_lens, cos_cache, sin_cache
+      );
+    }
     float rms_norm_eps = config.rms_norm_eps;
     uint32_t hidden_states = uint32_t(-1);
     uint32_t res = uint32_t(-1);
     if (residual.has_value()) {
-      auto x_and_residual = add_rmsnorm(x, residual.value(), rms_norm_eps, identity_reshape_func);
+      auto x_and_residual = add_rmsnorm(x, residual.value(), rms_norm_eps, identity_reshape);
       assert(x_and_residual.size() == 2);
       hidden_states = x_and_residual[0];
       res = x_and_residual[1];
     } else {
       res = x;
-      hidden_states = add_rmsnorm(x, std::nullopt, rms_norm_eps, identity_reshape_func)[0];
+      hidden_states = add_rmsnorm(x, std::nullopt, rms_norm_eps, identity_reshape)[0];
     }
 
     hidden_states = add_attn(
       {hidden_states, key_cache, value_cache, position_ids, slot_mapping, block_tables, context_lens, cos_cache, sin_cache}
     );
 
-    auto hidden_states_and_res = add_rmsnorm(hidden_states, res, rms_norm_eps, identity_reshape_func);
+    auto hidden_states_and_res = add_rmsnorm(hidden_states, res, rms_norm_eps, identity_reshape);
     assert(hidden_states_and_res.size() == 2);
     hidden_states = hidden_states_and_res[0];
     res = hidden_states_and_res[1];
 
-    auto y = add_mlp(hidden_states);
+    auto y = config.num_experts > 0 ? add_moe_layer(hidden_states) : add_mlp(hidden_states);
     return {y, res};
   }
 
+  // add_decoder_layer with the small ops folded into the matmuls, the same {y, residual} out
+  // and the same weights in the same order
+  std::vector<uint32_t> add_fused_decoder_layer(
+    uint32_t x,
+    std::optional<uint32_t> residual,
+    uint32_t key_cache,
+    uint32_t value_cache,
+    uint32_t position_ids,
+    uint32_t slot_mapping,
+    uint32_t block_tables,
+    uint32_t context_lens,
+    uint32_t cos_cache,
+    uint32_t sin_cache
+  ) {
+    float rms_norm_eps = config.rms_norm_eps;
+    int num_heads = config.num_heads;
+    int head_dim = config.hidden_size / num_heads;
+    uint32_t res = uint32_t(-1);
+    uint32_t hidden_states = uint32_t(-1);
+    {
+      Scope attn_scope(*this, "attn");
+      // weights: input norm, qkv, q norm, k norm
+      uint32_t norm_w = tensor_num++;
+      uint32_t qkv_w = tensor_num++;
+      uint32_t q_norm_w = tensor_num++;
+      uint32_t k_norm_w = tensor_num++;
+      uint32_t q = tensor_num++;
+      res = tensor_num++;
+      std::vector<uint32_t> node_in_ids = {
+        x, norm_w, qkv_w, q_norm_w, k_norm_w, position_ids, cos_cache, sin_cache, slot_mapping, key_cache, value_cache
+      };
+      if (residual.has_value()) {
+        node_in_ids.push_back(residual.value());
+      }
+      // the caches are written in place, paged attention reads them next
+      push_node("fused_qkv", {{"eps", rms_norm_eps}, {"has_residual", residual.has_value()}}, node_in_ids, {q, res});
+      for (auto w: {norm_w, qkv_w, q_norm_w, k_norm_w}) {
+        in_ids.push_back(w);
+      }
+      internal_ids.push_back(q);
+      internal_ids.push_back(res);
+
+      auto attn_out = add_paged_attn_node(q, key_cache, value_cache, block_tables, context_lens, identity_reshape);
+
+      // o proj + residual, x: [bs, num_heads, head_dim] -> [bs, hidden_size]
+      Reshape x_reshape_back = {num_heads * head_dim};
+      uint32_t o_w = tensor_num++;
+      hidden_states = tensor_num++;
+      push_node("linear_add", {}, {attn_out, o_w, res}, {hidden_states}, {x_reshape_back, identity_reshape, identity_reshape});
+      in_ids.push_back(o_w);
+      internal_ids.push_back(hidden_states);
+    }
+
+    uint32_t y = uint32_t(-1);
+    if (config.num_experts > 0) {
+      auto normed = add_rmsnorm(hidden_states, std::nullopt, rms_norm_eps, identity_reshape);
+      y = add_moe_layer(normed[0]);
+    } else {
+      Scope mlp_scope(*this, "mlp");
+      // weights: post attention norm, gate_up
+      uint32_t norm_w = tensor_num++;
+      uint32_t gate_up_w = tensor_num++;
+      uint32_t act = tensor_num++;
+      push_node("fused_gate_up", {{"eps", rms_norm_eps}}, {hidden_states, norm_w, gate_up_w}, {act});
+      in_ids.push_back(norm_w);
+      in_ids.push_back(gate_up_w);
+      internal_ids.push_back(act);
+      y = add_linear(act, false, true, identity_reshape);
+    }
+    return {y, hidden_states};
+  }
+
 
   uint32_t add_embedding(uint32_t token_ids) {
     // dbg(token_ids);
-    atb::Node node;
-    atb::infer::GatherParam param;
-    param.axis = 0;
-    CHECK_ATB(atb::CreateOperation(param, &node.operation));
-    uint32_t vocab_weight = tensor_num++;
+    vocab_weight = tensor_num++;
     uint32_t y = tensor_num++;
-    node.inTensorIds = {vocab_weight, token_ids};
-    node.outTensorIds = {y};
-    graph_param.nodes.push_back(node);
+    push_node("embedding", {{"axis", 0}}, {vocab_weight, token_ids}, {y});
     in_ids.push_back(vocab_weight);
     internal_ids.push_back(y);
     return y;
   }
 
+  uint32_t add_lm_head(uint32_t x) {
+    // x: [bs, hidden_size] -> logits: [bs, vocab_size]
+    // a split without the embedding takes the tied weight as a new weight input
+    uint32_t w = vocab_weight;
+    if (!config.tie_word_embeddings || w == uint32_t(-1)) {
+      w = tensor_num++;
+      in_ids.push_back(w);
+    }
+    uint32_t y = tensor_num++;
+    push_node("lm_head", {{"trans_a", 0}, {"trans_b", 1}, {"weight_quant", 0}}, {x, w}, {y});
+    internal_ids.push_back(y);
+    return y;
+  }
+
+  uint32_t add_sampling(uint32_t logits, std::vector<uint32_t> params) {
+    // params: temperature, top_k, top_p, repetition_penalty, uniform, penalty_token_ids
+    assert(params.size() == 6);
+    uint32_t token_ids = tensor_num++;
+    std::vector<uint32_t> node_in_ids = {logits};
+    node_in_ids.insert(node_in_ids.end(), params.begin(), params.end());
+    push_node("sampling", {}, node_in_ids, {token_ids});
+    internal_ids.push_back(token_ids);
+    return token_ids;
+  }
+
   uint32_t add_mlp(uint32_t x) {
-    auto y = add_linear(x, false, true, identity_reshape_func);
+    Scope mlp_scope(*this, "mlp");
+    auto y = add_linear(x, false, true, identity_reshape, config.weight_quant);
+    y = add_swiglu(y);
+    y = add_linear(y, false, true, identity_reshape, config.weight_quant);
+    return y;
+  }
+
+  uint32_t add_moe_layer(uint32_t x) {
+    Scope moe_scope(*this, "moe");
+    // weights: router [num_experts, hidden_size],
+    //   gate_up [num_experts, 2 * moe_intermediate_size, hidden_size], down [num_experts, hidden_size, moe_intermediate_size],
+    //   then gate_up and down of the shared experts if any
+    auto logits = add_linear(x, false, true, identity_reshape);
+    auto topk = add_moe_gating(logits, config.num_experts_per_tok, config.norm_topk_prob);
+    auto topk_weights = topk[0];
+    auto topk_ids = topk[1];
+
+    auto permuted = add_moe_permute(x, topk_ids, config.num_experts);
+    auto permuted_x = permuted[0];
+    auto expanded_row_idx = permuted[1];
+    auto group_list = permuted[2];
+
+    auto y = add_grouped_linear(permuted_x, group_list, config.weight_quant);
     y = add_swiglu(y);
-    y = add_linear(y, false, true, identity_reshape_func);
+    y = add_grouped_linear(y, group_list, config.weight_quant);
+    y = add_moe_unpermute(y, expanded_row_idx, topk_weights);
+
+    if (config.shared_expert_intermediate_size > 0) {
+      auto shared_y = add_mlp(x);
+      y = add_elewise_add(y, shared_y);
+    }
+    return y;
+  }
+
+  std::vector<uint32_t> add_moe_gating(uint32_t logits, int top_k, bool renormalize) {
+    // dbg(logits, top_k, renormalize);
+    uint32_t topk_weights = tensor_num++;
+    uint32_t topk_ids = tensor_num++;
+    push_node("gating", {{"top_k", top_k}, {"renormalize", renormalize}}, {logits}, {topk_weights, topk_ids});
+    internal_ids.push_back(topk_weights);
+    internal_ids.push_back(topk_ids);
+    return {topk_weights, topk_ids};
+  }
+
+  std::vector<uint32_t> add_moe_permute(uint32_t x, uint32_t topk_ids, int num_experts) {
+    // dbg(x, topk_ids, num_experts);
+    uint32_t permuted_x = tensor_num++;
+    uint32_t expanded_row_idx = tensor_num++;
+    uint32_t group_list = tensor_num++;
+    push_node("permute", {{"num_experts", num_experts}}, {x, topk_ids}, {permuted_x, expanded_row_idx, group_list});
+    internal_ids.push_back(permuted_x);
+    internal_ids.push_back(expanded_row_idx);
+    internal_ids.push_back(group_list);
+    return {permuted_x, expanded_row_idx, group_list};
+  }
+
+  uint32_t add_moe_unpermute(uint32_t y, uint32_t expanded_row_idx, uint32_t topk_weights) {
+    // dbg(y, expanded_row_idx, topk_weights);
+    uint32_t out = tensor_num++;
+    push_node("unpermute", {}, {y, expanded_row_idx, topk_weights}, {out});
+    internal_ids.push_back(out);
+    return out;
+  }
+
+  uint32_t add_grouped_linear(uint32_t x, uint32_t group_list, bool weight_quant = false) {
+    // dbg(x, group_list);
+    // w: [num_experts, out, in], x @ w[e].T for the rows of expert e
+    uint32_t w = tensor_num++;
+    uint32_t y = tensor_num++;
+    std::vector<uint32_t> node_in_ids;
+    if (weight_quant) {
+      uint32_t scale = tensor_num++;
+      node_in_ids = {x, w, scale, group_list};
+      in_ids.push_back(w);
+      in_ids.push_back(scale);
+    } else {
+      node_in_ids = {x, w, group_list};
+      in_ids.push_back(w);
+    }
+    push_node("grouped_linear", {{"weight_quant", weight_quant}}, node_in_ids, {y});
+    internal_ids.push_back(y);
     return y;
   }
 
+  uint32_t add_elewise_add(uint32_t x, uint32_t y) {
+    // dbg(x, y);
+    uint32_t out = tensor_num++;
+    push_node("add", {}, {x, y}, {out});
+    internal_ids.push_back(out);
+    return out;
+  }
+
   uint32_t add_attn(std::vector<uint32_t> xs) {
     // dbg(xs);
+    Scope attn_scope(*this, "attn");
     int num_heads = config.num_heads;
     int num_kv_heads = config.num_kv_heads;
     int head_dim = config.hidden_size / num_heads;
@@ -226,33 +665,19 @@ public:
     int kv_size = num_kv_heads * head_dim;
     int hidden_size = num_heads * head_dim;
 
-    auto qkv_proj = add_linear(x, false, true, identity_reshape_func);
+    auto qkv_proj = add_linear(x, false, true, identity_reshape, config.weight_quant);
     auto split = add_split(qkv_proj, 1, {q_size, kv_size, kv_size});
     auto q = split[0];
     auto k = split[1];
     auto v = split[2];
-    auto q_reshape_func = [=](const atb::Dims& old_shape, atb::Dims& new_shape) {
-      // q: [bs, q_size] -> [bs, num_heads, head_dim]
-      assert(old_shape.dimNum == 2);
-      assert(old_shape.dims[1] == q_size);
-      new_shape.dimNum = 3;
-      new_shape.dims[0] = old_shape.dims[0];
-      new_shape.dims[1] = num_heads;
-      new_shape.dims[2] = head_dim;
-    };
-    auto kv_reshape_func = [=](const atb::Dims& old_shape, atb::Dims& new_shape) {
-      // kv: [bs, kv_size] -> [bs, num_kv_heads, head_dim]
-      assert(old_shape.dimNum == 2);
-      assert(old_shape.dims[1] == kv_size);
-      new_shape.dimNum = 3;
-      new_shape.dims[0] = old_shape.dims[0];
-      new_shape.dims[1] = num_kv_heads;
-      new_shape.dims[2] = head_dim;
-    };
-    auto q_norm = add_rmsnorm(q, std::nullopt, rms_norm_eps, q_reshape_func);
-    auto k_norm = add_rmsnorm(k, std::nullopt, rms_norm_eps, kv_reshape_func);
+    // q: [bs, q_size] -> [bs, num_heads, head_dim]
+    Reshape q_reshape = {num_heads, head_dim};
+    // kv: [bs, kv_size] -> [bs, num_kv_heads, head_dim]
+    Reshape kv_reshape = {num_kv_heads, head_dim};
+    auto q_norm = add_rmsnorm(q, std::nullopt, rms_norm_eps, q_reshape);
+    auto k_norm = add_rmsnorm(k, std::nullopt, rms_norm_eps, kv_reshape);
 
-    auto qk_rope = add_rope(q_norm[0], k_norm[0], position_ids, cos_cache, sin_cache, identity_reshape_func, identity_reshape_func);
+    auto qk_rope = add_rope(q_norm[0], k_norm[0], position_ids, cos_cache, sin_cache, identity_reshape, identity_reshape);
 
     auto attn_out = add_paged_attn(
       qk_rope[0],
@@ -264,34 +689,28 @@ public:
       slot_mapping,
       block_tables,
       context_lens,
-      identity_reshape_func,
-      identity_reshape_func,
-      kv_reshape_func
+      identity_reshape,
+      identity_reshape,
+      kv_reshape
     );
 
-    auto x_reshape_back_func = [=](const atb::Dims& old_shape, atb::Dims& new_shape) {
-      // x: [bs, num_heads, head_dim] -> [bs, hidden_size]
-      assert(old_shape.dimNum == 3);
-      assert(old_shape.dims[1] == num_heads);
-      assert(old_shape.dims[2] == head_dim);
-      new_shape.dimNum = 2;
-      new_shape.dims[0] = old_shape.dims[0];
-      new_shape.dims[1] = hidden_size;
-    };
-    auto y = add_linear(attn_out, false, true, x_reshape_back_func);
+    // x: [bs, num_heads, head_dim] -> [bs, hidden_size]
+    Reshape x_reshape_back = {hidden_size};
+    auto y = add_linear(attn_out, false, true, x_reshape_back, config.weight_quant);
     return y;
   }
 
-  std::vector<uint32_t> add_rope(uint32_t q, uint32_t k, uint32_t position_ids, uint32_t cos_cache, uint32_t sin_cache, atb::ReshapeFunc q_reshape_func, atb::ReshapeFunc k_reshape_func) {
+  std::vector<uint32_t> add_rope(uint32_t q, uint32_t k, uint32_t position_ids, uint32_t cos_cache, uint32_t sin_cache, Reshape q_reshape, Reshape k_reshape) {
     // dbg(q, k, position_ids, cos_cache, sin_cache);
     uint32_t out_q = tensor_num++;
     uint32_t out_k = tensor_num++;
-    atb::Node node;
-    node.operation = new RopeEx();
-    node.inTensorIds = {q, k, position_ids, cos_cache, sin_cache};
-    node.outTensorIds = {out_q, out_k};
-    node.inTensorReshapeFuncs = {q_reshape_func, k_reshape_func, identity_reshape_func, identity_reshape_func, identity_reshape_func};
-    graph_param.nodes.push_back(node);
+    push_node(
+      "rope",
+      {},
+      {q, k, position_ids, cos_cache, sin_cache},
+      {out_q, out_k},
+      {q_reshape, k_reshape, identity_reshape, identity_reshape, identity_reshape}
+    );
     internal_ids.push_back(out_q);
     internal_ids.push_back(out_k);
     return {out_q, out_k};
@@ -308,108 +727,78 @@ public:
     uint32_t slot_mapping,
     uint32_t block_tables,
     uint32_t context_lens,
-    atb::ReshapeFunc q_reshape_func,
-    atb::ReshapeFunc k_reshape_func,
-    atb::ReshapeFunc v_reshape_func
+    Reshape q_reshape,
+    Reshape k_reshape,
+    Reshape v_reshape
   ) {
     // dbg(q, k, v, key_cache, value_cache, position_ids, slot_mapping, block_tables, context_lens);
+    push_node(
+      "reshape_and_cache",
+      {},
+      {k, v, key_cache, value_cache, slot_mapping},
+      {key_cache, value_cache},
+      {k_reshape, v_reshape, identity_reshape, identity_reshape, identity_reshape}
+    );
+
+    return add_paged_attn_node(q, key_cache, value_cache, block_tables, context_lens, q_reshape);
+  }
+
+  // the attention itself, on caches that already hold this step's k and v
+  uint32_t add_paged_attn_node(
+    uint32_t q,
+    uint32_t key_cache,
+    uint32_t value_cache,
+    uint32_t block_tables,
+    uint32_t context_lens,
+    Reshape q_reshape
+  ) {
     int num_heads = config.num_heads;
     int num_kv_heads = config.num_kv_heads;
     int head_dim = config.hidden_size / num_heads;
     float scale_value = 1.0f / std::sqrt(head_dim);
-
-    atb::Node cache_node;
-    atb::infer::ReshapeAndCacheParam cache_param;
-    cache_param.compressType = atb::infer::ReshapeAndCacheParam::COMPRESS_TYPE_UNDEFINED;
-    // cache_param.kvCacheCfg = atb::infer::ReshapeAndCacheParam::K_CACHE_V_CACHE;
-    cache_param.kvCacheCfg = atb::infer::ReshapeAndCacheParam::K_CACHE_V_CACHE_NZ;
-    CHECK_ATB(atb::CreateOperation(cache_param, &cache_node.operation));
-    cache_node.inTensorIds = {k, v, key_cache, value_cache, slot_mapping};
-    cache_node.outTensorIds = {key_cache, value_cache};
-    cache_node.inTensorReshapeFuncs = {
-      k_reshape_func,
-      v_reshape_func,
-      identity_reshape_func,
-      identity_reshape_func,
-      identity_reshape_func
-    };
-    graph_param.nodes.push_back(cache_node);
-
-
-    // paged attn
     uint32_t y = tensor_num++;
-    atb::Node paged_attn_node;
-    atb::infer::PagedAttentionParam paged_attn_param;
-    paged_attn_param.headNum = num_heads;
-    paged_attn_param.qkScale = scale_value;
-    paged_attn_param.kvHeadNum = num_kv_heads;
-    CHECK_ATB(atb::CreateOperation(paged_attn_param, &paged_attn_node.operation));
-    paged_attn_node.inTensorIds = {q, key_cache, value_cache, block_tables, context_lens};
-    paged_attn_node.outTensorIds = {y};
-    paged_attn_node.inTensorReshapeFuncs = {
-      q_reshape_func,
-      identity_reshape_func,
-      identity_reshape_func,
-      identity_reshape_func,
-      identity_reshape_func
+    std::map<std::string, double> params = {
+      {"ex", config.num_speculative_tokens > 0},
+      {"num_heads", num_heads},
+      {"num_kv_heads", num_kv_heads},
+      {"qk_scale", scale_value}
     };
-    graph_param.nodes.push_back(paged_attn_node);
+    push_node(
+      "paged_attention",
+      params,
+      {q, key_cache, value_cache, block_tables, context_lens},
+      {y},
+      {q_reshape, identity_reshape, identity_reshape, identity_reshape, identity_reshape}
+    );
     internal_ids.push_back(y);
     return y;
   }
 
   std::vector<uint32_t> add_split(uint32_t x, int dim, std::vector<int> sizes) {
     // dbg(x, dim, sizes);
-    atb::Node node;
-    atb::infer::SplitParam param;
-    param.splitDim = dim;
-    param.splitNum = (int32_t)sizes.size();
-    atb::SVector<int> split_sizes;
-    for (auto& size: sizes) {
-      split_sizes.push_back(size);
-    }
-    param.splitSizes = split_sizes;
-    CHECK_ATB(atb::CreateOperation(param, &node.operation));
-
+    std::map<std::string, double> params = {{"dim", dim}};
     std::vector<uint32_t> ys(sizes.size());
-    atb::SVector<uint32_t> ys_vec;
     for (int i = 0; i < sizes.size(); i++) {
+      params["size_" + std::to_string(i)] = sizes[i];
       ys[i] = tensor_num++;
-      ys_vec.push_back(ys[i]);
     }
-    node.inTensorIds = {x};
-    node.outTensorIds = ys_vec;
-    graph_param.nodes.push_back(node);
+    push_node("split", params, {x}, ys);
     for (auto& y: ys) {
       internal_ids.push_back(y);
     }
     return ys;
   }
 
-  std::vector<uint32_t> add_rmsnorm(uint32_t x, std::optional<uint32_t> residual, float eps, atb::ReshapeFunc x_reshape_func) {
+  std::vector<uint32_t> add_rmsnorm(uint32_t x, std::optional<uint32_t> residual, float eps, Reshape x_reshape) {
     // dbg(x, residual, eps);
     if (residual.has_value()) {
       uint32_t y_add = tensor_num++;
-      atb::Node add_node;
-      atb::infer::ElewiseParam add_param;
-      add_param.elewiseType = atb::infer::ElewiseParam::ELEWISE_ADD;
-      CHECK_ATB(atb::CreateOperation(add_param, &add_node.operation));
-      add_node.inTensorIds = {x, residual.value()};
-      add_node.outTensorIds = {y_add};
-      add_node.inTensorReshapeFuncs = {x_reshape_func, identity_reshape_func};
-      graph_param.nodes.push_back(add_node);
+      push_node("add", {}, {x, residual.value()}, {y_add}, {x_reshape, identity_reshape});
       internal_ids.push_back(y_add);
 
       uint32_t rmsnorm_w = tensor_num++;
       uint32_t y = tensor_num++;
-      atb::Node rmsnorm_node;
-      atb::infer::RmsNormParam rmsnorm_param;
-      rmsnorm_param.layerType = atb::infer::RmsNormParam::RMS_NORM_NORM;
-      rmsnorm_param.normParam.epsilon = eps;
-      CHECK_ATB(atb::CreateOperation(rmsnorm_param, &rmsnorm_node.operation));
-      rmsnorm_node.inTensorIds = {y_add, rmsnorm_w};
-      rmsnorm_node.outTensorIds = {y};
-      graph_param.nodes.push_back(rmsnorm_node);
+      push_node("rmsnorm", {{"eps", eps}}, {y_add, rmsnorm_w}, {y});
       in_ids.push_back(rmsnorm_w);
       internal_ids.push_back(y);
 
@@ -417,15 +806,7 @@ public:
     } else {
       uint32_t rmsnorm_w = tensor_num++;
       uint32_t y = tensor_num++;
-      atb::Node node;
-      atb::infer::RmsNormParam param;
-      param.layerType = atb::infer::RmsNormParam::RMS_NORM_NORM;
-      param.normParam.epsilon = eps;
-      CHECK_ATB(atb::CreateOperation(param, &node.operation));
-      node.inTensorIds = {x, rmsnorm_w};
-      node.outTensorIds = {y};
-      node.inTensorReshapeFuncs = {x_reshape_func, identity_reshape_func};
-      graph_param.nodes.push_back(node);
+      push_node("rmsnorm", {{"eps", eps}}, {x, rmsnorm_w}, {y}, {x_reshape, identity_reshape});
       in_ids.push_back(rmsnorm_w);
       internal_ids.push_back(y);
       return {y};
@@ -435,38 +816,52 @@ public:
   uint32_t add_swiglu(uint32_t x) {
     // dbg(x);
     uint32_t y = tensor_num++;
-    atb::Node node;
-    // FIXME: maybe memory leak
-    node.operation = new SwiGluEx();
-    node.inTensorIds = {x};
-    node.outTensorIds = {y};
-    graph_param.nodes.push_back(node);
+    push_node("swiglu", {}, {x}, {y});
 
     internal_ids.push_back(y);
     return y;
   }
 
-  uint32_t add_linear(uint32_t x, bool trans_a, bool trans_b, atb::ReshapeFunc x_reshape_func) {
+  uint32_t add_linear(uint32_t x, bool trans_a, bool trans_b, Reshape x_reshape, bool weight_quant = false) {
     // dbg(x, trans_a, trans_b);
-    atb::Node node;
+    if (weight_quant) {
+      return add_weight_quant_linear(x, trans_a, trans_b, x_reshape);
+    }
+    uint32_t w = tensor_num++;
+    uint32_t y = tensor_num++;
+
+    push_node(
+      "linear",
+      {{"trans_a", trans_a}, {"trans_b", trans_b}, {"weight_quant", 0}},
+      {x, w},
+      {y},
+      {x_reshape, identity_reshape}
+    );
 
-    atb::infer::LinearParam param;
-    param.transposeA = trans_a;
-    param.transposeB = trans_b;
-    param.hasBias = false;
-    param.outDataType = ACL_DT_UNDEFINED;
+    in_ids.push_back(w);
+    internal_ids.push_back(y);
 
-    CHECK_ATB(atb::CreateOperation(param, &node.operation));
+    return y;
+  }
 
+  uint32_t add_weight_quant_linear(uint32_t x, bool trans_a, bool trans_b, Reshape x_reshape) {
+    // dbg(x, trans_a, trans_b);
+    // WeightQuantMatMulEx only supports x @ w.T with w: [out, in] int8
+    assert(!trans_a && trans_b);
     uint32_t w = tensor_num++;
+    uint32_t scale = tensor_num++;
     uint32_t y = tensor_num++;
 
-    node.inTensorIds = {x, w};
-    node.outTensorIds = {y};
-    node.inTensorReshapeFuncs = {x_reshape_func, identity_reshape_func};
-    graph_param.nodes.push_back(node);
+    push_node(
+      "linear",
+      {{"trans_a", trans_a}, {"trans_b", trans_b}, {"weight_quant", 1}},
+      {x, w, scale},
+      {y},
+      {x_reshape, identity_reshape, identity_reshape}
+    );
 
     in_ids.push_back(w);
+    in_ids.push_back(scale);
     internal_ids.push_back(y);
 
     return y;
@@ -484,6 +879,16 @@ public:
 
   GraphConfig config;
 
+  // wrap the nodes of the graphs built from now on in TimedNodes, see node_stats
+  bool instrument = false;
+  // per op: its name, its nodes and their profile counters, plus the records of all timed nodes
+  std::vector<std::string> names;
+  std::vector<std::vector<NodeInfo>> node_infos;
+  std::vector<OpStats*> split_stats;
+  std::vector<std::shared_ptr<NodeRecord>> node_records;
+  // what every op was made of, see export
+  std::vector<GraphDesc> descs;
+
   Graph(GraphConfig config) : config(config) {
     config.display();
   }
@@ -496,18 +901,44 @@ public:
     }
   }
 
+  void add_op(atb::Operation* op, GraphBuilder& builder) {
+    const GraphDesc& desc = builder.desc;
+    ops.push_back(op);
+    descs.push_back(desc);
+    in_tensor_nums.push_back(desc.input_num);
+    weight_nums.push_back(desc.in_tensor_num - desc.input_num);
+    out_tensor_nums.push_back(desc.out_tensor_num);
+    names.push_back(desc.name);
+    node_infos.push_back(builder.node_infos);
+    split_stats.push_back(&op_stats(("graph." + desc.name).c_str()));
+    node_records.insert(node_records.end(), builder.records.begin(), builder.records.end());
+  }
+
+  // the ops of descriptions saved by export, instead of building them
+  void load(const std::vector<GraphDesc>& graph_descs) {
+    for (auto& desc: graph_descs) {
+      GraphBuilder builder(config, instrument);
+      auto op = builder.create(desc);
+      add_op(op, builder);
+      LOG_DBG(desc.name, in_tensor_nums.back(), weight_nums.back(), out_tensor_nums.back());
+    }
+  }
+
   void build_model(int num_split) {
+    if (config.fused_layers && config.weight_quant) {
+      throw std::runtime_error("fused_layers needs fp16 weights, not weight_quant");
+    }
     int num_layers = config.num_layers;
     assert(num_layers >= num_split);
     int num_layers_per_split = (num_layers + num_split - 1) / num_split;
     assert(num_layers_per_split > 0);
-    dbg(num_layers_per_split);
+    LOG_DBG(num_layers_per_split);
     for (int split_id = 0; split_id < num_split; split_id++) {
       int start_layer = split_id * num_layers_per_split;
       int end_layer = std::min(start_layer + num_layers_per_split, num_layers);
-      dbg(start_layer, end_layer);
+      LOG_DBG(start_layer, end_layer);
 
-      GraphBuilder builder(config);
+      GraphBuilder builder(config, instrument);
       int input_num = 0;
       if (start_layer == 0) {
         // input: token_ids, [key_cache, value_cache] * layer_num, position_ids, slot_mapping, block_tables, context_lens, cos_cache, sin_cache
@@ -516,6 +947,11 @@ public:
         // input: hidden_states, residual, [key_cache, value_cache] * layer_num, position_ids, slot_mapping, block_tables, context_lens, cos_cache, sin_cache
         input_num = 1 + 1 + 2 * (end_layer - start_layer) + 4 + 2;
       }
+      bool sampling = config.sampling && end_layer == num_layers;
+      if (sampling) {
+        // input: ..., temperature, top_k, top_p, repetition_penalty, uniform, penalty_token_ids
+        input_num += 6;
+      }
 
       std::string name = "split_" + std::to_string(split_id);
       auto op = builder.build(name.c_str(), input_num, [&](std::vector<uint32_t> xs) -> std::vector<uint32_t> {
@@ -563,6 +999,7 @@ public:
 
         // build
         for (int i = 0; i < end_layer - start_layer; i++) {
+          GraphBuilder::Scope layer_scope(builder, "layers." + std::to_string(start_layer + i));
           auto hidden_states_and_residual = builder.add_decoder_layer(
             hidden_states,
             residual,
@@ -582,55 +1019,70 @@ public:
 
         // build post-layer
         if (end_layer == config.num_layers) {
-          auto y_and_residual = builder.add_rmsnorm(hidden_states, residual, config.rms_norm_eps, builder.identity_reshape_func);
-          assert(y_and_residual.size() == 2);
-          auto y = y_and_residual[0];
+          uint32_t y = uint32_t(-1);
+          {
+            GraphBuilder::Scope norm_scope(builder, "norm");
+            auto y_and_residual = builder.add_rmsnorm(hidden_states, residual, config.rms_norm_eps, builder.identity_reshape);
+            assert(y_and_residual.size() == 2);
+            y = y_and_residual[0];
+          }
+          if (sampling) {
+            auto logits = builder.add_lm_head(y);
+            std::vector<uint32_t> params(xs.end() - 6, xs.end());
+            y = builder.add_sampling(logits, params);
+          } else if (config.num_speculative_tokens > 0) {
+            // the acceptance on the host needs the target logits of the draft positions
+            y = builder.add_lm_head(y);
+          }
           return {y};
         } else {
           return {hidden_states, residual.value()};
         }
       });
 
-      ops.push_back(op);
-      in_tensor_nums.push_back(input_num);
-      weight_nums.push_back(builder.in_ids.size() - input_num);
-      out_tensor_nums.push_back(builder.out_ids.size());
-      dbg(split_id, in_tensor_nums.back(), weight_nums.back(), out_tensor_nums.back());
+      add_op(op, builder);
+      LOG_DBG(split_id, in_tensor_nums.back(), weight_nums.back(), out_tensor_nums.back());
     }
   }
 
   void build_embedding() {
-    GraphBuilder builder(config);
+    GraphBuilder builder(config, instrument);
     auto op = builder.build("embedding", 1, [&](std::vector<uint32_t> xs) -> std::vector<uint32_t> {
       assert(xs.size() == 1);
       auto y = builder.add_embedding(xs[0]);
       return {y};
     });
 
-    ops.push_back(op);
-    in_tensor_nums.push_back(1);
-    weight_nums.push_back(builder.in_ids.size() - 1);
-    out_tensor_nums.push_back(builder.out_ids.size());
-    dbg(in_tensor_nums.back(), weight_nums.back(), out_tensor_nums.back());
+    add_op(op, builder);
+    LOG_DBG(in_tensor_nums.back(), weight_nums.back(), out_tensor_nums.back());
   }
 
   void build_mlp() {
-    GraphBuilder builder(config);
+    GraphBuilder builder(config, instrument);
     auto op = builder.build("mlp", 1, [&](std::vector<uint32_t> xs) -> std::vector<uint32_t> {
       assert(xs.size() == 1);
       auto y = builder.add_mlp(xs[0]);
       return {y};
     });
 
-    ops.push_back(op);
-    in_tensor_nums.push_back(1);
-    weight_nums.push_back(builder.in_ids.size() - 1);
-    out_tensor_nums.push_back(builder.out_ids.size());
-    dbg(in_tensor_nums.back(), weight_nums.back(), out_tensor_nums.back());
+    add_op(op, builder);
+    LOG_DBG(in_tensor_nums.back(), weight_nums.back(), out_tensor_nums.back());
+  }
+
+  void build_moe_layer() {
+    GraphBuilder builder(config, instrument);
+    auto op = builder.build("moe_layer", 1, [&](std::vector<uint32_t> xs) -> std::vector<uint32_t> {
+      assert(xs.size() == 1);
+      auto y = builder.add_moe_layer(xs[0]);
+      return {y};
+    });
+
+    add_op(op, builder);
+    LOG_DBG(in_tensor_nums.back(), weight_nums.back(), out_tensor_nums.back());
   }
 
   void build_attn() {
-    GraphBuilder builder(config);
+    GraphBuilder builder(config, instrument);
     auto op = builder.build("attn", 9, [&](std::vector<uint32_t> xs) -> std::vector<uint32_t> {
       // x, key_cache, value_cache, position_ids, slot_mapping, block_tables, context_lens
       assert(xs.size() == 9);
@@ -638,15 +1090,12 @@ public:
       return {y};
     });
 
-    ops.push_back(op);
-    in_tensor_nums.push_back(9);
-    weight_nums.push_back(builder.in_ids.size() - 9);
-    out_tensor_nums.push_back(builder.out_ids.size());
-    dbg(in_tensor_nums.back(), weight_nums.back(), out_tensor_nums.back());
+    add_op(op, builder);
+    LOG_DBG(in_tensor_nums.back(), weight_nums.back(), out_tensor_nums.back());
   }
 
   void build_paged_attn() {
-    GraphBuilder builder(config);
+    GraphBuilder builder(config, instrument);
     auto op = builder.build("paged_attn", 9, [&](std::vector<uint32_t> xs) -> std::vector<uint32_t> {
       assert(xs.size() == 9);
       auto q = xs[0];
@@ -669,65 +1118,53 @@ public:
         slot_mapping,
         block_tables,
         context_lens,
-        builder.identity_reshape_func,
-        builder.identity_reshape_func,
-        builder.identity_reshape_func
+        builder.identity_reshape,
+        builder.identity_reshape,
+        builder.identity_reshape
       );
 
       return {attn_out};
     });
 
-    ops.push_back(op);
-    in_tensor_nums.push_back(9);
-    weight_nums.push_back(builder.in_ids.size() - 9);
-    out_tensor_nums.push_back(builder.out_ids.size());
-    dbg(in_tensor_nums.back(), weight_nums.back(), out_tensor_nums.back());
+    add_op(op, builder);
+    LOG_DBG(in_tensor_nums.back(), weight_nums.back(), out_tensor_nums.back());
   }
 
   void build_rope() {
-    GraphBuilder builder(config);
+    GraphBuilder builder(config, instrument);
     auto op = builder.build("rope", 5, [&](std::vector<uint32_t> xs) -> std::vector<uint32_t> {
       assert(xs.size() == 5);
-      auto ys = builder.add_rope(xs[0], xs[1], xs[2], xs[3], xs[4], builder.identity_reshape_func, builder.identity_reshape_func);
+      auto ys = builder.add_rope(xs[0], xs[1], xs[2], xs[3], xs[4], builder.identity_reshape, builder.identity_reshape);
       return ys;
     });
 
-    ops.push_back(op);
-    in_tensor_nums.push_back(5);
-    weight_nums.push_back(builder.in_ids.size() - 5);
-    out_tensor_nums.push_back(builder.out_ids.size());
-    dbg(in_tensor_nums.back(), weight_nums.back(), out_tensor_nums.back());
+    add_op(op, builder);
+    LOG_DBG(in_tensor_nums.back(), weight_nums.back(), out_tensor_nums.back());
   }
 
 
   void build_rmsnorm() {
-    GraphBuilder builder(config);
+    GraphBuilder builder(config, instrument);
     auto op = builder.build("rmsnorm", 1, [&](std::vector<uint32_t> xs) -> std::vector<uint32_t> {
       assert(xs.size() == 1);
-      auto ys = builder.add_rmsnorm(xs[0], std::nullopt, builder.config.rms_norm_eps, builder.identity_reshape_func);
+      auto ys = builder.add_rmsnorm(xs[0], std::nullopt, builder.config.rms_norm_eps, builder.identity_reshape);
       return ys;
     });
 
-    ops.push_back(op);
-    in_tensor_nums.push_back(1);
-    weight_nums.push_back(builder.in_ids.size() - 1);
-    out_tensor_nums.push_back(builder.out_ids.size());
-    dbg(in_tensor_nums.back(), weight_nums.back(), out_tensor_nums.back());
+    add_op(op, builder);
+    LOG_DBG(in_tensor_nums.back(), weight_nums.back(), out_tensor_nums.back());
   }
 
   void build_rmsnorm_with_residual() {
-    GraphBuilder builder(config);
+    GraphBuilder builder(config, instrument);
     auto op = builder.build("rmsnorm_with_residual", 2, [&](std::vector<uint32_t> xs) -> std::vector<uint32_t> {
       assert(xs.size() == 2);
-      auto ys = builder.add_rmsnorm(xs[0], xs[1], builder.config.rms_norm_eps, builder.identity_reshape_func);
+      auto ys = builder.add_rmsnorm(xs[0], xs[1], builder.config.rms_norm_eps, builder.identity_reshape);
       return ys;
     });
 
-    ops.push_back(op);
-    in_tensor_nums.push_back(2);
-    weight_nums.push_back(builder.in_ids.size() - 2);
-    out_tensor_nums.push_back(builder.out_ids.size());
-    dbg(in_tensor_nums.back(), weight_nums.back(), out_tensor_nums.back());
+    add_op(op, builder);
+    LOG_DBG(in_tensor_nums.back(), weight_nums.back(), out_tensor_nums.back());
   }
 
 };
@@ -745,17 +1182,73 @@ public:
   Context() {
     atb::Context* raw = nullptr;
     CHECK_ATB(atb::CreateContext(&raw));
-    printf("Context created %p\n", raw);
+    LOG_DEBUG("Context created %p", raw);
     ctx.reset(raw, [](atb::Context* p) {
       if (p) {
-        printf("Context destroyed %p\n", p);
+        LOG_DEBUG("Context destroyed %p", p);
         atb::DestroyContext(p);
       }
     });
   }
 };
 
+py::dict graph_desc_to_dict(const GraphDesc& desc) {
+  py::list nodes;
+  for (auto& node: desc.nodes) {
+    py::dict d;
+    d["name"] = node.name;
+    d["kind"] = node.kind;
+    d["params"] = node.params;
+    d["inputs"] = node.in_ids;
+    d["outputs"] = node.out_ids;
+    d["reshapes"] = node.reshapes;
+    nodes.append(d);
+  }
+  py::dict d;
+  d["name"] = desc.name;
+  d["input_num"] = desc.input_num;
+  d["in_tensor_num"] = desc.in_tensor_num;
+  d["out_tensor_num"] = desc.out_tensor_num;
+  d["internal_tensor_num"] = desc.internal_tensor_num;
+  d["nodes"] = nodes;
+  return d;
+}
+
+GraphDesc graph_desc_from_dict(const py::dict& d) {
+  GraphDesc desc;
+  desc.name = d["name"].cast<std::string>();
+  desc.input_num = d["input_num"].cast<uint32_t>();
+  desc.in_tensor_num = d["in_tensor_num"].cast<uint32_t>();
+  desc.out_tensor_num = d["out_tensor_num"].cast<uint32_t>();
+  desc.internal_tensor_num = d["internal_tensor_num"].cast<uint32_t>();
+  uint32_t tensor_num = desc.in_tensor_num + desc.out_tensor_num + desc.internal_tensor_num;
+  for (auto item: d["nodes"]) {
+    auto n = item.cast<py::dict>();
+    NodeDesc node;
+    node.name = n["name"].cast<std::string>();
+    node.kind = n["kind"].cast<std::string>();
+    node.params = n["params"].cast<std::map<std::string, double>>();
+    node.in_ids = n["inputs"].cast<std::vector<uint32_t>>();
+    node.out_ids = n["outputs"].cast<std::vector<uint32_t>>();
+    node.reshapes = n["reshapes"].cast<std::vector<Reshape>>();
+    for (auto ids: {&node.in_ids, &node.out_ids}) {
+      for (auto id: *ids) {
+        if (id >= tensor_num) {
+          throw std::runtime_error("node " + node.name + " of " + desc.name + " uses tensor " + std::to_string(id) + " of " + std::to_string(tensor_num));
+        }
+      }
+    }
+    if (!node.reshapes.empty() && node.reshapes.size() != node.in_ids.size()) {
+      throw std::runtime_error("node " + node.name + " of " + desc.name + " has " + std::to_string(node.reshapes.size()) + " reshapes for " + std::to_string(node.in_ids.size()) + " inputs");
+    }
+    desc.nodes.push_back(node);
+  }
+  return desc;
+}
+
 void init_ffi_graph(py::module_ &&m) {
+  m.attr("DESC_VERSION") = kGraphDescVersion;
+
   py::class_<GraphConfig>(m, "GraphConfig")
     .def(py::init<>())
     .def_readwrite("batch_size", &GraphConfig::batch_size)
@@ -764,22 +1257,111 @@ void init_ffi_graph(py::module_ &&m) {
     .def_readwrite("num_kv_heads", &GraphConfig::num_kv_heads)
     .def_readwrite("intermediate_size", &GraphConfig::intermediate_size)
     .def_readwrite("num_layers", &GraphConfig::num_layers)
-    .def_readwrite("rms_norm_eps", &GraphConfig::rms_norm_eps);
+    .def_readwrite("rms_norm_eps", &GraphConfig::rms_norm_eps)
+    .def_readwrite("weight_quant", &GraphConfig::weight_quant)
+    .def_readwrite("num_experts", &GraphConfig::num_experts)
+    .def_readwrite("num_experts_per_tok", &GraphConfig::num_experts_per_tok)
+    .def_readwrite("norm_topk_prob", &GraphConfig::norm_topk_prob)
+    .def_readwrite("shared_expert_intermediate_size", &GraphConfig::shared_expert_intermediate_size)
+    .def_readwrite("sampling", &GraphConfig::sampling)
+    .def_readwrite("tie_word_embeddings", &GraphConfig::tie_word_embeddings)
+    .def_readwrite("num_speculative_tokens", &GraphConfig::num_speculative_tokens)
+    .def_readwrite("fused_layers", &GraphConfig::fused_layers)
+    .def("num_tokens", &GraphConfig::num_tokens);
 
   py::class_<Graph>(m, "Graph")
     .def(py::init<GraphConfig>())
     .def("build_model", &Graph::build_model)
     .def("build_embedding", &Graph::build_embedding)
     .def("build_mlp", &Graph::build_mlp)
+    .def("build_moe_layer", &Graph::build_moe_layer)
     .def("build_paged_attn", &Graph::build_paged_attn)
     .def("build_rope", &Graph::build_rope)
     .def("build_rmsnorm", &Graph::build_rmsnorm)
     .def("build_rmsnorm_with_residual", &Graph::build_rmsnorm_with_residual)
-    .def("build_attn", &Graph::build_attn);
+    .def("build_attn", &Graph::build_attn)
+    .def_readonly("config", &Graph::config)
+    .def_readwrite("instrument", &Graph::instrument)
+    .def("export", [](Graph& self) {
+      py::list splits;
+      for (auto& desc: self.descs) {
+        splits.append(graph_desc_to_dict(desc));
+      }
+      py::dict d;
+      d["version"] = kGraphDescVersion;
+      d["splits"] = splits;
+      return d;
+    }, "The built ops as data: per op its tensor counts and nodes with kind, params, tensor ids and reshapes")
+    .def("load", [](Graph& self, py::dict d) {
+      int version = d["version"].cast<int>();
+      if (version != kGraphDescVersion) {
+        std::stringstream ss;
+        ss << "graph desc version mismatch, expected " << kGraphDescVersion << ", got " << version;
+        throw std::runtime_error(ss.str());
+      }
+      std::vector<GraphDesc> descs;
+      for (auto split: d["splits"]) {
+        descs.push_back(graph_desc_from_dict(split.cast<py::dict>()));
+      }
+      pybind11::gil_scoped_release gil_release;
+      self.load(descs);
+    }, "Creates the ops of a Graph.export instead of building them")
+    .def("nodes", [](Graph& self) {
+      py::list nodes;
+      for (int i = 0; i < self.names.size(); i++) {
+        for (auto& info: self.node_infos[i]) {
+          py::dict node;
+          node["split"] = self.names[i];
+          node["name"] = info.name;
+          node["op_type"] = info.op_type;
+          node["inputs"] = info.in_ids;
+          node["outputs"] = info.out_ids;
+          nodes.append(node);
+        }
+      }
+      return nodes;
+    }, "Node registry of the built graphs: split, scoped name, atb op type and graph tensor ids")
+    .def("node_stats", [](Graph& self) {
+      {
+        pybind11::gil_scoped_release gil_release;
+        for (auto& record: self.node_records) {
+          std::lock_guard<std::mutex> lock(record->mutex);
+          record->resolve(true);
+        }
+      }
+      py::list stats;
+      for (auto& record: self.node_records) {
+        std::lock_guard<std::mutex> lock(record->mutex);
+        py::dict node;
+        node["split"] = record->split;
+        node["name"] = record->name;
+        node["op_type"] = record->op_type;
+        node["in_shapes"] = record->in_shapes;
+        node["out_shapes"] = record->out_shapes;
+        node["out_bytes"] = record->out_bytes;
+        node["workspace_bytes"] = record->workspace_size;
+        node["calls"] = record->calls;
+        node["device_ns"] = record->device_ns;
+        stats.append(node);
+      }
+      return stats;
+    }, "Shapes, output bytes, workspace and device time of every node of an instrumented graph, waits for the pending runs")
+    .def("reset_node_stats", [](Graph& self) {
+      pybind11::gil_scoped_release gil_release;
+      for (auto& record: self.node_records) {
+        std::lock_guard<std::mutex> lock(record->mutex);
+        record->resolve(true);
+        record->calls = 0;
+        record->device_ns = 0;
+      }
+    });
 
 
   py::class_<Context>(m, "Context")
     .def(py::init<>())
+    // of the last setup, one per split
+    .def_readonly("workspace_sizes", &Context::workspace_sizes)
+    .def_readonly("max_workspace_size", &Context::max_workspace_size)
     .def("setup", [](
       Context& self,
       Graph& graph,
@@ -793,11 +1375,12 @@ void init_ffi_graph(py::module_ &&m) {
       at::Tensor cos_cache,
       at::Tensor sin_cache,
       std::vector<at::Tensor> weights,
-      at::Tensor out
+      at::Tensor out,
+      std::vector<at::Tensor> sampling_inputs
     ) -> uint64_t {
       pybind11::gil_scoped_release gil_release;
       aclrtStream stream = c10_npu::getCurrentNPUStream().stream();
-      dbg(stream);
+      LOG_DBG(stream);
       CHECK_ATB(self.ctx->SetExecuteStream(stream));
       if (key_caches.size() != graph.config.num_layers) {
         std::stringstream ss;
@@ -809,14 +1392,14 @@ void init_ffi_graph(py::module_ &&m) {
         ss << "value_caches size mismatch, expected " << graph.config.num_layers << ", got " << value_caches.size();
         throw std::runtime_error(ss.str());
       }
-      if (position_ids.size(0) != graph.config.batch_size) {
+      if (position_ids.size(0) != graph.config.num_tokens()) {
         std::stringstream ss;
-        ss << "position_ids size mismatch, expected " << graph.config.batch_size << ", got " << position_ids.size(0);
+        ss << "position_ids size mismatch, expected " << graph.config.num_tokens() << ", got " << position_ids.size(0);
         throw std::runtime_error(ss.str());
       }
-      if (slot_mapping.size(0) != graph.config.batch_size) {
+      if (slot_mapping.size(0) != graph.config.num_tokens()) {
         std::stringstream ss;
-        ss << "slot_mapping size mismatch, expected " << graph.config.batch_size << ", got " << slot_mapping.size(0);
+        ss << "slot_mapping size mismatch, expected " << graph.config.num_tokens() << ", got " << slot_mapping.size(0);
         throw std::runtime_error(ss.str());
       }
       if (block_tables.size(0) != graph.config.batch_size) {
@@ -830,6 +1413,25 @@ void init_ffi_graph(py::module_ &&m) {
         throw std::runtime_error(ss.str());
       }
 
+      if (graph.config.sampling && sampling_inputs.size() != 6) {
+        std::stringstream ss;
+        ss << "sampling_inputs size mismatch, expected 6, got " << sampling_inputs.size();
+        throw std::runtime_error(ss.str());
+      }
+      if (graph.config.sampling) {
+        // SamplingEx reads the params of every logits row, a penalty_token_ids without tokens is empty
+        const char* names[] = {"temperature", "top_k", "top_p", "repetition_penalty", "uniform", "penalty_token_ids"};
+        for (int i = 0; i < 6; ++i) {
+          if (i == 5 && sampling_inputs[i].numel() == 0) continue;
+          if (sampling_inputs[i].dim() == 0 || sampling_inputs[i].size(0) != graph.config.num_tokens()) {
+            std::stringstream ss;
+            ss << names[i] << " size mismatch, expected " << graph.config.num_tokens() << ", got "
+              << (sampling_inputs[i].dim() == 0 ? 0 : sampling_inputs[i].size(0));
+            throw std::runtime_error(ss.str());
+          }
+        }
+      }
+
       int total_weight_num = std::accumulate(graph.weight_nums.begin(), graph.weight_nums.end(), 0);
       if (weights.size() != total_weight_num) {
         std::stringstream ss;
@@ -839,9 +1441,11 @@ void init_ffi_graph(py::module_ &&m) {
 
       int num_split = graph.ops.size();
       int num_layers_per_split = (graph.config.num_layers + num_split - 1) / num_split;
-      dbg(num_split, num_layers_per_split);
+      LOG_DBG(num_split, num_layers_per_split);
       std::map<torch::ScalarType, aclDataType> dtype_map = {
         {torch::kFloat16, ACL_FLOAT16},
+        {torch::kFloat32, ACL_FLOAT},
+        {torch::kInt8, ACL_INT8},
         {torch::kInt32, ACL_INT32},
         {torch::kInt64, ACL_INT64}
       };
@@ -888,11 +1492,16 @@ void init_ffi_graph(py::module_ &&m) {
         pack.inTensors.push_back(to_atb_tensor(context_lens, ACL_FORMAT_ND));
         pack.inTensors.push_back(to_atb_tensor(cos_cache, ACL_FORMAT_ND));
         pack.inTensors.push_back(to_atb_tensor(sin_cache, ACL_FORMAT_ND));
+        if (graph.config.sampling && split_id == num_split - 1) {
+          for (auto& x: sampling_inputs) {
+            pack.inTensors.push_back(to_atb_tensor(x, ACL_FORMAT_ND));
+          }
+        }
         assert(pack.inTensors.size() == graph.in_tensor_nums[split_id]);
 
         // weight
         int weight_num = graph.weight_nums[split_id];
-        dbg(weight_num, weight_num_offset, pack.inTensors.size());
+        LOG_DBG(weight_num, weight_num_offset, pack.inTensors.size());
         for (int i = weight_num_offset; i < weight_num_offset + weight_num; i++) {
           assert(i < weights.size());
           pack.inTensors.push_back(to_atb_tensor(weights[i], ACL_FORMAT_ND));
@@ -903,8 +1512,8 @@ void init_ffi_graph(py::module_ &&m) {
         // output
         if (split_id < num_split - 1) {
           auto options = at::TensorOptions().dtype(key_caches[0].scalar_type()).device(key_caches[0].device());
-          auto y = at::empty({graph.config.batch_size, graph.config.hidden_size}, options);
-          auto y_residual = at::empty({graph.config.batch_size, graph.config.hidden_size}, options);
+          auto y = at::empty({graph.config.num_tokens(), graph.config.hidden_size}, options);
+          auto y_residual = at::empty({graph.config.num_tokens(), graph.config.hidden_size}, options);
           self.intermediate_tensors.push_back({y, y_residual});
           pack.outTensors.push_back(to_atb_tensor(y, ACL_FORMAT_ND));
           pack.outTensors.push_back(to_atb_tensor(y_residual, ACL_FORMAT_ND));
@@ -915,7 +1524,7 @@ void init_ffi_graph(py::module_ &&m) {
 
         uint64_t workspace_size = 0;
         CHECK_ATB(graph.ops[split_id]->Setup(pack, workspace_size, self.ctx.get()));
-        dbg(split_id, workspace_size);
+        LOG_DBG(split_id, workspace_size);
         self.workspace_sizes.push_back(workspace_size);
         self.packs.push_back(pack);
       }
@@ -928,18 +1537,32 @@ void init_ffi_graph(py::module_ &&m) {
       }
       auto _max_workspace_size = std::max_element(self.workspace_sizes.begin(), self.workspace_sizes.end());
       self.max_workspace_size = *_max_workspace_size;
-      dbg(self.max_workspace_size);
+      LOG_DBG(self.max_workspace_size);
       if (self.packs.size() != num_split) {
         std::stringstream ss;
         ss << "packs size mismatch, expected " << num_split << ", got " << self.packs.size();
         throw std::runtime_error(ss.str());
       }
       return self.max_workspace_size;
-    })
+    },
+    py::arg("graph"),
+    py::arg("token_ids"),
+    py::arg("key_caches"),
+    py::arg("value_caches"),
+    py::arg("position_ids"),
+    py::arg("slot_mapping"),
+    py::arg("block_tables"),
+    py::arg("context_lens"),
+    py::arg("cos_cache"),
+    py::arg("sin_cache"),
+    py::arg("weights"),
+    py::arg("out"),
+    // temperature, top_k, top_p, repetition_penalty, uniform, penalty_token_ids, only with config.sampling
+    py::arg("sampling_inputs") = std::vector<at::Tensor>())
     .def("setup_fullgraph", [](Context& self, Graph& graph, std::vector<at::Tensor>& inputs, std::vector<int> input_formats, std::vector<at::Tensor>& weights, std::vector<at::Tensor>& outputs) -> uint64_t {
       pybind11::gil_scoped_release gil_release;
       aclrtStream stream = c10_npu::getCurrentNPUStream().stream();
-      dbg(stream);
+      LOG_DBG(stream);
       CHECK_ATB(self.ctx->SetExecuteStream(stream));
       if (graph.ops.size() != 1) {
         std::stringstream ss;
@@ -964,6 +1587,8 @@ void init_ffi_graph(py::module_ &&m) {
 
       std::map<torch::ScalarType, aclDataType> dtype_map = {
         {torch::kFloat16, ACL_FLOAT16},
+        {torch::kFloat32, ACL_FLOAT},
+        {torch::kInt8, ACL_INT8},
         {torch::kInt32, ACL_INT32},
         {torch::kInt64, ACL_INT64}
       };
@@ -1012,9 +1637,9 @@ void init_ffi_graph(py::module_ &&m) {
       }
       uint64_t workspace_size = 0;
       CHECK_ATB(graph.ops[0]->Setup(pack, workspace_size, self.ctx.get()));
-      dbg(workspace_size);
+      LOG_DBG(workspace_size);
       self.max_workspace_size = workspace_size;
-      dbg(self.max_workspace_size);
+      LOG_DBG(self.max_workspace_size);
 
       self.workspace_sizes.push_back(workspace_size);
       self.packs.push_back(pack);
@@ -1026,8 +1651,13 @@ void init_ffi_graph(py::module_ &&m) {
       // So we need to use run_with_dummy_setup
       // dbg("[warning] use run_with_dummy_setup instead to support re-run");
       pybind11::gil_scoped_release gil_release;
+      aclrtStream stream = self.ctx->GetExecuteStream();
       for (int i = 0; i < graph.ops.size(); i++) {
+        PROFILE_OP_STATS(timer, *graph.split_stats[i], stream);
+        timer.created();
+        timer.workspace_sized();
         CHECK_ATB(graph.ops[i]->Execute(self.packs[i], workspace.data_ptr<uint8_t>(), self.workspace_sizes[i], self.ctx.get()));
+        timer.launched();
       }
     })
     .def("run_with_dummy_setup", [](Context& self, Graph& graph, at::Tensor workspace) {
@@ -1048,7 +1678,11 @@ void init_ffi_graph(py::module_ &&m) {
       }
       // dbg("run_with_dummy_setup execute");
       for (int i = 0; i < graph.ops.size(); i++) {
+        PROFILE_OP_STATS(timer, *graph.split_stats[i], stream);
+        timer.created();
+        timer.workspace_sized();
         CHECK_ATB(graph.ops[i]->Execute(self.packs[i], workspace.data_ptr<uint8_t>(), self.workspace_sizes[i], self.ctx.get()));
+        timer.launched();
       }
     });
 
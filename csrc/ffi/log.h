@@ -0,0 +1,49 @@
+#pragma once
+
+#include <atomic>
+#include <cstdarg>
+#include <cstdio>
+
+namespace native {
+
+// ASCEND910A_EXTRAS_LOG_LEVEL=error|warn|info|debug, default warn: the hot path prints nothing
+enum LogLevel { kLogError = 0, kLogWarn = 1, kLogInfo = 2, kLogDebug = 3 };
+
+extern std::atomic<int> log_level;
+
+inline bool log_enabled(int level) {
+  return level <= log_level.load(std::memory_order_relaxed);
+}
+
+inline void log_write(int level, const char* fmt, ...) {
+  static const char* names[] = {"E", "W", "I", "D"};
+  fprintf(stderr, "[ascend910a_extras %s] ", names[level]);
+  va_list args;
+  va_start(args, fmt);
+  vfprintf(stderr, fmt, args);
+  va_end(args);
+  fputc('\n', stderr);
+}
+
+}  // namespace native
+
+// printf-style, the arguments are only evaluated when the level is on
+#define NATIVE_LOG(level, ...) \
+  do { \
+    if (native::log_enabled(level)) { \
+      native::log_write(level, __VA_ARGS__); \
+    } \
+  } while (0)
+
+#define LOG_ERROR(...) NATIVE_LOG(native::kLogError, __VA_ARGS__)
+#define LOG_WARN(...) NATIVE_LOG(native::kLogWarn, __VA_ARGS__)
+#define LOG_INFO(...) NATIVE_LOG(native::kLogInfo, __VA_ARGS__)
+#define LOG_DEBUG(...) NATIVE_LOG(native::kLogDebug, __VA_ARGS__)
+
+// dbg(...) of dbg/dbg.h at debug level, for dumping tensors and vectors by name
+#define LOG_DBG(...) \
+  do { \
+    if (native::log_enabled(native::kLogDebug)) { \
+      dbg(__VA_ARGS__); \
+    } \
+  } while (0)
@@ -6,11 +6,60 @@
 #include "aclnn_reshape_and_cache_ex.h"
 #include "aclnn_paged_attention_ex.h"
 #include "aclnn_rope_ex.h"
+#include "aclnn_weight_quant_mat_mul_ex.h"
+#include "aclnn_weight_quant_grouped_mat_mul_ex.h"
+#include "aclnn_moe_gating_top_k_ex.h"
+#include "aclnn_moe_permute_ex.h"
+#include "aclnn_moe_unpermute_ex.h"
+#include "aclnn_sampling_ex.h"
+#include "aclnn_copy_blocks_ex.h"
+#include "log.h"
+#include "profile.h"
+#include <map>
+#include <mutex>
 #include <tuple>
 
 namespace native {
 
-std::vector<at::Tensor> rope(at::Tensor q, at::Tensor k, at::Tensor position_ids, at::Tensor cos_cache, at::Tensor sin_cache) {
+// scratch of the aclnn calls, one buffer per stream grown on demand instead of an allocation
+// per call; the kernels of a stream run in order so they can all share it
+void* get_workspace(uint64_t size, const at::Device& device) {
+  if (size == 0) {
+    return nullptr;
+  }
+  static std::mutex mutex;
+  // never freed, the runtime may be gone when static destructors run
+  static auto* buffers = new std::map<aclrtStream, at::Tensor>();
+  aclrtStream stream = c10_npu::getCurrentNPUStream().stream();
+  std::lock_guard<std::mutex> lock(mutex);
+  at::Tensor& buffer = (*buffers)[stream];
+  if (!buffer.defined() || (uint64_t)buffer.numel() < size) {
+    buffer = at::empty({(int64_t)size}, at::TensorOptions().dtype(torch::kUInt8).device(device));
+  }
+  return buffer.data_ptr();
+}
+
+// 1-element device tensors of scalar arguments (epsilon, window_size), made once per value
+at::Tensor device_scalar(double value, at::ScalarType dtype, const at::Device& device) {
+  static std::mutex mutex;
+  static auto* scalars = new std::map<std::tuple<int, int, double>, at::Tensor>();
+  std::lock_guard<std::mutex> lock(mutex);
+  auto key = std::make_tuple((int)device.index(), (int)dtype, value);
+  auto it = scalars->find(key);
+  if (it == scalars->end()) {
+    it = scalars->emplace(key, at::tensor({value}, at::TensorOptions().dtype(dtype).device(device))).first;
+  }
+  return it->second;
+}
+
+void check_out(const at::Tensor& out, at::IntArrayRef sizes, at::ScalarType dtype, const at::Device& device, const char* name) {
+  TORCH_CHECK(out.sizes() == sizes && out.scalar_type() == dtype && out.device() == device && out.is_contiguous(),
+              name, " must be a contiguous ", dtype, " tensor of shape ", sizes, " on ", device,
+              ", got ", out.scalar_type(), " ", out.sizes(), " on ", out.device());
+}
+
+// out_q/out_k may be q/k, every token row is loaded before it is written
+void rope_out(at::Tensor q, at::Tensor k, at::Tensor position_ids, at::Tensor cos_cache, at::Tensor sin_cache, at::Tensor out_q, at::Tensor out_k) {
   TORCH_CHECK(q.dim() == 3 && k.dim() == 3 && position_ids.dim() == 1 && cos_cache.dim() == 2 && sin_cache.dim() == 2,
               "rope: input tensors must be 3D, 3D, 1D, 2D, and 2D, got ", q.dim(), "D, ", k.dim(), "D, ", position_ids.dim(), "D, ", cos_cache.dim(), "D, ", sin_cache.dim(), "D");
   TORCH_CHECK(position_ids.size(0) == q.size(0),
@@ -22,10 +71,11 @@ std::vector<at::Tensor> rope(at::Tensor q, at::Tensor k, at::Tensor position_ids
   int num_heads = q.size(1);
   int head_dim = q.size(2);
 
-  at::Tensor out_q = at::empty_like(q);
-  at::Tensor out_k = at::empty_like(k);
+  check_out(out_q, q.sizes(), q.scalar_type(), q.device(), "rope: out_q");
+  check_out(out_k, k.sizes(), k.scalar_type(), k.device(), "rope: out_k");
 
   aclrtStream stream = c10_npu::getCurrentNPUStream().stream();
+  PROFILE_OP(timer, "rope", stream);
 
   // create ACL tensors
   auto q_sizes = q.sizes();
@@ -71,16 +121,18 @@ std::vector<at::Tensor> rope(at::Tensor q, at::Tensor k, at::Tensor position_ids
     throw std::runtime_error("Failed to create ACL tensor for out_k");
   }
 
+  timer.created();
   uint64_t workspace_size = 0;
   aclOpExecutor* handle = nullptr;
   if (aclnnRopeExGetWorkspaceSize(q_acl, k_acl, position_ids_acl, cos_cache_acl, sin_cache_acl, out_q_acl, out_k_acl, &workspace_size, &handle) != ACL_SUCCESS) {
     throw std::runtime_error("Failed to get workspace size");
   }
-  auto options = at::TensorOptions().dtype(torch::kUInt8).device(q.device());
-  auto workspace_tensor = at::empty({(int64_t)workspace_size}, options);
-  if (aclnnRopeEx(workspace_tensor.data_ptr(), workspace_size, handle, stream) != ACL_SUCCESS) {
+  void* workspace = get_workspace(workspace_size, q.device());
+  timer.workspace_sized();
+  if (aclnnRopeEx(workspace, workspace_size, handle, stream) != ACL_SUCCESS) {
     throw std::runtime_error("Failed to execute rope");
   }
+  timer.launched();
 
   if (aclDestroyTensor(q_acl) != ACL_SUCCESS) {
     throw std::runtime_error("Failed to destroy ACL tensor for q");
@@ -103,27 +155,35 @@ std::vector<at::Tensor> rope(at::Tensor q, at::Tensor k, at::Tensor position_ids
   if (aclDestroyTensor(out_k_acl) != ACL_SUCCESS) {
     throw std::runtime_error("Failed to destroy ACL tensor for out_k");
   }
+}
 
+std::vector<at::Tensor> rope(at::Tensor q, at::Tensor k, at::Tensor position_ids, at::Tensor cos_cache, at::Tensor sin_cache) {
+  at::Tensor out_q = at::empty_like(q);
+  at::Tensor out_k = at::empty_like(k);
+  rope_out(q, k, position_ids, cos_cache, sin_cache, out_q, out_k);
   return {out_q, out_k};
 }
 
-at::Tensor swiglu(at::Tensor x) {
+void swiglu_out(at::Tensor x, int64_t block_size, int64_t core_num, at::Tensor y) {
   TORCH_CHECK(x.dim() == 2,
               "swiglu: input tensor must be 2D, got ", x.dim(), "D tensor");
   TORCH_CHECK(x.size(-1) >= 64 && x.size(-1) % 64 == 0,
               "swiglu: last dimension must be a multiple of 64, got ", x.size(-1));
   TORCH_CHECK(x.is_contiguous(),
               "swiglu: input tensor must be contiguous");
+  TORCH_CHECK(block_size == 0 || (x.size(-1) / 2) % block_size == 0,
+              "swiglu: output dimension must be a multiple of block_size, got ", x.size(-1) / 2, " and ", block_size);
 
   at::ScalarType scalar_type = x.scalar_type();
   auto x_sizes = x.sizes();
   auto x_strides = x.strides();
   std::vector<int64_t> y_sizes(x_sizes.begin(), x_sizes.end());
   y_sizes.back() = y_sizes.back() / 2;
-  at::Tensor y = at::empty(y_sizes, x.options());
+  check_out(y, y_sizes, x.scalar_type(), x.device(), "swiglu: out");
   auto y_strides = y.strides();
 
   aclrtStream stream = c10_npu::getCurrentNPUStream().stream();
+  PROFILE_OP(timer, "swiglu", stream);
   aclTensor *x_acl = aclCreateTensor(x_sizes.data(), x.dim(), ACL_FLOAT16, x_strides.data(), 0, ACL_FORMAT_ND, x_sizes.data(), x.dim(), x.data_ptr());
   if (x_acl == nullptr) {
     throw std::runtime_error("Failed to create ACL tensor");
@@ -133,16 +193,18 @@ at::Tensor swiglu(at::Tensor x) {
     throw std::runtime_error("Failed to create ACL tensor");
   }
 
+  timer.created();
   uint64_t workspace_size = 0;
   aclOpExecutor* handle = nullptr;
-  if (aclnnSwiGluExGetWorkspaceSize(x_acl, y_acl, &workspace_size, &handle) != ACL_SUCCESS) {
+  if (aclnnSwiGluExGetWorkspaceSize(x_acl, block_size, core_num, y_acl, &workspace_size, &handle) != ACL_SUCCESS) {
     throw std::runtime_error("Failed to get workspace size");
   }
-  auto options = at::TensorOptions().dtype(torch::kUInt8).device(x.device());
-  auto workspace_tensor = at::empty({(int64_t)workspace_size}, options);
-  if (aclnnSwiGluEx(workspace_tensor.data_ptr(), workspace_size, handle, stream) != ACL_SUCCESS) {
+  void* workspace = get_workspace(workspace_size, x.device());
+  timer.workspace_sized();
+  if (aclnnSwiGluEx(workspace, workspace_size, handle, stream) != ACL_SUCCESS) {
     throw std::runtime_error("Failed to execute swiglu");
   }
+  timer.launched();
 
   if (aclDestroyTensor(x_acl) != ACL_SUCCESS) {
     throw std::runtime_error("Failed to destroy ACL tensor for x");
@@ -150,11 +212,17 @@ at::Tensor swiglu(at::Tensor x) {
   if (aclDestroyTensor(y_acl) != ACL_SUCCESS) {
     throw std::runtime_error("Failed to destroy ACL tensor for y");
   }
+}
+
+at::Tensor swiglu(at::Tensor x, int64_t block_size, int64_t core_num) {
+  TORCH_CHECK(x.dim() == 2, "swiglu: input tensor must be 2D, got ", x.dim(), "D tensor");
+  at::Tensor y = at::empty({x.size(0), x.size(1) / 2}, x.options());
+  swiglu_out(x, block_size, core_num, y);
   return y;
 }
 
 
-at::Tensor grouped_matmul(at::Tensor x, at::Tensor w, at::Tensor group_list) {
+void grouped_matmul_out(at::Tensor x, at::Tensor w, at::Tensor group_list, at::Tensor y) {
   TORCH_CHECK(x.dim() == 2 && w.dim() == 3 && group_list.dim() == 1,
               "grouped_matmul: input tensors must be 2D and group_list must be 1D");
   at::ScalarType scalar_type = x.scalar_type();
@@ -176,10 +244,11 @@ at::Tensor grouped_matmul(at::Tensor x, at::Tensor w, at::Tensor group_list) {
   uint8_t* x_ptr = reinterpret_cast<uint8_t*>(x.data_ptr());
   uint8_t* w_ptr = reinterpret_cast<uint8_t*>(w.data_ptr());
   uint8_t* group_list_ptr = reinterpret_cast<uint8_t*>(group_list.data_ptr());
-  at::Tensor y = at::empty({num_tokens, inner_dim}, x.options());
+  check_out(y, {num_tokens, inner_dim}, x.scalar_type(), x.device(), "grouped_matmul: out");
   uint8_t* y_ptr = reinterpret_cast<uint8_t*>(y.data_ptr());
 
   aclrtStream stream = c10_npu::getCurrentNPUStream().stream();
+  PROFILE_OP(timer, "grouped_matmul", stream);
   auto x_sizes = x.sizes();
   auto x_strides = x.strides();
   aclTensor* x_acl = aclCreateTensor(x_sizes.data(), x.dim(), ACL_FLOAT16, x_strides.data(), 0, ACL_FORMAT_ND, x_sizes.data(), x.dim(), x.data_ptr());
@@ -206,16 +275,186 @@ at::Tensor grouped_matmul(at::Tensor x, at::Tensor w, at::Tensor group_list) {
   if (y_acl == nullptr) {
     throw std::runtime_error("Failed to create ACL tensor for y");
   }
+  timer.created();
   uint64_t workspace_size = 0;
   aclOpExecutor* handle = nullptr;
   if (aclnnGroupedMatMulExGetWorkspaceSize(x_acl, w_acl, group_list_acl, y_acl, &workspace_size, &handle) != ACL_SUCCESS) {
     throw std::runtime_error("Failed to get workspace size");
   }
-  auto options = at::TensorOptions().dtype(torch::kUInt8).device(x.device());
-  auto workspace_tensor = at::empty({(int64_t)workspace_size}, options);
-  if (aclnnGroupedMatMulEx(workspace_tensor.data_ptr(), workspace_size, handle, stream) != ACL_SUCCESS) {
+  void* workspace = get_workspace(workspace_size, x.device());
+  timer.workspace_sized();
+  if (aclnnGroupedMatMulEx(workspace, workspace_size, handle, stream) != ACL_SUCCESS) {
     throw std::runtime_error("Failed to execute grouped_matmul");
   }
+  timer.launched();
+
+  if (aclDestroyTensor(x_acl) != ACL_SUCCESS) {
+    throw std::runtime_error("Failed to destroy ACL tensor for x");
+  }
+  if (aclDestroyTensor(w_acl) != ACL_SUCCESS) {
+    throw std::runtime_error("Failed to destroy ACL tensor for w");
+  }
+  if (aclDestroyTensor(group_list_acl) != ACL_SUCCESS) {
+    throw std::runtime_error("Failed to destroy ACL tensor for group_list");
+  }
+  if (aclDestroyTensor(y_acl) != ACL_SUCCESS) {
+    throw std::runtime_error("Failed to destroy ACL tensor for y");
+  }
+}
+
+at::Tensor grouped_matmul(at::Tensor x, at::Tensor w, at::Tensor group_list) {
+  TORCH_CHECK(x.dim() == 2 && w.dim() == 3, "grouped_matmul: input tensors must be 2D and group_list must be 1D");
+  at::Tensor y = at::empty({x.size(0), w.size(2)}, x.options());
+  grouped_matmul_out(x, w, group_list, y);
+  return y;
+}
+
+
+void weight_quant_matmul_out(at::Tensor x, at::Tensor w, at::Tensor scale, at::Tensor y) {
+  TORCH_CHECK(x.dim() == 2 && w.dim() == 2 && scale.dim() == 2,
+              "weight_quant_matmul: x, w and scale must be 2D");
+  TORCH_CHECK(w.scalar_type() == at::kChar,
+              "weight_quant_matmul: w must be int8, got ", w.scalar_type());
+  TORCH_CHECK(x.size(1) == w.size(1),
+              "weight_quant_matmul: last dimension of x must match last dimension of w, got ", x.size(1), " and ", w.size(1));
+  TORCH_CHECK(scale.size(1) == w.size(0) && x.size(1) % scale.size(0) == 0,
+              "weight_quant_matmul: scale must be [dim / group_size, inner_dim], got ", scale.sizes());
+  TORCH_CHECK(x.is_contiguous() && w.is_contiguous() && scale.is_contiguous(),
+              "weight_quant_matmul: all input tensors must be contiguous");
+  TORCH_CHECK(w.size(0) % 64 == 0 && (x.size(1) / scale.size(0)) % 64 == 0,
+              "weight_quant_matmul: inner_dim and group_size must be multiples of 64, got ", w.size(0), " and ", x.size(1) / scale.size(0));
+
+  int num_tokens = x.size(0);
+  int inner_dim = w.size(0);
+  check_out(y, {num_tokens, inner_dim}, x.scalar_type(), x.device(), "weight_quant_matmul: out");
+
+  aclrtStream stream = c10_npu::getCurrentNPUStream().stream();
+  PROFILE_OP(timer, "weight_quant_matmul", stream);
+  auto x_sizes = x.sizes();
+  auto x_strides = x.strides();
+  aclTensor* x_acl = aclCreateTensor(x_sizes.data(), x.dim(), ACL_FLOAT16, x_strides.data(), 0, ACL_FORMAT_ND, x_sizes.data(), x.dim(), x.data_ptr());
+  if (x_acl == nullptr) {
+    throw std::runtime_error("Failed to create ACL tensor for x");
+  }
+  auto w_sizes = w.sizes();
+  auto w_strides = w.strides();
+  aclTensor* w_acl = aclCreateTensor(w_sizes.data(), w.dim(), ACL_INT8, w_strides.data(), 0, ACL_FORMAT_ND, w_sizes.data(), w.dim(), w.data_ptr());
+  if (w_acl == nullptr) {
+    throw std::runtime_error("Failed to create ACL tensor for w");
+  }
+  auto scale_sizes = scale.sizes();
+  auto scale_strides = scale.strides();
+  aclTensor* scale_acl = aclCreateTensor(scale_sizes.data(), scale.dim(), ACL_FLOAT16, scale_strides.data(), 0, ACL_FORMAT_ND, scale_sizes.data(), scale.dim(), scale.data_ptr());
+  if (scale_acl == nullptr) {
+    throw std::runtime_error("Failed to create ACL tensor for scale");
+  }
+  auto y_sizes = y.sizes();
+  auto y_strides = y.strides();
+  aclTensor* y_acl = aclCreateTensor(y_sizes.data(), y.dim(), ACL_FLOAT16, y_strides.data(), 0, ACL_FORMAT_ND, y_sizes.data(), y.dim(), y.data_ptr());
+  if (y_acl == nullptr) {
+    throw std::runtime_error("Failed to create ACL tensor for y");
+  }
+
+  timer.created();
+  uint64_t workspace_size = 0;
+  aclOpExecutor* handle = nullptr;
+  if (aclnnWeightQuantMatMulExGetWorkspaceSize(x_acl, w_acl, scale_acl, y_acl, &workspace_size, &handle) != ACL_SUCCESS) {
+    throw std::runtime_error("Failed to get workspace size");
+  }
+  void* workspace = get_workspace(workspace_size, x.device());
+  timer.workspace_sized();
+  if (aclnnWeightQuantMatMulEx(workspace, workspace_size, handle, stream) != ACL_SUCCESS) {
+    throw std::runtime_error("Failed to execute weight_quant_matmul");
+  }
+  timer.launched();
+
+  if (aclDestroyTensor(x_acl) != ACL_SUCCESS) {
+    throw std::runtime_error("Failed to destroy ACL tensor for x");
+  }
+  if (aclDestroyTensor(w_acl) != ACL_SUCCESS) {
+    throw std::runtime_error("Failed to destroy ACL tensor for w");
+  }
+  if (aclDestroyTensor(scale_acl) != ACL_SUCCESS) {
+    throw std::runtime_error("Failed to destroy ACL tensor for scale");
+  }
+  if (aclDestroyTensor(y_acl) != ACL_SUCCESS) {
+    throw std::runtime_error("Failed to destroy ACL tensor for y");
+  }
+}
+
+at::Tensor weight_quant_matmul(at::Tensor x, at::Tensor w, at::Tensor scale) {
+  TORCH_CHECK(x.dim() == 2 && w.dim() == 2, "weight_quant_matmul: x, w and scale must be 2D");
+  at::Tensor y = at::empty({x.size(0), w.size(0)}, x.options());
+  weight_quant_matmul_out(x, w, scale, y);
+  return y;
+}
+
+
+void weight_quant_grouped_matmul_out(at::Tensor x, at::Tensor w, at::Tensor scale, at::Tensor group_list, at::Tensor y) {
+  TORCH_CHECK(x.dim() == 2 && w.dim() == 3 && scale.dim() == 3 && group_list.dim() == 1,
+              "weight_quant_grouped_matmul: x must be 2D, w and scale must be 3D and group_list must be 1D");
+  TORCH_CHECK(w.scalar_type() == at::kChar,
+              "weight_quant_grouped_matmul: w must be int8, got ", w.scalar_type());
+  TORCH_CHECK(x.size(1) == w.size(2),
+              "weight_quant_grouped_matmul: last dimension of x must match last dimension of w, got ", x.size(1), " and ", w.size(2));
+  TORCH_CHECK(scale.size(0) == w.size(0) && scale.size(2) == w.size(1) && x.size(1) % scale.size(1) == 0,
+              "weight_quant_grouped_matmul: scale must be [num_exports, dim / group_size, inner_dim], got ", scale.sizes());
+  TORCH_CHECK(group_list.size(0) == w.size(0),
+              "weight_quant_grouped_matmul: group_list must have num_exports entries, got ", group_list.size(0));
+  TORCH_CHECK(x.is_contiguous() && w.is_contiguous() && scale.is_contiguous() && group_list.is_contiguous(),
+              "weight_quant_grouped_matmul: all input tensors must be contiguous");
+  TORCH_CHECK(w.size(1) % 64 == 0 && (x.size(1) / scale.size(1)) % 64 == 0,
+              "weight_quant_grouped_matmul: inner_dim and group_size must be multiples of 64, got ", w.size(1), " and ", x.size(1) / scale.size(1));
+
+  int num_tokens = x.size(0);
+  int inner_dim = w.size(1);
+  check_out(y, {num_tokens, inner_dim}, x.scalar_type(), x.device(), "weight_quant_grouped_matmul: out");
+
+  aclrtStream stream = c10_npu::getCurrentNPUStream().stream();
+  PROFILE_OP(timer, "weight_quant_grouped_matmul", stream);
+  auto x_sizes = x.sizes();
+  auto x_strides = x.strides();
+  aclTensor* x_acl = aclCreateTensor(x_sizes.data(), x.dim(), ACL_FLOAT16, x_strides.data(), 0, ACL_FORMAT_ND, x_sizes.data(), x.dim(), x.data_ptr());
+  if (x_acl == nullptr) {
+    throw std::runtime_error("Failed to create ACL tensor for x");
+  }
+  auto w_sizes = w.sizes();
+  auto w_strides = w.strides();
+  aclTensor* w_acl = aclCreateTensor(w_sizes.data(), w.dim(), ACL_INT8, w_strides.data(), 0, ACL_FORMAT_ND, w_sizes.data(), w.dim(), w.data_ptr());
+  if (w_acl == nullptr) {
+    throw std::runtime_error("Failed to create ACL tensor for w");
+  }
+  auto scale_sizes = scale.sizes();
+  auto scale_strides = scale.strides();
+  aclTensor* scale_acl = aclCreateTensor(scale_sizes.data(), scale.dim(), ACL_FLOAT16, scale_strides.data(), 0, ACL_FORMAT_ND, scale_sizes.data(), scale.dim(), scale.data_ptr());
+  if (scale_acl == nullptr) {
+    throw std::runtime_error("Failed to create ACL tensor for scale");
+  }
+  auto group_list_sizes = group_list.sizes();
+  auto group_list_strides = group_list.strides();
+  aclTensor* group_list_acl = aclCreateTensor(group_list_sizes.data(), group_list.dim(), ACL_INT64, group_list_strides.data(), 0, ACL_FORMAT_ND, group_list_sizes.data(), group_list.dim(), group_list.data_ptr());
+  if (group_list_acl == nullptr) {
+    throw std::runtime_error("Failed to create ACL tensor for group_list");
+  }
+  auto y_sizes = y.sizes();
+  auto y_strides = y.strides();
+  aclTensor* y_acl = aclCreateTensor(y_sizes.data(), y.dim(), ACL_FLOAT16, y_strides.data(), 0, ACL_FORMAT_ND, y_sizes.data(), y.dim(), y.data_ptr());
+  if (y_acl == nullptr) {
+    throw std::runtime_error("Failed to create ACL tensor for y");
+  }
+
+  timer.created();
+  uint64_t workspace_size = 0;
+  aclOpExecutor* handle = nullptr;
+  if (aclnnWeightQuantGroupedMatMulExGetWorkspaceSize(x_acl, w_acl, scale_acl, group_list_acl, y_acl, &workspace_size, &handle) != ACL_SUCCESS) {
+    throw std::runtime_error("Failed to get workspace size");
+  }
+  void* workspace = get_workspace(workspace_size, x.device());
+  timer.workspace_sized();
+  if (aclnnWeightQuantGroupedMatMulEx(workspace, workspace_size, handle, stream) != ACL_SUCCESS) {
+    throw std::runtime_error("Failed to execute weight_quant_grouped_matmul");
+  }
+  timer.launched();
 
   if (aclDestroyTensor(x_acl) != ACL_SUCCESS) {
     throw std::runtime_error("Failed to destroy ACL tensor for x");
@@ -223,17 +462,27 @@ at::Tensor grouped_matmul(at::Tensor x, at::Tensor w, at::Tensor group_list) {
   if (aclDestroyTensor(w_acl) != ACL_SUCCESS) {
     throw std::runtime_error("Failed to destroy ACL tensor for w");
   }
+  if (aclDestroyTensor(scale_acl) != ACL_SUCCESS) {
+    throw std::runtime_error("Failed to destroy ACL tensor for scale");
+  }
   if (aclDestroyTensor(group_list_acl) != ACL_SUCCESS) {
     throw std::runtime_error("Failed to destroy ACL tensor for group_list");
   }
   if (aclDestroyTensor(y_acl) != ACL_SUCCESS) {
     throw std::runtime_error("Failed to destroy ACL tensor for y");
   }
+}
+
+at::Tensor weight_quant_grouped_matmul(at::Tensor x, at::Tensor w, at::Tensor scale, at::Tensor group_list) {
+  TORCH_CHECK(x.dim() == 2 && w.dim() == 3, "weight_quant_grouped_matmul: x must be 2D, w and scale must be 3D and group_list must be 1D");
+  at::Tensor y = at::empty({x.size(0), w.size(1)}, x.options());
+  weight_quant_grouped_matmul_out(x, w, scale, group_list, y);
   return y;
 }
 
 
-std::tuple<at::Tensor, at::Tensor> add_rms_norm(at::Tensor x, at::Tensor residual, at::Tensor weight, float epsilon) {
+// y may be x and residual_output may be residual, every block is loaded before it is written
+void add_rms_norm_out(at::Tensor x, at::Tensor residual, at::Tensor weight, float epsilon, int64_t block_size, int64_t core_num, at::Tensor y, at::Tensor residual_output) {
   TORCH_CHECK(x.dim() == 2 && residual.dim() == 2 && weight.dim() == 1,
               "add_rms_norm: x and residual must be 2D, weight must be 1D");
   TORCH_CHECK(x.size(1) == weight.size(0),
@@ -247,10 +496,11 @@ std::tuple<at::Tensor, at::Tensor> add_rms_norm(at::Tensor x, at::Tensor residua
 
   int num_tokens = x.size(0);
   int dim = x.size(1);
-  at::Tensor y = at::empty({num_tokens, dim}, x.options());
-  at::Tensor residual_output = at::empty({num_tokens, dim}, x.options());
+  check_out(y, {num_tokens, dim}, x.scalar_type(), x.device(), "add_rms_norm: out");
+  check_out(residual_output, {num_tokens, dim}, x.scalar_type(), x.device(), "add_rms_norm: residual_out");
 
   aclrtStream stream = c10_npu::getCurrentNPUStream().stream();
+  PROFILE_OP(timer, "add_rms_norm", stream);
 
   // Create ACL tensors
   auto x_sizes = x.sizes();
@@ -275,7 +525,7 @@ std::tuple<at::Tensor, at::Tensor> add_rms_norm(at::Tensor x, at::Tensor residua
   }
 
   // Create epsilon tensor (optional parameter)
-  at::Tensor epsilon_tensor = at::tensor({epsilon}, at::TensorOptions().dtype(torch::kFloat32).device(x.device()));
+  at::Tensor epsilon_tensor = device_scalar(epsilon, torch::kFloat32, x.device());
   auto epsilon_sizes = epsilon_tensor.sizes();
   auto epsilon_strides = epsilon_tensor.strides();
   aclTensor* epsilon_acl = aclCreateTensor(epsilon_sizes.data(), epsilon_tensor.dim(), ACL_FLOAT, epsilon_strides.data(), 0, ACL_FORMAT_ND, epsilon_sizes.data(), epsilon_tensor.dim(), epsilon_tensor.data_ptr());
@@ -298,16 +548,18 @@ std::tuple<at::Tensor, at::Tensor> add_rms_norm(at::Tensor x, at::Tensor residua
   }
 
   // Get workspace size and execute
+  timer.created();
   uint64_t workspace_size = 0;
   aclOpExecutor* handle = nullptr;
-  if (aclnnAddRMSNormExGetWorkspaceSize(x_acl, residual_acl, weight_acl, epsilon_acl, y_acl, residual_output_acl, &workspace_size, &handle) != ACL_SUCCESS) {
+  if (aclnnAddRMSNormExGetWorkspaceSize(x_acl, residual_acl, weight_acl, epsilon_acl, block_size, core_num, y_acl, residual_output_acl, &workspace_size, &handle) != ACL_SUCCESS) {
     throw std::runtime_error("Failed to get workspace size");
   }
-  auto options = at::TensorOptions().dtype(torch::kUInt8).device(x.device());
-  auto workspace_tensor = at::empty({(int64_t)workspace_size}, options);
-  if (aclnnAddRMSNormEx(workspace_tensor.data_ptr(), workspace_size, handle, stream) != ACL_SUCCESS) {
+  void* workspace = get_workspace(workspace_size, x.device());
+  timer.workspace_sized();
+  if (aclnnAddRMSNormEx(workspace, workspace_size, handle, stream) != ACL_SUCCESS) {
     throw std::runtime_error("Failed to execute add_rms_norm");
   }
+  timer.launched();
 
   // Clean up ACL tensors
   if (aclDestroyTensor(x_acl) != ACL_SUCCESS) {
@@ -328,12 +580,17 @@ std::tuple<at::Tensor, at::Tensor> add_rms_norm(at::Tensor x, at::Tensor residua
   if (aclDestroyTensor(residual_output_acl) != ACL_SUCCESS) {
     throw std::runtime_error("Failed to destroy ACL tensor for residual_output");
   }
+}
 
+std::tuple<at::Tensor, at::Tensor> add_rms_norm(at::Tensor x, at::Tensor residual, at::Tensor weight, float epsilon, int64_t block_size, int64_t core_num) {
+  at::Tensor y = at::empty_like(x);
+  at::Tensor residual_output = at::empty_like(x);
+  add_rms_norm_out(x, residual, weight, epsilon, block_size, core_num, y, residual_output);
   return std::make_tuple(y, residual_output);
 }
 
 
-void reshape_and_cache(at::Tensor key, at::Tensor value, at::Tensor key_cache, at::Tensor value_cache, at::Tensor slot_indices) {
+void reshape_and_cache(at::Tensor key, at::Tensor value, at::Tensor key_cache, at::Tensor value_cache, at::Tensor slot_indices, at::Tensor key_scale, at::Tensor value_scale) {
   TORCH_CHECK(key.dim() == 3 && key_cache.dim() == 4 && slot_indices.dim() == 1,
               "reshape_and_cache: key must be 3D, key_cache must be 4D, slot_indices must be 1D");
   TORCH_CHECK(key.is_contiguous() && key_cache.is_contiguous() && slot_indices.is_contiguous(),
@@ -345,7 +602,21 @@ void reshape_and_cache(at::Tensor key, at::Tensor value, at::Tensor key_cache, a
   if (value_cache.numel() > 0) {
       TORCH_CHECK(value_cache.dim() == 4 && value_cache.is_contiguous(), "reshape_and_cache: value_cache must be 4D and contiguous if not None");
   }
+  // int8 kv cache: key_scale/value_scale: [num_pages, num_kv_heads, page_size]
+  bool kv_quant = key_cache.scalar_type() == at::kChar;
+  aclDataType cache_dtype = kv_quant ? ACL_INT8 : ACL_FLOAT16;
+  if (kv_quant) {
+    TORCH_CHECK(key_scale.dim() == 3 && key_scale.is_contiguous() && key_scale.scalar_type() == at::kHalf,
+                "reshape_and_cache: key_scale must be a contiguous 3D fp16 tensor for int8 key_cache");
+    TORCH_CHECK(value_cache.numel() == 0 || value_cache.scalar_type() == at::kChar,
+                "reshape_and_cache: key_cache and value_cache must have the same dtype");
+    if (value.numel() > 0 && value_cache.numel() > 0) {
+      TORCH_CHECK(value_scale.dim() == 3 && value_scale.is_contiguous() && value_scale.scalar_type() == at::kHalf,
+                  "reshape_and_cache: value_scale must be a contiguous 3D fp16 tensor for int8 value_cache");
+    }
+  }
   aclrtStream stream = c10_npu::getCurrentNPUStream().stream();
+  PROFILE_OP(timer, "reshape_and_cache", stream);
 
   // create ACL tensor
   auto key_sizes = key.sizes();
@@ -364,7 +635,7 @@ void reshape_and_cache(at::Tensor key, at::Tensor value, at::Tensor key_cache, a
 
   auto key_cache_sizes = key_cache.sizes();
   auto key_cache_strides = key_cache.strides();
-  aclTensor* key_cache_acl = aclCreateTensor(key_cache_sizes.data(), key_cache.dim(), ACL_FLOAT16, key_cache_strides.data(), 0, ACL_FORMAT_ND, key_cache_sizes.data(), key_cache.dim(), key_cache.data_ptr());
+  aclTensor* key_cache_acl = aclCreateTensor(key_cache_sizes.data(), key_cache.dim(), cache_dtype, key_cache_strides.data(), 0, ACL_FORMAT_ND, key_cache_sizes.data(), key_cache.dim(), key_cache.data_ptr());
   TORCH_CHECK(key_cache_acl != nullptr, "Failed to create ACL tensor for key_cache");
 
   // value_cache can be empty
@@ -372,7 +643,7 @@ void reshape_and_cache(at::Tensor key, at::Tensor value, at::Tensor key_cache, a
   if (value_cache.numel() > 0) {
     auto value_cache_sizes = value_cache.sizes();
     auto value_cache_strides = value_cache.strides();
-    value_cache_acl = aclCreateTensor(value_cache_sizes.data(), value_cache.dim(), ACL_FLOAT16, value_cache_strides.data(), 0, ACL_FORMAT_ND, value_cache_sizes.data(), value_cache.dim(), value_cache.data_ptr());
+    value_cache_acl = aclCreateTensor(value_cache_sizes.data(), value_cache.dim(), cache_dtype, value_cache_strides.data(), 0, ACL_FORMAT_ND, value_cache_sizes.data(), value_cache.dim(), value_cache.data_ptr());
     TORCH_CHECK(value_cache_acl != nullptr, "Failed to create ACL tensor for value_cache");
   }
 
@@ -381,19 +652,33 @@ void reshape_and_cache(at::Tensor key, at::Tensor value, at::Tensor key_cache, a
   aclTensor* slot_indices_acl = aclCreateTensor(slot_indices_sizes.data(), slot_indices.dim(), ACL_INT32, slot_indices_strides.data(), 0, ACL_FORMAT_ND, slot_indices_sizes.data(), slot_indices.dim(), slot_indices.data_ptr());
   TORCH_CHECK(slot_indices_acl != nullptr, "Failed to create ACL tensor for slot_indices");
 
+  // scales only exist for int8 kv cache
+  aclTensor* key_scale_acl = nullptr;
+  if (kv_quant) {
+    key_scale_acl = aclCreateTensor(key_scale.sizes().data(), key_scale.dim(), ACL_FLOAT16, key_scale.strides().data(), 0, ACL_FORMAT_ND, key_scale.sizes().data(), key_scale.dim(), key_scale.data_ptr());
+    TORCH_CHECK(key_scale_acl != nullptr, "Failed to create ACL tensor for key_scale");
+  }
+  aclTensor* value_scale_acl = nullptr;
+  if (kv_quant && value_scale.numel() > 0) {
+    value_scale_acl = aclCreateTensor(value_scale.sizes().data(), value_scale.dim(), ACL_FLOAT16, value_scale.strides().data(), 0, ACL_FORMAT_ND, value_scale.sizes().data(), value_scale.dim(), value_scale.data_ptr());
+    TORCH_CHECK(value_scale_acl != nullptr, "Failed to create ACL tensor for value_scale");
+  }
+
   // get workspace and handle
+  timer.created();
   uint64_t workspace_size = 0;
   aclOpExecutor* handle = nullptr;
-  if (aclnnReshapeAndCacheExGetWorkspaceSize(key_acl, value_acl, key_cache_acl, value_cache_acl, slot_indices_acl, &workspace_size, &handle) != ACL_SUCCESS) {
+  if (aclnnReshapeAndCacheExGetWorkspaceSize(key_acl, value_acl, key_cache_acl, value_cache_acl, slot_indices_acl, key_scale_acl, value_scale_acl, &workspace_size, &handle) != ACL_SUCCESS) {
     throw std::runtime_error("Failed to get workspace size for reshape_and_cache");
   }
-  auto options = at::TensorOptions().dtype(torch::kUInt8).device(key.device());
-  auto workspace_tensor = at::empty({(int64_t)workspace_size}, options);
+  void* workspace = get_workspace(workspace_size, key.device());
+  timer.workspace_sized();
 
   // execute kernel
-  if (aclnnReshapeAndCacheEx(workspace_tensor.data_ptr(), workspace_size, handle, stream) != ACL_SUCCESS) {
+  if (aclnnReshapeAndCacheEx(workspace, workspace_size, handle, stream) != ACL_SUCCESS) {
     throw std::runtime_error("Failed to execute reshape_and_cache");
   }
+  timer.launched();
 
   // clean up
   aclDestroyTensor(key_acl);
@@ -401,11 +686,13 @@ void reshape_and_cache(at::Tensor key, at::Tensor value, at::Tensor key_cache, a
   aclDestroyTensor(key_cache_acl);
   if (value_cache_acl) aclDestroyTensor(value_cache_acl);
   aclDestroyTensor(slot_indices_acl);
+  if (key_scale_acl) aclDestroyTensor(key_scale_acl);
+  if (value_scale_acl) aclDestroyTensor(value_scale_acl);
   return;
 }
 
 
-at::Tensor paged_attention(at::Tensor q, at::Tensor key_cache, at::Tensor value_cache, at::Tensor block_tables, at::Tensor context_lens) {
+void paged_attention_out(at::Tensor q, at::Tensor key_cache, at::Tensor value_cache, at::Tensor block_tables, at::Tensor context_lens, at::Tensor key_scale, at::Tensor value_scale, at::Tensor alibi_slopes, int64_t window_size, at::Tensor y) {
   int bs = q.size(0);
   int num_heads = q.size(1);
   int head_dim = q.size(2);
@@ -413,7 +700,30 @@ at::Tensor paged_attention(at::Tensor q, at::Tensor key_cache, at::Tensor value_
   int num_pages = key_cache.size(0);
   int num_kv_heads = key_cache.size(1) * 16 / head_dim;
   int page_size = key_cache.size(2);
-  printf("bs: %d, num_heads: %d, head_dim: %d, num_pages: %d, num_kv_heads: %d, page_size: %d\n", bs, num_heads, head_dim, num_pages, num_kv_heads, page_size);
+  TORCH_CHECK(head_dim % 16 == 0 && page_size % 16 == 0, "paged_attention: head_dim and page_size must be multiples of 16");
+  TORCH_CHECK(num_kv_heads > 0 && num_heads % num_kv_heads == 0, "paged_attention: num_heads must be a multiple of num_kv_heads");
+  TORCH_CHECK(num_heads / num_kv_heads <= 64, "paged_attention: group size must be in [1, 64], got ", num_heads / num_kv_heads);
+  // int8 kv cache: key_scale/value_scale: [num_pages, num_kv_heads, page_size]
+  bool kv_quant = key_cache.scalar_type() == at::kChar;
+  aclDataType cache_dtype = kv_quant ? ACL_INT8 : ACL_FLOAT16;
+  if (kv_quant) {
+    TORCH_CHECK(value_cache.scalar_type() == at::kChar, "paged_attention: key_cache and value_cache must have the same dtype");
+    TORCH_CHECK(key_scale.dim() == 3 && value_scale.dim() == 3, "paged_attention: key_scale and value_scale must be 3D for int8 kv cache");
+    TORCH_CHECK(key_scale.is_contiguous() && value_scale.is_contiguous(), "paged_attention: key_scale and value_scale must be contiguous");
+    TORCH_CHECK(key_scale.size(1) == num_kv_heads && key_scale.size(2) == page_size, "paged_attention: key_scale must be [num_pages, num_kv_heads, page_size]");
+    TORCH_CHECK(value_scale.sizes() == key_scale.sizes(), "paged_attention: key_scale and value_scale must have the same shape");
+  }
+  // alibi_slopes: [num_heads] fp32, empty means no alibi
+  bool has_alibi = alibi_slopes.numel() > 0;
+  if (has_alibi) {
+    TORCH_CHECK(alibi_slopes.dim() == 1 && alibi_slopes.size(0) == num_heads && alibi_slopes.scalar_type() == at::kFloat,
+                "paged_attention: alibi_slopes must be a [num_heads] fp32 tensor");
+  }
+  TORCH_CHECK(window_size >= 0, "paged_attention: window_size must be >= 0");
+  // q rows are the last num_query_tokens positions of each sequence, > 1 when verifying draft tokens
+  TORCH_CHECK(block_tables.size(0) > 0 && bs % block_tables.size(0) == 0 && context_lens.size(0) == block_tables.size(0),
+              "paged_attention: q rows must be a multiple of the batch size of block_tables and context_lens");
+  LOG_DEBUG("paged_attention: bs: %d, num_heads: %d, head_dim: %d, num_pages: %d, num_kv_heads: %d, page_size: %d", bs, num_heads, head_dim, num_pages, num_kv_heads, page_size);
 
   uint8_t* q_ptr = reinterpret_cast<uint8_t*>(q.data_ptr());
   uint8_t* key_cache_ptr = reinterpret_cast<uint8_t*>(key_cache.data_ptr());
@@ -421,18 +731,19 @@ at::Tensor paged_attention(at::Tensor q, at::Tensor key_cache, at::Tensor value_
   uint8_t* block_tables_ptr = reinterpret_cast<uint8_t*>(block_tables.data_ptr());
   uint8_t* context_lens_ptr = reinterpret_cast<uint8_t*>(context_lens.data_ptr());
 
-  at::Tensor y = at::empty_like(q);
+  check_out(y, q.sizes(), q.scalar_type(), q.device(), "paged_attention: out");
 
   aclrtStream stream = c10_npu::getCurrentNPUStream().stream();
+  PROFILE_OP(timer, "paged_attention", stream);
   aclTensor* q_acl = aclCreateTensor(q.sizes().data(), q.dim(), ACL_FLOAT16, q.strides().data(), 0, ACL_FORMAT_ND, q.sizes().data(), q.dim(), q.data_ptr());
   if (q_acl == nullptr) {
     throw std::runtime_error("Failed to create ACL tensor for q");
   }
-  aclTensor* key_cache_acl = aclCreateTensor(key_cache.sizes().data(), key_cache.dim(), ACL_FLOAT16, key_cache.strides().data(), 0, ACL_FORMAT_ND, key_cache.sizes().data(), key_cache.dim(), key_cache.data_ptr());
+  aclTensor* key_cache_acl = aclCreateTensor(key_cache.sizes().data(), key_cache.dim(), cache_dtype, key_cache.strides().data(), 0, ACL_FORMAT_ND, key_cache.sizes().data(), key_cache.dim(), key_cache.data_ptr());
   if (key_cache_acl == nullptr) {
     throw std::runtime_error("Failed to create ACL tensor for key_cache");
   }
-  aclTensor* value_cache_acl = aclCreateTensor(value_cache.sizes().data(), value_cache.dim(), ACL_FLOAT16, value_cache.strides().data(), 0, ACL_FORMAT_ND, value_cache.sizes().data(), value_cache.dim(), value_cache.data_ptr());
+  aclTensor* value_cache_acl = aclCreateTensor(value_cache.sizes().data(), value_cache.dim(), cache_dtype, value_cache.strides().data(), 0, ACL_FORMAT_ND, value_cache.sizes().data(), value_cache.dim(), value_cache.data_ptr());
   if (value_cache_acl == nullptr) {
     throw std::runtime_error("Failed to create ACL tensor for value_cache");
   }
@@ -444,21 +755,52 @@ at::Tensor paged_attention(at::Tensor q, at::Tensor key_cache, at::Tensor value_
   if (context_lens_acl == nullptr) {
     throw std::runtime_error("Failed to create ACL tensor for context_lens");
   }
+  aclTensor* key_scale_acl = nullptr;
+  aclTensor* value_scale_acl = nullptr;
+  if (kv_quant) {
+    key_scale_acl = aclCreateTensor(key_scale.sizes().data(), key_scale.dim(), ACL_FLOAT16, key_scale.strides().data(), 0, ACL_FORMAT_ND, key_scale.sizes().data(), key_scale.dim(), key_scale.data_ptr());
+    if (key_scale_acl == nullptr) {
+      throw std::runtime_error("Failed to create ACL tensor for key_scale");
+    }
+    value_scale_acl = aclCreateTensor(value_scale.sizes().data(), value_scale.dim(), ACL_FLOAT16, value_scale.strides().data(), 0, ACL_FORMAT_ND, value_scale.sizes().data(), value_scale.dim(), value_scale.data_ptr());
+    if (value_scale_acl == nullptr) {
+      throw std::runtime_error("Failed to create ACL tensor for value_scale");
+    }
+  }
+  aclTensor* alibi_slopes_acl = nullptr;
+  if (has_alibi) {
+    alibi_slopes_acl = aclCreateTensor(alibi_slopes.sizes().data(), alibi_slopes.dim(), ACL_FLOAT, alibi_slopes.strides().data(), 0, ACL_FORMAT_ND, alibi_slopes.sizes().data(), alibi_slopes.dim(), alibi_slopes.data_ptr());
+    if (alibi_slopes_acl == nullptr) {
+      throw std::runtime_error("Failed to create ACL tensor for alibi_slopes");
+    }
+  }
+  // window_size tensor (optional parameter), 0 means full attention
+  at::Tensor window_size_tensor;
+  aclTensor* window_size_acl = nullptr;
+  if (window_size > 0) {
+    window_size_tensor = device_scalar(window_size, torch::kInt32, q.device());
+    window_size_acl = aclCreateTensor(window_size_tensor.sizes().data(), window_size_tensor.dim(), ACL_INT32, window_size_tensor.strides().data(), 0, ACL_FORMAT_ND, window_size_tensor.sizes().data(), window_size_tensor.dim(), window_size_tensor.data_ptr());
+    if (window_size_acl == nullptr) {
+      throw std::runtime_error("Failed to create ACL tensor for window_size");
+    }
+  }
   aclTensor* y_acl = aclCreateTensor(y.sizes().data(), y.dim(), ACL_FLOAT16, y.strides().data(), 0, ACL_FORMAT_ND, y.sizes().data(), y.dim(), y.data_ptr());
   if (y_acl == nullptr) {
     throw std::runtime_error("Failed to create ACL tensor for y");
   }
 
+  timer.created();
   uint64_t workspace_size = 0;
   aclOpExecutor* handle = nullptr;
-  if (aclnnPagedAttentionExGetWorkspaceSize(q_acl, key_cache_acl, value_cache_acl, block_tables_acl, context_lens_acl, y_acl, &workspace_size, &handle) != ACL_SUCCESS) {
+  if (aclnnPagedAttentionExGetWorkspaceSize(q_acl, key_cache_acl, value_cache_acl, block_tables_acl, context_lens_acl, key_scale_acl, value_scale_acl, alibi_slopes_acl, window_size_acl, y_acl, &workspace_size, &handle) != ACL_SUCCESS) {
     throw std::runtime_error("Failed to get workspace size");
   }
-  auto options = at::TensorOptions().dtype(torch::kUInt8).device(q.device());
-  auto workspace_tensor = at::empty({(int64_t)workspace_size}, options);
-  if (aclnnPagedAttentionEx(workspace_tensor.data_ptr(), workspace_size, handle, stream) != ACL_SUCCESS) {
+  void* workspace = get_workspace(workspace_size, q.device());
+  timer.workspace_sized();
+  if (aclnnPagedAttentionEx(workspace, workspace_size, handle, stream) != ACL_SUCCESS) {
     throw std::runtime_error("Failed to execute paged_attention");
   }
+  timer.launched();
 
   if (aclDestroyTensor(q_acl) != ACL_SUCCESS) {
     throw std::runtime_error("Failed to destroy ACL tensor for q");
@@ -475,19 +817,467 @@ at::Tensor paged_attention(at::Tensor q, at::Tensor key_cache, at::Tensor value_
   if (aclDestroyTensor(context_lens_acl) != ACL_SUCCESS) {
     throw std::runtime_error("Failed to destroy ACL tensor for context_lens");
   }
+  if (key_scale_acl && aclDestroyTensor(key_scale_acl) != ACL_SUCCESS) {
+    throw std::runtime_error("Failed to destroy ACL tensor for key_scale");
+  }
+  if (value_scale_acl && aclDestroyTensor(value_scale_acl) != ACL_SUCCESS) {
+    throw std::runtime_error("Failed to destroy ACL tensor for value_scale");
+  }
+  if (alibi_slopes_acl && aclDestroyTensor(alibi_slopes_acl) != ACL_SUCCESS) {
+    throw std::runtime_error("Failed to destroy ACL tensor for alibi_slopes");
+  }
+  if (window_size_acl && aclDestroyTensor(window_size_acl) != ACL_SUCCESS) {
+    throw std::runtime_error("Failed to destroy ACL tensor for window_size");
+  }
   if (aclDestroyTensor(y_acl) != ACL_SUCCESS) {
     throw std::runtime_error("Failed to destroy ACL tensor for y");
   }
+}
+
+at::Tensor paged_attention(at::Tensor q, at::Tensor key_cache, at::Tensor value_cache, at::Tensor block_tables, at::Tensor context_lens, at::Tensor key_scale, at::Tensor value_scale, at::Tensor alibi_slopes, int64_t window_size) {
+  at::Tensor y = at::empty_like(q);
+  paged_attention_out(q, key_cache, value_cache, block_tables, context_lens, key_scale, value_scale, alibi_slopes, window_size, y);
   return y;
 }
 
+void moe_gating_topk_out(at::Tensor logits, int64_t top_k, bool renormalize, at::Tensor topk_weights, at::Tensor topk_ids) {
+  TORCH_CHECK(logits.dim() == 2,
+              "moe_gating_topk: logits must be 2D, got ", logits.dim(), "D tensor");
+  TORCH_CHECK(logits.scalar_type() == at::kHalf,
+              "moe_gating_topk: logits must be float16");
+  TORCH_CHECK(logits.is_contiguous(),
+              "moe_gating_topk: logits must be contiguous");
+  TORCH_CHECK(logits.size(1) <= 1024,
+              "moe_gating_topk: at most 1024 experts are supported, got ", logits.size(1));
+  TORCH_CHECK(top_k > 0 && top_k <= logits.size(1),
+              "moe_gating_topk: top_k must be in [1, num_experts], got ", top_k);
+
+  int64_t num_tokens = logits.size(0);
+  check_out(topk_weights, {num_tokens, top_k}, at::kFloat, logits.device(), "moe_gating_topk: topk_weights");
+  check_out(topk_ids, {num_tokens, top_k}, at::kInt, logits.device(), "moe_gating_topk: topk_ids");
+
+  aclrtStream stream = c10_npu::getCurrentNPUStream().stream();
+  PROFILE_OP(timer, "moe_gating_topk", stream);
+  auto logits_sizes = logits.sizes();
+  auto logits_strides = logits.strides();
+  aclTensor* logits_acl = aclCreateTensor(logits_sizes.data(), logits.dim(), ACL_FLOAT16, logits_strides.data(), 0, ACL_FORMAT_ND, logits_sizes.data(), logits.dim(), logits.data_ptr());
+  if (logits_acl == nullptr) {
+    throw std::runtime_error("Failed to create ACL tensor for logits");
+  }
+  auto topk_weights_sizes = topk_weights.sizes();
+  auto topk_weights_strides = topk_weights.strides();
+  aclTensor* topk_weights_acl = aclCreateTensor(topk_weights_sizes.data(), topk_weights.dim(), ACL_FLOAT, topk_weights_strides.data(), 0, ACL_FORMAT_ND, topk_weights_sizes.data(), topk_weights.dim(), topk_weights.data_ptr());
+  if (topk_weights_acl == nullptr) {
+    throw std::runtime_error("Failed to create ACL tensor for topk_weights");
+  }
+  auto topk_ids_sizes = topk_ids.sizes();
+  auto topk_ids_strides = topk_ids.strides();
+  aclTensor* topk_ids_acl = aclCreateTensor(topk_ids_sizes.data(), topk_ids.dim(), ACL_INT32, topk_ids_strides.data(), 0, ACL_FORMAT_ND, topk_ids_sizes.data(), topk_ids.dim(), topk_ids.data_ptr());
+  if (topk_ids_acl == nullptr) {
+    throw std::runtime_error("Failed to create ACL tensor for topk_ids");
+  }
+
+  timer.created();
+  uint64_t workspace_size = 0;
+  aclOpExecutor* handle = nullptr;
+  if (aclnnMoeGatingTopKExGetWorkspaceSize(logits_acl, top_k, renormalize, topk_weights_acl, topk_ids_acl, &workspace_size, &handle) != ACL_SUCCESS) {
+    throw std::runtime_error("Failed to get workspace size");
+  }
+  void* workspace = get_workspace(workspace_size, logits.device());
+  timer.workspace_sized();
+  if (aclnnMoeGatingTopKEx(workspace, workspace_size, handle, stream) != ACL_SUCCESS) {
+    throw std::runtime_error("Failed to execute moe_gating_topk");
+  }
+  timer.launched();
+
+  if (aclDestroyTensor(logits_acl) != ACL_SUCCESS) {
+    throw std::runtime_error("Failed to destroy ACL tensor for logits");
+  }
+  if (aclDestroyTensor(topk_weights_acl) != ACL_SUCCESS) {
+    throw std::runtime_error("Failed to destroy ACL tensor for topk_weights");
+  }
+  if (aclDestroyTensor(topk_ids_acl) != ACL_SUCCESS) {
+    throw std::runtime_error("Failed to destroy ACL tensor for topk_ids");
+  }
+}
+
+std::tuple<at::Tensor, at::Tensor> moe_gating_topk(at::Tensor logits, int64_t top_k, bool renormalize) {
+  TORCH_CHECK(logits.dim() == 2, "moe_gating_topk: logits must be 2D, got ", logits.dim(), "D tensor");
+  at::Tensor topk_weights = at::empty({logits.size(0), top_k}, logits.options().dtype(at::kFloat));
+  at::Tensor topk_ids = at::empty({logits.size(0), top_k}, logits.options().dtype(at::kInt));
+  moe_gating_topk_out(logits, top_k, renormalize, topk_weights, topk_ids);
+  return {topk_weights, topk_ids};
+}
+
+void moe_permute_out(at::Tensor x, at::Tensor topk_ids, int64_t num_experts, at::Tensor permuted_x, at::Tensor expanded_row_idx, at::Tensor group_list) {
+  TORCH_CHECK(x.dim() == 2 && topk_ids.dim() == 2,
+              "moe_permute: x and topk_ids must be 2D");
+  TORCH_CHECK(x.scalar_type() == at::kHalf && topk_ids.scalar_type() == at::kInt,
+              "moe_permute: x must be float16 and topk_ids must be int32");
+  TORCH_CHECK(x.size(0) == topk_ids.size(0),
+              "moe_permute: x and topk_ids must have the same number of tokens, got ", x.size(0), " and ", topk_ids.size(0));
+  TORCH_CHECK(x.size(1) % 16 == 0,
+              "moe_permute: hidden size must be a multiple of 16, got ", x.size(1));
+  TORCH_CHECK(num_experts > 0 && num_experts <= 1024,
+              "moe_permute: num_experts must be in [1, 1024], got ", num_experts);
+  TORCH_CHECK(x.is_contiguous() && topk_ids.is_contiguous(),
+              "moe_permute: x and topk_ids must be contiguous tensors");
+
+  int64_t num_rows = topk_ids.numel();
+  check_out(permuted_x, {num_rows, x.size(1)}, x.scalar_type(), x.device(), "moe_permute: permuted_x");
+  check_out(expanded_row_idx, {num_rows}, at::kInt, x.device(), "moe_permute: expanded_row_idx");
+  check_out(group_list, {num_experts}, at::kLong, x.device(), "moe_permute: group_list");
+
+  aclrtStream stream = c10_npu::getCurrentNPUStream().stream();
+  PROFILE_OP(timer, "moe_permute", stream);
+  auto x_sizes = x.sizes();
+  auto x_strides = x.strides();
+  aclTensor* x_acl = aclCreateTensor(x_sizes.data(), x.dim(), ACL_FLOAT16, x_strides.data(), 0, ACL_FORMAT_ND, x_sizes.data(), x.dim(), x.data_ptr());
+  if (x_acl == nullptr) {
+    throw std::runtime_error("Failed to create ACL tensor for x");
+  }
+  auto topk_ids_sizes = topk_ids.sizes();
+  auto topk_ids_strides = topk_ids.strides();
+  aclTensor* topk_ids_acl = aclCreateTensor(topk_ids_sizes.data(), topk_ids.dim(), ACL_INT32, topk_ids_strides.data(), 0, ACL_FORMAT_ND, topk_ids_sizes.data(), topk_ids.dim(), topk_ids.data_ptr());
+  if (topk_ids_acl == nullptr) {
+    throw std::runtime_error("Failed to create ACL tensor for topk_ids");
+  }
+  auto permuted_x_sizes = permuted_x.sizes();
+  auto permuted_x_strides = permuted_x.strides();
+  aclTensor* permuted_x_acl = aclCreateTensor(permuted_x_sizes.data(), permuted_x.dim(), ACL_FLOAT16, permuted_x_strides.data(), 0, ACL_FORMAT_ND, permuted_x_sizes.data(), permuted_x.dim(), permuted_x.data_ptr());
+  if (permuted_x_acl == nullptr) {
+    throw std::runtime_error("Failed to create ACL tensor for permuted_x");
+  }
+  auto expanded_row_idx_sizes = expanded_row_idx.sizes();
+  auto expanded_row_idx_strides = expanded_row_idx.strides();
+  aclTensor* expanded_row_idx_acl = aclCreateTensor(expanded_row_idx_sizes.data(), expanded_row_idx.dim(), ACL_INT32, expanded_row_idx_strides.data(), 0, ACL_FORMAT_ND, expanded_row_idx_sizes.data(), expanded_row_idx.dim(), expanded_row_idx.data_ptr());
+  if (expanded_row_idx_acl == nullptr) {
+    throw std::runtime_error("Failed to create ACL tensor for expanded_row_idx");
+  }
+  auto group_list_sizes = group_list.sizes();
+  auto group_list_strides = group_list.strides();
+  aclTensor* group_list_acl = aclCreateTensor(group_list_sizes.data(), group_list.dim(), ACL_INT64, group_list_strides.data(), 0, ACL_FORMAT_ND, group_list_sizes.data(), group_list.dim(), group_list.data_ptr());
+  if (group_list_acl == nullptr) {
+    throw std::runtime_error("Failed to create ACL tensor for group_list");
+  }
+
+  timer.created();
+  uint64_t workspace_size = 0;
+  aclOpExecutor* handle = nullptr;
+  if (aclnnMoePermuteExGetWorkspaceSize(x_acl, topk_ids_acl, num_experts, permuted_x_acl, expanded_row_idx_acl, group_list_acl, &workspace_size, &handle) != ACL_SUCCESS) {
+    throw std::runtime_error("Failed to get workspace size");
+  }
+  void* workspace = get_workspace(workspace_size, x.device());
+  timer.workspace_sized();
+  if (aclnnMoePermuteEx(workspace, workspace_size, handle, stream) != ACL_SUCCESS) {
+    throw std::runtime_error("Failed to execute moe_permute");
+  }
+  timer.launched();
+
+  if (aclDestroyTensor(x_acl) != ACL_SUCCESS) {
+    throw std::runtime_error("Failed to destroy ACL tensor for x");
+  }
+  if (aclDestroyTensor(topk_ids_acl) != ACL_SUCCESS) {
+    throw std::runtime_error("Failed to destroy ACL tensor for topk_ids");
+  }
+  if (aclDestroyTensor(permuted_x_acl) != ACL_SUCCESS) {
+    throw std::runtime_error("Failed to destroy ACL tensor for permuted_x");
+  }
+  if (aclDestroyTensor(expanded_row_idx_acl) != ACL_SUCCESS) {
+    throw std::runtime_error("Failed to destroy ACL tensor for expanded_row_idx");
+  }
+  if (aclDestroyTensor(group_list_acl) != ACL_SUCCESS) {
+    throw std::runtime_error("Failed to destroy ACL tensor for group_list");
+  }
+}
+
+std::tuple<at::Tensor, at::Tensor, at::Tensor> moe_permute(at::Tensor x, at::Tensor topk_ids, int64_t num_experts) {
+  TORCH_CHECK(x.dim() == 2, "moe_permute: x and topk_ids must be 2D");
+  int64_t num_rows = topk_ids.numel();
+  at::Tensor permuted_x = at::empty({num_rows, x.size(1)}, x.options());
+  at::Tensor expanded_row_idx = at::empty({num_rows}, topk_ids.options());
+  at::Tensor group_list = at::empty({num_experts}, topk_ids.options().dtype(at::kLong));
+  moe_permute_out(x, topk_ids, num_experts, permuted_x, expanded_row_idx, group_list);
+  return {permuted_x, expanded_row_idx, group_list};
+}
+
+void moe_unpermute_out(at::Tensor y, at::Tensor expanded_row_idx, at::Tensor topk_weights, at::Tensor out) {
+  TORCH_CHECK(y.dim() == 2 && expanded_row_idx.dim() == 1 && topk_weights.dim() == 2,
+              "moe_unpermute: y and topk_weights must be 2D and expanded_row_idx must be 1D");
+  TORCH_CHECK(y.scalar_type() == at::kHalf && expanded_row_idx.scalar_type() == at::kInt && topk_weights.scalar_type() == at::kFloat,
+              "moe_unpermute: y must be float16, expanded_row_idx int32 and topk_weights float32");
+  TORCH_CHECK(y.size(0) == topk_weights.numel() && expanded_row_idx.size(0) == topk_weights.numel(),
+              "moe_unpermute: y and expanded_row_idx must have num_tokens * top_k rows, got ", y.size(0), " and ", expanded_row_idx.size(0));
+  TORCH_CHECK(y.size(1) % 16 == 0,
+              "moe_unpermute: hidden size must be a multiple of 16, got ", y.size(1));
+  TORCH_CHECK(y.is_contiguous() && expanded_row_idx.is_contiguous() && topk_weights.is_contiguous(),
+              "moe_unpermute: y, expanded_row_idx and topk_weights must be contiguous tensors");
+
+  check_out(out, {topk_weights.size(0), y.size(1)}, y.scalar_type(), y.device(), "moe_unpermute: out");
+
+  aclrtStream stream = c10_npu::getCurrentNPUStream().stream();
+  PROFILE_OP(timer, "moe_unpermute", stream);
+  auto y_sizes = y.sizes();
+  auto y_strides = y.strides();
+  aclTensor* y_acl = aclCreateTensor(y_sizes.data(), y.dim(), ACL_FLOAT16, y_strides.data(), 0, ACL_FORMAT_ND, y_sizes.data(), y.dim(), y.data_ptr());
+  if (y_acl == nullptr) {
+    throw std::runtime_error("Failed to create ACL tensor for y");
+  }
+  auto expanded_row_idx_sizes = expanded_row_idx.sizes();
+  auto expanded_row_idx_strides = expanded_row_idx.strides();
+  aclTensor* expanded_row_idx_acl = aclCreateTensor(expanded_row_idx_sizes.data(), expanded_row_idx.dim(), ACL_INT32, expanded_row_idx_strides.data(), 0, ACL_FORMAT_ND, expanded_row_idx_sizes.data(), expanded_row_idx.dim(), expanded_row_idx.data_ptr());
+  if (expanded_row_idx_acl == nullptr) {
+    throw std::runtime_error("Failed to create ACL tensor for expanded_row_idx");
+  }
+  auto topk_weights_sizes = topk_weights.sizes();
+  auto topk_weights_strides = topk_weights.strides();
+  aclTensor* topk_weights_acl = aclCreateTensor(topk_weights_sizes.data(), topk_weights.dim(), ACL_FLOAT, topk_weights_strides.data(), 0, ACL_FORMAT_ND, topk_weights_sizes.data(), topk_weights.dim(), topk_weights.data_ptr());
+  if (topk_weights_acl == nullptr) {
+    throw std::runtime_error("Failed to create ACL tensor for topk_weights");
+  }
+  auto out_sizes = out.sizes();
+  auto out_strides = out.strides();
+  aclTensor* out_acl = aclCreateTensor(out_sizes.data(), out.dim(), ACL_FLOAT16, out_strides.data(), 0, ACL_FORMAT_ND, out_sizes.data(), out.dim(), out.data_ptr());
+  if (out_acl == nullptr) {
+    throw std::runtime_error("Failed to create ACL tensor for out");
+  }
+
+  timer.created();
+  uint64_t workspace_size = 0;
+  aclOpExecutor* handle = nullptr;
+  if (aclnnMoeUnpermuteExGetWorkspaceSize(y_acl, expanded_row_idx_acl, topk_weights_acl, out_acl, &workspace_size, &handle) != ACL_SUCCESS) {
+    throw std::runtime_error("Failed to get workspace size");
+  }
+  void* workspace = get_workspace(workspace_size, y.device());
+  timer.workspace_sized();
+  if (aclnnMoeUnpermuteEx(workspace, workspace_size, handle, stream) != ACL_SUCCESS) {
+    throw std::runtime_error("Failed to execute moe_unpermute");
+  }
+  timer.launched();
+
+  if (aclDestroyTensor(y_acl) != ACL_SUCCESS) {
+    throw std::runtime_error("Failed to destroy ACL tensor for y");
+  }
+  if (aclDestroyTensor(expanded_row_idx_acl) != ACL_SUCCESS) {
+    throw std::runtime_error("Failed to destroy ACL tensor for expanded_row_idx");
+  }
+  if (aclDestroyTensor(topk_weights_acl) != ACL_SUCCESS) {
+    throw std::runtime_error("Failed to destroy ACL tensor for topk_weights");
+  }
+  if (aclDestroyTensor(out_acl) != ACL_SUCCESS) {
+    throw std::runtime_error("Failed to destroy ACL tensor for out");
+  }
+}
+
+at::Tensor moe_unpermute(at::Tensor y, at::Tensor expanded_row_idx, at::Tensor topk_weights) {
+  TORCH_CHECK(y.dim() == 2 && topk_weights.dim() == 2, "moe_unpermute: y and topk_weights must be 2D and expanded_row_idx must be 1D");
+  at::Tensor out = at::empty({topk_weights.size(0), y.size(1)}, y.options());
+  moe_unpermute_out(y, expanded_row_idx, topk_weights, out);
+  return out;
+}
+
+void sampling_out(at::Tensor logits, at::Tensor temperature, at::Tensor top_k, at::Tensor top_p, at::Tensor repetition_penalty, at::Tensor uniform, at::Tensor penalty_token_ids, at::Tensor token_ids) {
+  TORCH_CHECK(logits.dim() == 2 && logits.scalar_type() == at::kHalf,
+              "sampling: logits must be a 2D float16 tensor");
+  TORCH_CHECK(logits.size(1) % 64 == 0,
+              "sampling: vocab size must be a multiple of 64, got ", logits.size(1));
+  int64_t bs = logits.size(0);
+  for (auto& t: {temperature, top_p, repetition_penalty, uniform}) {
+    TORCH_CHECK(t.dim() == 1 && t.size(0) == bs && t.scalar_type() == at::kFloat,
+                "sampling: temperature, top_p, repetition_penalty and uniform must be [bs] float32 tensors");
+  }
+  TORCH_CHECK(top_k.dim() == 1 && top_k.size(0) == bs && top_k.scalar_type() == at::kInt,
+              "sampling: top_k must be a [bs] int32 tensor");
+  // penalty_token_ids: [bs, n] int32 padded with -1, empty means no repetition penalty
+  bool has_penalty = penalty_token_ids.numel() > 0;
+  if (has_penalty) {
+    TORCH_CHECK(penalty_token_ids.dim() == 2 && penalty_token_ids.size(0) == bs && penalty_token_ids.scalar_type() == at::kInt,
+                "sampling: penalty_token_ids must be a [bs, n] int32 tensor");
+    TORCH_CHECK(penalty_token_ids.is_contiguous(),
+                "sampling: penalty_token_ids must be contiguous");
+  }
+  TORCH_CHECK(logits.is_contiguous(),
+              "sampling: logits must be contiguous");
+
+  check_out(token_ids, {bs}, at::kInt, logits.device(), "sampling: out");
+
+  aclrtStream stream = c10_npu::getCurrentNPUStream().stream();
+  PROFILE_OP(timer, "sampling", stream);
+  aclTensor* logits_acl = aclCreateTensor(logits.sizes().data(), logits.dim(), ACL_FLOAT16, logits.strides().data(), 0, ACL_FORMAT_ND, logits.sizes().data(), logits.dim(), logits.data_ptr());
+  if (logits_acl == nullptr) {
+    throw std::runtime_error("Failed to create ACL tensor for logits");
+  }
+  aclTensor* temperature_acl = aclCreateTensor(temperature.sizes().data(), temperature.dim(), ACL_FLOAT, temperature.strides().data(), 0, ACL_FORMAT_ND, temperature.sizes().data(), temperature.dim(), temperature.data_ptr());
+  if (temperature_acl == nullptr) {
+    throw std::runtime_error("Failed to create ACL tensor for temperature");
+  }
+  aclTensor* top_k_acl = aclCreateTensor(top_k.sizes().data(), top_k.dim(), ACL_INT32, top_k.strides().data(), 0, ACL_FORMAT_ND, top_k.sizes().data(), top_k.dim(), top_k.data_ptr());
+  if (top_k_acl == nullptr) {
+    throw std::runtime_error("Failed to create ACL tensor for top_k");
+  }
+  aclTensor* top_p_acl = aclCreateTensor(top_p.sizes().data(), top_p.dim(), ACL_FLOAT, top_p.strides().data(), 0, ACL_FORMAT_ND, top_p.sizes().data(), top_p.dim(), top_p.data_ptr());
+  if (top_p_acl == nullptr) {
+    throw std::runtime_error("Failed to create ACL tensor for top_p");
+  }
+  aclTensor* repetition_penalty_acl = aclCreateTensor(repetition_penalty.sizes().data(), repetition_penalty.dim(), ACL_FLOAT, repetition_penalty.strides().data(), 0, ACL_FORMAT_ND, repetition_penalty.sizes().data(), repetition_penalty.dim(), repetition_penalty.data_ptr());
+  if (repetition_penalty_acl == nullptr) {
+    throw std::runtime_error("Failed to create ACL tensor for repetition_penalty");
+  }
+  aclTensor* uniform_acl = aclCreateTensor(uniform.sizes().data(), uniform.dim(), ACL_FLOAT, uniform.strides().data(), 0, ACL_FORMAT_ND, uniform.sizes().data(), uniform.dim(), uniform.data_ptr());
+  if (uniform_acl == nullptr) {
+    throw std::runtime_error("Failed to create ACL tensor for uniform");
+  }
+  aclTensor* penalty_token_ids_acl = nullptr;
+  if (has_penalty) {
+    penalty_token_ids_acl = aclCreateTensor(penalty_token_ids.sizes().data(), penalty_token_ids.dim(), ACL_INT32, penalty_token_ids.strides().data(), 0, ACL_FORMAT_ND, penalty_token_ids.sizes().data(), penalty_token_ids.dim(), penalty_token_ids.data_ptr());
+    if (penalty_token_ids_acl == nullptr) {
+      throw std::runtime_error("Failed to create ACL tensor for penalty_token_ids");
+    }
+  }
+  aclTensor* token_ids_acl = aclCreateTensor(token_ids.sizes().data(), token_ids.dim(), ACL_INT32, token_ids.strides().data(), 0, ACL_FORMAT_ND, token_ids.sizes().data(), token_ids.dim(), token_ids.data_ptr());
+  if (token_ids_acl == nullptr) {
+    throw std::runtime_error("Failed to create ACL tensor for token_ids");
+  }
+
+  timer.created();
+  uint64_t workspace_size = 0;
+  aclOpExecutor* handle = nullptr;
+  if (aclnnSamplingExGetWorkspaceSize(logits_acl, temperature_acl, top_k_acl, top_p_acl, repetition_penalty_acl, uniform_acl, penalty_token_ids_acl, token_ids_acl, &workspace_size, &handle) != ACL_SUCCESS) {
+    throw std::runtime_error("Failed to get workspace size");
+  }
+  void* workspace = get_workspace(workspace_size, logits.device());
+  timer.workspace_sized();
+  if (aclnnSamplingEx(workspace, workspace_size, handle, stream) != ACL_SUCCESS) {
+    throw std::runtime_error("Failed to execute sampling");
+  }
+  timer.launched();
+
+  if (aclDestroyTensor(logits_acl) != ACL_SUCCESS) {
+    throw std::runtime_error("Failed to destroy ACL tensor for logits");
+  }
+  if (aclDestroyTensor(temperature_acl) != ACL_SUCCESS) {
+    throw std::runtime_error("Failed to destroy ACL tensor for temperature");
+  }
+  if (aclDestroyTensor(top_k_acl) != ACL_SUCCESS) {
+    throw std::runtime_error("Failed to destroy ACL tensor for top_k");
+  }
+  if (aclDestroyTensor(top_p_acl) != ACL_SUCCESS) {
+    throw std::runtime_error("Failed to destroy ACL tensor for top_p");
+  }
+  if (aclDestroyTensor(repetition_penalty_acl) != ACL_SUCCESS) {
+    throw std::runtime_error("Failed to destroy ACL tensor for repetition_penalty");
+  }
+  if (aclDestroyTensor(uniform_acl) != ACL_SUCCESS) {
+    throw std::runtime_error("Failed to destroy ACL tensor for uniform");
+  }
+  if (penalty_token_ids_acl && aclDestroyTensor(penalty_token_ids_acl) != ACL_SUCCESS) {
+    throw std::runtime_error("Failed to destroy ACL tensor for penalty_token_ids");
+  }
+  if (aclDestroyTensor(token_ids_acl) != ACL_SUCCESS) {
+    throw std::runtime_error("Failed to destroy ACL tensor for token_ids");
+  }
+}
+
+at::Tensor sampling(at::Tensor logits, at::Tensor temperature, at::Tensor top_k, at::Tensor top_p, at::Tensor repetition_penalty, at::Tensor uniform, at::Tensor penalty_token_ids) {
+  at::Tensor token_ids = at::empty({logits.size(0)}, logits.options().dtype(at::kInt));
+  sampling_out(logits, temperature, top_k, top_p, repetition_penalty, uniform, penalty_token_ids, token_ids);
+  return token_ids;
+}
+
+
+void copy_blocks(std::vector<at::Tensor> key_caches, std::vector<at::Tensor> value_caches, at::Tensor block_mapping) {
+  // key_caches/value_caches: one cache per layer, all of the same shape and dtype
+  // block_mapping: [num_pairs, 2] (src page, dst page)
+  TORCH_CHECK(key_caches.size() > 0 && key_caches.size() == value_caches.size(),
+              "copy_blocks: key_caches and value_caches must be non-empty and have the same length");
+  TORCH_CHECK(block_mapping.dim() == 2 && block_mapping.size(1) == 2, "copy_blocks: block_mapping must be [num_pairs, 2]");
+  if (block_mapping.size(0) == 0) {
+    return;
+  }
+  auto& cache0 = key_caches[0];
+  int64_t num_pages = cache0.size(0);
+  for (auto* caches: {&key_caches, &value_caches}) {
+    for (auto& cache: *caches) {
+      TORCH_CHECK(cache.is_contiguous(), "copy_blocks: caches must be contiguous");
+      TORCH_CHECK(cache.sizes() == cache0.sizes() && cache.scalar_type() == cache0.scalar_type(),
+                  "copy_blocks: all caches must have the same shape and dtype");
+      TORCH_CHECK(cache.device() == cache0.device(), "copy_blocks: all caches must be on the same device");
+    }
+  }
+  int64_t page_bytes = cache0.numel() / num_pages * cache0.element_size();
+  TORCH_CHECK(page_bytes % 32 == 0, "copy_blocks: page size must be a multiple of 32 bytes, got ", page_bytes);
+  auto mapping_cpu = block_mapping.to(at::kCPU, at::kLong);
+  TORCH_CHECK(mapping_cpu.min().item<int64_t>() >= 0 && mapping_cpu.max().item<int64_t>() < num_pages,
+              "copy_blocks: block_mapping out of range [0, ", num_pages, ")");
+  aclrtStream stream = c10_npu::getCurrentNPUStream().stream();
+  PROFILE_OP(timer, "copy_blocks", stream);
+
+  // the kernel takes the caches by address, so all layers go in one launch
+  int64_t num_layers = key_caches.size();
+  auto ptrs_cpu = at::empty({2, num_layers}, at::TensorOptions().dtype(at::kLong));
+  for (int64_t i = 0; i < num_layers; i++) {
+    ptrs_cpu[0][i] = reinterpret_cast<int64_t>(key_caches[i].data_ptr());
+    ptrs_cpu[1][i] = reinterpret_cast<int64_t>(value_caches[i].data_ptr());
+  }
+  auto ptrs = ptrs_cpu.to(cache0.device());
+  auto key_cache_ptrs = ptrs[0];
+  auto value_cache_ptrs = ptrs[1];
+  auto mapping = mapping_cpu.to(cache0.device());
+
+  aclTensor* key_cache_ptrs_acl = aclCreateTensor(key_cache_ptrs.sizes().data(), key_cache_ptrs.dim(), ACL_INT64, key_cache_ptrs.strides().data(), 0, ACL_FORMAT_ND, key_cache_ptrs.sizes().data(), key_cache_ptrs.dim(), key_cache_ptrs.data_ptr());
+  TORCH_CHECK(key_cache_ptrs_acl != nullptr, "Failed to create ACL tensor for key_cache_ptrs");
+  aclTensor* value_cache_ptrs_acl = aclCreateTensor(value_cache_ptrs.sizes().data(), value_cache_ptrs.dim(), ACL_INT64, value_cache_ptrs.strides().data(), 0, ACL_FORMAT_ND, value_cache_ptrs.sizes().data(), value_cache_ptrs.dim(), value_cache_ptrs.data_ptr());
+  TORCH_CHECK(value_cache_ptrs_acl != nullptr, "Failed to create ACL tensor for value_cache_ptrs");
+  aclTensor* mapping_acl = aclCreateTensor(mapping.sizes().data(), mapping.dim(), ACL_INT64, mapping.strides().data(), 0, ACL_FORMAT_ND, mapping.sizes().data(), mapping.dim(), mapping.data_ptr());
+  TORCH_CHECK(mapping_acl != nullptr, "Failed to create ACL tensor for block_mapping");
+
+  timer.created();
+  uint64_t workspace_size = 0;
+  aclOpExecutor* handle = nullptr;
+  if (aclnnCopyBlocksExGetWorkspaceSize(key_cache_ptrs_acl, value_cache_ptrs_acl, mapping_acl, page_bytes, &workspace_size, &handle) != ACL_SUCCESS) {
+    throw std::runtime_error("Failed to get workspace size for copy_blocks");
+  }
+  void* workspace = get_workspace(workspace_size, cache0.device());
+  timer.workspace_sized();
+
+  if (aclnnCopyBlocksEx(workspace, workspace_size, handle, stream) != ACL_SUCCESS) {
+    throw std::runtime_error("Failed to execute copy_blocks");
+  }
+  timer.launched();
+
+  aclDestroyTensor(key_cache_ptrs_acl);
+  aclDestroyTensor(value_cache_ptrs_acl);
+  aclDestroyTensor(mapping_acl);
+  return;
+}
+
 void init_ffi_ops(py::module_ &&m) {
   m.def("rope", &rope, "Rope");
   m.def("swiglu", &swiglu, "Swiglu");
   m.def("grouped_matmul", &grouped_matmul, "GroupedMatMul");
+  m.def("weight_quant_matmul", &weight_quant_matmul, "WeightQuantMatMul");
+  m.def("weight_quant_grouped_matmul", &weight_quant_grouped_matmul, "WeightQuantGroupedMatMul");
   m.def("add_rms_norm", &add_rms_norm, "AddRMSNorm");
   m.def("reshape_and_cache", &reshape_and_cache, "ReshapeAndCache");
   m.def("paged_attention", &paged_attention, "PagedAttention");
+  m.def("moe_gating_topk", &moe_gating_topk, "MoeGatingTopK");
+  m.def("moe_permute", &moe_permute, "MoePermute");
+  m.def("moe_unpermute", &moe_unpermute, "MoeUnpermute");
+  m.def("sampling", &sampling, "Sampling");
+  m.def("copy_blocks", &copy_blocks, "CopyBlocks");
+
+  // out variants write into caller buffers and allocate nothing
+  m.def("rope_out", &rope_out, "Rope into out_q/out_k");
+  m.def("swiglu_out", &swiglu_out, "Swiglu into out");
+  m.def("grouped_matmul_out", &grouped_matmul_out, "GroupedMatMul into out");
+  m.def("weight_quant_matmul_out", &weight_quant_matmul_out, "WeightQuantMatMul into out");
+  m.def("weight_quant_grouped_matmul_out", &weight_quant_grouped_matmul_out, "WeightQuantGroupedMatMul into out");
+  m.def("add_rms_norm_out", &add_rms_norm_out, "AddRMSNorm into out/residual_out");
+  m.def("paged_attention_out", &paged_attention_out, "PagedAttention into out");
+  m.def("moe_gating_topk_out", &moe_gating_topk_out, "MoeGatingTopK into topk_weights/topk_ids");
+  m.def("moe_permute_out", &moe_permute_out, "MoePermute into permuted_x/expanded_row_idx/group_list");
+  m.def("moe_unpermute_out", &moe_unpermute_out, "MoeUnpermute into out");
+  m.def("sampling_out", &sampling_out, "Sampling into out");
 }
 
 }
@@ -0,0 +1,180 @@
+#include <torch/extension.h>
+#include <pybind11/pybind11.h>
+#include <strings.h>
+
+#include <cstdlib>
+#include <deque>
+#include <map>
+#include <mutex>
+#include <string>
+#include <vector>
+
+#include "log.h"
+#include "profile.h"
+
+namespace py = pybind11;
+
+namespace native {
+
+static int env_log_level() {
+  const char* value = std::getenv("ASCEND910A_EXTRAS_LOG_LEVEL");
+  if (value == nullptr) {
+    return kLogWarn;
+  }
+  static const char* names[] = {"error", "warn", "info", "debug"};
+  for (int i = 0; i <= kLogDebug; i++) {
+    if (strcasecmp(value, names[i]) == 0) {
+      return i;
+    }
+  }
+  return kLogWarn;
+}
+
+std::atomic<int> log_level{env_log_level()};
+std::atomic<int> profile_mode{kProfileOff};
+
+namespace {
+
+struct DeviceSample {
+  OpStats* stats;
+  aclrtEvent start;
+  aclrtEvent end;
+};
+
+// device samples wait here until their end event completes, bounded so a host that runs far
+// ahead of the device waits on the oldest one instead of piling up events
+constexpr size_t kMaxPending = 4096;
+
+std::mutex mutex;
+// never freed, like the ops' workspaces
+auto* stats_by_name = new std::map<std::string, OpStats*>();
+auto* free_events = new std::vector<aclrtEvent>();
+auto* pending = new std::deque<DeviceSample>();
+
+// with mutex held
+void resolve(const DeviceSample& sample) {
+  float ms = 0;
+  if (aclrtEventElapsedTime(&ms, sample.start, sample.end) == ACL_SUCCESS) {
+    sample.stats->device_ns.fetch_add((uint64_t)(ms * 1e6), std::memory_order_relaxed);
+    sample.stats->device_calls.fetch_add(1, std::memory_order_relaxed);
+  }
+  free_events->push_back(sample.start);
+  free_events->push_back(sample.end);
+}
+
+// with mutex held, wait = false only takes the samples that are already done
+void drain(bool wait) {
+  while (!pending->empty()) {
+    auto& sample = pending->front();
+    if (wait) {
+      aclrtSynchronizeEvent(sample.end);
+    } else {
+      aclrtEventRecordedStatus status = ACL_EVENT_RECORDED_STATUS_NOT_READY;
+      if (aclrtQueryEventStatus(sample.end, &status) != ACL_SUCCESS || status != ACL_EVENT_RECORDED_STATUS_COMPLETE) {
+        return;
+      }
+    }
+    resolve(sample);
+    pending->pop_front();
+  }
+}
+
+}  // namespace
+
+OpStats& op_stats(const char* name) {
+  std::lock_guard<std::mutex> lock(mutex);
+  auto it = stats_by_name->try_emplace(name, nullptr).first;
+  if (it->second == nullptr) {
+    it->second = new OpStats();
+    // the key outlives the caller's string
+    it->second->name = it->first.c_str();
+  }
+  return *it->second;
+}
+
+aclrtEvent acquire_event() {
+  {
+    std::lock_guard<std::mutex> lock(mutex);
+    if (!free_events->empty()) {
+      aclrtEvent event = free_events->back();
+      free_events->pop_back();
+      return event;
+    }
+  }
+  aclrtEvent event = nullptr;
+  if (aclrtCreateEvent(&event) != ACL_SUCCESS) {
+    throw std::runtime_error("Failed to create event for profiling");
+  }
+  return event;
+}
+
+void release_event(aclrtEvent event) {
+  std::lock_guard<std::mutex> lock(mutex);
+  free_events->push_back(event);
+}
+
+void push_device_sample(OpStats& stats, aclrtEvent start, aclrtEvent end) {
+  std::lock_guard<std::mutex> lock(mutex);
+  pending->push_back({&stats, start, end});
+  drain(false);
+  if (pending->size() > kMaxPending) {
+    aclrtSynchronizeEvent(pending->front().end);
+    drain(false);
+  }
+}
+
+py::dict snapshot() {
+  std::lock_guard<std::mutex> lock(mutex);
+  drain(true);
+  py::dict result;
+  for (auto& [name, stats] : *stats_by_name) {
+    uint64_t calls = stats->calls.load();
+    if (calls == 0) {
+      continue;
+    }
+    py::dict d;
+    d["calls"] = calls;
+    d["create_ns"] = stats->create_ns.load();
+    d["workspace_ns"] = stats->workspace_ns.load();
+    d["launch_ns"] = stats->launch_ns.load();
+    d["device_ns"] = stats->device_ns.load();
+    d["device_calls"] = stats->device_calls.load();
+    result[py::str(name)] = d;
+  }
+  return result;
+}
+
+void reset() {
+  std::lock_guard<std::mutex> lock(mutex);
+  // the device time of calls made before the reset must not leak into the next snapshot
+  drain(true);
+  for (auto& [name, stats] : *stats_by_name) {
+    stats->calls = 0;
+    stats->create_ns = 0;
+    stats->workspace_ns = 0;
+    stats->launch_ns = 0;
+    stats->device_ns = 0;
+    stats->device_calls = 0;
+  }
+}
+
+void init_ffi_profile(py::module_ &&m) {
+  m.attr("compiled") = (bool)NATIVE_PROFILE;
+  m.def("set_mode", [](int mode) {
+    TORCH_CHECK(mode >= kProfileOff && mode <= kProfileDevice, "profile: mode must be 0 (off), 1 (host) or 2 (device), got ", mode);
+    if (mode != kProfileOff && !NATIVE_PROFILE) {
+      LOG_WARN("profile: built with NATIVE_PROFILE=0, the counters stay empty");
+    }
+    profile_mode = mode;
+  }, "0 off, 1 host phases, 2 host phases and device time");
+  m.def("get_mode", []() { return profile_mode.load(); });
+  m.def("snapshot", &snapshot, "Counters of the ops called since the last reset, waits for pending device times");
+  m.def("reset", &reset, "Zero all counters");
+  m.def("set_log_level", [](int level) {
+    TORCH_CHECK(level >= kLogError && level <= kLogDebug, "log level must be in [0, 3], got ", level);
+    log_level = level;
+  }, "0 error, 1 warn, 2 info, 3 debug");
+  m.def("get_log_level", []() { return log_level.load(); });
+}
+
+}  // namespace native
@@ -0,0 +1,141 @@
+#pragma once
+
+#include <acl/acl.h>
+
+#include <atomic>
+#include <chrono>
+#include <cstdint>
+
+// per-op counters of the ffi ops. Built with NATIVE_PROFILE=0 (cmake -DPROFILE_OPS=OFF) the timers
+// are empty and compile away; built in, they cost one relaxed load per op while the mode is off.
+#ifndef NATIVE_PROFILE
+#define NATIVE_PROFILE 1
+#endif
+
+namespace native {
+
+// off, host phases, host phases and device time between events around the launch
+enum ProfileMode { kProfileOff = 0, kProfileHost = 1, kProfileDevice = 2 };
+
+extern std::atomic<int> profile_mode;
+
+struct OpStats {
+  const char* name;
+  std::atomic<uint64_t> calls{0};
+  // host ns: aclCreateTensor/aclDestroyTensor, GetWorkspaceSize and the workspace, the launch
+  std::atomic<uint64_t> create_ns{0};
+  std::atomic<uint64_t> workspace_ns{0};
+  std::atomic<uint64_t> launch_ns{0};
+  // device ns of the calls made in kProfileDevice, filled in as their events complete
+  std::atomic<uint64_t> device_ns{0};
+  std::atomic<uint64_t> device_calls{0};
+};
+
+// the counters of an op, made on first use and kept for the process
+OpStats& op_stats(const char* name);
+aclrtEvent acquire_event();
+void release_event(aclrtEvent event);
+// takes ownership of the events, the elapsed time is added once end has completed
+void push_device_sample(OpStats& stats, aclrtEvent start, aclrtEvent end);
+
+#if NATIVE_PROFILE
+
+class OpTimer {
+public:
+  OpTimer(OpStats& stats, aclrtStream stream)
+      : stats_(stats), stream_(stream), mode_(profile_mode.load(std::memory_order_relaxed)) {
+    if (mode_ != kProfileOff) {
+      t_ = now();
+    }
+  }
+
+  OpTimer(const OpTimer&) = delete;
+  OpTimer& operator=(const OpTimer&) = delete;
+
+  // the acl tensors are made
+  void created() {
+    if (mode_ != kProfileOff) {
+      lap(stats_.create_ns);
+    }
+  }
+
+  // GetWorkspaceSize returned and the workspace is there, the launch comes next
+  void workspace_sized() {
+    if (mode_ == kProfileOff) {
+      return;
+    }
+    lap(stats_.workspace_ns);
+    if (mode_ == kProfileDevice) {
+      start_ = acquire_event();
+      aclrtRecordEvent(start_, stream_);
+      t_ = now();
+    }
+  }
+
+  // the kernel is queued
+  void launched() {
+    if (mode_ == kProfileOff) {
+      return;
+    }
+    lap(stats_.launch_ns);
+    if (start_ != nullptr) {
+      aclrtEvent end = acquire_event();
+      aclrtRecordEvent(end, stream_);
+      push_device_sample(stats_, start_, end);
+      start_ = nullptr;
+      t_ = now();
+    }
+    launched_ = true;
+  }
+
+  // destroying the acl tensors counts as descriptor time, calls that threw are not counted
+  ~OpTimer() {
+    if (start_ != nullptr) {
+      release_event(start_);
+    }
+    if (launched_) {
+      lap(stats_.create_ns);
+      stats_.calls.fetch_add(1, std::memory_order_relaxed);
+    }
+  }
+
+private:
+  static uint64_t now() {
+    return std::chrono::duration_cast<std::chrono::nanoseconds>(
+        std::chrono::steady_clock::now().time_since_epoch()).count();
+  }
+
+  void lap(std::atomic<uint64_t>& counter) {
+    uint64_t t = now();
+    counter.fetch_add(t - t_, std::memory_order_relaxed);
+    t_ = t;
+  }
+
+  OpStats& stats_;
+  aclrtStream stream_;
+  int mode_;
+  uint64_t t_ = 0;
+  aclrtEvent start_ = nullptr;
+  bool launched_ = false;
+};
+
+#define PROFILE_OP(timer, name, stream) \
+  static native::OpStats& timer##_stats = native::op_stats(name); \
+  native::OpTimer timer(timer##_stats, stream)
+#define PROFILE_OP_STATS(timer, stats, stream) native::OpTimer timer(stats, stream)
+
+#else
+
+class OpTimer {
+public:
+  void created() {}
+  void workspace_sized() {}
+  void launched() {}
+};
+
+#define PROFILE_OP(timer, name, stream) native::OpTimer timer
+#define PROFILE_OP_STATS(timer, stats, stream) native::OpTimer timer
+
+#endif
+
+}  // namespace native
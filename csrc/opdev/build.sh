@@ -22,6 +22,10 @@ mkdir -p build_out
 rm -rf build_out/*
 
 opts=$(python3 $script_path/cmake/util/preset_parse.py $script_path/CMakePresets.json)
+# OPS selects the ops to compile, MAX_JOBS sizes the kernel compile pool, both from setup.py
+jobs=${MAX_JOBS:-0}
+if [ "$jobs" -le 0 ]; then jobs=$(nproc); fi
+extra_opts="-DOPS=${OPS} -DMAX_JOBS=${jobs}"
 ENABLE_CROSS="-DENABLE_CROSS_COMPILE=True"
 ENABLE_BINARY="-DENABLE_BINARY_PACKAGE=True"
 ENABLE_LIBRARY="-DASCEND_PACK_SHARED_LIBRARY=True"
@@ -34,9 +38,9 @@ if [[ $opts =~ $ENABLE_LIBRARY ]]; then target=install; fi
 if [[ $opts =~ $ENABLE_CROSS ]] && [[ $opts =~ $ENABLE_BINARY ]]
 then
   if [ "$cmake_version" \< "3.19.0" ] ; then
-    cmake -S . -B "$BUILD_DIR" $opts -DENABLE_CROSS_COMPILE=0
+    cmake -S . -B "$BUILD_DIR" $opts $extra_opts -DENABLE_CROSS_COMPILE=0
   else
-    cmake -S . -B "$BUILD_DIR" --preset=default -DENABLE_CROSS_COMPILE=0
+    cmake -S . -B "$BUILD_DIR" --preset=default $extra_opts -DENABLE_CROSS_COMPILE=0
   fi
   cmake --build "$BUILD_DIR" --target cust_optiling
   mkdir $BUILD_DIR/$HOST_NATIVE_DIR
@@ -46,20 +50,20 @@ then
   mv $HOST_NATIVE_DIR $BUILD_DIR
   host_native_tiling_lib=$(realpath $(find $BUILD_DIR -type f -name "libcust_opmaster_rt2.0.so"))
   if [ "$cmake_version" \< "3.19.0" ] ; then
-    cmake -S . -B "$BUILD_DIR" $opts -DHOST_NATIVE_TILING_LIB=$host_native_tiling_lib
+    cmake -S . -B "$BUILD_DIR" $opts $extra_opts -DHOST_NATIVE_TILING_LIB=$host_native_tiling_lib
   else
-    cmake -S . -B "$BUILD_DIR" --preset=default -DHOST_NATIVE_TILING_LIB=$host_native_tiling_lib
+    cmake -S . -B "$BUILD_DIR" --preset=default $extra_opts -DHOST_NATIVE_TILING_LIB=$host_native_tiling_lib
   fi
-  cmake --build "$BUILD_DIR" --target binary -j$(nproc)
-  cmake --build "$BUILD_DIR" --target $target -j$(nproc)
+  cmake --build "$BUILD_DIR" --target binary -j$jobs
+  cmake --build "$BUILD_DIR" --target $target -j$jobs
 else
   if [ "$cmake_version" \< "3.19.0" ] ; then
-    cmake -S . -B "$BUILD_DIR" $opts
+    cmake -S . -B "$BUILD_DIR" $opts $extra_opts
   else
-      cmake -S . -B "$BUILD_DIR" --preset=default
+      cmake -S . -B "$BUILD_DIR" --preset=default $extra_opts
   fi
-  cmake --build "$BUILD_DIR" --target binary -j$(nproc)
-  cmake --build "$BUILD_DIR" --target $target -j$(nproc)
+  cmake --build "$BUILD_DIR" --target binary -j$jobs
+  cmake --build "$BUILD_DIR" --target $target -j$jobs
 fi
 
 
@@ -35,6 +35,18 @@ endif()
 if (NOT DEFINED ASCEND_PACK_SHARED_LIBRARY)
     set(ASCEND_PACK_SHARED_LIBRARY False CACHE BOOL "")
 endif()
+# embed: the kernel binaries are packed by one assembler call, objcopy: one llvm-objcopy per binary
+if (NOT DEFINED ASCEND_PACK_MODE)
+    set(ASCEND_PACK_MODE embed CACHE STRING "")
+endif()
+# comma separated op files or op types to compile, the others come from the kernel cache
+if (NOT DEFINED OPS)
+    set(OPS "" CACHE STRING "")
+endif()
+# workers of the kernel compile pool across ops, 0 = all cpus
+if (NOT DEFINED MAX_JOBS)
+    set(MAX_JOBS 0 CACHE STRING "")
+endif()
 set(ASCEND_TENSOR_COMPILER_PATH ${ASCEND_CANN_PACKAGE_PATH}/compiler)
 set(ASCEND_CCEC_COMPILER_PATH ${ASCEND_TENSOR_COMPILER_PATH}/ccec_compiler/bin)
 set(ASCEND_AUTOGEN_PATH ${CMAKE_BINARY_DIR}/autogen)
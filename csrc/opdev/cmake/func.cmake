@@ -118,79 +118,63 @@ function(add_npu_support_target)
   endif()
 endfunction()
 
-function(add_simple_kernel_compile)
-  set(options "")
-  set(single_value_args "OPS_INFO;OUT_DIR;TILING_LIB;OP_TYPE;SRC;COMPUTE_UNIT;JSON_FILE;DYNAMIC_PATH")
-  set(multi_value_args "OPTIONS;CONFIGS")
-  cmake_parse_arguments(BINCMP "${options}" "${single_value_args}" "${multi_value_args}" ${ARGN})
-  if (NOT DEFINED BINCMP_OUT_DIR)
-    set(BINCMP_OUT_DIR ${CMAKE_CURRENT_BINARY_DIR}/binary)
+function(add_kernels_compile_pool)
+  # all ops of COMPUTE_UNIT in one ascendc_compile_ops.py job pool, instead of a target per op
+  cmake_parse_arguments(POOL "" "OUT_DIR;TILING_LIB;COMPUTE_UNIT;JSON_FILE;DYNAMIC_PATH" "" ${ARGN})
+  if (NOT DEFINED POOL_OUT_DIR)
+    set(POOL_OUT_DIR ${CMAKE_CURRENT_BINARY_DIR}/binary)
   endif()
-  if (NOT DEFINED BINCMP_TILING_LIB)
-    set(BINCMP_TILING_LIB $<TARGET_FILE:cust_optiling>)
+  if (NOT DEFINED POOL_TILING_LIB)
+    if (${ENABLE_CROSS_COMPILE})
+      if (${ENABLE_BINARY_PACKAGE} AND NOT DEFINED HOST_NATIVE_TILING_LIB)
+        message(FATAL_ERROR "Native host libs was not set for cross compile!")
+      endif()
+      set(POOL_TILING_LIB ${HOST_NATIVE_TILING_LIB})
+    else()
+      set(POOL_TILING_LIB $<TARGET_FILE:cust_optiling>)
+    endif()
+  endif()
+  set(_ASCENDC_ENV_VAR)
+  if(${CMAKE_CXX_COMPILER_LAUNCHER} MATCHES "ccache$")
+    list(APPEND _ASCENDC_ENV_VAR export ASCENDC_CCACHE_EXECUTABLE=${CMAKE_CXX_COMPILER_LAUNCHER} &&)
+  endif()
+  set(POOL_TARGET ascendc_bin_${POOL_COMPUTE_UNIT}_kernels)
+  add_custom_target(${POOL_TARGET}
+                    COMMAND ${_ASCENDC_ENV_VAR} ${ASCEND_PYTHON_EXECUTABLE} ${CMAKE_SOURCE_DIR}/cmake/util/ascendc_compile_ops.py
+                    --config-ini=${ASCEND_AUTOGEN_PATH}/aic-${POOL_COMPUTE_UNIT}-ops-info.ini
+                    --src-dir=${CMAKE_SOURCE_DIR}/op_kernel
+                    --compute-unit=${POOL_COMPUTE_UNIT}
+                    --tiling-lib=${POOL_TILING_LIB}
+                    --output-path=${POOL_OUT_DIR}
+                    --dynamic-dir=${POOL_DYNAMIC_PATH}
+                    --enable-binary=\"${ENABLE_BINARY_PACKAGE}\"
+                    --json-file=${POOL_JSON_FILE}
+                    --ops=\"${OPS}\"
+                    --jobs=${MAX_JOBS}
+                    --report=${CMAKE_BINARY_DIR}/kernel_build_report_${POOL_COMPUTE_UNIT}.json)
+  if (NOT ${ENABLE_CROSS_COMPILE})
+    add_dependencies(${POOL_TARGET} cust_optiling)
   endif()
   if (${ASCEND_PACK_SHARED_LIBRARY})
     if (NOT TARGET op_kernel_pack)
       add_custom_target(op_kernel_pack
                         COMMAND ${ASCEND_PYTHON_EXECUTABLE} ${CMAKE_SOURCE_DIR}/cmake/util/ascendc_pack_kernel.py
-                        --input-path=${BINCMP_OUT_DIR}
-                        --output-path=${BINCMP_OUT_DIR}/library
+                        --input-path=${POOL_OUT_DIR}
+                        --output-path=${POOL_OUT_DIR}/library
                         --enable-library=${ASCEND_PACK_SHARED_LIBRARY}
-                        --platform=${CMAKE_SYSTEM_PROCESSOR})
+                        --platform=${CMAKE_SYSTEM_PROCESSOR}
+                        --pack-mode=${ASCEND_PACK_MODE}
+                        --compiler=${CMAKE_CXX_COMPILER})
       add_library(ascend_kernels INTERFACE)
       target_link_libraries(ascend_kernels INTERFACE kernels)
-      target_link_directories(ascend_kernels INTERFACE ${BINCMP_OUT_DIR}/library)
-      target_include_directories(ascend_kernels INTERFACE ${BINCMP_OUT_DIR}/library)
+      target_link_directories(ascend_kernels INTERFACE ${POOL_OUT_DIR}/library)
+      target_include_directories(ascend_kernels INTERFACE ${POOL_OUT_DIR}/library)
       add_dependencies(ascend_kernels op_kernel_pack)
-      add_dependencies(op_kernel_pack ${BINCMP_OP_TYPE}_${BINCMP_COMPUTE_UNIT})
-    endif()
-  endif()
-  # add Environment Variable Configurations of ccache
-  set(_ASCENDC_ENV_VAR)
-  if(${CMAKE_CXX_COMPILER_LAUNCHER} MATCHES "ccache$")
-    list(APPEND _ASCENDC_ENV_VAR export ASCENDC_CCACHE_EXECUTABLE=${CMAKE_CXX_COMPILER_LAUNCHER} &&)
-  endif()
-
-  if (NOT DEFINED BINCMP_OPS_INFO)
-    set(BINCMP_OPS_INFO ${ASCEND_AUTOGEN_PATH}/aic-${BINCMP_COMPUTE_UNIT}-ops-info.ini)
-  endif()
-  if (NOT ${ENABLE_CROSS_COMPILE})
-    add_custom_target(${BINCMP_OP_TYPE}_${BINCMP_COMPUTE_UNIT}
-                      COMMAND ${_ASCENDC_ENV_VAR} ${ASCEND_PYTHON_EXECUTABLE} ${CMAKE_SOURCE_DIR}/cmake/util/ascendc_compile_kernel.py
-                      --op-name=${BINCMP_OP_TYPE}
-                      --src-file=${BINCMP_SRC}
-                      --compute-unit=${BINCMP_COMPUTE_UNIT}
-                      --compile-options=\"${BINCMP_OPTIONS}\"
-                      --debug-config=\"${BINCMP_CONFIGS}\"
-                      --config-ini=${BINCMP_OPS_INFO}
-                      --tiling-lib=${BINCMP_TILING_LIB}
-                      --output-path=${BINCMP_OUT_DIR}
-                      --dynamic-dir=${BINCMP_DYNAMIC_PATH}
-                      --enable-binary=\"${ENABLE_BINARY_PACKAGE}\"
-                      --json-file=${BINCMP_JSON_FILE}
-                      --build-tool=$(MAKE))
-    add_dependencies(${BINCMP_OP_TYPE}_${BINCMP_COMPUTE_UNIT} cust_optiling)
-  else()
-    if (${ENABLE_BINARY_PACKAGE} AND NOT DEFINED HOST_NATIVE_TILING_LIB)
-      message(FATAL_ERROR "Native host libs was not set for cross compile!")
     endif()
-    add_custom_target(${BINCMP_OP_TYPE}_${BINCMP_COMPUTE_UNIT}
-                      COMMAND ${_ASCENDC_ENV_VAR} ${ASCEND_PYTHON_EXECUTABLE} ${CMAKE_SOURCE_DIR}/cmake/util/ascendc_compile_kernel.py
-                      --op-name=${BINCMP_OP_TYPE}
-                      --src-file=${BINCMP_SRC}
-                      --compute-unit=${BINCMP_COMPUTE_UNIT}
-                      --compile-options=\"${BINCMP_OPTIONS}\"
-                      --debug-config=\"${BINCMP_CONFIGS}\"
-                      --config-ini=${BINCMP_OPS_INFO}
-                      --tiling-lib=${HOST_NATIVE_TILING_LIB}
-                      --output-path=${BINCMP_OUT_DIR}
-                      --dynamic-dir=${BINCMP_DYNAMIC_PATH}
-                      --enable-binary=\"${ENABLE_BINARY_PACKAGE}\"
-                      --json-file=${BINCMP_JSON_FILE}
-                      --build-tool=$(MAKE))
+    add_dependencies(op_kernel_pack ${POOL_TARGET})
   endif()
-  add_dependencies(ascendc_bin_${BINCMP_COMPUTE_UNIT}_gen_ops_config ${BINCMP_OP_TYPE}_${BINCMP_COMPUTE_UNIT})
-  add_dependencies(${BINCMP_OP_TYPE}_${BINCMP_COMPUTE_UNIT} ops_info_gen_${BINCMP_COMPUTE_UNIT})
+  add_dependencies(ascendc_bin_${POOL_COMPUTE_UNIT}_gen_ops_config ${POOL_TARGET})
+  add_dependencies(${POOL_TARGET} ops_info_gen_${POOL_COMPUTE_UNIT})
 endfunction()
 
 function(ascendc_device_library)
@@ -240,7 +224,9 @@ function(add_opregistry_target)
                     --vendor-name=${vendor_name}
                     --compute-unit=${COMPUTE_UNIT}
                     --framework-type=${ASCEND_FRAMEWORK_TYPE}
-                    --platform=${CMAKE_SYSTEM_PROCESSOR})
+                    --platform=${CMAKE_SYSTEM_PROCESSOR}
+                    --pack-mode=${ASCEND_PACK_MODE}
+                    --compiler=${CMAKE_CXX_COMPILER})
   add_library(ascend_opregistry INTERFACE)
   target_link_libraries(ascend_opregistry INTERFACE opregistry)
   target_link_directories(ascend_opregistry INTERFACE ${CMAKE_SOURCE_DIR}/build_out/library)
@@ -326,31 +312,11 @@ function(add_kernels_compile)
       endif()
       add_dependencies(binary ascendc_bin_${compute_unit}_gen_ops_config)
 
-      # get op_type-op_name from aic-${compute_unit}-ops-info.ini
-      execute_process(COMMAND ${ASCEND_PYTHON_EXECUTABLE} ${CMAKE_SOURCE_DIR}/cmake/util/ascendc_get_op_name.py
-                              --ini-file=${ASCEND_AUTOGEN_PATH}/aic-${compute_unit}-ops-info.ini
-                      OUTPUT_VARIABLE OP_TYPE_NAME
-                      RESULT_VARIABLE EXEC_RESULT
-                      ERROR_VARIABLE EXEC_ERROR
-      )
-      if (${EXEC_RESULT})
-        message(FATAL_ERROR, "get op name failed, gen error: ${EXEC_ERROR}")
-      endif()
-
-      # compile op one by one with ascendc_compile_kernel.py
-      string(REPLACE "\n" ";" TYPE_NAME_LIST "${OP_TYPE_NAME}")
-      foreach(TYPE_NAME IN LISTS TYPE_NAME_LIST)
-        if (NOT "${TYPE_NAME}" STREQUAL "")
-          string(REPLACE "-" ";" bin_sep ${TYPE_NAME})
-          list(GET bin_sep 0 op_type)
-          list(GET bin_sep 1 op_file)
-          add_simple_kernel_compile(OP_TYPE ${op_type}
-                                    SRC ${CMAKE_SOURCE_DIR}/op_kernel/${op_file}.cpp
-                                    COMPUTE_UNIT ${compute_unit}
-                                    JSON_FILE ${CMAKE_CURRENT_BINARY_DIR}/tbe/op_info_cfg/ai_core/${compute_unit}/aic-${compute_unit}-ops-info.json
-                                    DYNAMIC_PATH ${DYNAMIC_PATH})
-        endif()
-      endforeach()
+      # compile the kernel variants of all ops in one pool with ascendc_compile_ops.py,
+      # OPS limits what is compiled, MAX_JOBS the number of workers
+      add_kernels_compile_pool(COMPUTE_UNIT ${compute_unit}
+                               JSON_FILE ${CMAKE_CURRENT_BINARY_DIR}/tbe/op_info_cfg/ai_core/${compute_unit}/aic-${compute_unit}-ops-info.json
+                               DYNAMIC_PATH ${DYNAMIC_PATH})
     endif()
   endforeach()
 
@@ -0,0 +1,329 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+"""
+Content-addressed cache of the kernel binaries built by ascendc_compile_kernel.py.
+
+The key of an op is the sha256 of everything its binaries depend on:
+  the kernel source and the quoted headers it includes, recursively
+  the tiling header op_host/<op_file>_tiling.h
+  the compile options of the op from custom_compile_options.ini / custom_opc_options.ini
+  and the ones passed on the command line
+  the op section of aic-<soc>-ops-info.ini, which lists the dtype/format variants
+  the SoC
+  the toolkit: its version files and the ccec binary, its headers are not in the sources
+A hit copies the .o/.json files of the op back into the output dir without calling the compiler.
+
+The cache is ASCEND910A_EXTRAS_KERNEL_CACHE or ~/.cache/ascend910a_extras/kernels, set it to
+"off" to always compile.
+
+    python ascendc_compile_cache.py key --src-file=... --compute-unit=... --config-ini=... -n OpType
+    python ascendc_compile_cache.py clear
+"""
+
+import argparse
+import filecmp
+import hashlib
+import json
+import os
+import re
+import shutil
+import tempfile
+
+CACHE_ENV = "ASCEND910A_EXTRAS_KERNEL_CACHE"
+DEFAULT_CACHE = os.path.join(
+    os.path.expanduser("~"), ".cache", "ascend910a_extras", "kernels"
+)
+MANIFEST = "manifest.json"
+COMPILE_OPTIONS_FILES = ["custom_compile_options.ini", "custom_opc_options.ini"]
+INCLUDE_RE = re.compile(r'^\s*#\s*include\s*"([^"]+)"', re.MULTILINE)
+# set by the toolkit's set_env.sh, the first one set is the toolkit in use
+TOOLKIT_ENVS = ["ASCEND_HOME_PATH", "ASCEND_TOOLKIT_HOME"]
+TOOLKIT_VERSION_FILES = ["version.cfg", os.path.join("compiler", "version.info")]
+CCEC = os.path.join("compiler", "ccec_compiler", "bin", "ccec")
+
+
+def file_digest(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as fd:
+        for chunk in iter(lambda: fd.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def include_dirs(compile_options: str) -> list:
+    # -I<dir> and -I <dir> of the compile options
+    dirs = []
+    opts = compile_options.replace(";", " ").split()
+    for i, opt in enumerate(opts):
+        if opt == "-I" and i + 1 < len(opts):
+            dirs.append(opts[i + 1])
+        elif opt.startswith("-I") and len(opt) > 2:
+            dirs.append(opt[2:])
+    return dirs
+
+
+def source_digests(src_file: str, inc_dirs: list = ()) -> dict:
+    # path -> digest of the source and of every quoted include it reaches, includes that are
+    # not found (the toolkit headers) are skipped
+    digests = {}
+    todo = [os.path.realpath(src_file)]
+    while todo:
+        path = todo.pop()
+        if path in digests:
+            continue
+        digests[path] = file_digest(path)
+        with open(path, errors="replace") as fd:
+            text = fd.read()
+        for name in INCLUDE_RE.findall(text):
+            for d in [os.path.dirname(path), *inc_dirs]:
+                candidate = os.path.realpath(os.path.join(d, name))
+                if os.path.isfile(candidate):
+                    todo.append(candidate)
+                    break
+    return digests
+
+
+def toolkit_home() -> str:
+    for name in TOOLKIT_ENVS:
+        if os.getenv(name):
+            return os.getenv(name)
+    return ""
+
+
+def toolkit_identity(home: str = None) -> dict:
+    # what identifies the compiler and the toolkit headers, an upgrade changes the version files
+    # and the ccec binary; its size and mtime stand in for a digest of a large binary
+    home = toolkit_home() if home is None else home
+    if not home:
+        return {}
+    identity = {}
+    for name in TOOLKIT_VERSION_FILES:
+        path = os.path.join(home, name)
+        if os.path.isfile(path):
+            identity[name] = file_digest(path)
+    ccec = os.path.join(home, CCEC)
+    if os.path.isfile(ccec):
+        stat = os.stat(os.path.realpath(ccec))
+        identity["ccec"] = "{}:{}".format(stat.st_size, stat.st_mtime_ns)
+    return identity
+
+
+def tiling_header(src_file: str) -> str:
+    # op_kernel/rope_ex.cpp -> op_host/rope_ex_tiling.h
+    src_file = os.path.realpath(src_file)
+    op_file = os.path.splitext(os.path.basename(src_file))[0]
+    root = os.path.dirname(os.path.dirname(src_file))
+    return os.path.join(root, "op_host", op_file + "_tiling.h")
+
+
+def op_compile_options(autogen_dir: str, op_type: str, compute_unit: str) -> list:
+    # the lines of the options files that apply to this op, in file order
+    lines = []
+    for name in COMPILE_OPTIONS_FILES:
+        path = os.path.join(autogen_dir, name)
+        if not os.path.isfile(path):
+            continue
+        with open(path) as fd:
+            for line in fd:
+                fields = line.strip().split(",", 2)
+                if len(fields) < 3:
+                    continue
+                if fields[0] in (op_type, "ALL") and fields[1] in (compute_unit, ""):
+                    lines.append(name + ":" + line.strip())
+    return lines
+
+
+def op_config_section(config_ini: str, op_type: str) -> str:
+    # the [op_type] section of the ops info ini
+    if not os.path.isfile(config_ini):
+        return ""
+    section, inside = [], False
+    with open(config_ini) as fd:
+        for line in fd:
+            stripped = line.strip()
+            if stripped.startswith("[") and stripped.endswith("]"):
+                inside = stripped[1:-1] == op_type
+                continue
+            if inside and stripped:
+                section.append(stripped)
+    return "\n".join(section)
+
+
+def key_inputs(
+    op_type: str,
+    src_file: str,
+    compute_unit: str,
+    config_ini: str,
+    compile_options: str = "",
+    debug_config: str = "",
+    toolkit: dict = None,
+) -> dict:
+    # everything the key hashes, kept readable in the manifest to explain a miss,
+    # toolkit defaults to the one of the environment
+    inc_dirs = include_dirs(compile_options)
+    sources = source_digests(src_file, inc_dirs)
+    root = os.path.dirname(os.path.dirname(os.path.realpath(src_file)))
+    tiling = tiling_header(src_file)
+    config = op_config_section(config_ini, op_type)
+    return {
+        "op_type": op_type,
+        "compute_unit": compute_unit,
+        "sources": {os.path.relpath(p, root): d for p, d in sorted(sources.items())},
+        "tiling": file_digest(tiling) if os.path.isfile(tiling) else "",
+        "compile_options": compile_options,
+        "debug_config": debug_config,
+        "op_compile_options": op_compile_options(
+            os.path.dirname(os.path.realpath(config_ini)), op_type, compute_unit
+        ),
+        "op_config": hashlib.sha256(config.encode()).hexdigest(),
+        "toolkit": toolkit_identity() if toolkit is None else toolkit,
+    }
+
+
+def cache_key(inputs: dict) -> str:
+    return hashlib.sha256(json.dumps(inputs, sort_keys=True).encode()).hexdigest()
+
+
+def cache_dir() -> str:
+    return os.getenv(CACHE_ENV) or DEFAULT_CACHE
+
+
+def cache_enabled() -> bool:
+    return os.getenv(CACHE_ENV, "").lower() not in ("off", "0", "false")
+
+
+class CompileCache:
+    def __init__(self: any, root: str = None):
+        self.root = root or cache_dir()
+
+    def entry(self: any, key: str) -> str:
+        return os.path.join(self.root, key[:2], key)
+
+    def restore(self: any, key: str, out_dir: str) -> bool:
+        # copies the cached files of key into out_dir, False on a miss or a damaged entry
+        entry = self.entry(key)
+        manifest = os.path.join(entry, MANIFEST)
+        if not os.path.isfile(manifest):
+            return False
+        with open(manifest) as fd:
+            files = json.load(fd)["files"]
+        for name, digest in files.items():
+            path = os.path.join(entry, name)
+            if not os.path.isfile(path) or file_digest(path) != digest:
+                return False
+        os.makedirs(out_dir, exist_ok=True)
+        for name in files:
+            dst = os.path.join(out_dir, name)
+            os.makedirs(os.path.dirname(dst), exist_ok=True)
+            shutil.copy2(os.path.join(entry, name), dst)
+        return True
+
+    def store(self: any, key: str, out_dir: str, inputs: dict = None) -> int:
+        # saves the files under out_dir as the entry of key, returns the number of files
+        files = {}
+        for base, _, names in os.walk(out_dir):
+            for name in names:
+                path = os.path.join(base, name)
+                files[os.path.relpath(path, out_dir)] = file_digest(path)
+        if not files:
+            return 0
+        entry = self.entry(key)
+        os.makedirs(os.path.dirname(entry), exist_ok=True)
+        # written aside and renamed, concurrent builds of the same key keep one complete entry
+        tmp = tempfile.mkdtemp(dir=os.path.dirname(entry), prefix=".tmp_")
+        try:
+            for name in files:
+                dst = os.path.join(tmp, name)
+                os.makedirs(os.path.dirname(dst), exist_ok=True)
+                shutil.copy2(os.path.join(out_dir, name), dst)
+            with open(os.path.join(tmp, MANIFEST), "w") as fd:
+                json.dump({"files": files, "inputs": inputs or {}}, fd, indent=2)
+            if os.path.isdir(entry):
+                shutil.rmtree(entry)
+            os.rename(tmp, entry)
+        except OSError:
+            shutil.rmtree(tmp, ignore_errors=True)
+            if not os.path.isdir(entry):
+                raise
+        return len(files)
+
+    def clear(self: any):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+
+def sync_tree(src: str, dst: str) -> tuple:
+    # makes dst a copy of src, copying only new or changed files and removing the stale ones,
+    # returns (copied, removed) relative paths
+    copied, removed = [], []
+    for base, _, names in os.walk(src):
+        rel_base = os.path.relpath(base, src)
+        os.makedirs(os.path.join(dst, rel_base), exist_ok=True)
+        for name in names:
+            s = os.path.join(base, name)
+            d = os.path.join(dst, rel_base, name)
+            rel = os.path.normpath(os.path.join(rel_base, name))
+            if os.path.islink(s):
+                target = os.readlink(s)
+                if os.path.islink(d) and os.readlink(d) == target:
+                    continue
+                if os.path.lexists(d):
+                    os.remove(d)
+                os.symlink(target, d)
+                copied.append(rel)
+                continue
+            if (
+                os.path.isfile(d)
+                and not os.path.islink(d)
+                and filecmp.cmp(s, d, shallow=False)
+            ):
+                continue
+            if os.path.lexists(d):
+                os.remove(d)
+            shutil.copy2(s, d)
+            copied.append(rel)
+    for base, dirs, names in os.walk(dst, topdown=False):
+        rel_base = os.path.relpath(base, dst)
+        for name in names:
+            rel = os.path.normpath(os.path.join(rel_base, name))
+            if not os.path.lexists(os.path.join(src, rel)):
+                os.remove(os.path.join(base, name))
+                removed.append(rel)
+        for name in dirs:
+            path = os.path.join(base, name)
+            if not os.path.isdir(os.path.join(src, rel_base, name)) and not os.listdir(
+                path
+            ):
+                os.rmdir(path)
+    return copied, removed
+
+
+def args_parse():
+    parser = argparse.ArgumentParser()
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("key", help="print the key and its inputs")
+    p.add_argument("-n", "--op-name", required=True)
+    p.add_argument("-s", "--src-file", required=True)
+    p.add_argument("-u", "--compute-unit", required=True)
+    p.add_argument("-i", "--config-ini", required=True)
+    p.add_argument("-c", "--compile-options", default="")
+    p.add_argument("-d", "--debug-config", default="")
+    sub.add_parser("clear", help="remove every entry")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = args_parse()
+    if args.cmd == "clear":
+        CompileCache().clear()
+        print("cleared {}".format(cache_dir()))
+    else:
+        inputs = key_inputs(
+            args.op_name,
+            args.src_file,
+            args.compute_unit,
+            args.config_ini,
+            args.compile_options,
+            args.debug_config,
+        )
+        print(cache_key(inputs))
+        print(json.dumps(inputs, indent=2))
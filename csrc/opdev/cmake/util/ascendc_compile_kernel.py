@@ -13,6 +13,7 @@ import sys
 import time
 
 import ascendc_bin_param_build
+import ascendc_compile_cache
 import ascendc_impl_build
 import ascendc_op_info
 import const_var
@@ -30,6 +31,8 @@ class CompileKernel:
         self.op_output = os.path.realpath(args.output_path)
         self.op_impl_py = None
         self.compile_sh = []
+        self.cache_inputs = None
+        self.cache_key = None
         self.working_dir = os.path.join(
             os.getcwd(),
             self.op_type + "_" + self.op_soc_ver,
@@ -141,10 +144,71 @@ class CompileKernel:
                     )
                 )
 
-    def ascendc_build(self: any):
+    def ascendc_op_bin_dir(self: any):
         op_info = ascendc_op_info.OpInfo(self.op_type, self.op_cfg_ini)
-        op_file = op_info.get_op_file()
-        op_bin_dir = os.path.join(self.op_output, self.op_soc_ver, op_file)
+        return op_info.get_op_file(), os.path.join(
+            self.op_output, self.op_soc_ver, op_info.get_op_file()
+        )
+
+    def ascendc_restore(self: any):
+        # True when the binaries of the current inputs are in the compile cache
+        if not ascendc_compile_cache.cache_enabled():
+            return False
+        self.cache_inputs = ascendc_compile_cache.key_inputs(
+            self.op_type,
+            self.op_cpp_file,
+            self.op_soc_ver,
+            self.op_cfg_ini,
+            self.compile_options or "",
+            self.op_debug_config or "",
+        )
+        self.cache_key = ascendc_compile_cache.cache_key(self.cache_inputs)
+        _, op_bin_dir = self.ascendc_op_bin_dir()
+        # the dir holds exactly the binaries of one key, restored or built
+        shutil.rmtree(op_bin_dir, ignore_errors=True)
+        cache = ascendc_compile_cache.CompileCache()
+        if not cache.restore(self.cache_key, op_bin_dir):
+            return False
+        print(
+            "[kernel cache] hit {} {} {}".format(
+                self.op_type, self.op_soc_ver, self.cache_key[:16]
+            )
+        )
+        return True
+
+    def ascendc_store(self: any):
+        if self.cache_key is None:
+            return
+        _, op_bin_dir = self.ascendc_op_bin_dir()
+        cache = ascendc_compile_cache.CompileCache()
+        num_files = cache.store(self.cache_key, op_bin_dir, self.cache_inputs)
+        print(
+            "[kernel cache] stored {} {} {}, {} files".format(
+                self.op_type, self.op_soc_ver, self.cache_key[:16], num_files
+            )
+        )
+
+    def ascendc_env(self: any):
+        return dict(
+            os.environ,
+            HI_PYTHON="python3",
+            ASCEND_CUSTOM_OPP_PATH=self.build_opp_path,
+        )
+
+    def ascendc_jobs(self: any):
+        # the variants ascendc_build would run as (build dir, command), for a pool across ops
+        _, op_bin_dir = self.ascendc_op_bin_dir()
+        os.makedirs(op_bin_dir, exist_ok=True)
+        jobs = []
+        for index, sh in enumerate(self.compile_sh):
+            build_path = os.path.join(self.working_dir, "kernel_" + str(index))
+            os.makedirs(build_path)
+            cmd = ["bash", sh, "--kernel-src=" + self.op_cpp_file]
+            jobs.append((build_path, cmd + [self.op_impl_py, op_bin_dir, "make"]))
+        return jobs
+
+    def ascendc_build(self: any):
+        op_file, op_bin_dir = self.ascendc_op_bin_dir()
         os.makedirs(op_bin_dir, exist_ok=True)
         all_tar = []
         sub_cmd = []
@@ -255,8 +319,10 @@ if __name__ == "__main__":
         kernel_builder.clean()
     else:
         kernel_builder.ascendc_gen_impl()
-        kernel_builder.ascendc_gen_param()
-        kernel_builder.ascendc_put_json()
-        kernel_builder.ascendc_put_tiling()
-        kernel_builder.ascendc_build()
+        if not kernel_builder.ascendc_restore():
+            kernel_builder.ascendc_gen_param()
+            kernel_builder.ascendc_put_json()
+            kernel_builder.ascendc_put_tiling()
+            kernel_builder.ascendc_build()
+            kernel_builder.ascendc_store()
         kernel_builder.clean()
@@ -0,0 +1,288 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+"""
+Builds the kernels of all ops of a compute unit in one job pool.
+
+Every op is prepared like ascendc_compile_kernel.py does (impl script, bin params, json, tiling)
+and looked up in the compile cache, then the kernel variants of all ops that missed run in one
+pool of --jobs workers, so a slow op no longer holds back the others. Ops are queued by their
+compile time in the previous run, the slowest first.
+
+--ops selects ops by op file (rope_ex) or op type (RopeEx), comma separated. The other ops are
+only restored from the compile cache and left out of the package when they are not cached.
+The report lists the compile time of every op and is printed at the end.
+
+    python ascendc_compile_ops.py --config-ini=autogen/aic-ascend910-ops-info.ini ... --ops=rope_ex --jobs=16
+"""
+
+import argparse
+import configparser
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+STATUS_COMPILED = "compiled"
+STATUS_CACHED = "cached"
+STATUS_SKIPPED = "skipped"
+STATUS_FAILED = "failed"
+
+
+def parse_ops(config_ini: str) -> list:
+    # (op_type, op_file) of every op in the ops info ini
+    op_config = configparser.ConfigParser()
+    op_config.read(config_ini)
+    return [
+        (section, op_config.get(section, "opFile.value"))
+        for section in op_config.sections()
+    ]
+
+
+def select_ops(ops: list, selection: str) -> set:
+    # op types picked by a comma separated list of op files or op types, empty picks all
+    names = [n.strip() for n in (selection or "").split(",") if n.strip()]
+    if not names:
+        return {op_type for op_type, _ in ops}
+    selected = set()
+    for name in names:
+        matches = {op_type for op_type, op_file in ops if name in (op_type, op_file)}
+        if not matches:
+            available = ", ".join(op_file for _, op_file in ops)
+            raise ValueError("unknown op {}, available: {}".format(name, available))
+        selected |= matches
+    return selected
+
+
+def run_jobs(jobs: list, num_jobs: int) -> list:
+    # jobs: (op_type, cwd, cmd, env), returns one (op_type, start, end, returncode, output) per
+    # job in order, the jobs not started after a failure get returncode None
+    stop = threading.Event()
+
+    def run(job):
+        op_type, cwd, cmd, env = job
+        if stop.is_set():
+            return op_type, 0.0, 0.0, None, ""
+        start = time.perf_counter()
+        proc = subprocess.run(
+            cmd,
+            cwd=cwd,
+            env=env,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            universal_newlines=True,
+        )
+        end = time.perf_counter()
+        if proc.returncode != 0:
+            stop.set()
+        return op_type, start, end, proc.returncode, proc.stdout
+
+    with ThreadPoolExecutor(max_workers=max(1, num_jobs)) as pool:
+        return list(pool.map(run, jobs))
+
+
+def op_report(builds: dict, results: list, t0: float) -> dict:
+    # builds: op_type -> {"op_file", "status", "num_variants", "prepare"}
+    report = {}
+    for op_type, build in builds.items():
+        runs = [r for r in results if r[0] == op_type and r[3] is not None]
+        entry = dict(build)
+        entry["compile"] = sum(end - start for _, start, end, _, _ in runs)
+        entry["wall"] = (
+            max(end for _, _, end, _, _ in runs) - min(s for _, s, _, _, _ in runs)
+            if runs
+            else 0.0
+        )
+        entry["finish"] = max(end for _, _, end, _, _ in runs) - t0 if runs else 0.0
+        report[op_type] = entry
+    return report
+
+
+def format_report(report: dict) -> str:
+    lines = [
+        "{:<36} {:>9} {:>8} {:>10} {:>10} {:>10}".format(
+            "op", "status", "variants", "prepare s", "compile s", "wall s"
+        )
+    ]
+    ops = report["ops"]
+    for op_type in sorted(ops, key=lambda k: -ops[k]["compile"]):
+        e = ops[op_type]
+        lines.append(
+            "{:<36} {:>9} {:>8} {:>10.1f} {:>10.1f} {:>10.1f}".format(
+                op_type,
+                e["status"],
+                e["num_variants"],
+                e["prepare"],
+                e["compile"],
+                e["wall"],
+            )
+        )
+    lines.append(
+        "total {:.1f} s with {} jobs, compile {:.1f} s, {} compiled, {} cached, {} skipped".format(
+            report["wall"],
+            report["jobs"],
+            sum(e["compile"] for e in ops.values()),
+            sum(e["status"] == STATUS_COMPILED for e in ops.values()),
+            sum(e["status"] == STATUS_CACHED for e in ops.values()),
+            sum(e["status"] == STATUS_SKIPPED for e in ops.values()),
+        )
+    )
+    return "\n".join(lines)
+
+
+def previous_times(report_path: str) -> dict:
+    # op_type -> compile seconds of the last report, to queue the slow ops first
+    if not report_path or not os.path.isfile(report_path):
+        return {}
+    try:
+        with open(report_path) as fd:
+            return {k: v["compile"] for k, v in json.load(fd)["ops"].items()}
+    except (OSError, ValueError, KeyError):
+        return {}
+
+
+def build_ops(args: any) -> dict:
+    import ascendc_compile_cache
+    from ascendc_compile_kernel import CompileKernel
+
+    t0 = time.perf_counter()
+    # the pool is the parallelism, variants compile their tiling keys one by one
+    os.environ.pop("TILINGKEY_PAR_COMPILE", None)
+    ops = parse_ops(args.config_ini)
+    selected = select_ops(ops, args.ops)
+    # build_out is wiped by build.sh, the last report is also kept next to the kernel cache
+    history_path = os.path.join(
+        ascendc_compile_cache.cache_dir(),
+        "compile_times_{}.json".format(args.compute_unit),
+    )
+    history = previous_times(history_path)
+    ops.sort(key=lambda op: -history.get(op[0], 0.0))
+
+    builders, builds, jobs = {}, {}, []
+    for op_type, op_file in ops:
+        start = time.perf_counter()
+        kernel_args = SimpleNamespace(
+            op_name=op_type,
+            src_file=os.path.join(args.src_dir, op_file + ".cpp"),
+            compute_unit=args.compute_unit,
+            compile_options=args.compile_options,
+            debug_config=args.debug_config,
+            config_ini=args.config_ini,
+            tiling_lib=args.tiling_lib,
+            output_path=args.output_path,
+            dynamic_dir=args.dynamic_dir,
+            json_file=args.json_file,
+        )
+        builder = CompileKernel(kernel_args)
+        builder.clean()
+        builder.ascendc_gen_impl()
+        build = {"op_file": op_file, "status": STATUS_COMPILED, "num_variants": 0}
+        if args.enable_binary == "False":
+            build["status"] = STATUS_SKIPPED
+            builder.clean()
+        elif builder.ascendc_restore():
+            build["status"] = STATUS_CACHED
+            builder.clean()
+        elif op_type not in selected:
+            print(
+                "[kernel pool] {} is not in OPS and not cached, left out".format(
+                    op_type
+                )
+            )
+            build["status"] = STATUS_SKIPPED
+            builder.clean()
+        else:
+            builder.ascendc_gen_param()
+            builder.ascendc_put_json()
+            builder.ascendc_put_tiling()
+            env = builder.ascendc_env()
+            op_jobs = [(op_type, cwd, cmd, env) for cwd, cmd in builder.ascendc_jobs()]
+            build["num_variants"] = len(op_jobs)
+            jobs += op_jobs
+            builders[op_type] = builder
+        build["prepare"] = time.perf_counter() - start
+        builds[op_type] = build
+
+    print(
+        "[kernel pool] {} variants of {} ops on {} jobs".format(
+            len(jobs), len(builders), args.jobs
+        ),
+        flush=True,
+    )
+    results = run_jobs(jobs, args.jobs)
+    failed = [r for r in results if r[3] not in (0, None)]
+    for op_type in {r[0] for r in failed}:
+        builds[op_type]["status"] = STATUS_FAILED
+    report = {
+        "compute_unit": args.compute_unit,
+        "jobs": args.jobs,
+        "ops": op_report(builds, results, t0),
+    }
+    if not failed:
+        for builder in builders.values():
+            builder.ascendc_store()
+            builder.clean()
+    report["wall"] = time.perf_counter() - t0
+    if args.report:
+        with open(args.report, "w") as fd:
+            json.dump(report, fd, indent=2)
+    if ascendc_compile_cache.cache_enabled() and not failed:
+        # cached ops keep their last compile time
+        times = {
+            op_type: {
+                "compile": (
+                    e["compile"]
+                    if e["status"] == STATUS_COMPILED
+                    else history.get(op_type, 0.0)
+                )
+            }
+            for op_type, e in report["ops"].items()
+        }
+        os.makedirs(os.path.dirname(history_path), exist_ok=True)
+        with open(history_path, "w") as fd:
+            json.dump({"ops": times}, fd, indent=2)
+    print(format_report(report), flush=True)
+    for op_type, _, _, _, output in failed:
+        print(output, file=sys.stderr)
+    if failed:
+        op_type = failed[0][0]
+        raise RuntimeError(
+            "Kernel Compilation Error: OpType {} Kernel File {}!".format(
+                op_type, builders[op_type].op_cpp_file
+            )
+        )
+    return report
+
+
+def default_jobs() -> int:
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def args_parse(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-i", "--config-ini", help="Op config ini file.")
+    parser.add_argument("-s", "--src-dir", help="Dir of the op kernel sources.")
+    parser.add_argument("-u", "--compute-unit", help="Compute unit.")
+    parser.add_argument("-c", "--compile-options", default="")
+    parser.add_argument("-d", "--debug-config", default="")
+    parser.add_argument("-t", "--tiling-lib", help="Tiling shared library file.")
+    parser.add_argument("-o", "--output-path", help="Output path of compile result.")
+    parser.add_argument("-dy", "--dynamic-dir", default=None)
+    parser.add_argument("-eb", "--enable-binary", default=None)
+    parser.add_argument("-j", "--json-file", default=None)
+    parser.add_argument("--ops", default="", help="op files or op types, comma sep.")
+    parser.add_argument("--jobs", type=int, default=0, help="default all cpus")
+    parser.add_argument("--report", default=None, help="json report path")
+    args = parser.parse_args(argv)
+    args.jobs = args.jobs if args.jobs > 0 else default_jobs()
+    return args
+
+
+if __name__ == "__main__":
+    build_ops(args_parse())
@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+"""
+Embeds the kernel binaries of ascendc_pack_kernel.py / ascendc_pack_opregistry.py in one object.
+
+Instead of one llvm-objcopy process per binary, every binary is pulled into a single generated
+assembly file with .incbin and assembled by one compiler call. The symbols are the ones
+llvm-objcopy --input-target binary defines, <sym>_start and <sym>_end, so the generated
+*_op_resource.h headers do not change. Binaries with the same content are stored once and
+all their symbols point at that copy.
+
+    python ascendc_pack_embed.py --compiler=g++ -o kernels_embed.o sym_a=path/a.o sym_b=path/b.json
+"""
+
+import argparse
+import hashlib
+import os
+import re
+import subprocess
+
+IDENT_RE = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+SECTION = ".rodata.ascendc_embed"
+ALIGN = 16
+
+
+def file_digest(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as fd:
+        for chunk in iter(lambda: fd.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def group_blobs(entries: list) -> list:
+    # entries: (sym, path), returns (path, [syms]) per distinct content in first seen order
+    groups = {}
+    for sym, path in entries:
+        if not IDENT_RE.match(sym):
+            raise ValueError("{} of {} is not a valid symbol".format(sym, path))
+        key = (os.path.getsize(path), file_digest(path))
+        if key not in groups:
+            groups[key] = (os.path.realpath(path), [])
+        if sym not in groups[key][1]:
+            groups[key][1].append(sym)
+    return list(groups.values())
+
+
+def asm_string(path: str) -> str:
+    return '"{}"'.format(path.replace("\\", "\\\\").replace('"', '\\"'))
+
+
+def embed_source(groups: list) -> str:
+    # GNU as source valid for x86_64 and aarch64
+    lines = ['\t.section {},"a",%progbits'.format(SECTION)]
+    for path, syms in groups:
+        lines.append("\t.balign {}".format(ALIGN))
+        for suffix in ["_start", "_end"]:
+            for sym in syms:
+                lines.append("\t.globl {}{}".format(sym, suffix))
+                lines.append("\t.type {}{}, %object".format(sym, suffix))
+        lines += ["{}_start:".format(sym) for sym in syms]
+        lines.append("\t.incbin {}".format(asm_string(path)))
+        lines += ["{}_end:".format(sym) for sym in syms]
+    lines.append('\t.section .note.GNU-stack,"",%progbits')
+    return "\n".join(lines) + "\n"
+
+
+def embed_objects(entries: list, out_file: str, compiler: str = None) -> dict:
+    # writes <out_file without .o>.S and assembles it into out_file with one compiler call
+    groups = group_blobs(entries)
+    src_file = os.path.splitext(out_file)[0] + ".S"
+    with open(src_file, "w") as fd:
+        fd.write(embed_source(groups))
+    compiler = compiler or os.getenv("CXX") or "c++"
+    proc = subprocess.run(
+        [compiler, "-c", src_file, "-o", out_file],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        universal_newlines=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(
+            "assembling {} failed:\n{}".format(src_file, proc.stdout.strip())
+        )
+    sizes = [os.path.getsize(path) for path, _ in groups]
+    return {
+        "symbols": sum(len(syms) for _, syms in groups),
+        "binaries": len(groups),
+        "bytes": sum(sizes),
+        "deduplicated_bytes": sum(
+            os.path.getsize(path) * (len(syms) - 1) for path, syms in groups
+        ),
+    }
+
+
+def args_parse():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-o", "--output", required=True, help="Object file to write.")
+    parser.add_argument("--compiler", default=None, help="default $CXX or c++")
+    parser.add_argument("entries", nargs="+", help="sym=path")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = args_parse()
+    stats = embed_objects(
+        [tuple(e.split("=", 1)) for e in args.entries], args.output, args.compiler
+    )
+    print(
+        "embedded {symbols} symbols, {binaries} binaries, {bytes} bytes".format(**stats)
+    )
@@ -6,10 +6,12 @@ import argparse
 import glob
 import math
 import os
+import platform
 import shutil
 import subprocess
 import sys
 
+import ascendc_pack_embed
 import const_var
 from tbe.tikcpp.log_utils import AscendCLogLevel, LogUtil
 
@@ -24,6 +26,11 @@ class PackKernel:
         self.vendor_name = args.vendor_name
         self.framework_type = args.framework_type
         self.platform = args.platform
+        self.pack_mode = args.pack_mode
+        self.compiler = args.compiler
+        self.uname = platform.machine()
+        # (sym, path) of the binaries assembled by ascendc_gen_embed in embed mode
+        self.embeds = []
         self.op_info = {}
         self.file_info = {}
         if os.path.exists(self.copy_path):
@@ -74,6 +81,9 @@ class PackKernel:
         in_file = vname + "/" + in_file
         path = vname + "/" + path
         sym = self.get_symbol("_binary_" + in_file)
+        if self.pack_mode == "embed":
+            self.embeds.append((sym, os.path.realpath(in_file)))
+            return [sym + "_start", sym + "_end"]
         out_file = os.path.join(self.out_path, sym + ".o")
         # ascend610lite only supoort aarch64
         if path.find("ascend610lite") != -1:
@@ -101,11 +111,10 @@ class PackKernel:
                 return None
             return [sym + "_start", sym + "_end"]
 
-        uname = os.popen("uname -m").read().strip()
         if self.platform is not None:
             target_platform = self.platform
         else:
-            target_platform = uname
+            target_platform = self.uname
         try:
             if target_platform == "x86_64":
                 subprocess.run(
@@ -231,11 +240,34 @@ class PackKernel:
                 LogUtil.Option.NON_SOC,
             )
 
+    def ascendc_gen_embed(self: any):
+        out_file = os.path.join(self.out_path, "opregistry_embed.o")
+        try:
+            stats = ascendc_pack_embed.embed_objects(
+                self.embeds, out_file, self.compiler
+            )
+        except Exception as e:
+            LogUtil.print_compile_log(
+                "",
+                f"embed binaries error: {e}!",
+                AscendCLogLevel.LOG_ERROR,
+                LogUtil.Option.NON_SOC,
+            )
+            raise
+        print(
+            "[pack] {symbols} symbols, {binaries} binaries, {deduplicated_bytes} "
+            "duplicate bytes dropped".format(**stats)
+        )
+        return out_file
+
     def ascendc_gen_lib(self: any):
         out_lib = os.path.join(self.out_path, "libopregistry.a")
         if os.path.exists(out_lib):
             os.remove(out_lib)
-        objs = glob.glob(os.path.join(self.out_path, "*.o"))
+        if self.pack_mode == "embed":
+            objs = [self.ascendc_gen_embed()]
+        else:
+            objs = glob.glob(os.path.join(self.out_path, "*.o"))
         start = 0
         batch_size = 100
         for _ in range(math.ceil(len(objs) / batch_size)):
@@ -356,6 +388,19 @@ def args_parse():
         default=None,
         help="target platform is x86_64 or aarch64.",
     )
+    parser.add_argument(
+        "-m",
+        "--pack-mode",
+        choices=["embed", "objcopy"],
+        default="embed",
+        help="embed: one assembled object, objcopy: one llvm-objcopy per binary.",
+    )
+    parser.add_argument(
+        "--compiler",
+        nargs="?",
+        default=None,
+        help="Compiler assembling the embed object, default $CXX or c++.",
+    )
     return parser.parse_args()
 
 
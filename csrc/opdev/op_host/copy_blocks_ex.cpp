@@ -0,0 +1,99 @@
+#include "copy_blocks_ex_tiling.h"
+#include "register/op_def_registry.h"
+#include "tiling/platform/platform_ascendc.h"
+
+
+namespace optiling {
+static ge::graphStatus TilingFunc(gert::TilingContext* context)
+{
+
+  CopyBlocksExTilingData tiling;
+  const gert::StorageShape* key_cache_ptrs_shape = context->GetInputShape(0);
+  const gert::StorageShape* value_cache_ptrs_shape = context->GetInputShape(1);
+  const gert::StorageShape* block_mapping_shape = context->GetInputShape(2);
+  const gert::RuntimeAttrs* attrs = context->GetAttrs();
+  // key_cache_ptrs/value_cache_ptrs: [num_layers] int64 device addresses of the caches
+  // block_mapping: [num_pairs, 2] int64 (src page, dst page)
+  int num_layers = key_cache_ptrs_shape->GetStorageShape().GetDim(0);
+  int num_pairs = block_mapping_shape->GetStorageShape().GetDim(0);
+  int64_t page_bytes = *attrs->GetAttrPointer<int64_t>(0);
+  if (value_cache_ptrs_shape->GetStorageShape().GetDim(0) != num_layers) {
+    return ge::GRAPH_FAILED;
+  }
+  if (block_mapping_shape->GetStorageShape().GetDimNum() != 2 || block_mapping_shape->GetStorageShape().GetDim(1) != 2) {
+    return ge::GRAPH_FAILED;
+  }
+  // pages are copied as int16 in 32B units
+  if (page_bytes <= 0 || page_bytes % 32 != 0) {
+    return ge::GRAPH_FAILED;
+  }
+
+  // one task is one page of one cache, k and v of all layers share the launch
+  auto ascendc_platform = platform_ascendc::PlatformAscendC(context->GetPlatformInfo());
+  int max_core_num = ascendc_platform.GetCoreNumAiv();
+  int num_tasks = num_layers * 2 * num_pairs;
+  int core_num = (num_tasks < max_core_num) ? num_tasks : max_core_num;
+  core_num = (core_num > 0) ? core_num : 1;
+
+  context->SetBlockDim(core_num);
+  tiling.set_num_layers(num_layers);
+  tiling.set_num_pairs(num_pairs);
+  tiling.set_page_elems(page_bytes / 2);
+  tiling.set_core_num(core_num);
+  tiling.SaveToBuffer(context->GetRawTilingData()->GetData(), context->GetRawTilingData()->GetCapacity());
+  context->GetRawTilingData()->SetDataSize(tiling.GetDataSize());
+
+  size_t *workspace_sizes = context->GetWorkspaceSizes(1);
+  workspace_sizes[0] = 0;
+  return ge::GRAPH_SUCCESS;
+}
+}
+
+
+namespace ge {
+static ge::graphStatus InferShape(gert::InferShapeContext* context)
+{
+    return GRAPH_SUCCESS;
+}
+static ge::graphStatus InferDataType(gert::InferDataTypeContext *context)
+{
+return ge::GRAPH_SUCCESS;
+}
+}
+
+
+namespace ops {
+class CopyBlocksEx : public OpDef {
+public:
+    explicit CopyBlocksEx(const char* name) : OpDef(name)
+    {
+        this->Input("key_cache_ptrs")
+            .ParamType(REQUIRED)
+            .DataType({ge::DT_INT64})
+            .Format({ge::FORMAT_ND})
+            .UnknownShapeFormat({ge::FORMAT_ND});
+        this->Input("value_cache_ptrs")
+            .ParamType(REQUIRED)
+            .DataType({ge::DT_INT64})
+            .Format({ge::FORMAT_ND})
+            .UnknownShapeFormat({ge::FORMAT_ND});
+        this->Input("block_mapping")
+            .ParamType(REQUIRED)
+            .DataType({ge::DT_INT64})
+            .Format({ge::FORMAT_ND})
+            .UnknownShapeFormat({ge::FORMAT_ND});
+        // bytes of one page of one cache, the same for all layers
+        this->Attr("page_bytes").Int();
+
+        this->SetInferShape(ge::InferShape).SetInferDataType(ge::InferDataType);
+
+        this->AICore()
+            .SetTiling(optiling::TilingFunc);
+        this->AICore().AddConfig("ascend910");
+        this->AICore().AddConfig("ascend910b");
+
+    }
+};
+
+OP_ADD(CopyBlocksEx);
+}
@@ -0,0 +1,12 @@
+#include "register/tilingdata_base.h"
+
+namespace optiling {
+BEGIN_TILING_DATA_DEF(CopyBlocksExTilingData)
+  TILING_DATA_FIELD_DEF(uint32_t, num_layers);
+  TILING_DATA_FIELD_DEF(uint32_t, num_pairs);
+  TILING_DATA_FIELD_DEF(uint32_t, page_elems);
+  TILING_DATA_FIELD_DEF(uint32_t, core_num);
+END_TILING_DATA_DEF;
+
+REGISTER_TILING_DATA_CLASS(CopyBlocksEx, CopyBlocksExTilingData)
+}
@@ -0,0 +1,119 @@
+
+#include "fused_gate_up_ex_tiling.h"
+#include "register/op_def_registry.h"
+#include "tiling/platform/platform_ascendc.h"
+
+
+namespace optiling {
+static ge::graphStatus TilingFunc(gert::TilingContext* context)
+{
+
+  FusedGateUpExTilingData tiling;
+  const gert::StorageShape* x_shape = context->GetInputShape(0);
+  const gert::StorageShape* norm_weight_shape = context->GetInputShape(1);
+  const gert::StorageShape* w_shape = context->GetInputShape(2);
+  // x: [num_tokens, hidden_size]
+  // norm_weight: [hidden_size]
+  // w: [2 * intermediate_size, hidden_size]
+  int num_tokens = x_shape->GetStorageShape().GetDim(0);
+  int hidden_size = x_shape->GetStorageShape().GetDim(1);
+  int intermediate_size = w_shape->GetStorageShape().GetDim(0) / 2;
+  if (w_shape->GetStorageShape().GetDim(1) != hidden_size || norm_weight_shape->GetStorageShape().GetDim(0) != hidden_size) {
+    return ge::GRAPH_FAILED;
+  }
+  // MatMulNT works on 64 x 64 tiles
+  if (hidden_size % 64 != 0 || intermediate_size % 64 != 0) {
+    return ge::GRAPH_FAILED;
+  }
+  const gert::RuntimeAttrs* attrs = context->GetAttrs();
+  float epsilon = *attrs->GetAttrPointer<float>(0);
+
+  // split intermediate channels across cores in units of 64
+  auto ascendc_platform = platform_ascendc::PlatformAscendC(context->GetPlatformInfo());
+  int max_core_num = ascendc_platform.GetCoreNumAic();
+  int num_tiles = intermediate_size / 64;
+  int tiles_per_core = (num_tiles + max_core_num - 1) / max_core_num;
+  int inner_dim_per_core = tiles_per_core * 64;
+  int core_num = (intermediate_size + inner_dim_per_core - 1) / inner_dim_per_core;
+
+  context->SetBlockDim(core_num);
+  tiling.set_num_tokens(num_tokens);
+  tiling.set_hidden_size(hidden_size);
+  tiling.set_intermediate_size(intermediate_size);
+  tiling.set_core_num(core_num);
+  tiling.set_inner_dim_per_core(inner_dim_per_core);
+  tiling.set_epsilon(epsilon);
+  tiling.SaveToBuffer(context->GetRawTilingData()->GetData(), context->GetRawTilingData()->GetCapacity());
+  context->GetRawTilingData()->SetDataSize(tiling.GetDataSize());
+
+  // per core the normed x and its gate and up tiles, fp16
+  size_t *workspace_sizes = context->GetWorkspaceSizes(1);
+  workspace_sizes[0] = ascendc_platform.GetLibApiWorkSpaceSize() +
+    (size_t)core_num * num_tokens * (hidden_size + 2 * inner_dim_per_core) * sizeof(uint16_t);
+  return ge::GRAPH_SUCCESS;
+}
+}
+
+
+namespace ge {
+static ge::graphStatus InferShape(gert::InferShapeContext* context)
+{
+    const gert::Shape* x_shape = context->GetInputShape(0);
+    const gert::Shape* w_shape = context->GetInputShape(2);
+    if (w_shape->GetDim(1) != x_shape->GetDim(1)) {
+        return GRAPH_FAILED;
+    }
+    gert::Shape* y_shape = context->GetOutputShape(0);
+    y_shape->SetDimNum(2);
+    y_shape->SetDim(0, x_shape->GetDim(0));
+    y_shape->SetDim(1, w_shape->GetDim(0) / 2);
+    return GRAPH_SUCCESS;
+}
+static ge::graphStatus InferDataType(gert::InferDataTypeContext *context)
+{
+const auto inputDataType = context->GetInputDataType(0);
+context->SetOutputDataType(0, inputDataType);
+return ge::GRAPH_SUCCESS;
+}
+}
+
+
+namespace ops {
+class FusedGateUpEx : public OpDef {
+public:
+    explicit FusedGateUpEx(const char* name) : OpDef(name)
+    {
+        this->Input("x")
+            .ParamType(REQUIRED)
+            .DataType({ge::DT_FLOAT16})
+            .Format({ge::FORMAT_ND})
+            .UnknownShapeFormat({ge::FORMAT_ND});
+        this->Input("norm_weight")
+            .ParamType(REQUIRED)
+            .DataType({ge::DT_FLOAT16})
+            .Format({ge::FORMAT_ND})
+            .UnknownShapeFormat({ge::FORMAT_ND});
+        this->Input("weight")
+            .ParamType(REQUIRED)
+            .DataType({ge::DT_FLOAT16})
+            .Format({ge::FORMAT_ND})
+            .UnknownShapeFormat({ge::FORMAT_ND});
+        this->Output("y")
+            .ParamType(REQUIRED)
+            .DataType({ge::DT_FLOAT16})
+            .Format({ge::FORMAT_ND})
+            .UnknownShapeFormat({ge::FORMAT_ND});
+
+        this->Attr("epsilon").AttrType(OPTIONAL).Float(1e-6);
+
+        this->SetInferShape(ge::InferShape).SetInferDataType(ge::InferDataType);
+
+        this->AICore()
+            .SetTiling(optiling::TilingFunc);
+        this->AICore().AddConfig("ascend910");
+
+    }
+};
+
+OP_ADD(FusedGateUpEx);
+}
@@ -0,0 +1,15 @@
+
+#include "register/tilingdata_base.h"
+
+namespace optiling {
+BEGIN_TILING_DATA_DEF(FusedGateUpExTilingData)
+  TILING_DATA_FIELD_DEF(uint32_t, num_tokens);
+  TILING_DATA_FIELD_DEF(uint32_t, hidden_size);
+  TILING_DATA_FIELD_DEF(uint32_t, intermediate_size);
+  TILING_DATA_FIELD_DEF(uint32_t, core_num);
+  TILING_DATA_FIELD_DEF(uint32_t, inner_dim_per_core);
+  TILING_DATA_FIELD_DEF(float, epsilon);
+END_TILING_DATA_DEF;
+
+REGISTER_TILING_DATA_CLASS(FusedGateUpEx, FusedGateUpExTilingData)
+}
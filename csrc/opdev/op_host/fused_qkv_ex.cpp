@@ -0,0 +1,184 @@
+
+#include "fused_qkv_ex_tiling.h"
+#include "register/op_def_registry.h"
+#include "tiling/platform/platform_ascendc.h"
+
+
+namespace optiling {
+static ge::graphStatus TilingFunc(gert::TilingContext* context)
+{
+
+  FusedQkvExTilingData tiling;
+  const gert::StorageShape* x_shape = context->GetInputShape(0);
+  const gert::StorageShape* w_shape = context->GetInputShape(2);
+  const gert::StorageShape* q_norm_weight_shape = context->GetInputShape(3);
+  const gert::StorageShape* key_cache_shape = context->GetInputShape(9);
+  // x: [num_tokens, hidden_size]
+  // weight: [(num_heads + 2 * num_kv_heads) * head_dim, hidden_size]
+  // q_norm_weight, k_norm_weight: [head_dim]
+  // key_cache, value_cache: [num_pages, num_kv_heads * head_dim / 16, page_size, 16]
+  int num_tokens = x_shape->GetStorageShape().GetDim(0);
+  int hidden_size = x_shape->GetStorageShape().GetDim(1);
+  int head_dim = q_norm_weight_shape->GetStorageShape().GetDim(0);
+  int num_pages = key_cache_shape->GetStorageShape().GetDim(0);
+  int page_size = key_cache_shape->GetStorageShape().GetDim(2);
+  // MatMulNT works on 64 x 64 tiles, the cache on 16 wide chunks
+  if (hidden_size % 64 != 0 || head_dim % 64 != 0) {
+    return ge::GRAPH_FAILED;
+  }
+  int num_kv_heads = key_cache_shape->GetStorageShape().GetDim(1) * 16 / head_dim;
+  int num_heads = w_shape->GetStorageShape().GetDim(0) / head_dim - 2 * num_kv_heads;
+  if (w_shape->GetStorageShape().GetDim(1) != hidden_size || num_kv_heads <= 0 || num_heads <= 0) {
+    return ge::GRAPH_FAILED;
+  }
+  const gert::RuntimeAttrs* attrs = context->GetAttrs();
+  float epsilon = *attrs->GetAttrPointer<float>(0);
+
+  // one head of q, k or v per core at a time
+  auto ascendc_platform = platform_ascendc::PlatformAscendC(context->GetPlatformInfo());
+  int max_core_num = ascendc_platform.GetCoreNumAic();
+  int total_heads = num_heads + 2 * num_kv_heads;
+  int core_num = (total_heads < max_core_num) ? total_heads : max_core_num;
+
+  context->SetBlockDim(core_num);
+  tiling.set_num_tokens(num_tokens);
+  tiling.set_hidden_size(hidden_size);
+  tiling.set_num_heads(num_heads);
+  tiling.set_num_kv_heads(num_kv_heads);
+  tiling.set_head_dim(head_dim);
+  tiling.set_num_pages(num_pages);
+  tiling.set_page_size(page_size);
+  tiling.set_core_num(core_num);
+  tiling.set_epsilon(epsilon);
+  tiling.SaveToBuffer(context->GetRawTilingData()->GetData(), context->GetRawTilingData()->GetCapacity());
+  context->GetRawTilingData()->SetDataSize(tiling.GetDataSize());
+
+  // per core the normed x and one head tile, fp16
+  size_t *workspace_sizes = context->GetWorkspaceSizes(1);
+  workspace_sizes[0] = ascendc_platform.GetLibApiWorkSpaceSize() +
+    (size_t)core_num * num_tokens * (hidden_size + head_dim) * sizeof(uint16_t);
+  return ge::GRAPH_SUCCESS;
+}
+}
+
+
+namespace ge {
+static ge::graphStatus InferShape(gert::InferShapeContext* context)
+{
+    const gert::Shape* x_shape = context->GetInputShape(0);
+    const gert::Shape* w_shape = context->GetInputShape(2);
+    const gert::Shape* q_norm_weight_shape = context->GetInputShape(3);
+    const gert::Shape* key_cache_shape = context->GetInputShape(9);
+    int head_dim = q_norm_weight_shape->GetDim(0);
+    int num_kv_heads = key_cache_shape->GetDim(1) * 16 / head_dim;
+    int num_heads = w_shape->GetDim(0) / head_dim - 2 * num_kv_heads;
+    gert::Shape* q_shape = context->GetOutputShape(0);
+    q_shape->SetDimNum(3);
+    q_shape->SetDim(0, x_shape->GetDim(0));
+    q_shape->SetDim(1, num_heads);
+    q_shape->SetDim(2, head_dim);
+    gert::Shape* residual_output_shape = context->GetOutputShape(1);
+    *residual_output_shape = *x_shape;
+    return GRAPH_SUCCESS;
+}
+static ge::graphStatus InferDataType(gert::InferDataTypeContext *context)
+{
+const auto inputDataType = context->GetInputDataType(0);
+context->SetOutputDataType(0, inputDataType);
+context->SetOutputDataType(1, inputDataType);
+return ge::GRAPH_SUCCESS;
+}
+}
+
+
+namespace ops {
+class FusedQkvEx : public OpDef {
+public:
+    explicit FusedQkvEx(const char* name) : OpDef(name)
+    {
+        this->Input("x")
+            .ParamType(REQUIRED)
+            .DataType({ge::DT_FLOAT16})
+            .Format({ge::FORMAT_ND})
+            .UnknownShapeFormat({ge::FORMAT_ND});
+        this->Input("norm_weight")
+            .ParamType(REQUIRED)
+            .DataType({ge::DT_FLOAT16})
+            .Format({ge::FORMAT_ND})
+            .UnknownShapeFormat({ge::FORMAT_ND});
+        this->Input("weight")
+            .ParamType(REQUIRED)
+            .DataType({ge::DT_FLOAT16})
+            .Format({ge::FORMAT_ND})
+            .UnknownShapeFormat({ge::FORMAT_ND});
+        this->Input("q_norm_weight")
+            .ParamType(REQUIRED)
+            .DataType({ge::DT_FLOAT16})
+            .Format({ge::FORMAT_ND})
+            .UnknownShapeFormat({ge::FORMAT_ND});
+        this->Input("k_norm_weight")
+            .ParamType(REQUIRED)
+            .DataType({ge::DT_FLOAT16})
+            .Format({ge::FORMAT_ND})
+            .UnknownShapeFormat({ge::FORMAT_ND});
+        this->Input("position_ids")
+            .ParamType(REQUIRED)
+            .DataType({ge::DT_INT32})
+            .Format({ge::FORMAT_ND})
+            .UnknownShapeFormat({ge::FORMAT_ND});
+        this->Input("cos_cache")
+            .ParamType(REQUIRED)
+            .DataType({ge::DT_FLOAT16})
+            .Format({ge::FORMAT_ND})
+            .UnknownShapeFormat({ge::FORMAT_ND});
+        this->Input("sin_cache")
+            .ParamType(REQUIRED)
+            .DataType({ge::DT_FLOAT16})
+            .Format({ge::FORMAT_ND})
+            .UnknownShapeFormat({ge::FORMAT_ND});
+        this->Input("slot_mapping")
+            .ParamType(REQUIRED)
+            .DataType({ge::DT_INT32})
+            .Format({ge::FORMAT_ND})
+            .UnknownShapeFormat({ge::FORMAT_ND});
+        // written in place
+        this->Input("key_cache")
+            .ParamType(REQUIRED)
+            .DataType({ge::DT_FLOAT16})
+            .Format({ge::FORMAT_ND})
+            .UnknownShapeFormat({ge::FORMAT_ND});
+        this->Input("value_cache")
+            .ParamType(REQUIRED)
+            .DataType({ge::DT_FLOAT16})
+            .Format({ge::FORMAT_ND})
+            .UnknownShapeFormat({ge::FORMAT_ND});
+        // none on the first layer, residual_output is then a copy of x
+        this->Input("residual")
+            .ParamType(OPTIONAL)
+            .DataType({ge::DT_FLOAT16})
+            .Format({ge::FORMAT_ND})
+            .UnknownShapeFormat({ge::FORMAT_ND});
+        this->Output("q")
+            .ParamType(REQUIRED)
+            .DataType({ge::DT_FLOAT16})
+            .Format({ge::FORMAT_ND})
+            .UnknownShapeFormat({ge::FORMAT_ND});
+        this->Output("residual_output")
+            .ParamType(REQUIRED)
+            .DataType({ge::DT_FLOAT16})
+            .Format({ge::FORMAT_ND})
+            .UnknownShapeFormat({ge::FORMAT_ND});
+
+        this->Attr("epsilon").AttrType(OPTIONAL).Float(1e-6);
+
+        this->SetInferShape(ge::InferShape).SetInferDataType(ge::InferDataType);
+
+        this->AICore()
+            .SetTiling(optiling::TilingFunc);
+        this->AICore().AddConfig("ascend910");
+
+    }
+};
+
+OP_ADD(FusedQkvEx);
+}
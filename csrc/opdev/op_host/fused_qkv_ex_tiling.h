@@ -0,0 +1,18 @@
+
+#include "register/tilingdata_base.h"
+
+namespace optiling {
+BEGIN_TILING_DATA_DEF(FusedQkvExTilingData)
+  TILING_DATA_FIELD_DEF(uint32_t, num_tokens);
+  TILING_DATA_FIELD_DEF(uint32_t, hidden_size);
+  TILING_DATA_FIELD_DEF(uint32_t, num_heads);
+  TILING_DATA_FIELD_DEF(uint32_t, num_kv_heads);
+  TILING_DATA_FIELD_DEF(uint32_t, head_dim);
+  TILING_DATA_FIELD_DEF(uint32_t, num_pages);
+  TILING_DATA_FIELD_DEF(uint32_t, page_size);
+  TILING_DATA_FIELD_DEF(uint32_t, core_num);
+  TILING_DATA_FIELD_DEF(float, epsilon);
+END_TILING_DATA_DEF;
+
+REGISTER_TILING_DATA_CLASS(FusedQkvEx, FusedQkvExTilingData)
+}
@@ -18,7 +18,6 @@ static ge::graphStatus TilingFunc(gert::TilingContext* context)
   int num_exports = w_shape->GetStorageShape().GetDim(0);
   int inner_dim = w_shape->GetStorageShape().GetDim(1);
   int core_num = (num_exports < 65535) ? num_exports : 65535;
-  // printf("num_tokens: %d, dim: %d, num_exports: %d, inner_dim: %d, core_num: %d\n", num_tokens, dim, num_exports, inner_dim, core_num);
   context->SetBlockDim(core_num);
   tiling.set_num_tokens(num_tokens);
   tiling.set_dim(dim);
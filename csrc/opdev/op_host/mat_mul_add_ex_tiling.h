@@ -0,0 +1,14 @@
+
+#include "register/tilingdata_base.h"
+
+namespace optiling {
+BEGIN_TILING_DATA_DEF(MatMulAddExTilingData)
+  TILING_DATA_FIELD_DEF(uint32_t, num_tokens);
+  TILING_DATA_FIELD_DEF(uint32_t, dim);
+  TILING_DATA_FIELD_DEF(uint32_t, inner_dim);
+  TILING_DATA_FIELD_DEF(uint32_t, core_num);
+  TILING_DATA_FIELD_DEF(uint32_t, inner_dim_per_core);
+END_TILING_DATA_DEF;
+
+REGISTER_TILING_DATA_CLASS(MatMulAddEx, MatMulAddExTilingData)
+}
@@ -0,0 +1,100 @@
+#include "moe_gating_top_k_ex_tiling.h"
+#include "register/op_def_registry.h"
+
+
+namespace optiling {
+// one row of router logits lives in ub
+constexpr int MAX_EXPERTS = 1024;
+
+static ge::graphStatus TilingFunc(gert::TilingContext* context)
+{
+
+  MoeGatingTopKExTilingData tiling;
+  const gert::StorageShape* logits_shape = context->GetInputShape(0);
+  const gert::RuntimeAttrs* attrs = context->GetAttrs();
+  // logits: [num_tokens, num_experts]
+  // topk_weights: [num_tokens, top_k] fp32, topk_ids: [num_tokens, top_k] int32
+  int num_tokens = logits_shape->GetStorageShape().GetDim(0);
+  int num_experts = logits_shape->GetStorageShape().GetDim(1);
+  int top_k = *attrs->GetAttrPointer<int64_t>(0);
+  bool renormalize = *attrs->GetAttrPointer<bool>(1);
+  if (num_experts <= 0 || num_experts > MAX_EXPERTS || top_k <= 0 || top_k > num_experts) {
+    return ge::GRAPH_FAILED;
+  }
+  int num_experts_pad = (num_experts + 15) / 16 * 16;
+  int core_num = (num_tokens < 65535) ? num_tokens : 65535;
+
+  context->SetBlockDim(core_num);
+  tiling.set_num_tokens(num_tokens);
+  tiling.set_num_experts(num_experts);
+  tiling.set_num_experts_pad(num_experts_pad);
+  tiling.set_top_k(top_k);
+  tiling.set_renormalize(renormalize ? 1 : 0);
+  tiling.set_core_num(core_num);
+  tiling.SaveToBuffer(context->GetRawTilingData()->GetData(), context->GetRawTilingData()->GetCapacity());
+  context->GetRawTilingData()->SetDataSize(tiling.GetDataSize());
+
+  size_t *workspace_sizes = context->GetWorkspaceSizes(1);
+  workspace_sizes[0] = 0;
+  return ge::GRAPH_SUCCESS;
+}
+}
+
+
+namespace ge {
+static ge::graphStatus InferShape(gert::InferShapeContext* context)
+{
+    const gert::Shape* logits_shape = context->GetInputShape(0);
+    int64_t top_k = *context->GetAttrs()->GetAttrPointer<int64_t>(0);
+    gert::Shape* topk_weights_shape = context->GetOutputShape(0);
+    gert::Shape* topk_ids_shape = context->GetOutputShape(1);
+    *topk_weights_shape = *logits_shape;
+    topk_weights_shape->SetDim(1, top_k);
+    *topk_ids_shape = *topk_weights_shape;
+    return GRAPH_SUCCESS;
+}
+static ge::graphStatus InferDataType(gert::InferDataTypeContext *context)
+{
+context->SetOutputDataType(0, ge::DT_FLOAT);
+context->SetOutputDataType(1, ge::DT_INT32);
+return ge::GRAPH_SUCCESS;
+}
+}
+
+
+namespace ops {
+class MoeGatingTopKEx : public OpDef {
+public:
+    explicit MoeGatingTopKEx(const char* name) : OpDef(name)
+    {
+        this->Input("logits")
+            .ParamType(REQUIRED)
+            .DataType({ge::DT_FLOAT16})
+            .Format({ge::FORMAT_ND})
+            .UnknownShapeFormat({ge::FORMAT_ND});
+        this->Output("topk_weights")
+            .ParamType(REQUIRED)
+            .DataType({ge::DT_FLOAT})
+            .Format({ge::FORMAT_ND})
+            .UnknownShapeFormat({ge::FORMAT_ND});
+        this->Output("topk_ids")
+            .ParamType(REQUIRED)
+            .DataType({ge::DT_INT32})
+            .Format({ge::FORMAT_ND})
+            .UnknownShapeFormat({ge::FORMAT_ND});
+        // top_k is part of the output shape, so it is an attr rather than an input tensor
+        this->Attr("top_k").Int();
+        this->Attr("renormalize").AttrType(OPTIONAL).Bool(true);
+
+        this->SetInferShape(ge::InferShape).SetInferDataType(ge::InferDataType);
+
+        this->AICore()
+            .SetTiling(optiling::TilingFunc);
+        this->AICore().AddConfig("ascend910");
+        this->AICore().AddConfig("ascend910b");
+
+    }
+};
+
+OP_ADD(MoeGatingTopKEx);
+}
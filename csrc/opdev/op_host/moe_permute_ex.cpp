@@ -0,0 +1,129 @@
+#include "moe_permute_ex_tiling.h"
+#include "register/op_def_registry.h"
+#include "tiling/platform/platform_ascendc.h"
+
+
+namespace optiling {
+// per expert counters live in ub
+constexpr int MAX_EXPERTS = 1024;
+
+static ge::graphStatus TilingFunc(gert::TilingContext* context)
+{
+
+  MoePermuteExTilingData tiling;
+  const gert::StorageShape* x_shape = context->GetInputShape(0);
+  const gert::StorageShape* topk_ids_shape = context->GetInputShape(1);
+  const gert::RuntimeAttrs* attrs = context->GetAttrs();
+  // x: [num_tokens, hidden], topk_ids: [num_tokens, top_k]
+  // permuted_x: [num_tokens * top_k, hidden], expanded_row_idx: [num_tokens * top_k], group_list: [num_experts]
+  int num_tokens = x_shape->GetStorageShape().GetDim(0);
+  int hidden = x_shape->GetStorageShape().GetDim(1);
+  int top_k = topk_ids_shape->GetStorageShape().GetDim(1);
+  int num_experts = *attrs->GetAttrPointer<int64_t>(0);
+  if (topk_ids_shape->GetStorageShape().GetDim(0) != num_tokens) {
+    return ge::GRAPH_FAILED;
+  }
+  if (hidden % 16 != 0 || num_experts <= 0 || num_experts > MAX_EXPERTS) {
+    return ge::GRAPH_FAILED;
+  }
+
+  // every core scans all topk_ids for the expert offsets, so use at most one block per core
+  auto ascendc_platform = platform_ascendc::PlatformAscendC(context->GetPlatformInfo());
+  int max_core_num = ascendc_platform.GetCoreNumAiv();
+  int num_rows = num_tokens * top_k;
+  int rows_per_core = (num_rows + max_core_num - 1) / max_core_num;
+  rows_per_core = (rows_per_core > 0) ? rows_per_core : 1;
+  int core_num = (num_rows + rows_per_core - 1) / rows_per_core;
+  core_num = (core_num > 0) ? core_num : 1;
+
+  context->SetBlockDim(core_num);
+  tiling.set_num_tokens(num_tokens);
+  tiling.set_hidden(hidden);
+  tiling.set_top_k(top_k);
+  tiling.set_num_experts(num_experts);
+  tiling.set_core_num(core_num);
+  tiling.set_rows_per_core(rows_per_core);
+  tiling.SaveToBuffer(context->GetRawTilingData()->GetData(), context->GetRawTilingData()->GetCapacity());
+  context->GetRawTilingData()->SetDataSize(tiling.GetDataSize());
+
+  size_t *workspace_sizes = context->GetWorkspaceSizes(1);
+  workspace_sizes[0] = 0;
+  return ge::GRAPH_SUCCESS;
+}
+}
+
+
+namespace ge {
+static ge::graphStatus InferShape(gert::InferShapeContext* context)
+{
+    const gert::Shape* x_shape = context->GetInputShape(0);
+    const gert::Shape* topk_ids_shape = context->GetInputShape(1);
+    int64_t num_experts = *context->GetAttrs()->GetAttrPointer<int64_t>(0);
+    int64_t num_rows = x_shape->GetDim(0) * topk_ids_shape->GetDim(1);
+    gert::Shape* permuted_x_shape = context->GetOutputShape(0);
+    gert::Shape* expanded_row_idx_shape = context->GetOutputShape(1);
+    gert::Shape* group_list_shape = context->GetOutputShape(2);
+    *permuted_x_shape = *x_shape;
+    permuted_x_shape->SetDim(0, num_rows);
+    expanded_row_idx_shape->SetDimNum(1);
+    expanded_row_idx_shape->SetDim(0, num_rows);
+    group_list_shape->SetDimNum(1);
+    group_list_shape->SetDim(0, num_experts);
+    return GRAPH_SUCCESS;
+}
+static ge::graphStatus InferDataType(gert::InferDataTypeContext *context)
+{
+const auto inputDataType = context->GetInputDataType(0);
+context->SetOutputDataType(0, inputDataType);
+context->SetOutputDataType(1, ge::DT_INT32);
+context->SetOutputDataType(2, ge::DT_INT64);
+return ge::GRAPH_SUCCESS;
+}
+}
+
+
+namespace ops {
+class MoePermuteEx : public OpDef {
+public:
+    explicit MoePermuteEx(const char* name) : OpDef(name)
+    {
+        this->Input("x")
+            .ParamType(REQUIRED)
+            .DataType({ge::DT_FLOAT16})
+            .Format({ge::FORMAT_ND})
+            .UnknownShapeFormat({ge::FORMAT_ND});
+        this->Input("topk_ids")
+            .ParamType(REQUIRED)
+            .DataType({ge::DT_INT32})
+            .Format({ge::FORMAT_ND})
+            .UnknownShapeFormat({ge::FORMAT_ND});
+        this->Output("permuted_x")
+            .ParamType(REQUIRED)
+            .DataType({ge::DT_FLOAT16})
+            .Format({ge::FORMAT_ND})
+            .UnknownShapeFormat({ge::FORMAT_ND});
+        this->Output("expanded_row_idx")
+            .ParamType(REQUIRED)
+            .DataType({ge::DT_INT32})
+            .Format({ge::FORMAT_ND})
+            .UnknownShapeFormat({ge::FORMAT_ND});
+        this->Output("group_list")
+            .ParamType(REQUIRED)
+            .DataType({ge::DT_INT64})
+            .Format({ge::FORMAT_ND})
+            .UnknownShapeFormat({ge::FORMAT_ND});
+        // num_experts is part of the output shape
+        this->Attr("num_experts").Int();
+
+        this->SetInferShape(ge::InferShape).SetInferDataType(ge::InferDataType);
+
+        this->AICore()
+            .SetTiling(optiling::TilingFunc);
+        this->AICore().AddConfig("ascend910");
+        this->AICore().AddConfig("ascend910b");
+
+    }
+};
+
+OP_ADD(MoePermuteEx);
+}
@@ -0,0 +1,15 @@
+
+#include "register/tilingdata_base.h"
+
+namespace optiling {
+BEGIN_TILING_DATA_DEF(MoePermuteExTilingData)
+  TILING_DATA_FIELD_DEF(uint32_t, num_tokens);
+  TILING_DATA_FIELD_DEF(uint32_t, hidden);
+  TILING_DATA_FIELD_DEF(uint32_t, top_k);
+  TILING_DATA_FIELD_DEF(uint32_t, num_experts);
+  TILING_DATA_FIELD_DEF(uint32_t, core_num);
+  TILING_DATA_FIELD_DEF(uint32_t, rows_per_core);
+END_TILING_DATA_DEF;
+
+REGISTER_TILING_DATA_CLASS(MoePermuteEx, MoePermuteExTilingData)
+}
@@ -0,0 +1,98 @@
+#include "moe_unpermute_ex_tiling.h"
+#include "register/op_def_registry.h"
+
+
+namespace optiling {
+static ge::graphStatus TilingFunc(gert::TilingContext* context)
+{
+
+  MoeUnpermuteExTilingData tiling;
+  const gert::StorageShape* y_shape = context->GetInputShape(0);
+  const gert::StorageShape* expanded_row_idx_shape = context->GetInputShape(1);
+  const gert::StorageShape* topk_weights_shape = context->GetInputShape(2);
+  // y: [num_tokens * top_k, hidden], expanded_row_idx: [num_tokens * top_k]
+  // topk_weights: [num_tokens, top_k] fp32, out: [num_tokens, hidden]
+  int num_rows = y_shape->GetStorageShape().GetDim(0);
+  int hidden = y_shape->GetStorageShape().GetDim(1);
+  int num_tokens = topk_weights_shape->GetStorageShape().GetDim(0);
+  int top_k = topk_weights_shape->GetStorageShape().GetDim(1);
+  if (num_rows != num_tokens * top_k || expanded_row_idx_shape->GetStorageShape().GetDim(0) != num_rows) {
+    return ge::GRAPH_FAILED;
+  }
+  if (hidden % 16 != 0) {
+    return ge::GRAPH_FAILED;
+  }
+  int core_num = (num_tokens < 65535) ? num_tokens : 65535;
+
+  context->SetBlockDim(core_num);
+  tiling.set_num_tokens(num_tokens);
+  tiling.set_hidden(hidden);
+  tiling.set_top_k(top_k);
+  tiling.set_core_num(core_num);
+  tiling.SaveToBuffer(context->GetRawTilingData()->GetData(), context->GetRawTilingData()->GetCapacity());
+  context->GetRawTilingData()->SetDataSize(tiling.GetDataSize());
+
+  size_t *workspace_sizes = context->GetWorkspaceSizes(1);
+  workspace_sizes[0] = 0;
+  return ge::GRAPH_SUCCESS;
+}
+}
+
+
+namespace ge {
+static ge::graphStatus InferShape(gert::InferShapeContext* context)
+{
+    const gert::Shape* y_shape = context->GetInputShape(0);
+    const gert::Shape* topk_weights_shape = context->GetInputShape(2);
+    gert::Shape* out_shape = context->GetOutputShape(0);
+    *out_shape = *y_shape;
+    out_shape->SetDim(0, topk_weights_shape->GetDim(0));
+    return GRAPH_SUCCESS;
+}
+static ge::graphStatus InferDataType(gert::InferDataTypeContext *context)
+{
+const auto inputDataType = context->GetInputDataType(0);
+context->SetOutputDataType(0, inputDataType);
+return ge::GRAPH_SUCCESS;
+}
+}
+
+
+namespace ops {
+class MoeUnpermuteEx : public OpDef {
+public:
+    explicit MoeUnpermuteEx(const char* name) : OpDef(name)
+    {
+        this->Input("y")
+            .ParamType(REQUIRED)
+            .DataType({ge::DT_FLOAT16})
+            .Format({ge::FORMAT_ND})
+            .UnknownShapeFormat({ge::FORMAT_ND});
+        this->Input("expanded_row_idx")
+            .ParamType(REQUIRED)
+            .DataType({ge::DT_INT32})
+            .Format({ge::FORMAT_ND})
+            .UnknownShapeFormat({ge::FORMAT_ND});
+        this->Input("topk_weights")
+            .ParamType(REQUIRED)
+            .DataType({ge::DT_FLOAT})
+            .Format({ge::FORMAT_ND})
+            .UnknownShapeFormat({ge::FORMAT_ND});
+        this->Output("out")
+            .ParamType(REQUIRED)
+            .DataType({ge::DT_FLOAT16})
+            .Format({ge::FORMAT_ND})
+            .UnknownShapeFormat({ge::FORMAT_ND});
+
+        this->SetInferShape(ge::InferShape).SetInferDataType(ge::InferDataType);
+
+        this->AICore()
+            .SetTiling(optiling::TilingFunc);
+        this->AICore().AddConfig("ascend910");
+        this->AICore().AddConfig("ascend910b");
+
+    }
+};
+
+OP_ADD(MoeUnpermuteEx);
+}
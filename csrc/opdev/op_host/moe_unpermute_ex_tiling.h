@@ -0,0 +1,13 @@
+
+#include "register/tilingdata_base.h"
+
+namespace optiling {
+BEGIN_TILING_DATA_DEF(MoeUnpermuteExTilingData)
+  TILING_DATA_FIELD_DEF(uint32_t, num_tokens);
+  TILING_DATA_FIELD_DEF(uint32_t, hidden);
+  TILING_DATA_FIELD_DEF(uint32_t, top_k);
+  TILING_DATA_FIELD_DEF(uint32_t, core_num);
+END_TILING_DATA_DEF;
+
+REGISTER_TILING_DATA_CLASS(MoeUnpermuteEx, MoeUnpermuteExTilingData)
+}
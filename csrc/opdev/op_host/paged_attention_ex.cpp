@@ -5,6 +5,10 @@
 
 
 namespace optiling {
+// k_b2 + v_b2 must fit in l0b
+constexpr int MAX_PAGE_ELEMS = 128 * 128;
+constexpr int MAX_GROUP_SIZE = 64;
+
 static ge::graphStatus TilingFunc(gert::TilingContext* context)
 {
 
@@ -14,8 +18,15 @@ static ge::graphStatus TilingFunc(gert::TilingContext* context)
   const gert::StorageShape* value_cache_shape = context->GetInputShape(2);
   const gert::StorageShape* block_tables_shape = context->GetInputShape(3);
   const gert::StorageShape* context_lens_shape = context->GetInputShape(4);
-
-  // q: [bs, num_heads, head_dim]
+  // int8 kv cache: key_scale/value_scale: [num_pages, num_kv_heads, page_size]
+  const gert::StorageShape* key_scale_shape = context->GetOptionalInputShape(5);
+  const gert::StorageShape* value_scale_shape = context->GetOptionalInputShape(6);
+  bool kv_quant = context->GetInputDesc(1)->GetDataType() == ge::DT_INT8;
+  // alibi_slopes: [num_heads] fp32, window_size: [1] int32, 0 means no window
+  const gert::StorageShape* alibi_slopes_shape = context->GetOptionalInputShape(7);
+  const gert::StorageShape* window_size_shape = context->GetOptionalInputShape(8);
+
+  // q: [bs * num_query_tokens, num_heads, head_dim], the last num_query_tokens positions of each sequence
   // kvcache: [num_pages, num_kv_heads * head_dim // 16, page_size, 16]
   int num_heads = q_shape->GetStorageShape().GetDim(1);
   int head_dim = q_shape->GetStorageShape().GetDim(2);
@@ -32,9 +43,35 @@ static ge::graphStatus TilingFunc(gert::TilingContext* context)
   int64_t stride_kv_p = num_kv_heads * head_dim * page_size;
   int64_t stride_kv_h = head_dim * page_size;
   int64_t stride_tables_bs = max_page_num_per_seq;
+  int64_t stride_scale_p = num_kv_heads * page_size;
+
+  if (kv_quant) {
+    if (key_scale_shape == nullptr || value_scale_shape == nullptr) {
+      return ge::GRAPH_FAILED;
+    }
+    if (key_scale_shape->GetStorageShape().GetDim(1) != num_kv_heads ||
+        key_scale_shape->GetStorageShape().GetDim(2) != page_size ||
+        value_scale_shape->GetStorageShape().GetDim(1) != num_kv_heads ||
+        value_scale_shape->GetStorageShape().GetDim(2) != page_size) {
+      return ge::GRAPH_FAILED;
+    }
+  }
 
   int group_size = num_heads / num_kv_heads;
-  int bs = q_shape->GetStorageShape().GetDim(0);
+  int bs = block_tables_shape->GetStorageShape().GetDim(0);
+  int num_q_rows = q_shape->GetStorageShape().GetDim(0);
+  if (bs == 0 || num_q_rows % bs != 0 || context_lens_shape->GetStorageShape().GetDim(0) != bs) {
+    return ge::GRAPH_FAILED;
+  }
+  int num_query_tokens = num_q_rows / bs;
+
+  // q rows of one kv head are padded to 16 for the cube, l0/ub buffers scale with the padded group
+  if (head_dim % 16 != 0 || page_size % 16 != 0 || num_kv_heads == 0 || num_heads % num_kv_heads != 0) {
+    return ge::GRAPH_FAILED;
+  }
+  if (group_size < 1 || group_size > MAX_GROUP_SIZE || page_size * head_dim > MAX_PAGE_ELEMS) {
+    return ge::GRAPH_FAILED;
+  }
 
   tiling.set_num_heads(num_heads);
   tiling.set_num_kv_heads(num_kv_heads);
@@ -50,8 +87,19 @@ static ge::graphStatus TilingFunc(gert::TilingContext* context)
   tiling.set_stride_kv_p(stride_kv_p);
   tiling.set_stride_kv_h(stride_kv_h);
   tiling.set_stride_tables_bs(stride_tables_bs);
-  printf("attn: bs=%d, num_heads=%d, num_kv_heads=%d, group_size=%d, head_dim=%d, num_pages=%d, page_size=%d, max_page_num_per_seq=%d, scale=%f\n", bs, num_heads, num_kv_heads, group_size, head_dim, num_pages, page_size, max_page_num_per_seq, scale);
-  context->SetBlockDim(bs * num_kv_heads);
+  if (alibi_slopes_shape != nullptr && alibi_slopes_shape->GetStorageShape().GetDim(0) != num_heads) {
+    return ge::GRAPH_FAILED;
+  }
+  if (window_size_shape != nullptr && window_size_shape->GetStorageShape().GetShapeSize() != 1) {
+    return ge::GRAPH_FAILED;
+  }
+
+  tiling.set_stride_scale_p(stride_scale_p);
+  tiling.set_kv_quant(kv_quant ? 1 : 0);
+  tiling.set_has_alibi(alibi_slopes_shape != nullptr ? 1 : 0);
+  tiling.set_has_window(window_size_shape != nullptr ? 1 : 0);
+  tiling.set_num_query_tokens(num_query_tokens);
+  context->SetBlockDim(num_q_rows * num_kv_heads);
   tiling.SaveToBuffer(context->GetRawTilingData()->GetData(), context->GetRawTilingData()->GetCapacity());
   context->GetRawTilingData()->SetDataSize(tiling.GetDataSize());
 
@@ -84,34 +132,54 @@ public:
     {
         this->Input("q")
             .ParamType(REQUIRED)
-            .DataType({ge::DT_FLOAT16})
-            .Format({ge::FORMAT_ND})
-            .UnknownShapeFormat({ge::FORMAT_ND});
+            .DataType({ge::DT_FLOAT16, ge::DT_FLOAT16})
+            .Format({ge::FORMAT_ND, ge::FORMAT_ND})
+            .UnknownShapeFormat({ge::FORMAT_ND, ge::FORMAT_ND});
         this->Input("key_cache")
             .ParamType(REQUIRED)
-            .DataType({ge::DT_FLOAT16})
-            .Format({ge::FORMAT_ND})
-            .UnknownShapeFormat({ge::FORMAT_ND});
+            .DataType({ge::DT_FLOAT16, ge::DT_INT8})
+            .Format({ge::FORMAT_ND, ge::FORMAT_ND})
+            .UnknownShapeFormat({ge::FORMAT_ND, ge::FORMAT_ND});
         this->Input("value_cache")
             .ParamType(REQUIRED)
-            .DataType({ge::DT_FLOAT16})
-            .Format({ge::FORMAT_ND})
-            .UnknownShapeFormat({ge::FORMAT_ND});
+            .DataType({ge::DT_FLOAT16, ge::DT_INT8})
+            .Format({ge::FORMAT_ND, ge::FORMAT_ND})
+            .UnknownShapeFormat({ge::FORMAT_ND, ge::FORMAT_ND});
         this->Input("block_tables")
             .ParamType(REQUIRED)
-            .DataType({ge::DT_INT32})
-            .Format({ge::FORMAT_ND})
-            .UnknownShapeFormat({ge::FORMAT_ND});
+            .DataType({ge::DT_INT32, ge::DT_INT32})
+            .Format({ge::FORMAT_ND, ge::FORMAT_ND})
+            .UnknownShapeFormat({ge::FORMAT_ND, ge::FORMAT_ND});
         this->Input("context_lens")
             .ParamType(REQUIRED)
-            .DataType({ge::DT_INT32})
-            .Format({ge::FORMAT_ND})
-            .UnknownShapeFormat({ge::FORMAT_ND});
+            .DataType({ge::DT_INT32, ge::DT_INT32})
+            .Format({ge::FORMAT_ND, ge::FORMAT_ND})
+            .UnknownShapeFormat({ge::FORMAT_ND, ge::FORMAT_ND});
+        this->Input("key_scale")
+            .ParamType(OPTIONAL)
+            .DataType({ge::DT_FLOAT16, ge::DT_FLOAT16})
+            .Format({ge::FORMAT_ND, ge::FORMAT_ND})
+            .UnknownShapeFormat({ge::FORMAT_ND, ge::FORMAT_ND});
+        this->Input("value_scale")
+            .ParamType(OPTIONAL)
+            .DataType({ge::DT_FLOAT16, ge::DT_FLOAT16})
+            .Format({ge::FORMAT_ND, ge::FORMAT_ND})
+            .UnknownShapeFormat({ge::FORMAT_ND, ge::FORMAT_ND});
+        this->Input("alibi_slopes")
+            .ParamType(OPTIONAL)
+            .DataType({ge::DT_FLOAT, ge::DT_FLOAT})
+            .Format({ge::FORMAT_ND, ge::FORMAT_ND})
+            .UnknownShapeFormat({ge::FORMAT_ND, ge::FORMAT_ND});
+        this->Input("window_size")
+            .ParamType(OPTIONAL)
+            .DataType({ge::DT_INT32, ge::DT_INT32})
+            .Format({ge::FORMAT_ND, ge::FORMAT_ND})
+            .UnknownShapeFormat({ge::FORMAT_ND, ge::FORMAT_ND});
         this->Output("o")
             .ParamType(REQUIRED)
-            .DataType({ge::DT_FLOAT16})
-            .Format({ge::FORMAT_ND})
-            .UnknownShapeFormat({ge::FORMAT_ND});
+            .DataType({ge::DT_FLOAT16, ge::DT_FLOAT16})
+            .Format({ge::FORMAT_ND, ge::FORMAT_ND})
+            .UnknownShapeFormat({ge::FORMAT_ND, ge::FORMAT_ND});
 
         this->SetInferShape(ge::InferShape).SetInferDataType(ge::InferDataType);
 
@@ -17,6 +17,11 @@ BEGIN_TILING_DATA_DEF(PagedAttentionExTilingData)
   TILING_DATA_FIELD_DEF(int64_t, stride_kv_p);
   TILING_DATA_FIELD_DEF(int64_t, stride_kv_h);
   TILING_DATA_FIELD_DEF(int64_t, stride_tables_bs);
+  TILING_DATA_FIELD_DEF(int64_t, stride_scale_p);
+  TILING_DATA_FIELD_DEF(uint32_t, kv_quant);
+  TILING_DATA_FIELD_DEF(uint32_t, has_alibi);
+  TILING_DATA_FIELD_DEF(uint32_t, has_window);
+  TILING_DATA_FIELD_DEF(uint32_t, num_query_tokens);
 END_TILING_DATA_DEF;
 
 REGISTER_TILING_DATA_CLASS(PagedAttentionEx, PagedAttentionExTilingData)
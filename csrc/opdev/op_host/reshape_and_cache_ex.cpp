@@ -13,6 +13,10 @@ static ge::graphStatus TilingFunc(gert::TilingContext* context)
   const gert::StorageShape* key_cache_shape = context->GetInputShape(2);
   const gert::StorageShape* value_cache_shape = context->GetInputShape(3);
   const gert::StorageShape* slot_indices_shape = context->GetInputShape(4);
+  // int8 kv cache: key_scale/value_scale: [num_blocks, num_kv_heads, nh16], one fp16 scale per token per head
+  const gert::StorageShape* key_scale_shape = context->GetOptionalInputShape(5);
+  const gert::StorageShape* value_scale_shape = context->GetOptionalInputShape(6);
+  bool kv_quant = context->GetInputDesc(2)->GetDataType() == ge::DT_INT8;
 
   int32_t num_tokens = key_shape->GetStorageShape().GetDim(0);
   int32_t num_kv_heads = key_shape->GetStorageShape().GetDim(1);
@@ -34,6 +38,19 @@ static ge::graphStatus TilingFunc(gert::TilingContext* context)
     // slot_indices length is invalid, prevent kernel overflow
     return ge::GRAPH_FAILED;
   }
+  if (kv_quant) {
+    if (key_scale_shape == nullptr) {
+      return ge::GRAPH_FAILED;
+    }
+    if (key_scale_shape->GetStorageShape().GetDim(0) != num_blocks ||
+        key_scale_shape->GetStorageShape().GetDim(1) != num_kv_heads ||
+        key_scale_shape->GetStorageShape().GetDim(2) != nh16) {
+      return ge::GRAPH_FAILED;
+    }
+    if (value_shape != nullptr && value_cache_shape != nullptr && value_scale_shape == nullptr) {
+      return ge::GRAPH_FAILED;
+    }
+  }
 
   tiling.set_num_tokens(num_tokens);
   tiling.set_num_kv_heads(num_kv_heads);
@@ -43,6 +60,7 @@ static ge::graphStatus TilingFunc(gert::TilingContext* context)
   tiling.set_block_size(block_size);
   tiling.set_nh16(nh16);
   tiling.set_h16(h16);
+  tiling.set_kv_quant(kv_quant ? 1 : 0);
   context->SetBlockDim(core_num);
   tiling.SaveToBuffer(context->GetRawTilingData()->GetData(), context->GetRawTilingData()->GetCapacity());
   context->GetRawTilingData()->SetDataSize(tiling.GetDataSize());
@@ -77,29 +95,39 @@ public:
     {
         this->Input("key")
             .ParamType(REQUIRED)
-            .DataType({ge::DT_FLOAT16})
-            .Format({ge::FORMAT_ND})
-            .UnknownShapeFormat({ge::FORMAT_ND});
+            .DataType({ge::DT_FLOAT16, ge::DT_FLOAT16})
+            .Format({ge::FORMAT_ND, ge::FORMAT_ND})
+            .UnknownShapeFormat({ge::FORMAT_ND, ge::FORMAT_ND});
         this->Input("value")
             .ParamType(OPTIONAL)
-            .DataType({ge::DT_FLOAT16})
-            .Format({ge::FORMAT_ND})
-            .UnknownShapeFormat({ge::FORMAT_ND});
+            .DataType({ge::DT_FLOAT16, ge::DT_FLOAT16})
+            .Format({ge::FORMAT_ND, ge::FORMAT_ND})
+            .UnknownShapeFormat({ge::FORMAT_ND, ge::FORMAT_ND});
         this->Input("key_cache")
             .ParamType(REQUIRED)
-            .DataType({ge::DT_FLOAT16})
-            .Format({ge::FORMAT_ND})
-            .UnknownShapeFormat({ge::FORMAT_ND});
+            .DataType({ge::DT_FLOAT16, ge::DT_INT8})
+            .Format({ge::FORMAT_ND, ge::FORMAT_ND})
+            .UnknownShapeFormat({ge::FORMAT_ND, ge::FORMAT_ND});
         this->Input("value_cache")
             .ParamType(OPTIONAL)
-            .DataType({ge::DT_FLOAT16})
-            .Format({ge::FORMAT_ND})
-            .UnknownShapeFormat({ge::FORMAT_ND});
+            .DataType({ge::DT_FLOAT16, ge::DT_INT8})
+            .Format({ge::FORMAT_ND, ge::FORMAT_ND})
+            .UnknownShapeFormat({ge::FORMAT_ND, ge::FORMAT_ND});
         this->Input("slot_indices")
             .ParamType(REQUIRED)
-            .DataType({ge::DT_INT32})
-            .Format({ge::FORMAT_ND})
-            .UnknownShapeFormat({ge::FORMAT_ND});
+            .DataType({ge::DT_INT32, ge::DT_INT32})
+            .Format({ge::FORMAT_ND, ge::FORMAT_ND})
+            .UnknownShapeFormat({ge::FORMAT_ND, ge::FORMAT_ND});
+        this->Input("key_scale")
+            .ParamType(OPTIONAL)
+            .DataType({ge::DT_FLOAT16, ge::DT_FLOAT16})
+            .Format({ge::FORMAT_ND, ge::FORMAT_ND})
+            .UnknownShapeFormat({ge::FORMAT_ND, ge::FORMAT_ND});
+        this->Input("value_scale")
+            .ParamType(OPTIONAL)
+            .DataType({ge::DT_FLOAT16, ge::DT_FLOAT16})
+            .Format({ge::FORMAT_ND, ge::FORMAT_ND})
+            .UnknownShapeFormat({ge::FORMAT_ND, ge::FORMAT_ND});
 
         this->SetInferShape(ge::InferShape).SetInferDataType(ge::InferDataType);
 
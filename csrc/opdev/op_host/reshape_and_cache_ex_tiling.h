@@ -11,6 +11,7 @@ BEGIN_TILING_DATA_DEF(ReshapeAndCacheExTilingData)
   TILING_DATA_FIELD_DEF(uint32_t, block_size);
   TILING_DATA_FIELD_DEF(uint32_t, nh16);
   TILING_DATA_FIELD_DEF(uint32_t, h16);
+  TILING_DATA_FIELD_DEF(uint32_t, kv_quant);
 END_TILING_DATA_DEF;
 
 REGISTER_TILING_DATA_CLASS(ReshapeAndCacheEx, ReshapeAndCacheExTilingData)
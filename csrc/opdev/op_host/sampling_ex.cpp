@@ -0,0 +1,126 @@
+#include "sampling_ex_tiling.h"
+#include "register/op_def_registry.h"
+#include "tiling/platform/platform_ascendc.h"
+
+
+namespace optiling {
+static ge::graphStatus TilingFunc(gert::TilingContext* context)
+{
+
+  SamplingExTilingData tiling;
+  const gert::StorageShape* logits_shape = context->GetInputShape(0);
+  const gert::StorageShape* penalty_token_ids_shape = context->GetOptionalInputShape(6);
+  // logits: [batch_size, vocab_size] fp16
+  // temperature, top_p, repetition_penalty, uniform: [batch_size] fp32, top_k: [batch_size] int32
+  // penalty_token_ids: [batch_size, num_penalty_tokens] int32, padded with -1, optional
+  // token_ids: [batch_size] int32
+  int batch_size = logits_shape->GetStorageShape().GetDim(0);
+  int vocab_size = logits_shape->GetStorageShape().GetDim(1);
+  int num_penalty_tokens = 0;
+  if (penalty_token_ids_shape != nullptr && penalty_token_ids_shape->GetStorageShape().GetShapeSize() > 0) {
+    if (penalty_token_ids_shape->GetStorageShape().GetDim(0) != batch_size) {
+      return ge::GRAPH_FAILED;
+    }
+    num_penalty_tokens = penalty_token_ids_shape->GetStorageShape().GetDim(1);
+  }
+  // CompareScalar works on 256B
+  if (vocab_size <= 0 || vocab_size % 64 != 0) {
+    return ge::GRAPH_FAILED;
+  }
+
+  auto ascendc_platform = platform_ascendc::PlatformAscendC(context->GetPlatformInfo());
+  int max_core_num = ascendc_platform.GetCoreNumAiv();
+  int core_num = (batch_size < max_core_num) ? batch_size : max_core_num;
+  core_num = (core_num > 0) ? core_num : 1;
+
+  context->SetBlockDim(core_num);
+  tiling.set_batch_size(batch_size);
+  tiling.set_vocab_size(vocab_size);
+  tiling.set_num_penalty_tokens(num_penalty_tokens);
+  tiling.set_core_num(core_num);
+  tiling.SaveToBuffer(context->GetRawTilingData()->GetData(), context->GetRawTilingData()->GetCapacity());
+  context->GetRawTilingData()->SetDataSize(tiling.GetDataSize());
+
+  // scaled and penalized fp32 logits, re-read by every threshold search pass
+  size_t *workspace_sizes = context->GetWorkspaceSizes(1);
+  workspace_sizes[0] = ascendc_platform.GetLibApiWorkSpaceSize() + (size_t)batch_size * vocab_size * sizeof(float);
+  return ge::GRAPH_SUCCESS;
+}
+}
+
+
+namespace ge {
+static ge::graphStatus InferShape(gert::InferShapeContext* context)
+{
+    const gert::Shape* logits_shape = context->GetInputShape(0);
+    gert::Shape* token_ids_shape = context->GetOutputShape(0);
+    token_ids_shape->SetDimNum(1);
+    token_ids_shape->SetDim(0, logits_shape->GetDim(0));
+    return GRAPH_SUCCESS;
+}
+static ge::graphStatus InferDataType(gert::InferDataTypeContext *context)
+{
+context->SetOutputDataType(0, ge::DT_INT32);
+return ge::GRAPH_SUCCESS;
+}
+}
+
+
+namespace ops {
+class SamplingEx : public OpDef {
+public:
+    explicit SamplingEx(const char* name) : OpDef(name)
+    {
+        this->Input("logits")
+            .ParamType(REQUIRED)
+            .DataType({ge::DT_FLOAT16})
+            .Format({ge::FORMAT_ND})
+            .UnknownShapeFormat({ge::FORMAT_ND});
+        this->Input("temperature")
+            .ParamType(REQUIRED)
+            .DataType({ge::DT_FLOAT})
+            .Format({ge::FORMAT_ND})
+            .UnknownShapeFormat({ge::FORMAT_ND});
+        this->Input("top_k")
+            .ParamType(REQUIRED)
+            .DataType({ge::DT_INT32})
+            .Format({ge::FORMAT_ND})
+            .UnknownShapeFormat({ge::FORMAT_ND});
+        this->Input("top_p")
+            .ParamType(REQUIRED)
+            .DataType({ge::DT_FLOAT})
+            .Format({ge::FORMAT_ND})
+            .UnknownShapeFormat({ge::FORMAT_ND});
+        this->Input("repetition_penalty")
+            .ParamType(REQUIRED)
+            .DataType({ge::DT_FLOAT})
+            .Format({ge::FORMAT_ND})
+            .UnknownShapeFormat({ge::FORMAT_ND});
+        this->Input("uniform")
+            .ParamType(REQUIRED)
+            .DataType({ge::DT_FLOAT})
+            .Format({ge::FORMAT_ND})
+            .UnknownShapeFormat({ge::FORMAT_ND});
+        this->Input("penalty_token_ids")
+            .ParamType(OPTIONAL)
+            .DataType({ge::DT_INT32})
+            .Format({ge::FORMAT_ND})
+            .UnknownShapeFormat({ge::FORMAT_ND});
+        this->Output("token_ids")
+            .ParamType(REQUIRED)
+            .DataType({ge::DT_INT32})
+            .Format({ge::FORMAT_ND})
+            .UnknownShapeFormat({ge::FORMAT_ND});
+
+        this->SetInferShape(ge::InferShape).SetInferDataType(ge::InferDataType);
+
+        this->AICore()
+            .SetTiling(optiling::TilingFunc);
+        this->AICore().AddConfig("ascend910");
+        this->AICore().AddConfig("ascend910b");
+
+    }
+};
+
+OP_ADD(SamplingEx);
+}
@@ -0,0 +1,13 @@
+
+#include "register/tilingdata_base.h"
+
+namespace optiling {
+BEGIN_TILING_DATA_DEF(SamplingExTilingData)
+  TILING_DATA_FIELD_DEF(uint32_t, batch_size);
+  TILING_DATA_FIELD_DEF(uint32_t, vocab_size);
+  TILING_DATA_FIELD_DEF(uint32_t, num_penalty_tokens);
+  TILING_DATA_FIELD_DEF(uint32_t, core_num);
+END_TILING_DATA_DEF;
+
+REGISTER_TILING_DATA_CLASS(SamplingEx, SamplingExTilingData)
+}
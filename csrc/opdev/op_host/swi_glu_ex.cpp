@@ -4,19 +4,35 @@
 
 
 namespace optiling {
+// ub holds 3 fp16 and 5 fp32 buffers of block_size
+constexpr int DEFAULT_BLOCK_SIZE = 64;
+constexpr int MAX_BLOCK_SIZE = 4096;
+
 static ge::graphStatus TilingFunc(gert::TilingContext* context)
 {
 
   SwiGluExTilingData tiling;
   const gert::StorageShape* x_shape = context->GetInputShape(0);
+  const gert::RuntimeAttrs* attrs = context->GetAttrs();
   int num_tokens = x_shape->GetStorageShape().GetDim(0);
   int dim = x_shape->GetStorageShape().GetDim(1) / 2;
-  int core_num = (num_tokens < 65535) ? num_tokens : 65535;
+  // block_size/core_num: tuned by ascend910a_extras.autotune, 0 = default
+  int block_size = *attrs->GetAttrPointer<int64_t>(0);
+  int core_num = *attrs->GetAttrPointer<int64_t>(1);
+  block_size = (block_size > 0) ? block_size : DEFAULT_BLOCK_SIZE;
+  if (block_size % 16 != 0 || block_size > MAX_BLOCK_SIZE || dim % block_size != 0) {
+    return ge::GRAPH_FAILED;
+  }
+  if (core_num <= 0 || core_num > num_tokens) {
+    core_num = num_tokens;
+  }
+  core_num = (core_num < 65535) ? core_num : 65535;
 
   context->SetBlockDim(core_num);
   tiling.set_num_tokens(num_tokens);
   tiling.set_dim(dim);
   tiling.set_core_num(core_num);
+  tiling.set_block_size(block_size);
   tiling.SaveToBuffer(context->GetRawTilingData()->GetData(), context->GetRawTilingData()->GetCapacity());
   context->GetRawTilingData()->SetDataSize(tiling.GetDataSize());
 
@@ -61,6 +77,10 @@ public:
             .Format({ge::FORMAT_ND})
             .UnknownShapeFormat({ge::FORMAT_ND});
 
+        // tiling choices, 0 = default
+        this->Attr("block_size").AttrType(OPTIONAL).Int(0);
+        this->Attr("core_num").AttrType(OPTIONAL).Int(0);
+
         this->SetInferShape(ge::InferShape).SetInferDataType(ge::InferDataType);
 
         this->AICore()
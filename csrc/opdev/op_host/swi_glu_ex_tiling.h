@@ -6,6 +6,7 @@ BEGIN_TILING_DATA_DEF(SwiGluExTilingData)
   TILING_DATA_FIELD_DEF(uint32_t, num_tokens);
   TILING_DATA_FIELD_DEF(uint32_t, dim);
   TILING_DATA_FIELD_DEF(uint32_t, core_num);
+  TILING_DATA_FIELD_DEF(uint32_t, block_size);
 END_TILING_DATA_DEF;
 
 REGISTER_TILING_DATA_CLASS(SwiGluEx, SwiGluExTilingData)
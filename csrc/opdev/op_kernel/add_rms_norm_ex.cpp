@@ -7,10 +7,10 @@ extern "C" __global__ __aicore__ void add_rms_norm_ex(
     int num_tokens = tiling_data.num_tokens;
     int dim = tiling_data.dim;
     int core_num = tiling_data.core_num;
+    int BLOCK_SIZE_DIM = tiling_data.block_size;
 
     using scalar_t = half;
     using acc_t = float;
-    constexpr int BLOCK_SIZE_DIM = 64;
 
     __gm__ scalar_t *x_ptr = reinterpret_cast<__gm__ scalar_t *>(x);
     __gm__ scalar_t *r_ptr = reinterpret_cast<__gm__ scalar_t *>(residual);
@@ -0,0 +1,53 @@
+#include "kernel_operator.h"
+
+// cache[dst] = cache[src] for every (src, dst) in block_mapping, for the k and v caches of all layers
+// the caches are passed by address, a page is page_elems int16 whatever the cache dtype
+// a dst page must not be the src of another pair, the order of the copies is not defined
+extern "C" __global__ __aicore__ void copy_blocks_ex(
+    GM_ADDR key_cache_ptrs, GM_ADDR value_cache_ptrs, GM_ADDR block_mapping, GM_ADDR workspace, GM_ADDR tiling) {
+    GET_TILING_DATA(tiling_data, tiling);
+    int num_layers = tiling_data.num_layers;
+    int num_pairs = tiling_data.num_pairs;
+    int64_t page_elems = tiling_data.page_elems;
+    int core_num = tiling_data.core_num;
+
+    using copy_t = int16_t;
+    // 32KB per buffer, double buffered so the copy out of one tile overlaps the copy in of the next
+    constexpr int BLOCK_SIZE = 16384;
+    __gm__ int64_t *key_cache_ptrs_ptr = reinterpret_cast<__gm__ int64_t *>(key_cache_ptrs);
+    __gm__ int64_t *value_cache_ptrs_ptr = reinterpret_cast<__gm__ int64_t *>(value_cache_ptrs);
+    __gm__ int64_t *block_mapping_ptr = reinterpret_cast<__gm__ int64_t *>(block_mapping);
+
+    AscendC::TPipe pipe;
+    AscendC::TQueBind<AscendC::QuePosition::VECIN, AscendC::QuePosition::VECOUT, 2> page_que;
+    AscendC::GlobalTensor<copy_t> src_tensor;
+    AscendC::GlobalTensor<copy_t> dst_tensor;
+
+    int block_elems = (page_elems < BLOCK_SIZE) ? page_elems : BLOCK_SIZE;
+    pipe.InitBuffer(page_que, 2, sizeof(copy_t) * block_elems);
+
+    int64_t num_tasks = static_cast<int64_t>(num_layers) * 2 * num_pairs;
+    for (int64_t t = AscendC::GetBlockIdx(); t < num_tasks; t += core_num) {
+        int64_t pair = t % num_pairs;
+        int64_t cache_id = t / num_pairs;
+        int64_t layer = cache_id / 2;
+        __gm__ copy_t *cache = reinterpret_cast<__gm__ copy_t *>(
+            (cache_id % 2 == 0) ? key_cache_ptrs_ptr[layer] : value_cache_ptrs_ptr[layer]);
+        int64_t src = block_mapping_ptr[2 * pair];
+        int64_t dst = block_mapping_ptr[2 * pair + 1];
+        if (src == dst) continue;
+        src_tensor.SetGlobalBuffer(cache + src * page_elems, page_elems);
+        dst_tensor.SetGlobalBuffer(cache + dst * page_elems, page_elems);
+        for (int64_t i = 0; i < page_elems; i += block_elems) {
+            // page_elems is a multiple of 16, so is the tail
+            int len = (page_elems - i < block_elems) ? page_elems - i : block_elems;
+            AscendC::LocalTensor<copy_t> page_in = page_que.AllocTensor<copy_t>();
+            AscendC::DataCopy(page_in, src_tensor[i], len);
+            page_que.EnQue(page_in);
+
+            AscendC::LocalTensor<copy_t> page_out = page_que.DeQue<copy_t>();
+            AscendC::DataCopy(dst_tensor[i], page_out, len);
+            page_que.FreeTensor(page_out);
+        }
+    }
+}
@@ -0,0 +1,105 @@
+#include "kernel_operator.h"
+
+#include "matmul_core.h"
+#include "norm_core.h"
+
+// the mlp prologue of a decode layer in one launch: y = swiglu(rmsnorm(x) @ w.T)
+// Every core norms all rows into its slice of the workspace, then owns a slice of the
+// intermediate channels: its gate and up tiles and their swiglu.
+extern "C" __global__ __aicore__ void fused_gate_up_ex(GM_ADDR x, GM_ADDR norm_weight, GM_ADDR weight, GM_ADDR y, GM_ADDR workspace, GM_ADDR tiling) {
+    GET_TILING_DATA(tiling_data, tiling);
+    using scalar_t = half;
+    using acc_t = float;
+    using index_t = int64_t;
+    constexpr int BLOCK = 256;
+
+    // x: [num_tokens, hidden_size]
+    // weight: [2 * intermediate_size, hidden_size], gate rows then up rows
+    // y: [num_tokens, intermediate_size]
+    int num_tokens = tiling_data.num_tokens;
+    int hidden_size = tiling_data.hidden_size;
+    int intermediate_size = tiling_data.intermediate_size;
+    int inner_dim_per_core = tiling_data.inner_dim_per_core;
+    acc_t eps = tiling_data.epsilon;
+
+    __gm__ scalar_t *x_ptr = reinterpret_cast<__gm__ scalar_t *>(x);
+    __gm__ scalar_t *norm_w_ptr = reinterpret_cast<__gm__ scalar_t *>(norm_weight);
+    __gm__ scalar_t *w_ptr = reinterpret_cast<__gm__ scalar_t *>(weight);
+    __gm__ scalar_t *y_ptr = reinterpret_cast<__gm__ scalar_t *>(y);
+
+    int core_id = AscendC::GetBlockIdx();
+    int n_start = core_id * inner_dim_per_core;
+    if (n_start >= intermediate_size) return;
+    int n_end = (n_start + inner_dim_per_core < intermediate_size) ? (n_start + inner_dim_per_core) : intermediate_size;
+    int n = n_end - n_start;
+
+    // per core: the normed x [num_tokens, hidden_size], gate and up [num_tokens, inner_dim_per_core]
+    __gm__ scalar_t *ws_ptr = reinterpret_cast<__gm__ scalar_t *>(AscendC::GetUserWorkspace(workspace));
+    __gm__ scalar_t *xn_ptr = ws_ptr + (size_t)core_id * num_tokens * (hidden_size + 2 * inner_dim_per_core);
+    __gm__ scalar_t *gate_ptr = xn_ptr + (size_t)num_tokens * hidden_size;
+    __gm__ scalar_t *up_ptr = gate_ptr + (size_t)num_tokens * n;
+
+    MatMulNT<scalar_t, acc_t, index_t> matmul;
+    matmul.InitPipe();
+    RmsNormCore<scalar_t, acc_t> norm;
+    norm.Init(&matmul.pipe);
+    AscendC::TPipe* pipe = &matmul.pipe;
+
+    for (int i = 0; i < num_tokens; ++i) {
+        norm.Row(x_ptr + i * hidden_size, nullptr, norm_w_ptr, xn_ptr + i * hidden_size, nullptr, hidden_size, eps);
+    }
+    SyncGmWriteToRead(pipe);
+
+    matmul.InitSize(num_tokens, n, hidden_size);
+    matmul.InitBuffer(xn_ptr, w_ptr + (size_t)n_start * hidden_size, gate_ptr);
+    matmul.Process();
+    matmul.InitBuffer(xn_ptr, w_ptr + (size_t)(intermediate_size + n_start) * hidden_size, up_ptr);
+    matmul.Process();
+    SyncGmWriteToRead(pipe);
+
+    // swiglu of the slice, as SwiGluEx
+    AscendC::TQue<AscendC::QuePosition::VECIN, 1> gate_que;
+    AscendC::TQue<AscendC::QuePosition::VECIN, 1> up_que;
+    AscendC::TQue<AscendC::QuePosition::VECOUT, 1> out_que;
+    AscendC::TBuf<AscendC::TPosition::VECCALC> calc_buf;
+    pipe->InitBuffer(gate_que, 1, BLOCK * sizeof(scalar_t));
+    pipe->InitBuffer(up_que, 1, BLOCK * sizeof(scalar_t));
+    pipe->InitBuffer(out_que, 1, BLOCK * sizeof(scalar_t));
+    pipe->InitBuffer(calc_buf, 3 * BLOCK * sizeof(acc_t));
+    AscendC::LocalTensor<acc_t> gate_f32 = calc_buf.GetWithOffset<acc_t>(BLOCK, 0);
+    AscendC::LocalTensor<acc_t> up_f32 = calc_buf.GetWithOffset<acc_t>(BLOCK, BLOCK * sizeof(acc_t));
+    AscendC::LocalTensor<acc_t> sigmoid_f32 = calc_buf.GetWithOffset<acc_t>(BLOCK, 2 * BLOCK * sizeof(acc_t));
+    AscendC::GlobalTensor<scalar_t> gate_gm;
+    AscendC::GlobalTensor<scalar_t> up_gm;
+    AscendC::GlobalTensor<scalar_t> y_gm;
+    for (int i = 0; i < num_tokens; ++i) {
+        gate_gm.SetGlobalBuffer(gate_ptr + i * n, n);
+        up_gm.SetGlobalBuffer(up_ptr + i * n, n);
+        y_gm.SetGlobalBuffer(y_ptr + i * intermediate_size + n_start, n);
+        for (int c = 0; c < n; c += BLOCK) {
+            int len = (c + BLOCK <= n) ? BLOCK : (n - c);
+            AscendC::LocalTensor<scalar_t> gate_copy = gate_que.AllocTensor<scalar_t>();
+            AscendC::LocalTensor<scalar_t> up_copy = up_que.AllocTensor<scalar_t>();
+            AscendC::DataCopy(gate_copy, gate_gm[c], len);
+            AscendC::DataCopy(up_copy, up_gm[c], len);
+            gate_que.EnQue(gate_copy);
+            up_que.EnQue(up_copy);
+            AscendC::LocalTensor<scalar_t> gate_local = gate_que.DeQue<scalar_t>();
+            AscendC::LocalTensor<scalar_t> up_local = up_que.DeQue<scalar_t>();
+            Cast(gate_f32, gate_local, AscendC::RoundMode::CAST_NONE, len);
+            Cast(up_f32, up_local, AscendC::RoundMode::CAST_NONE, len);
+            gate_que.FreeTensor(gate_local);
+            up_que.FreeTensor(up_local);
+            Sigmoid(sigmoid_f32, gate_f32, len);
+            Mul(gate_f32, gate_f32, sigmoid_f32, len);
+            Mul(gate_f32, gate_f32, up_f32, len);
+
+            AscendC::LocalTensor<scalar_t> out_local = out_que.AllocTensor<scalar_t>();
+            Cast(out_local, gate_f32, AscendC::RoundMode::CAST_ODD, len);
+            out_que.EnQue(out_local);
+            out_local = out_que.DeQue<scalar_t>();
+            AscendC::DataCopy(y_gm[c], out_local, len);
+            out_que.FreeTensor(out_local);
+        }
+    }
+}
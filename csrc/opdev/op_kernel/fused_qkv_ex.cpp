@@ -0,0 +1,170 @@
+#include "kernel_operator.h"
+
+#include "matmul_core.h"
+#include "norm_core.h"
+
+// the attention prologue of a decode layer in one launch:
+//   h = x + residual, qkv = rmsnorm(h) @ w.T, q/k heads rmsnorm'ed and rotated, k/v into the cache
+// Every core norms all rows into its slice of the workspace (a few rows at decode, cheaper than a
+// cross-core barrier), then owns whole heads: one [num_tokens, head_dim] matmul tile per head,
+// finished row by row.
+extern "C" __global__ __aicore__ void fused_qkv_ex(
+    GM_ADDR x, GM_ADDR norm_weight, GM_ADDR weight, GM_ADDR q_norm_weight, GM_ADDR k_norm_weight,
+    GM_ADDR position_ids, GM_ADDR cos_cache, GM_ADDR sin_cache, GM_ADDR slot_mapping,
+    GM_ADDR key_cache, GM_ADDR value_cache, GM_ADDR residual,
+    GM_ADDR q, GM_ADDR residual_output, GM_ADDR workspace, GM_ADDR tiling) {
+    GET_TILING_DATA(tiling_data, tiling);
+    using scalar_t = half;
+    using acc_t = float;
+    using index_t = int64_t;
+
+    // x, residual: [num_tokens, hidden_size]
+    // weight: [(num_heads + 2 * num_kv_heads) * head_dim, hidden_size]
+    // key_cache, value_cache: [num_pages, num_kv_heads * head_dim / 16, page_size, 16]
+    // q: [num_tokens, num_heads, head_dim]
+    int num_tokens = tiling_data.num_tokens;
+    int hidden_size = tiling_data.hidden_size;
+    int num_heads = tiling_data.num_heads;
+    int num_kv_heads = tiling_data.num_kv_heads;
+    int head_dim = tiling_data.head_dim;
+    int num_pages = tiling_data.num_pages;
+    int page_size = tiling_data.page_size;
+    int core_num = tiling_data.core_num;
+    acc_t eps = tiling_data.epsilon;
+    int embed_dim = head_dim / 2;
+    int nh16 = num_kv_heads * head_dim / 16;
+
+    __gm__ scalar_t *x_ptr = reinterpret_cast<__gm__ scalar_t *>(x);
+    __gm__ scalar_t *norm_w_ptr = reinterpret_cast<__gm__ scalar_t *>(norm_weight);
+    __gm__ scalar_t *w_ptr = reinterpret_cast<__gm__ scalar_t *>(weight);
+    __gm__ scalar_t *q_norm_w_ptr = reinterpret_cast<__gm__ scalar_t *>(q_norm_weight);
+    __gm__ scalar_t *k_norm_w_ptr = reinterpret_cast<__gm__ scalar_t *>(k_norm_weight);
+    __gm__ int32_t *position_ids_ptr = reinterpret_cast<__gm__ int32_t *>(position_ids);
+    __gm__ scalar_t *cos_cache_ptr = reinterpret_cast<__gm__ scalar_t *>(cos_cache);
+    __gm__ scalar_t *sin_cache_ptr = reinterpret_cast<__gm__ scalar_t *>(sin_cache);
+    __gm__ int32_t *slot_mapping_ptr = reinterpret_cast<__gm__ int32_t *>(slot_mapping);
+    __gm__ scalar_t *key_cache_ptr = reinterpret_cast<__gm__ scalar_t *>(key_cache);
+    __gm__ scalar_t *value_cache_ptr = reinterpret_cast<__gm__ scalar_t *>(value_cache);
+    // optional, the first layer has no residual yet
+    __gm__ scalar_t *r_ptr = reinterpret_cast<__gm__ scalar_t *>(residual);
+    __gm__ scalar_t *q_ptr = reinterpret_cast<__gm__ scalar_t *>(q);
+    __gm__ scalar_t *r_out_ptr = reinterpret_cast<__gm__ scalar_t *>(residual_output);
+
+    int core_id = AscendC::GetBlockIdx();
+    // per core: the normed x [num_tokens, hidden_size] and one head tile [num_tokens, head_dim]
+    __gm__ scalar_t *ws_ptr = reinterpret_cast<__gm__ scalar_t *>(AscendC::GetUserWorkspace(workspace));
+    __gm__ scalar_t *xn_ptr = ws_ptr + (size_t)core_id * num_tokens * (hidden_size + head_dim);
+    __gm__ scalar_t *tile_ptr = xn_ptr + (size_t)num_tokens * hidden_size;
+
+    MatMulNT<scalar_t, acc_t, index_t> matmul;
+    matmul.InitPipe();
+    RmsNormCore<scalar_t, acc_t> norm;
+    norm.Init(&matmul.pipe);
+    AscendC::TPipe* pipe = &matmul.pipe;
+
+    AscendC::TQue<AscendC::QuePosition::VECIN, 1> row_que;
+    AscendC::TQue<AscendC::QuePosition::VECIN, 1> cos_que;
+    AscendC::TQue<AscendC::QuePosition::VECIN, 1> sin_que;
+    AscendC::TQue<AscendC::QuePosition::VECOUT, 1> out_que;
+    AscendC::TBuf<AscendC::TPosition::VECCALC> calc_buf;
+    pipe->InitBuffer(row_que, 1, head_dim * sizeof(scalar_t));
+    pipe->InitBuffer(cos_que, 1, embed_dim * sizeof(scalar_t));
+    pipe->InitBuffer(sin_que, 1, embed_dim * sizeof(scalar_t));
+    pipe->InitBuffer(out_que, 1, head_dim * sizeof(scalar_t));
+    // row, rotated row, cos, sin, tmp
+    pipe->InitBuffer(calc_buf, 2 * head_dim * sizeof(acc_t) + 3 * embed_dim * sizeof(acc_t));
+    AscendC::LocalTensor<acc_t> row = calc_buf.GetWithOffset<acc_t>(head_dim, 0);
+    AscendC::LocalTensor<acc_t> rot = calc_buf.GetWithOffset<acc_t>(head_dim, head_dim * sizeof(acc_t));
+    AscendC::LocalTensor<acc_t> cos_f32 = calc_buf.GetWithOffset<acc_t>(embed_dim, 2 * head_dim * sizeof(acc_t));
+    AscendC::LocalTensor<acc_t> sin_f32 = calc_buf.GetWithOffset<acc_t>(embed_dim, (2 * head_dim + embed_dim) * sizeof(acc_t));
+    AscendC::LocalTensor<acc_t> tmp = calc_buf.GetWithOffset<acc_t>(embed_dim, (2 * head_dim + 2 * embed_dim) * sizeof(acc_t));
+
+    for (int i = 0; i < num_tokens; ++i) {
+        __gm__ scalar_t *r_row = (r_ptr != nullptr) ? r_ptr + i * hidden_size : nullptr;
+        // one core writes residual_output, a copy of x without residual
+        __gm__ scalar_t *r_out_row = (core_id == 0) ? r_out_ptr + i * hidden_size : nullptr;
+        norm.Row(x_ptr + i * hidden_size, r_row, norm_w_ptr, xn_ptr + i * hidden_size, r_out_row, hidden_size, eps);
+    }
+    SyncGmWriteToRead(pipe);
+
+    AscendC::GlobalTensor<scalar_t> tile_gm;
+    AscendC::GlobalTensor<scalar_t> out_gm;
+    AscendC::GlobalTensor<scalar_t> cos_gm;
+    AscendC::GlobalTensor<scalar_t> sin_gm;
+    tile_gm.SetGlobalBuffer(tile_ptr, num_tokens * head_dim);
+    int total_heads = num_heads + 2 * num_kv_heads;
+    for (int t = core_id; t < total_heads; t += core_num) {
+        bool is_q = t < num_heads;
+        bool is_k = !is_q && t < num_heads + num_kv_heads;
+        bool is_v = !is_q && !is_k;
+        int kv_head = is_k ? (t - num_heads) : (t - num_heads - num_kv_heads);
+
+        matmul.InitSize(num_tokens, head_dim, hidden_size);
+        matmul.InitBuffer(xn_ptr, w_ptr + (size_t)t * head_dim * hidden_size, tile_ptr);
+        matmul.Process();
+        SyncGmWriteToRead(pipe);
+
+        for (int i = 0; i < num_tokens; ++i) {
+            int32_t slot = slot_mapping_ptr[i];
+            // padded rows write nothing to the cache
+            if (!is_q && (slot < 0 || slot >= num_pages * page_size)) continue;
+
+            AscendC::LocalTensor<scalar_t> row_copy = row_que.AllocTensor<scalar_t>();
+            AscendC::DataCopy(row_copy, tile_gm[i * head_dim], head_dim);
+            row_que.EnQue(row_copy);
+            AscendC::LocalTensor<scalar_t> row_local = row_que.DeQue<scalar_t>();
+            Cast(row, row_local, AscendC::RoundMode::CAST_NONE, head_dim);
+            row_que.FreeTensor(row_local);
+
+            if (!is_v) {
+                norm.NormInPlace(row, is_q ? q_norm_w_ptr : k_norm_w_ptr, head_dim, eps);
+                // rotate half, as RopeEx
+                int pos = position_ids_ptr[i];
+                cos_gm.SetGlobalBuffer(cos_cache_ptr + (size_t)pos * embed_dim, embed_dim);
+                sin_gm.SetGlobalBuffer(sin_cache_ptr + (size_t)pos * embed_dim, embed_dim);
+                AscendC::LocalTensor<scalar_t> cos_copy = cos_que.AllocTensor<scalar_t>();
+                AscendC::LocalTensor<scalar_t> sin_copy = sin_que.AllocTensor<scalar_t>();
+                AscendC::DataCopy(cos_copy, cos_gm, embed_dim);
+                AscendC::DataCopy(sin_copy, sin_gm, embed_dim);
+                cos_que.EnQue(cos_copy);
+                sin_que.EnQue(sin_copy);
+                AscendC::LocalTensor<scalar_t> cos_local = cos_que.DeQue<scalar_t>();
+                AscendC::LocalTensor<scalar_t> sin_local = sin_que.DeQue<scalar_t>();
+                Cast(cos_f32, cos_local, AscendC::RoundMode::CAST_NONE, embed_dim);
+                Cast(sin_f32, sin_local, AscendC::RoundMode::CAST_NONE, embed_dim);
+                cos_que.FreeTensor(cos_local);
+                sin_que.FreeTensor(sin_local);
+
+                AscendC::Mul(rot, row, cos_f32, embed_dim);
+                AscendC::Mul(tmp, row[embed_dim], sin_f32, embed_dim);
+                AscendC::Sub(rot, rot, tmp, embed_dim);
+                AscendC::Mul(rot[embed_dim], row[embed_dim], cos_f32, embed_dim);
+                AscendC::Mul(tmp, row, sin_f32, embed_dim);
+                AscendC::Add(rot[embed_dim], rot[embed_dim], tmp, embed_dim);
+            }
+
+            AscendC::LocalTensor<scalar_t> out_local = out_que.AllocTensor<scalar_t>();
+            Cast(out_local, is_v ? row : rot, AscendC::RoundMode::CAST_NONE, head_dim);
+            out_que.EnQue(out_local);
+            out_local = out_que.DeQue<scalar_t>();
+            if (is_q) {
+                out_gm.SetGlobalBuffer(q_ptr + ((size_t)i * num_heads + t) * head_dim, head_dim);
+                AscendC::DataCopy(out_gm, out_local, head_dim);
+            } else {
+                // nz cache: the 16 wide chunks of a token are page_size * 16 apart
+                int page = slot / page_size;
+                int offset = slot % page_size;
+                __gm__ scalar_t *cache_ptr = is_k ? key_cache_ptr : value_cache_ptr;
+                size_t dst = (((size_t)page * nh16 + kv_head * head_dim / 16) * page_size + offset) * 16;
+                out_gm.SetGlobalBuffer(cache_ptr + dst, head_dim * page_size);
+                AscendC::DataCopyParams params;
+                params.blockCount = head_dim / 16;
+                params.blockLen = 1;
+                params.srcStride = 0;
+                params.dstStride = page_size - 1;
+                AscendC::DataCopy(out_gm, out_local, params);
+            }
+            out_que.FreeTensor(out_local);
+        }
+    }
+}
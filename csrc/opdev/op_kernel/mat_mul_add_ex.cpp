@@ -0,0 +1,81 @@
+#include "kernel_operator.h"
+
+#include "matmul_core.h"
+#include "norm_core.h"
+
+// y = x @ w.T + residual, the o projection and the residual add of a decode layer in one launch
+extern "C" __global__ __aicore__ void mat_mul_add_ex(GM_ADDR x, GM_ADDR w, GM_ADDR residual, GM_ADDR y, GM_ADDR workspace, GM_ADDR tiling) {
+    GET_TILING_DATA(tiling_data, tiling);
+    using scalar_t = half;
+    using acc_t = float;
+    using index_t = int64_t;
+    constexpr int BLOCK = 256;
+
+    // x: [num_tokens, dim]
+    // w: [inner_dim, dim]
+    // residual, y: [num_tokens, inner_dim]
+    int num_tokens = tiling_data.num_tokens;
+    int dim = tiling_data.dim;
+    int inner_dim = tiling_data.inner_dim;
+    int inner_dim_per_core = tiling_data.inner_dim_per_core;
+
+    __gm__ scalar_t *x_ptr = reinterpret_cast<__gm__ scalar_t *>(x);
+    __gm__ scalar_t *w_ptr = reinterpret_cast<__gm__ scalar_t *>(w);
+    __gm__ scalar_t *r_ptr = reinterpret_cast<__gm__ scalar_t *>(residual);
+    __gm__ scalar_t *y_ptr = reinterpret_cast<__gm__ scalar_t *>(y);
+
+    // each core owns a slice of output channels, as WeightQuantMatMulEx
+    int n_start = AscendC::GetBlockIdx() * inner_dim_per_core;
+    if (n_start >= inner_dim) return;
+    int n_end = (n_start + inner_dim_per_core < inner_dim) ? (n_start + inner_dim_per_core) : inner_dim;
+
+    MatMulNT<scalar_t, acc_t, index_t> matmul;
+    matmul.InitPipe();
+    matmul.InitSize(num_tokens, n_end - n_start, dim);
+    matmul.InitLdc(inner_dim);
+    matmul.InitBuffer(x_ptr, w_ptr + n_start * dim, y_ptr + n_start);
+    matmul.Process();
+    AscendC::TPipe* pipe = &matmul.pipe;
+    SyncGmWriteToRead(pipe);
+
+    // then add the residual to the slice in place
+    AscendC::TQue<AscendC::QuePosition::VECIN, 1> y_que;
+    AscendC::TQue<AscendC::QuePosition::VECIN, 1> r_que;
+    AscendC::TQue<AscendC::QuePosition::VECOUT, 1> out_que;
+    AscendC::TBuf<AscendC::TPosition::VECCALC> calc_buf;
+    pipe->InitBuffer(y_que, 1, BLOCK * sizeof(scalar_t));
+    pipe->InitBuffer(r_que, 1, BLOCK * sizeof(scalar_t));
+    pipe->InitBuffer(out_que, 1, BLOCK * sizeof(scalar_t));
+    pipe->InitBuffer(calc_buf, 2 * BLOCK * sizeof(acc_t));
+    AscendC::LocalTensor<acc_t> y_f32 = calc_buf.GetWithOffset<acc_t>(BLOCK, 0);
+    AscendC::LocalTensor<acc_t> r_f32 = calc_buf.GetWithOffset<acc_t>(BLOCK, BLOCK * sizeof(acc_t));
+    AscendC::GlobalTensor<scalar_t> y_gm;
+    AscendC::GlobalTensor<scalar_t> r_gm;
+    for (int i = 0; i < num_tokens; ++i) {
+        y_gm.SetGlobalBuffer(y_ptr + i * inner_dim + n_start, n_end - n_start);
+        r_gm.SetGlobalBuffer(r_ptr + i * inner_dim + n_start, n_end - n_start);
+        for (int c = 0; c < n_end - n_start; c += BLOCK) {
+            int len = (c + BLOCK <= n_end - n_start) ? BLOCK : (n_end - n_start - c);
+            AscendC::LocalTensor<scalar_t> y_copy = y_que.AllocTensor<scalar_t>();
+            AscendC::LocalTensor<scalar_t> r_copy = r_que.AllocTensor<scalar_t>();
+            AscendC::DataCopy(y_copy, y_gm[c], len);
+            AscendC::DataCopy(r_copy, r_gm[c], len);
+            y_que.EnQue(y_copy);
+            r_que.EnQue(r_copy);
+            AscendC::LocalTensor<scalar_t> y_local = y_que.DeQue<scalar_t>();
+            AscendC::LocalTensor<scalar_t> r_local = r_que.DeQue<scalar_t>();
+            Cast(y_f32, y_local, AscendC::RoundMode::CAST_NONE, len);
+            Cast(r_f32, r_local, AscendC::RoundMode::CAST_NONE, len);
+            AscendC::Add(y_f32, y_f32, r_f32, len);
+            y_que.FreeTensor(y_local);
+            r_que.FreeTensor(r_local);
+
+            AscendC::LocalTensor<scalar_t> out_local = out_que.AllocTensor<scalar_t>();
+            Cast(out_local, y_f32, AscendC::RoundMode::CAST_NONE, len);
+            out_que.EnQue(out_local);
+            out_local = out_que.DeQue<scalar_t>();
+            AscendC::DataCopy(y_gm[c], out_local, len);
+            out_que.FreeTensor(out_local);
+        }
+    }
+}
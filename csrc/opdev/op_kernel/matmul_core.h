@@ -28,6 +28,7 @@ public:
     AscendC::GlobalTensor<scalar_t> c_gm;
 
     int m, n, k;
+    int ldc;
     uint16_t curr_block_m;
     __gm__ scalar_t* a;
     __gm__ scalar_t* b;
@@ -37,13 +38,14 @@ public:
         m = 0;
         n = 0;
         k = 0;
+        ldc = 0;
         curr_block_m = 0;
     }
     __aicore__ inline void Process() {
         for (int mi = 0; mi < m; mi += BLOCK_M) {
             for (int ni = 0; ni < n; ni += BLOCK_N) {
                 this->curr_block_m = (m - mi < BLOCK_M) ? (m - mi) : BLOCK_M;
-                c_gm.SetGlobalBuffer(c + mi * n + ni);
+                c_gm.SetGlobalBuffer(c + mi * ldc + ni);
                 AscendC::LocalTensor<acc_t> acc = co1_que.AllocTensor<acc_t>();
                 // for (int ki = 0; ki < k; ki += BLOCK_K) {
                 for (int ki = 0; ki < k; ki += BLOCK_K * L1_STAGE) {
@@ -81,6 +83,12 @@ public:
         this->m = m;
         this->n = n;
         this->k = k;
+        this->ldc = n;
+    }
+
+    // row stride of c, for cores that only compute a slice of the output columns
+    __aicore__ inline void InitLdc(int ldc) {
+        this->ldc = ldc;
     }
 
     __aicore__ inline void InitBuffer(
@@ -214,11 +222,141 @@ public:
             int dst_offset = i * 16;
             // FIXME: uint16_t out of bound for large n
             // AscendC::DataCopy(c_gm[dst_offset], co2[src_offset], { this->curr_block_m, 2, 0, uint16_t((n / 16 - 1) * 2) });
-            AscendC::DataCopy(c_gm[dst_offset], c_casted[src_offset], { this->curr_block_m, 1, 0, uint16_t(n / 16 - 1) });
+            AscendC::DataCopy(c_gm[dst_offset], c_casted[src_offset], { this->curr_block_m, 1, 0, uint16_t(ldc / 16 - 1) });
         }
         c_que.FreeTensor(c_casted);
     }
 };
 
 
+// W8A16: b is int8 [n, k] (transposed) with fp16 scales [k / group_size, n].
+// Each BLOCK_N x BLOCK_K tile of b is dequantized in UB and then moved into L1, so the cube
+// still runs in fp16 while HBM traffic for the weight is halved.
+// FIXME: must be group_size % BLOCK_K == 0 and k % 32 == 0
+template<typename scalar_t, typename acc_t, typename id_t>
+class MatMulNTW8A16: public MatMulNT<scalar_t, acc_t, id_t> {
+public:
+    using Base = MatMulNT<scalar_t, acc_t, id_t>;
+    using Base::BLOCK_M;
+    using Base::BLOCK_K;
+    using Base::BLOCK_N;
+
+    AscendC::TQue<AscendC::TPosition::VECIN, 1> bq_que;
+    AscendC::TQue<AscendC::TPosition::VECIN, 1> scale_que;
+    AscendC::TQue<AscendC::TPosition::VECOUT, 1> bdq_que;
+
+    AscendC::GlobalTensor<int8_t> bq_gm; // transposed
+    AscendC::GlobalTensor<scalar_t> scale_gm;
+
+    int group_size;
+    int ldscale;
+    __gm__ int8_t* bq;
+    __gm__ scalar_t* scale;
+
+    __aicore__ inline MatMulNTW8A16() : Base() {
+        group_size = 0;
+        ldscale = 0;
+    }
+
+    __aicore__ inline void Process() {
+        for (int mi = 0; mi < this->m; mi += BLOCK_M) {
+            for (int ni = 0; ni < this->n; ni += BLOCK_N) {
+                this->curr_block_m = (this->m - mi < BLOCK_M) ? (this->m - mi) : BLOCK_M;
+                this->c_gm.SetGlobalBuffer(this->c + mi * this->ldc + ni);
+                AscendC::LocalTensor<acc_t> acc = this->co1_que.template AllocTensor<acc_t>();
+                for (int ki = 0; ki < this->k; ki += BLOCK_K) {
+                    this->a_gm.SetGlobalBuffer(this->a + mi * this->k + ki);
+                    bq_gm.SetGlobalBuffer(bq + ni * this->k + ki);
+                    scale_gm.SetGlobalBuffer(scale + (ki / group_size) * ldscale + ni);
+                    CopyGmToL2();
+                    this->CopyL2ToL1();
+                    this->Mma(acc, ki == 0);
+                }
+                this->co1_que.EnQue(acc);
+                this->CopyCO1ToCO2();
+                this->CopyCO2ToGm();
+            }
+        }
+    }
+
+    __aicore__ inline void InitPipe() {
+        Base::InitPipe();
+        this->pipe.InitBuffer(bq_que, 1, BLOCK_N * BLOCK_K * sizeof(int8_t));
+        this->pipe.InitBuffer(scale_que, 1, BLOCK_N * sizeof(scalar_t));
+        this->pipe.InitBuffer(bdq_que, 1, BLOCK_N * BLOCK_K * sizeof(scalar_t));
+    }
+
+    // group_size: number of k elements sharing one scale, group_size == k means per-channel
+    // ldscale: row stride of scale, i.e. the full n of the weight
+    __aicore__ inline void InitQuant(int group_size, int ldscale) {
+        this->group_size = group_size;
+        this->ldscale = ldscale;
+    }
+
+    __aicore__ inline void InitBuffer(
+        __gm__ scalar_t* a,
+        __gm__ int8_t* bq,
+        __gm__ scalar_t* scale,
+        __gm__ scalar_t* c
+    ) {
+        this->a = a;
+        this->bq = bq;
+        this->scale = scale;
+        this->c = c;
+    }
+
+    __aicore__ inline void CopyGmToL2() {
+        AscendC::LocalTensor<scalar_t> a1 = this->a1_que.template AllocTensor<scalar_t>();
+        // for a: nd -> nz
+        for (int i = 0; i < BLOCK_K / 16; ++i) {
+            int src_offset = i * 16;
+            int dst_offset = i * 16 * BLOCK_M;
+            AscendC::DataCopy(a1[dst_offset], this->a_gm[src_offset], { this->curr_block_m, 1, uint16_t(this->k / 16 - 1), 0});
+        }
+        this->a1_que.EnQue(a1);
+
+        DequantB();
+    }
+
+    __aicore__ inline void DequantB() {
+        // gm -> ub
+        {
+            // b: [BLOCK_N, BLOCK_K] int8, 32 int8 per 32B block
+            AscendC::LocalTensor<int8_t> bq_local = bq_que.AllocTensor<int8_t>();
+            AscendC::DataCopy(bq_local, bq_gm, { BLOCK_N, uint16_t(BLOCK_K / 32), uint16_t((this->k - BLOCK_K) / 32), 0 });
+            bq_que.EnQue(bq_local);
+            AscendC::LocalTensor<scalar_t> scale_local = scale_que.AllocTensor<scalar_t>();
+            AscendC::DataCopy(scale_local, scale_gm, BLOCK_N);
+            scale_que.EnQue(scale_local);
+        }
+        // dequant: int8 -> fp16, scale each row (output channel)
+        {
+            AscendC::LocalTensor<int8_t> bq_local = bq_que.DeQue<int8_t>();
+            AscendC::LocalTensor<scalar_t> scale_local = scale_que.DeQue<scalar_t>();
+            AscendC::LocalTensor<scalar_t> bdq = bdq_que.AllocTensor<scalar_t>();
+            Cast(bdq, bq_local, AscendC::RoundMode::CAST_NONE, BLOCK_N * BLOCK_K);
+            for (int i = 0; i < BLOCK_N; ++i) {
+                Muls(bdq[i * BLOCK_K], bdq[i * BLOCK_K], scale_local.GetValue(i), BLOCK_K);
+            }
+            bdq_que.EnQue(bdq);
+            bq_que.FreeTensor(bq_local);
+            scale_que.FreeTensor(scale_local);
+        }
+        // ub -> b1
+        {
+            // for b (transposed): dn -> zn
+            AscendC::LocalTensor<scalar_t> bdq = bdq_que.DeQue<scalar_t>();
+            AscendC::LocalTensor<scalar_t> b1 = this->b1_que.template AllocTensor<scalar_t>();
+            for (int i = 0; i < BLOCK_K / 16; ++i) {
+                int src_offset = i * 16;
+                int dst_offset = i * 16 * BLOCK_N;
+                AscendC::DataCopy(b1[dst_offset], bdq[src_offset], { BLOCK_N, 1, uint16_t(BLOCK_K / 16 - 1), 0 });
+            }
+            this->b1_que.EnQue(b1);
+            bdq_que.FreeTensor(bdq);
+        }
+    }
+};
+
+
 #endif
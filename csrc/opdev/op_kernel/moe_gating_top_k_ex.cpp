@@ -0,0 +1,91 @@
+#include "kernel_operator.h"
+
+template<AscendC::HardEvent EVENT>
+__aicore__ inline void SyncPipe(AscendC::TPipe& pipe) {
+    event_t event_id = static_cast<event_t>(pipe.FetchEventID(EVENT));
+    AscendC::SetFlag<EVENT>(event_id);
+    AscendC::WaitFlag<EVENT>(event_id);
+}
+
+// softmax over the experts of one token, then top_k rounds of argmax
+extern "C" __global__ __aicore__ void moe_gating_top_k_ex(GM_ADDR logits, GM_ADDR topk_weights, GM_ADDR topk_ids, GM_ADDR workspace, GM_ADDR tiling) {
+    GET_TILING_DATA(tiling_data, tiling);
+    int num_tokens = tiling_data.num_tokens;
+    int num_experts = tiling_data.num_experts;
+    int num_experts_pad = tiling_data.num_experts_pad;
+    int top_k = tiling_data.top_k;
+    bool renormalize = tiling_data.renormalize != 0;
+    int core_num = tiling_data.core_num;
+
+    using scalar_t = half;
+    using acc_t = float;
+    // padded experts never win
+    constexpr acc_t MASK_VALUE = -1e30f;
+    __gm__ scalar_t *logits_ptr = reinterpret_cast<__gm__ scalar_t *>(logits);
+    __gm__ acc_t *topk_weights_ptr = reinterpret_cast<__gm__ acc_t *>(topk_weights);
+    __gm__ int32_t *topk_ids_ptr = reinterpret_cast<__gm__ int32_t *>(topk_ids);
+
+    AscendC::TPipe pipe;
+    AscendC::TQue<AscendC::QuePosition::VECIN, 1> logits_que;
+    AscendC::TBuf<AscendC::TPosition::VECCALC> calc_buf;
+    AscendC::GlobalTensor<scalar_t> logits_tensor;
+
+    pipe.InitBuffer(logits_que, 1, sizeof(scalar_t) * num_experts_pad);
+    pipe.InitBuffer(calc_buf, 3 * num_experts_pad * sizeof(acc_t));
+    AscendC::LocalTensor<acc_t> probs = calc_buf.GetWithOffset<acc_t>(num_experts_pad, 0);
+    AscendC::LocalTensor<acc_t> work = calc_buf.GetWithOffset<acc_t>(num_experts_pad, num_experts_pad * sizeof(acc_t));
+    AscendC::LocalTensor<acc_t> reduced = calc_buf.GetWithOffset<acc_t>(num_experts_pad, 2 * num_experts_pad * sizeof(acc_t));
+    // ReduceMax with calIndex stores the index bits of the max in reduced[1]
+    AscendC::LocalTensor<uint32_t> reduced_idx = reduced.ReinterpretCast<uint32_t>();
+
+    // the unaligned tail of a row is read by the scalar unit, DataCopy would run past the last row
+    int num_aligned = num_experts / 16 * 16;
+
+    for (int64_t i = AscendC::GetBlockIdx(); i < num_tokens; i += core_num) {
+        logits_tensor.SetGlobalBuffer(logits_ptr + num_experts * i, num_experts);
+        if (num_aligned > 0) {
+            AscendC::LocalTensor<scalar_t> x_copy = logits_que.AllocTensor<scalar_t>();
+            AscendC::DataCopy(x_copy, logits_tensor, num_aligned);
+            logits_que.EnQue(x_copy);
+            AscendC::LocalTensor<scalar_t> x = logits_que.DeQue<scalar_t>();
+            Cast(probs, x, AscendC::RoundMode::CAST_NONE, num_aligned);
+            logits_que.FreeTensor(x);
+        }
+        SyncPipe<AscendC::HardEvent::V_S>(pipe);
+        for (int j = num_aligned; j < num_experts_pad; ++j) {
+            probs.SetValue(j, j < num_experts ? static_cast<acc_t>(logits_ptr[num_experts * i + j]) : MASK_VALUE);
+        }
+        SyncPipe<AscendC::HardEvent::S_V>(pipe);
+
+        // softmax
+        AscendC::ReduceMax(reduced, probs, work, num_experts_pad, false);
+        SyncPipe<AscendC::HardEvent::V_S>(pipe);
+        acc_t row_max = reduced.GetValue(0);
+        AscendC::Adds(probs, probs, -row_max, num_experts_pad);
+        AscendC::Exp(probs, probs, num_experts_pad);
+        AscendC::ReduceSum(reduced, probs, work, num_experts_pad);
+        SyncPipe<AscendC::HardEvent::V_S>(pipe);
+        acc_t row_sum = reduced.GetValue(0);
+        AscendC::Muls(probs, probs, 1.0f / row_sum, num_experts_pad);
+
+        // top_k, the winner is knocked out below every real prob
+        acc_t topk_sum = 0.0f;
+        for (int j = 0; j < top_k; ++j) {
+            AscendC::ReduceMax(reduced, probs, work, num_experts_pad, true);
+            SyncPipe<AscendC::HardEvent::V_S>(pipe);
+            acc_t weight = reduced.GetValue(0);
+            uint32_t expert = reduced_idx.GetValue(1);
+            topk_weights_ptr[top_k * i + j] = weight;
+            topk_ids_ptr[top_k * i + j] = static_cast<int32_t>(expert);
+            topk_sum += weight;
+            probs.SetValue(expert, -1.0f);
+            SyncPipe<AscendC::HardEvent::S_V>(pipe);
+        }
+        if (renormalize) {
+            acc_t inv_sum = 1.0f / topk_sum;
+            for (int j = 0; j < top_k; ++j) {
+                topk_weights_ptr[top_k * i + j] = topk_weights_ptr[top_k * i + j] * inv_sum;
+            }
+        }
+    }
+}
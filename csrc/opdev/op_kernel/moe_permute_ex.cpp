@@ -0,0 +1,91 @@
+#include "kernel_operator.h"
+
+// scatter the rows of x into expert order, a stable counting sort over the flattened topk_ids
+//   permuted_x[expanded_row_idx[t * top_k + j]] = x[t]
+// rows of expert e are [group_list[e - 1], group_list[e]), invalid ids get expanded_row_idx -1
+extern "C" __global__ __aicore__ void moe_permute_ex(
+    GM_ADDR x, GM_ADDR topk_ids, GM_ADDR permuted_x, GM_ADDR expanded_row_idx, GM_ADDR group_list,
+    GM_ADDR workspace, GM_ADDR tiling) {
+    GET_TILING_DATA(tiling_data, tiling);
+    int num_tokens = tiling_data.num_tokens;
+    int hidden = tiling_data.hidden;
+    int top_k = tiling_data.top_k;
+    int num_experts = tiling_data.num_experts;
+    int rows_per_core = tiling_data.rows_per_core;
+
+    using scalar_t = half;
+    constexpr int BLOCK_SIZE_HIDDEN = 1024;
+    __gm__ scalar_t *x_ptr = reinterpret_cast<__gm__ scalar_t *>(x);
+    __gm__ int32_t *topk_ids_ptr = reinterpret_cast<__gm__ int32_t *>(topk_ids);
+    __gm__ scalar_t *permuted_x_ptr = reinterpret_cast<__gm__ scalar_t *>(permuted_x);
+    __gm__ int32_t *expanded_row_idx_ptr = reinterpret_cast<__gm__ int32_t *>(expanded_row_idx);
+    __gm__ int64_t *group_list_ptr = reinterpret_cast<__gm__ int64_t *>(group_list);
+
+    int num_rows = num_tokens * top_k;
+    int row_start = AscendC::GetBlockIdx() * rows_per_core;
+    int row_end = (row_start + rows_per_core < num_rows) ? row_start + rows_per_core : num_rows;
+
+    AscendC::TPipe pipe;
+    AscendC::TQueBind<AscendC::QuePosition::VECIN, AscendC::QuePosition::VECOUT, 1> copy_que;
+    AscendC::TBuf<AscendC::TPosition::VECCALC> count_buf;
+    AscendC::GlobalTensor<scalar_t> x_tensor;
+    AscendC::GlobalTensor<scalar_t> permuted_x_tensor;
+
+    int block_hidden = (hidden < BLOCK_SIZE_HIDDEN) ? hidden : BLOCK_SIZE_HIDDEN;
+    int num_experts_pad = (num_experts + 7) / 8 * 8;
+    pipe.InitBuffer(copy_que, 2, sizeof(scalar_t) * block_hidden);
+    pipe.InitBuffer(count_buf, 2 * num_experts_pad * sizeof(int32_t));
+    // rows per expert over all entries, and over the entries before this core
+    AscendC::LocalTensor<int32_t> total = count_buf.GetWithOffset<int32_t>(num_experts_pad, 0);
+    AscendC::LocalTensor<int32_t> offset = count_buf.GetWithOffset<int32_t>(num_experts_pad, num_experts_pad * sizeof(int32_t));
+    AscendC::Duplicate(total, 0, num_experts_pad);
+    AscendC::Duplicate(offset, 0, num_experts_pad);
+    {
+        event_t event_id = static_cast<event_t>(pipe.FetchEventID(AscendC::HardEvent::V_S));
+        AscendC::SetFlag<AscendC::HardEvent::V_S>(event_id);
+        AscendC::WaitFlag<AscendC::HardEvent::V_S>(event_id);
+    }
+
+    // every core counts all entries, cheaper than a cross-core prefix sum for decode sized batches
+    for (int r = 0; r < num_rows; ++r) {
+        int32_t expert = topk_ids_ptr[r];
+        if (expert < 0 || expert >= num_experts) continue;
+        total.SetValue(expert, total.GetValue(expert) + 1);
+        if (r < row_start) {
+            offset.SetValue(expert, offset.GetValue(expert) + 1);
+        }
+    }
+    // offset[e] = first row of expert e for this core
+    int64_t cumsum = 0;
+    for (int e = 0; e < num_experts; ++e) {
+        offset.SetValue(e, offset.GetValue(e) + static_cast<int32_t>(cumsum));
+        cumsum += total.GetValue(e);
+        if (AscendC::GetBlockIdx() == 0) {
+            group_list_ptr[e] = cumsum;
+        }
+    }
+
+    for (int r = row_start; r < row_end; ++r) {
+        int32_t expert = topk_ids_ptr[r];
+        if (expert < 0 || expert >= num_experts) {
+            expanded_row_idx_ptr[r] = -1;
+            continue;
+        }
+        int32_t dst_row = offset.GetValue(expert);
+        offset.SetValue(expert, dst_row + 1);
+        expanded_row_idx_ptr[r] = dst_row;
+
+        x_tensor.SetGlobalBuffer(x_ptr + static_cast<int64_t>(r / top_k) * hidden, hidden);
+        permuted_x_tensor.SetGlobalBuffer(permuted_x_ptr + static_cast<int64_t>(dst_row) * hidden, hidden);
+        for (int h = 0; h < hidden; h += block_hidden) {
+            // hidden is a multiple of 16, so is the tail
+            int len = (hidden - h < block_hidden) ? hidden - h : block_hidden;
+            AscendC::LocalTensor<scalar_t> row = copy_que.AllocTensor<scalar_t>();
+            AscendC::DataCopy(row, x_tensor[h], len);
+            copy_que.EnQue(row);
+            row = copy_que.DeQue<scalar_t>();
+            AscendC::DataCopy(permuted_x_tensor[h], row, len);
+            copy_que.FreeTensor(row);
+        }
+    }
+}
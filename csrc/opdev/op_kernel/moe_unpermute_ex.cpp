@@ -0,0 +1,64 @@
+#include "kernel_operator.h"
+
+// out[t] = sum_j topk_weights[t, j] * y[expanded_row_idx[t * top_k + j]], rows with index -1 are skipped
+extern "C" __global__ __aicore__ void moe_unpermute_ex(
+    GM_ADDR y, GM_ADDR expanded_row_idx, GM_ADDR topk_weights, GM_ADDR out, GM_ADDR workspace, GM_ADDR tiling) {
+    GET_TILING_DATA(tiling_data, tiling);
+    int num_tokens = tiling_data.num_tokens;
+    int hidden = tiling_data.hidden;
+    int top_k = tiling_data.top_k;
+    int core_num = tiling_data.core_num;
+
+    using scalar_t = half;
+    using acc_t = float;
+    constexpr int BLOCK_SIZE_HIDDEN = 1024;
+    __gm__ scalar_t *y_ptr = reinterpret_cast<__gm__ scalar_t *>(y);
+    __gm__ int32_t *expanded_row_idx_ptr = reinterpret_cast<__gm__ int32_t *>(expanded_row_idx);
+    __gm__ acc_t *topk_weights_ptr = reinterpret_cast<__gm__ acc_t *>(topk_weights);
+    __gm__ scalar_t *out_ptr = reinterpret_cast<__gm__ scalar_t *>(out);
+
+    AscendC::TPipe pipe;
+    AscendC::TQue<AscendC::QuePosition::VECIN, 2> y_que;
+    AscendC::TQue<AscendC::QuePosition::VECOUT, 1> out_que;
+    AscendC::TBuf<AscendC::TPosition::VECCALC> calc_buf;
+    AscendC::GlobalTensor<scalar_t> y_tensor;
+    AscendC::GlobalTensor<scalar_t> out_tensor;
+
+    int block_hidden = (hidden < BLOCK_SIZE_HIDDEN) ? hidden : BLOCK_SIZE_HIDDEN;
+    pipe.InitBuffer(y_que, 2, sizeof(scalar_t) * block_hidden);
+    pipe.InitBuffer(out_que, 1, sizeof(scalar_t) * block_hidden);
+    pipe.InitBuffer(calc_buf, 2 * block_hidden * sizeof(acc_t));
+    AscendC::LocalTensor<acc_t> acc = calc_buf.GetWithOffset<acc_t>(block_hidden, 0);
+    AscendC::LocalTensor<acc_t> y_f32 = calc_buf.GetWithOffset<acc_t>(block_hidden, block_hidden * sizeof(acc_t));
+
+    for (int64_t i = AscendC::GetBlockIdx(); i < num_tokens; i += core_num) {
+        out_tensor.SetGlobalBuffer(out_ptr + hidden * i, hidden);
+        for (int h = 0; h < hidden; h += block_hidden) {
+            // hidden is a multiple of 16, so is the tail
+            int len = (hidden - h < block_hidden) ? hidden - h : block_hidden;
+            AscendC::Duplicate(acc, 0.0f, len);
+            for (int j = 0; j < top_k; ++j) {
+                int32_t row = expanded_row_idx_ptr[top_k * i + j];
+                if (row < 0) continue;
+                acc_t weight = topk_weights_ptr[top_k * i + j];
+                y_tensor.SetGlobalBuffer(y_ptr + static_cast<int64_t>(row) * hidden, hidden);
+                AscendC::LocalTensor<scalar_t> y_copy = y_que.AllocTensor<scalar_t>();
+                AscendC::DataCopy(y_copy, y_tensor[h], len);
+                y_que.EnQue(y_copy);
+
+                AscendC::LocalTensor<scalar_t> y_row = y_que.DeQue<scalar_t>();
+                Cast(y_f32, y_row, AscendC::RoundMode::CAST_NONE, len);
+                // acc += weight * y
+                AscendC::Axpy(acc, y_f32, weight, len);
+                y_que.FreeTensor(y_row);
+            }
+            AscendC::LocalTensor<scalar_t> _out = out_que.AllocTensor<scalar_t>();
+            Cast(_out, acc, AscendC::RoundMode::CAST_NONE, len);
+            out_que.EnQue(_out);
+
+            AscendC::LocalTensor<scalar_t> out_copy = out_que.DeQue<scalar_t>();
+            AscendC::DataCopy(out_tensor[h], out_copy, len);
+            out_que.FreeTensor(out_copy);
+        }
+    }
+}
@@ -0,0 +1,153 @@
+#ifndef _NORM_CORE_H
+#define _NORM_CORE_H
+
+#include "kernel_operator.h"
+
+// rmsnorm building blocks of the fused decode kernels, on the pipe of the kernel's matmul.
+// Row works on gm rows of any length in BLOCK chunks, NormInPlace on an fp32 row already in ub.
+template<typename scalar_t, typename acc_t>
+class RmsNormCore {
+public:
+    static constexpr int BLOCK = 256;
+
+    AscendC::TPipe* pipe;
+    AscendC::TQue<AscendC::QuePosition::VECIN, 1> x_que;
+    AscendC::TQue<AscendC::QuePosition::VECIN, 1> r_que;
+    AscendC::TQue<AscendC::QuePosition::VECIN, 1> w_que;
+    AscendC::TQue<AscendC::QuePosition::VECOUT, 1> y_que;
+    AscendC::TQue<AscendC::QuePosition::VECOUT, 1> r_out_que;
+    AscendC::TBuf<AscendC::TPosition::VECCALC> calc_buf;
+
+    __aicore__ inline RmsNormCore() : pipe(nullptr) {}
+
+    __aicore__ inline void Init(AscendC::TPipe* pipe) {
+        this->pipe = pipe;
+        pipe->InitBuffer(x_que, 1, BLOCK * sizeof(scalar_t));
+        pipe->InitBuffer(r_que, 1, BLOCK * sizeof(scalar_t));
+        pipe->InitBuffer(w_que, 1, BLOCK * sizeof(scalar_t));
+        pipe->InitBuffer(y_que, 1, BLOCK * sizeof(scalar_t));
+        pipe->InitBuffer(r_out_que, 1, BLOCK * sizeof(scalar_t));
+        // h, w, square, reduce work and the reduced sum
+        pipe->InitBuffer(calc_buf, 4 * BLOCK * sizeof(acc_t) + 32);
+    }
+
+    // y = rmsnorm(x + r) * w and r_out = x + r, r = nullptr is a plain rmsnorm and
+    // r_out = nullptr skips it
+    __aicore__ inline void Row(
+        __gm__ scalar_t* x, __gm__ scalar_t* r, __gm__ scalar_t* w,
+        __gm__ scalar_t* y, __gm__ scalar_t* r_out, int dim, acc_t eps
+    ) {
+        AscendC::GlobalTensor<scalar_t> x_gm;
+        AscendC::GlobalTensor<scalar_t> r_gm;
+        AscendC::GlobalTensor<scalar_t> w_gm;
+        AscendC::GlobalTensor<scalar_t> y_gm;
+        AscendC::GlobalTensor<scalar_t> r_out_gm;
+        x_gm.SetGlobalBuffer(x, dim);
+        w_gm.SetGlobalBuffer(w, dim);
+        y_gm.SetGlobalBuffer(y, dim);
+        if (r != nullptr) {
+            r_gm.SetGlobalBuffer(r, dim);
+        }
+        if (r_out != nullptr) {
+            r_out_gm.SetGlobalBuffer(r_out, dim);
+        }
+
+        acc_t sum_sq = 0.0f;
+        for (int c = 0; c < dim; c += BLOCK) {
+            int len = (c + BLOCK <= dim) ? BLOCK : (dim - c);
+            AscendC::LocalTensor<acc_t> h = LoadSum(x_gm, r_gm, r != nullptr, c, len);
+            sum_sq += SumSquares(h, len);
+        }
+        acc_t inv_rms = 1.0f / sqrt(sum_sq / dim + eps);
+
+        for (int c = 0; c < dim; c += BLOCK) {
+            int len = (c + BLOCK <= dim) ? BLOCK : (dim - c);
+            AscendC::LocalTensor<acc_t> h = LoadSum(x_gm, r_gm, r != nullptr, c, len);
+            if (r_out != nullptr) {
+                AscendC::LocalTensor<scalar_t> r_out_local = r_out_que.AllocTensor<scalar_t>();
+                Cast(r_out_local, h, AscendC::RoundMode::CAST_NONE, len);
+                r_out_que.EnQue(r_out_local);
+                r_out_local = r_out_que.DeQue<scalar_t>();
+                AscendC::DataCopy(r_out_gm[c], r_out_local, len);
+                r_out_que.FreeTensor(r_out_local);
+            }
+            AscendC::LocalTensor<acc_t> w_f32 = LoadWeight(w_gm[c], len);
+            AscendC::Muls(h, h, inv_rms, len);
+            AscendC::Mul(h, h, w_f32, len);
+            AscendC::LocalTensor<scalar_t> y_local = y_que.AllocTensor<scalar_t>();
+            Cast(y_local, h, AscendC::RoundMode::CAST_NONE, len);
+            y_que.EnQue(y_local);
+            y_local = y_que.DeQue<scalar_t>();
+            AscendC::DataCopy(y_gm[c], y_local, len);
+            y_que.FreeTensor(y_local);
+        }
+    }
+
+    // x = rmsnorm(x) * w for an fp32 row of len <= BLOCK in ub, e.g. one head of q or k
+    __aicore__ inline void NormInPlace(AscendC::LocalTensor<acc_t>& x, __gm__ scalar_t* w, int len, acc_t eps) {
+        AscendC::GlobalTensor<scalar_t> w_gm;
+        w_gm.SetGlobalBuffer(w, len);
+        acc_t inv_rms = 1.0f / sqrt(SumSquares(x, len) / len + eps);
+        AscendC::LocalTensor<acc_t> w_f32 = LoadWeight(w_gm, len);
+        AscendC::Muls(x, x, inv_rms, len);
+        AscendC::Mul(x, x, w_f32, len);
+    }
+
+    __aicore__ inline AscendC::LocalTensor<acc_t> LoadSum(
+        AscendC::GlobalTensor<scalar_t>& x_gm, AscendC::GlobalTensor<scalar_t>& r_gm, bool has_r, int c, int len
+    ) {
+        AscendC::LocalTensor<acc_t> h = calc_buf.GetWithOffset<acc_t>(BLOCK, 0);
+        AscendC::LocalTensor<acc_t> r_f32 = calc_buf.GetWithOffset<acc_t>(BLOCK, 2 * BLOCK * sizeof(acc_t));
+        AscendC::LocalTensor<scalar_t> x_copy = x_que.AllocTensor<scalar_t>();
+        AscendC::DataCopy(x_copy, x_gm[c], len);
+        x_que.EnQue(x_copy);
+        if (has_r) {
+            AscendC::LocalTensor<scalar_t> r_copy = r_que.AllocTensor<scalar_t>();
+            AscendC::DataCopy(r_copy, r_gm[c], len);
+            r_que.EnQue(r_copy);
+        }
+        AscendC::LocalTensor<scalar_t> x_local = x_que.DeQue<scalar_t>();
+        Cast(h, x_local, AscendC::RoundMode::CAST_NONE, len);
+        x_que.FreeTensor(x_local);
+        if (has_r) {
+            AscendC::LocalTensor<scalar_t> r_local = r_que.DeQue<scalar_t>();
+            Cast(r_f32, r_local, AscendC::RoundMode::CAST_NONE, len);
+            AscendC::Add(h, h, r_f32, len);
+            r_que.FreeTensor(r_local);
+        }
+        return h;
+    }
+
+    __aicore__ inline AscendC::LocalTensor<acc_t> LoadWeight(const AscendC::GlobalTensor<scalar_t>& w_gm, int len) {
+        AscendC::LocalTensor<acc_t> w_f32 = calc_buf.GetWithOffset<acc_t>(BLOCK, BLOCK * sizeof(acc_t));
+        AscendC::LocalTensor<scalar_t> w_copy = w_que.AllocTensor<scalar_t>();
+        AscendC::DataCopy(w_copy, w_gm, len);
+        w_que.EnQue(w_copy);
+        AscendC::LocalTensor<scalar_t> w_local = w_que.DeQue<scalar_t>();
+        Cast(w_f32, w_local, AscendC::RoundMode::CAST_NONE, len);
+        w_que.FreeTensor(w_local);
+        return w_f32;
+    }
+
+    __aicore__ inline acc_t SumSquares(AscendC::LocalTensor<acc_t>& x, int len) {
+        AscendC::LocalTensor<acc_t> sq = calc_buf.GetWithOffset<acc_t>(BLOCK, 2 * BLOCK * sizeof(acc_t));
+        AscendC::LocalTensor<acc_t> work = calc_buf.GetWithOffset<acc_t>(BLOCK, 3 * BLOCK * sizeof(acc_t));
+        AscendC::LocalTensor<acc_t> reduced = calc_buf.GetWithOffset<acc_t>(8, 4 * BLOCK * sizeof(acc_t));
+        AscendC::Mul(sq, x, x, len);
+        AscendC::ReduceSum(reduced, sq, work, len);
+        // vector writes -> scalar reads
+        event_t event_id = static_cast<event_t>(pipe->FetchEventID(AscendC::HardEvent::V_S));
+        AscendC::SetFlag<AscendC::HardEvent::V_S>(event_id);
+        AscendC::WaitFlag<AscendC::HardEvent::V_S>(event_id);
+        return reduced.GetValue(0);
+    }
+};
+
+// gm writes of this core -> gm reads of this core, e.g. a matmul input written by the vector unit
+__aicore__ inline void SyncGmWriteToRead(AscendC::TPipe* pipe) {
+    event_t event_id = static_cast<event_t>(pipe->FetchEventID(AscendC::HardEvent::MTE3_MTE2));
+    AscendC::SetFlag<AscendC::HardEvent::MTE3_MTE2>(event_id);
+    AscendC::WaitFlag<AscendC::HardEvent::MTE3_MTE2>(event_id);
+}
+
+#endif
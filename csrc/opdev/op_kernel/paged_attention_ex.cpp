@@ -1,9 +1,12 @@
 #include "kernel_operator.h"
 
-template<typename scalar_t, typename acc_t>
+// group_size is padded to a multiple of BLOCK_M (m_pad) for the cube, padded q rows are zero
+// and padded o rows are never written back, so any group_size in [1, 64] works
+template<typename scalar_t, typename acc_t, bool KV_QUANT = false>
 class PagedAttention {
 public:
     static constexpr int BLOCK_M = 16;
+    static constexpr float MASK_VALUE = -1e30f;
 
     AscendC::TPipe pipe;
     AscendC::TQue<AscendC::QuePosition::A1, 1> q_a1_que, p_a1_que;
@@ -13,13 +16,29 @@ public:
     AscendC::TQue<AscendC::QuePosition::CO1, 1> s_co1_que, o_co1_que;
     AscendC::TQue<AscendC::QuePosition::CO2, 1> s_co2_que, o_co2_que;
 
+    AscendC::TQue<AscendC::QuePosition::VECIN, 1> q_que;
     AscendC::TQue<AscendC::QuePosition::VECCALC, 1> s_que;
     AscendC::TQue<AscendC::QuePosition::VECCALC, 1> p_f32_que;
-    AscendC::TQue<AscendC::QuePosition::VECOUT, 1> p_que, o_que;
+    AscendC::TQue<AscendC::QuePosition::VECOUT, 1> q_pad_que, p_que, o_que;
 
     AscendC::TBuf<AscendC::QuePosition::VECCALC> row_max_buf;
     AscendC::TBuf<AscendC::QuePosition::VECCALC> row_sum_buf;
     AscendC::TBuf<AscendC::QuePosition::VECCALC> o_scale_buf;
+    AscendC::TBuf<AscendC::QuePosition::VECCALC> cur_max_buf;
+    AscendC::TBuf<AscendC::QuePosition::VECCALC> cur_sum_buf;
+    AscendC::TBuf<AscendC::QuePosition::VECCALC> row_brc_buf;
+    AscendC::TBuf<AscendC::QuePosition::VECCALC> mask_buf;
+    AscendC::TBuf<AscendC::QuePosition::VECCALC> reduce_buf;
+    AscendC::TBuf<AscendC::QuePosition::VECCALC> o_acc_buf;
+    // alibi: slope of every q row and the key positions of a page relative to the query
+    AscendC::TBuf<AscendC::QuePosition::VECCALC> slope_buf;
+    AscendC::TBuf<AscendC::QuePosition::VECCALC> ramp_buf;
+    AscendC::TBuf<AscendC::QuePosition::VECCALC> pos_buf;
+
+    // int8 kv cache, a page is dequantized in ub before moving to b1
+    AscendC::TQue<AscendC::QuePosition::VECIN, 1> kv_q_que, kv_scale_que;
+    AscendC::TQue<AscendC::QuePosition::VECOUT, 1> kv_dq_que;
+    AscendC::TBuf<AscendC::QuePosition::VECCALC> scale_brc_buf;
 
     AscendC::GlobalTensor<scalar_t> q_gm;
     AscendC::GlobalTensor<scalar_t> key_cache_gm;
@@ -27,9 +46,17 @@ public:
     AscendC::GlobalTensor<int32_t> block_tables_gm;
     AscendC::GlobalTensor<int32_t> context_lens_gm;
     AscendC::GlobalTensor<scalar_t> o_gm;
+    AscendC::GlobalTensor<int8_t> key_cache_q_gm;
+    AscendC::GlobalTensor<int8_t> value_cache_q_gm;
+    AscendC::GlobalTensor<scalar_t> key_scale_gm;
+    AscendC::GlobalTensor<scalar_t> value_scale_gm;
+    AscendC::GlobalTensor<float> alibi_slopes_gm;
+    AscendC::GlobalTensor<int32_t> window_size_gm;
 
     // current batch id and kv head id
     int batch_id;
+    // number of draft tokens after the query row, they are masked out
+    int query_offset;
     int kv_head_id;
 
     uint32_t num_heads;
@@ -37,6 +64,7 @@ public:
     uint32_t head_dim;
     uint32_t page_size;
     uint32_t group_size;
+    uint32_t m_pad;
     uint32_t max_page_num_per_seq;
     float scale;
     float scale_log2;
@@ -47,6 +75,10 @@ public:
     int64_t stride_kv_p;
     int64_t stride_kv_h;
     int64_t stride_tables_bs;
+    int64_t stride_scale_p;
+
+    bool has_alibi = false;
+    int32_t window_size = 0;
 
     __aicore__ inline PagedAttention(
         uint32_t num_heads,
@@ -62,6 +94,7 @@ public:
         this->head_dim = head_dim;
         this->page_size = page_size;
         this->group_size = num_heads / num_kv_heads;
+        this->m_pad = (group_size + BLOCK_M - 1) / BLOCK_M * BLOCK_M;
         this->max_page_num_per_seq = max_page_num_per_seq;
         this->scale = scale;
         this->scale_log2 = scale_log2;
@@ -78,7 +111,8 @@ public:
         int64_t stride_qo_d,
         int64_t stride_kv_p,
         int64_t stride_kv_h,
-        int64_t stride_tables_bs
+        int64_t stride_tables_bs,
+        int num_query_tokens
     ) {
         this->stride_qo_bs = stride_qo_bs;
         this->stride_qo_h = stride_qo_h;
@@ -88,101 +122,214 @@ public:
         this->stride_tables_bs = stride_tables_bs;
 
         int core_id = AscendC::GetBlockIdx();
-        batch_id = core_id / num_kv_heads;
+        // q rows of one sequence are its last num_query_tokens positions, each row sees the kv up to itself
+        int row_id = core_id / num_kv_heads;
+        batch_id = row_id / num_query_tokens;
+        query_offset = num_query_tokens - 1 - row_id % num_query_tokens;
         kv_head_id = core_id % num_kv_heads;
 
-        q_gm.SetGlobalBuffer(q + batch_id * stride_qo_bs + kv_head_id * group_size * stride_qo_h, group_size * head_dim);
-        o_gm.SetGlobalBuffer(o + batch_id * stride_qo_bs + kv_head_id * group_size * stride_qo_h, group_size * head_dim);
+        q_gm.SetGlobalBuffer(q + row_id * stride_qo_bs + kv_head_id * group_size * stride_qo_h, group_size * head_dim);
+        o_gm.SetGlobalBuffer(o + row_id * stride_qo_bs + kv_head_id * group_size * stride_qo_h, group_size * head_dim);
         key_cache_gm.SetGlobalBuffer(key_cache + kv_head_id * stride_kv_h);
         value_cache_gm.SetGlobalBuffer(value_cache + kv_head_id * stride_kv_h);
         block_tables_gm.SetGlobalBuffer(block_tables + batch_id * stride_tables_bs, max_page_num_per_seq);
         context_lens_gm.SetGlobalBuffer(context_lens + batch_id, 1);
 
-        pipe.InitBuffer(q_a1_que, 1, group_size * head_dim * sizeof(scalar_t));
-        pipe.InitBuffer(q_a2_que, 1, BLOCK_M * head_dim * sizeof(scalar_t));
+        pipe.InitBuffer(q_que, 1, group_size * head_dim * sizeof(scalar_t));
+        pipe.InitBuffer(q_pad_que, 1, m_pad * head_dim * sizeof(scalar_t));
+        pipe.InitBuffer(q_a1_que, 1, m_pad * head_dim * sizeof(scalar_t));
+        pipe.InitBuffer(q_a2_que, 1, m_pad * head_dim * sizeof(scalar_t));
         pipe.InitBuffer(k_b1_que, 1, page_size * head_dim * sizeof(scalar_t));
         pipe.InitBuffer(k_b2_que, 1, page_size * head_dim * sizeof(scalar_t));
-        pipe.InitBuffer(s_co1_que, 1, BLOCK_M * page_size * sizeof(acc_t));
-        pipe.InitBuffer(s_co2_que, 1, group_size * page_size * sizeof(acc_t));
+        pipe.InitBuffer(s_co1_que, 1, m_pad * page_size * sizeof(acc_t));
+        pipe.InitBuffer(s_co2_que, 1, m_pad * page_size * sizeof(acc_t));
 
-        pipe.InitBuffer(p_a1_que, 1, group_size * page_size * sizeof(scalar_t));
-        pipe.InitBuffer(p_a2_que, 1, BLOCK_M * page_size * sizeof(scalar_t));
+        pipe.InitBuffer(p_a1_que, 1, m_pad * page_size * sizeof(scalar_t));
+        pipe.InitBuffer(p_a2_que, 1, m_pad * page_size * sizeof(scalar_t));
         pipe.InitBuffer(v_b1_que, 1, page_size * head_dim * sizeof(scalar_t));
         pipe.InitBuffer(v_b2_que, 1, page_size * head_dim * sizeof(scalar_t));
-        pipe.InitBuffer(o_co1_que, 1, BLOCK_M * head_dim * sizeof(acc_t));
-        pipe.InitBuffer(o_co2_que, 1, group_size * head_dim * sizeof(acc_t));
-
-        pipe.InitBuffer(s_que, 1, group_size * page_size * sizeof(acc_t));
-        pipe.InitBuffer(p_f32_que, 1, group_size * page_size * sizeof(acc_t));
-        pipe.InitBuffer(p_que, 1, group_size * page_size * sizeof(scalar_t));
-        pipe.InitBuffer(o_que, 1, group_size * head_dim * sizeof(scalar_t));
+        pipe.InitBuffer(o_co1_que, 1, m_pad * head_dim * sizeof(acc_t));
+        pipe.InitBuffer(o_co2_que, 1, m_pad * head_dim * sizeof(acc_t));
+
+        pipe.InitBuffer(s_que, 1, m_pad * page_size * sizeof(acc_t));
+        pipe.InitBuffer(p_f32_que, 1, m_pad * page_size * sizeof(acc_t));
+        pipe.InitBuffer(p_que, 1, m_pad * page_size * sizeof(scalar_t));
+        pipe.InitBuffer(o_que, 1, m_pad * head_dim * sizeof(scalar_t));
+
+        pipe.InitBuffer(row_max_buf, m_pad * sizeof(acc_t));
+        pipe.InitBuffer(row_sum_buf, m_pad * sizeof(acc_t));
+        pipe.InitBuffer(o_scale_buf, m_pad * sizeof(acc_t));
+        pipe.InitBuffer(cur_max_buf, m_pad * sizeof(acc_t));
+        pipe.InitBuffer(cur_sum_buf, m_pad * sizeof(acc_t));
+        pipe.InitBuffer(row_brc_buf, m_pad * 16 * sizeof(acc_t));
+        pipe.InitBuffer(mask_buf, page_size * sizeof(acc_t));
+        pipe.InitBuffer(reduce_buf, 2 * page_size * sizeof(acc_t));
+        pipe.InitBuffer(o_acc_buf, m_pad * head_dim * sizeof(acc_t));
+    }
+    __aicore__ inline void InitQuant(
+        __gm__ int8_t *key_cache,
+        __gm__ int8_t *value_cache,
+        __gm__ scalar_t *key_scale,
+        __gm__ scalar_t *value_scale,
+        int64_t stride_scale_p
+    ) {
+        // key_scale/value_scale: [num_pages, num_kv_heads, page_size]
+        this->stride_scale_p = stride_scale_p;
+        key_cache_q_gm.SetGlobalBuffer(key_cache + kv_head_id * stride_kv_h);
+        value_cache_q_gm.SetGlobalBuffer(value_cache + kv_head_id * stride_kv_h);
+        key_scale_gm.SetGlobalBuffer(key_scale + kv_head_id * page_size);
+        value_scale_gm.SetGlobalBuffer(value_scale + kv_head_id * page_size);
+
+        pipe.InitBuffer(kv_q_que, 1, page_size * head_dim * sizeof(int8_t));
+        pipe.InitBuffer(kv_scale_que, 1, page_size * sizeof(scalar_t));
+        pipe.InitBuffer(kv_dq_que, 1, page_size * head_dim * sizeof(scalar_t));
+        pipe.InitBuffer(scale_brc_buf, page_size * 16 * sizeof(scalar_t));
+    }
 
-        pipe.InitBuffer(row_max_buf, group_size * sizeof(acc_t));
-        pipe.InitBuffer(row_sum_buf, group_size * sizeof(acc_t));
-        pipe.InitBuffer(o_scale_buf, group_size * sizeof(acc_t));
+    __aicore__ inline void InitMask(__gm__ float *alibi_slopes, __gm__ int32_t *window_size) {
+        // alibi_slopes: [num_heads], window_size: [1], both optional
+        if (window_size != nullptr) {
+            window_size_gm.SetGlobalBuffer(window_size, 1);
+            this->window_size = window_size_gm.GetValue(0);
+        }
+        if (alibi_slopes != nullptr) {
+            has_alibi = true;
+            alibi_slopes_gm.SetGlobalBuffer(alibi_slopes + kv_head_id * group_size, group_size);
+            pipe.InitBuffer(slope_buf, m_pad * sizeof(acc_t));
+            pipe.InitBuffer(ramp_buf, page_size * sizeof(acc_t));
+            pipe.InitBuffer(pos_buf, page_size * sizeof(acc_t));
+            AscendC::LocalTensor<acc_t> slopes = slope_buf.Get<acc_t>(m_pad);
+            AscendC::LocalTensor<acc_t> ramp = ramp_buf.Get<acc_t>(page_size);
+            for (int i = 0; i < group_size; ++i) {
+                slopes.SetValue(i, alibi_slopes_gm.GetValue(i));
+            }
+            for (int j = 0; j < page_size; ++j) {
+                ramp.SetValue(j, (acc_t)j);
+            }
+            SyncSToV();
+        }
     }
 
     __aicore__ inline void Process() {
-        LoadQ();
-        AscendC::LocalTensor<scalar_t> q_a2 = q_a2_que.DeQue<scalar_t>();
-
-        int32_t seq_len = context_lens_gm.GetValue(0);
+        int32_t seq_len = context_lens_gm.GetValue(0) - query_offset;
         int cur_page_num = (seq_len + page_size - 1) / page_size;
-        AscendC::LocalTensor<acc_t> row_max = row_max_buf.Get<acc_t>(group_size);
-        AscendC::LocalTensor<acc_t> row_sum = row_sum_buf.Get<acc_t>(group_size);
-        AscendC::LocalTensor<acc_t> o_scale = o_scale_buf.Get<acc_t>(group_size);
+        // sliding window: keys [start, seq_len) are visible, earlier pages are skipped
+        int start = (window_size > 0 && seq_len > window_size) ? seq_len - window_size : 0;
+        int first_page = start / page_size;
+        AscendC::LocalTensor<acc_t> row_max = row_max_buf.Get<acc_t>(m_pad);
+        AscendC::LocalTensor<acc_t> row_sum = row_sum_buf.Get<acc_t>(m_pad);
+        AscendC::LocalTensor<acc_t> o_scale = o_scale_buf.Get<acc_t>(m_pad);
+        AscendC::LocalTensor<acc_t> o_acc = o_acc_buf.Get<acc_t>(m_pad * head_dim);
         InitStates(row_max, row_sum, o_scale);
+        Duplicate(o_acc, 0.0f, m_pad * head_dim);
 
-        AscendC::LocalTensor<acc_t> o_co1 = o_co1_que.AllocTensor<acc_t>();
-        for (int i = 0; i < cur_page_num; i++) {
+        LoadQ();
+        AscendC::LocalTensor<scalar_t> q_a2 = q_a2_que.DeQue<scalar_t>();
+        for (int i = first_page; i < cur_page_num; i++) {
             int32_t page_id = block_tables_gm.GetValue(i);
+            // tokens [valid_start, valid_end) of the page are valid
+            int valid_start = (i == first_page) ? start - i * page_size : 0;
+            int valid_end = seq_len - i * page_size;
+            valid_end = (valid_end < page_size) ? valid_end : page_size;
             LoadK(page_id);
             LoadV(page_id);
-        //     // gemm qk
-        //     MmaQK(q_a2);
-        //     CopySFromCO1ToCO2<true>();
-        //     // softmax
-        //     Softmax<true>(row_max, row_sum, o_scale);
-        //     LoadP();
-        //     // gemm pv
-        //     MmaPV(o_co1, true);
+            // gemm qk
+            MmaQK(q_a2);
+            CopySFromCO1ToCO2<true>();
+            // softmax
+            // key position relative to the query at seq_len - 1, for alibi
+            int rel_pos = i * page_size - (seq_len - 1);
+            Softmax<true>(row_max, row_sum, o_scale, valid_start, valid_end, rel_pos);
+            LoadP();
+            // gemm pv
+            MmaPV();
+            UpdateO(o_acc, o_scale);
         }
         q_a2_que.FreeTensor(q_a2);
-        o_co1_que.EnQue(o_co1);
-        // StoreO();
+        StoreO(o_acc, row_sum);
     }
     __aicore__ inline void InitStates(
         AscendC::LocalTensor<acc_t>& row_max,
         AscendC::LocalTensor<acc_t>& row_sum,
         AscendC::LocalTensor<acc_t>& o_scale
     ) {
-        Duplicate(row_max, -5e4f, group_size);
-        Duplicate(row_sum, 0.0f, group_size);
-        Duplicate(o_scale, 1.0f, group_size);
+        Duplicate(row_max, -5e4f, m_pad);
+        Duplicate(row_sum, 0.0f, m_pad);
+        Duplicate(o_scale, 1.0f, m_pad);
+    }
+
+    // vector results -> scalar reads
+    __aicore__ inline void SyncVToS() {
+        event_t event_id = static_cast<event_t>(pipe.FetchEventID(AscendC::HardEvent::V_S));
+        AscendC::SetFlag<AscendC::HardEvent::V_S>(event_id);
+        AscendC::WaitFlag<AscendC::HardEvent::V_S>(event_id);
+    }
+    // scalar writes -> vector reads
+    __aicore__ inline void SyncSToV() {
+        event_t event_id = static_cast<event_t>(pipe.FetchEventID(AscendC::HardEvent::S_V));
+        AscendC::SetFlag<AscendC::HardEvent::S_V>(event_id);
+        AscendC::WaitFlag<AscendC::HardEvent::S_V>(event_id);
+    }
+    // gm -> ub copies -> scalar reads
+    __aicore__ inline void SyncMTE2ToS() {
+        event_t event_id = static_cast<event_t>(pipe.FetchEventID(AscendC::HardEvent::MTE2_S));
+        AscendC::SetFlag<AscendC::HardEvent::MTE2_S>(event_id);
+        AscendC::WaitFlag<AscendC::HardEvent::MTE2_S>(event_id);
+    }
+
+    // x: nz [cols / 16, m_pad, 16], multiply row i by factor.GetValue(i)
+    __aicore__ inline void MulRowsNz(AscendC::LocalTensor<acc_t>& x, AscendC::LocalTensor<acc_t>& factor, int cols) {
+        AscendC::LocalTensor<acc_t> row_brc = row_brc_buf.Get<acc_t>(m_pad * 16);
+        SyncVToS();
+        for (int r = 0; r < m_pad; ++r) {
+            AscendC::Duplicate(row_brc[r * 16], factor.GetValue(r), 16);
+        }
+        for (int c = 0; c < cols / 16; ++c) {
+            AscendC::Mul(x[c * m_pad * 16], x[c * m_pad * 16], row_brc, m_pad * 16);
+        }
     }
+
     __aicore__ inline void LoadQ() {
-        // gm -> a1
+        // gm -> ub, zero the padded rows
+        {
+            AscendC::LocalTensor<scalar_t> q = q_que.AllocTensor<scalar_t>();
+            AscendC::DataCopy(q, q_gm, group_size * head_dim);
+            q_que.EnQue(q);
+        }
+        {
+            AscendC::LocalTensor<scalar_t> q = q_que.DeQue<scalar_t>();
+            AscendC::LocalTensor<scalar_t> q_pad = q_pad_que.AllocTensor<scalar_t>();
+            if (m_pad > group_size) {
+                AscendC::Duplicate(q_pad[group_size * head_dim], (scalar_t)0, (m_pad - group_size) * head_dim);
+            }
+            AscendC::DataCopy(q_pad, q, group_size * head_dim);
+            q_pad_que.EnQue(q_pad);
+            q_que.FreeTensor(q);
+        }
+        // ub -> a1
         {
+            AscendC::LocalTensor<scalar_t> q_pad = q_pad_que.DeQue<scalar_t>();
             AscendC::LocalTensor<scalar_t> q_a1 = q_a1_que.AllocTensor<scalar_t>();
             // q: nd -> nz
-            for (int i = 0; i < group_size / 16; ++i) {
+            for (int i = 0; i < head_dim / 16; ++i) {
                 int src_offset = i * 16;
-                int dst_offset = i * 16 * group_size;
-                AscendC::DataCopy(q_a1[dst_offset], q_gm[src_offset], { (uint16_t)group_size, 1, uint16_t(head_dim / 16 - 1), 0 });
+                int dst_offset = i * 16 * m_pad;
+                AscendC::DataCopy(q_a1[dst_offset], q_pad[src_offset], { (uint16_t)m_pad, 1, uint16_t(head_dim / 16 - 1), 0 });
             }
             q_a1_que.EnQue(q_a1);
+            q_pad_que.FreeTensor(q_pad);
         }
         // a1 -> a2
         {
             AscendC::LocalTensor<scalar_t> q_a2 = q_a2_que.AllocTensor<scalar_t>();
             AscendC::LocalTensor<scalar_t> q_a1 = q_a1_que.DeQue<scalar_t>();
             // q: nz -> zz
-            for (int i = 0; i < group_size / 16; ++i) {
+            for (int i = 0; i < m_pad / 16; ++i) {
                 int src_offset = i * 16 * 16;
                 int dst_offset = i * 16 * head_dim;
                 AscendC::LoadData2dParams params;
                 params.repeatTimes = head_dim / 16;
-                params.srcStride = group_size / 16;
+                params.srcStride = m_pad / 16;
                 params.ifTranspose = false;
                 AscendC::LoadData(q_a2[dst_offset], q_a1[src_offset], params);
             }
@@ -190,10 +337,56 @@ public:
             q_a1_que.FreeTensor(q_a1);
         }
     }
+
+    __aicore__ inline void DequantPage(
+        AscendC::GlobalTensor<int8_t>& cache_gm,
+        AscendC::GlobalTensor<scalar_t>& scale_gm,
+        int32_t page_id
+    ) {
+        int page_offset = page_id * stride_kv_p;
+        int scale_offset = page_id * stride_scale_p;
+        // gm -> ub
+        {
+            AscendC::LocalTensor<int8_t> kv_q = kv_q_que.AllocTensor<int8_t>();
+            AscendC::LocalTensor<scalar_t> kv_scale = kv_scale_que.AllocTensor<scalar_t>();
+            AscendC::DataCopy(kv_q, cache_gm[page_offset], {1, (uint16_t)(head_dim * page_size / 32), 0, 0});
+            AscendC::DataCopy(kv_scale, scale_gm[scale_offset], {1, (uint16_t)(page_size / 16), 0, 0});
+            kv_q_que.EnQue(kv_q);
+            kv_scale_que.EnQue(kv_scale);
+        }
+        // int8 -> fp16, then scale each token
+        {
+            // page: [head_dim / 16, page_size, 16], token t is row t of every [page_size, 16] block
+            AscendC::LocalTensor<int8_t> kv_q = kv_q_que.DeQue<int8_t>();
+            AscendC::LocalTensor<scalar_t> kv_scale = kv_scale_que.DeQue<scalar_t>();
+            AscendC::LocalTensor<scalar_t> kv_dq = kv_dq_que.AllocTensor<scalar_t>();
+            AscendC::LocalTensor<scalar_t> scale_brc = scale_brc_buf.Get<scalar_t>(page_size * 16);
+            SyncMTE2ToS();
+            for (int t = 0; t < page_size; ++t) {
+                AscendC::Duplicate(scale_brc[t * 16], kv_scale.GetValue(t), 16);
+            }
+            AscendC::Cast(kv_dq, kv_q, AscendC::RoundMode::CAST_NONE, page_size * head_dim);
+            for (int i = 0; i < head_dim / 16; ++i) {
+                AscendC::Mul(kv_dq[i * page_size * 16], kv_dq[i * page_size * 16], scale_brc, page_size * 16);
+            }
+            kv_dq_que.EnQue(kv_dq);
+            kv_q_que.FreeTensor(kv_q);
+            kv_scale_que.FreeTensor(kv_scale);
+        }
+    }
+
     __aicore__ inline void LoadK(int32_t page_id) {
         int page_offset = page_id * stride_kv_p;
         // gm -> b1
-        {
+        if (KV_QUANT) {
+            // ub -> b1, same layout as the fp16 page
+            DequantPage(key_cache_q_gm, key_scale_gm, page_id);
+            AscendC::LocalTensor<scalar_t> k_dq = kv_dq_que.DeQue<scalar_t>();
+            AscendC::LocalTensor<scalar_t> k_b1 = k_b1_que.AllocTensor<scalar_t>();
+            AscendC::DataCopy(k_b1, k_dq, {1, (uint16_t)(head_dim * page_size / 16), 0, 0});
+            k_b1_que.EnQue(k_b1);
+            kv_dq_que.FreeTensor(k_dq);
+        } else {
             // k: [head_dim / 16, page_size, 16]
             // already zn
             AscendC::LocalTensor<scalar_t> k_b1 = k_b1_que.AllocTensor<scalar_t>();
@@ -221,15 +414,27 @@ public:
             // k: [head_dim / 16, page_size, 16]
             // nz -> zz
             AscendC::LocalTensor<scalar_t> v_b1 = v_b1_que.AllocTensor<scalar_t>();
-            for (int i = 0; i < page_size / 16; ++i) {
-                int src_offset = i * 16 * 16;
-                int dst_offset = i * 16 * head_dim;
-                AscendC::DataCopyParams params;
-                params.blockCount = head_dim / 16;
-                params.blockLen = 16; // 16 * 16 * 2B = 512B = 32B * 16
-                params.srcStride = (page_size / 16 - 1) * 16;
-                params.dstStride = 0;
-                AscendC::DataCopy(v_b1[dst_offset], value_cache_gm[page_offset + src_offset], params);
+            AscendC::DataCopyParams params;
+            params.blockCount = head_dim / 16;
+            params.blockLen = 16; // 16 * 16 * 2B = 512B = 32B * 16
+            params.srcStride = (page_size / 16 - 1) * 16;
+            params.dstStride = 0;
+            if (KV_QUANT) {
+                // dequantized page in ub has the same layout, copy ub -> b1 instead of gm -> b1
+                DequantPage(value_cache_q_gm, value_scale_gm, page_id);
+                AscendC::LocalTensor<scalar_t> v_dq = kv_dq_que.DeQue<scalar_t>();
+                for (int i = 0; i < page_size / 16; ++i) {
+                    int src_offset = i * 16 * 16;
+                    int dst_offset = i * 16 * head_dim;
+                    AscendC::DataCopy(v_b1[dst_offset], v_dq[src_offset], params);
+                }
+                kv_dq_que.FreeTensor(v_dq);
+            } else {
+                for (int i = 0; i < page_size / 16; ++i) {
+                    int src_offset = i * 16 * 16;
+                    int dst_offset = i * 16 * head_dim;
+                    AscendC::DataCopy(v_b1[dst_offset], value_cache_gm[page_offset + src_offset], params);
+                }
             }
             v_b1_que.EnQue(v_b1);
         }
@@ -248,14 +453,15 @@ public:
         }
     }
 
+
     __aicore__ inline void MmaQK(AscendC::LocalTensor<scalar_t>& q_a2) {
-        // q_a2: [BLOCK_M, head_dim]
+        // q_a2: [m_pad, head_dim]
         // k_b2: [page_size, head_dim]
-        // s_co1: [BLOCK_M, page_size]
+        // s_co1: [m_pad, page_size]
         AscendC::LocalTensor<scalar_t> k_b2 = k_b2_que.DeQue<scalar_t>();
         AscendC::LocalTensor<acc_t> s_co1 = s_co1_que.AllocTensor<acc_t>();
         AscendC::MmadParams params;
-        params.m = BLOCK_M;
+        params.m = m_pad;
         params.n = page_size;
         params.k = head_dim;
         params.cmatrixInitVal = true;
@@ -270,25 +476,22 @@ public:
         AscendC::LocalTensor<acc_t> s_co2 = s_co2_que.AllocTensor<acc_t>();
         if (NzToNd) {
             // nz -> nd
-            for (int i = 0; i < head_dim / 16; ++i) {
-                int src_offset = i * group_size * 16;
+            for (int i = 0; i < page_size / 16; ++i) {
+                int src_offset = i * m_pad * 16;
                 int dst_offset = i * 16;
                 // 32B
                 AscendC::DataCopyParams params;
-                params.blockCount = group_size;
+                params.blockCount = m_pad;
                 params.blockLen = 2; // 16 * f32 = 64B = 2 * 32B
                 params.srcStride = 0;
-                params.dstStride = (head_dim / 16 - 1) * 2;
+                params.dstStride = (page_size / 16 - 1) * 2;
                 AscendC::DataCopy(s_co2[dst_offset], s_co1[src_offset], params);
-                // AscendC::DataCopyEnhancedParams enhanced_params;
-                // enhanced_params.blockMode = AscendC::BlockMode::BLOCK_MODE_VECTOR;
-                // AscendC::DataCopy(s_co2[dst_offset], s_co1[src_offset], params, enhanced_params);
             }
         } else {
             // nz -> nz
             AscendC::DataCopyParams params;
             params.blockCount = 1;
-            params.blockLen = (group_size * page_size) / (16 * 16);
+            params.blockLen = (m_pad * page_size) / (16 * 16);
             AscendC::DataCopyEnhancedParams enhanced_params;
             enhanced_params.blockMode = AscendC::BlockMode::BLOCK_MODE_MATRIX;
             AscendC::DataCopy(s_co2, s_co1, params, enhanced_params);
@@ -297,13 +500,31 @@ public:
         s_co1_que.FreeTensor(s_co1);
     }
 
+    __aicore__ inline void BuildMask(int valid_start, int valid_end) {
+        // additive mask of one page row, tokens outside [valid_start, valid_end) are masked
+        AscendC::LocalTensor<acc_t> mask = mask_buf.Get<acc_t>(page_size);
+        SyncVToS();
+        for (int j = 0; j < page_size; ++j) {
+            mask.SetValue(j, (j >= valid_start && j < valid_end) ? 0.0f : MASK_VALUE);
+        }
+        SyncSToV();
+    }
+
+    // online softmax over one page, s: nd [m_pad, page_size]
     template<bool isNd>
-    __aicore__ inline void Softmax(AscendC::LocalTensor<acc_t>& row_max, AscendC::LocalTensor<acc_t>& row_sum, AscendC::LocalTensor<acc_t>& o_scale) {
+    __aicore__ inline void Softmax(
+        AscendC::LocalTensor<acc_t>& row_max,
+        AscendC::LocalTensor<acc_t>& row_sum,
+        AscendC::LocalTensor<acc_t>& o_scale,
+        int valid_start,
+        int valid_end,
+        int rel_pos
+    ) {
         // copy co2 -> veccalc
         {
             AscendC::LocalTensor<acc_t> s_co2 = s_co2_que.DeQue<acc_t>();
             AscendC::LocalTensor<acc_t> s = s_que.AllocTensor<acc_t>();
-            AscendC::DataCopy(s, s_co2, {1, (uint16_t)(group_size * page_size / 16), 0, 0});
+            AscendC::DataCopy(s, s_co2, {1, (uint16_t)(m_pad * page_size * sizeof(acc_t) / 32), 0, 0});
             s_que.EnQue(s);
             s_co2_que.FreeTensor(s_co2);
         }
@@ -312,31 +533,67 @@ public:
         {
             AscendC::LocalTensor<acc_t> s = s_que.DeQue<acc_t>();
             AscendC::LocalTensor<acc_t> p_f32 = p_f32_que.AllocTensor<acc_t>();
-            /*
-            // s: [group_size, page_size]
+            AscendC::LocalTensor<acc_t> cur_max = cur_max_buf.Get<acc_t>(m_pad);
+            AscendC::LocalTensor<acc_t> cur_sum = cur_sum_buf.Get<acc_t>(m_pad);
+            AscendC::LocalTensor<acc_t> mask = mask_buf.Get<acc_t>(page_size);
+            AscendC::LocalTensor<acc_t> reduced = reduce_buf.Get<acc_t>(2 * page_size);
+            AscendC::LocalTensor<acc_t> work = reduced[page_size];
+            bool masked = valid_start > 0 || valid_end < page_size;
+            if (masked) {
+                BuildMask(valid_start, valid_end);
+            }
+            AscendC::LocalTensor<acc_t> pos;
+            AscendC::LocalTensor<acc_t> slopes;
+            if (has_alibi) {
+                // pos[j] = i * page_size + j - (seq_len - 1) <= 0
+                pos = pos_buf.Get<acc_t>(page_size);
+                slopes = slope_buf.Get<acc_t>(m_pad);
+                AscendC::Adds(pos, ramp_buf.Get<acc_t>(page_size), (acc_t)rel_pos, page_size);
+            }
+            // padded rows keep p = 0 and their running states
+            Duplicate(p_f32, 0.0f, m_pad * page_size);
+            Duplicate(cur_sum, 0.0f, m_pad);
+            AscendC::DataCopy(cur_max, row_max, m_pad);
+
+            // rowmax
             for (int i = 0; i < group_size; ++i) {
-                // rowmax
-                acc_t prev_max = row_max.GetValue(i);
-                acc_t curr_max = prev_max;
-                for (int j = 0; j < page_size; ++j) {
-                    auto val = s.GetValue(i * page_size + j);
-                    curr_max = max(curr_max, val);
+                AscendC::LocalTensor<acc_t> s_row = s[i * page_size];
+                AscendC::Muls(s_row, s_row, scale, page_size);
+                if (has_alibi) {
+                    // s += slope * pos
+                    AscendC::Axpy(s_row, pos, slopes.GetValue(i), page_size);
                 }
-
-                // exp
-                acc_t scores_scale = exp(prev_max * scale - curr_max);
-                o_scale.SetValue(i, scores_scale);
-                auto prev_sum = row_sum.GetValue(i);
-                row_sum.SetValue(i, prev_sum * scores_scale);
-                row_max.SetValue(i, curr_max);
-
-                for (int j = 0; j < page_size; ++j) {
-                    auto val = s.GetValue(i * page_size + j);
-                    p_f32.SetValue(i * page_size + j, exp(val - curr_max));
+                if (masked) {
+                    AscendC::Add(s_row, s_row, mask, page_size);
                 }
+                AscendC::ReduceMax(reduced, s_row, work, page_size, false);
+                SyncVToS();
+                acc_t page_max = reduced.GetValue(0);
+                acc_t prev_max = row_max.GetValue(i);
+                cur_max.SetValue(i, page_max > prev_max ? page_max : prev_max);
+            }
+            SyncSToV();
+            // o_scale = exp(prev_max - cur_max)
+            AscendC::Sub(o_scale, row_max, cur_max, m_pad);
+            AscendC::Exp(o_scale, o_scale, m_pad);
+            AscendC::DataCopy(row_max, cur_max, m_pad);
+
+            // exp and rowsum
+            for (int i = 0; i < group_size; ++i) {
+                AscendC::LocalTensor<acc_t> s_row = s[i * page_size];
+                AscendC::LocalTensor<acc_t> p_row = p_f32[i * page_size];
+                SyncVToS();
+                AscendC::Adds(s_row, s_row, -cur_max.GetValue(i), page_size);
+                AscendC::Exp(p_row, s_row, page_size);
+                AscendC::ReduceSum(reduced, p_row, work, page_size);
+                SyncVToS();
+                cur_sum.SetValue(i, reduced.GetValue(0));
             }
-            */
-            AscendC::DataCopy(p_f32, s, {1, (uint16_t)(group_size * page_size / 16), 0, 0});
+            SyncSToV();
+            // row_sum = row_sum * o_scale + cur_sum
+            AscendC::Mul(row_sum, row_sum, o_scale, m_pad);
+            AscendC::Add(row_sum, row_sum, cur_sum, m_pad);
+
             s_que.FreeTensor(s);
             p_f32_que.EnQue(p_f32);
         }
@@ -345,7 +602,7 @@ public:
         {
             AscendC::LocalTensor<acc_t> p_f32 = p_f32_que.DeQue<acc_t>();
             AscendC::LocalTensor<scalar_t> p = p_que.AllocTensor<scalar_t>();
-            Cast(p, p_f32, AscendC::RoundMode::CAST_NONE, group_size * page_size);
+            Cast(p, p_f32, AscendC::RoundMode::CAST_NONE, m_pad * page_size);
             p_que.EnQue(p);
             p_f32_que.FreeTensor(p_f32);
         }
@@ -358,10 +615,10 @@ public:
             // nd -> nz
             AscendC::LocalTensor<scalar_t> p = p_que.DeQue<scalar_t>();
             AscendC::LocalTensor<scalar_t> p_a1 = p_a1_que.AllocTensor<scalar_t>();
-            for (int i = 0; i < group_size / 16; ++i) {
+            for (int i = 0; i < page_size / 16; ++i) {
                 int src_offset = i * 16;
-                int dst_offset = i * 16 * group_size;
-                AscendC::DataCopy(p_a1[dst_offset], p[src_offset], { (uint16_t)group_size, 1, uint16_t(page_size / 16 - 1), 0 });
+                int dst_offset = i * 16 * m_pad;
+                AscendC::DataCopy(p_a1[dst_offset], p[src_offset], { (uint16_t)m_pad, 1, uint16_t(page_size / 16 - 1), 0 });
             }
             p_a1_que.EnQue(p_a1);
             p_que.FreeTensor(p);
@@ -371,12 +628,12 @@ public:
             // nz -> zz
             AscendC::LocalTensor<scalar_t> p_a2 = p_a2_que.AllocTensor<scalar_t>();
             AscendC::LocalTensor<scalar_t> p_a1 = p_a1_que.DeQue<scalar_t>();
-            for (int i = 0; i < group_size / 16; ++i) {
+            for (int i = 0; i < m_pad / 16; ++i) {
                 int src_offset = i * 16 * 16;
                 int dst_offset = i * 16 * page_size;
                 AscendC::LoadData2dParams params;
                 params.repeatTimes = page_size / 16;
-                params.srcStride = group_size / 16;
+                params.srcStride = m_pad / 16;
                 params.ifTranspose = false;
                 AscendC::LoadData(p_a2[dst_offset], p_a1[src_offset], params);
             }
@@ -385,20 +642,26 @@ public:
         }
     }
 
-    __aicore__ inline void MmaPV(AscendC::LocalTensor<acc_t>& o, bool zeroed) {
-        // TODO
+    __aicore__ inline void MmaPV() {
+        // p_a2: [m_pad, page_size]
+        // v_b2: [page_size, head_dim]
+        // o_co1: [m_pad, head_dim], one page, accumulated in ub by UpdateO
         AscendC::LocalTensor<scalar_t> p_a2 = p_a2_que.DeQue<scalar_t>();
         AscendC::LocalTensor<scalar_t> v_b2 = v_b2_que.DeQue<scalar_t>();
+        AscendC::LocalTensor<acc_t> o_co1 = o_co1_que.AllocTensor<acc_t>();
 
         AscendC::MmadParams params;
-        params.m = BLOCK_M;
+        params.m = m_pad;
         params.n = head_dim;
         params.k = page_size;
-        params.cmatrixInitVal = zeroed;
-        AscendC::Mmad(o, p_a2, v_b2, params);
+        params.cmatrixInitVal = true;
+        AscendC::Mmad(o_co1, p_a2, v_b2, params);
+        o_co1_que.EnQue(o_co1);
+        p_a2_que.FreeTensor(p_a2);
+        v_b2_que.FreeTensor(v_b2);
     }
 
-    __aicore__ inline void StoreO() {
+    __aicore__ inline void UpdateO(AscendC::LocalTensor<acc_t>& o_acc, AscendC::LocalTensor<acc_t>& o_scale) {
         // co1 -> co2
         // nz -> nz
         {
@@ -406,25 +669,44 @@ public:
             AscendC::LocalTensor<acc_t> o_co2 = o_co2_que.AllocTensor<acc_t>();
             AscendC::DataCopyParams params;
             params.blockCount = 1;
-            params.blockLen = (group_size * head_dim) / (16 * 16);
+            params.blockLen = (m_pad * head_dim) / (16 * 16);
             AscendC::DataCopyEnhancedParams enhanced_params;
             enhanced_params.blockMode = AscendC::BlockMode::BLOCK_MODE_MATRIX;
             AscendC::DataCopy(o_co2, o_co1, params, enhanced_params);
             o_co2_que.EnQue(o_co2);
             o_co1_que.FreeTensor(o_co1);
         }
-        // co2 -> gm
+        // o_acc = o_acc * o_scale + o_page
         {
             AscendC::LocalTensor<acc_t> o_co2 = o_co2_que.DeQue<acc_t>();
-            AscendC::LocalTensor<scalar_t> o_cast = o_que.DeQue<scalar_t>();
-            Cast(o_cast, o_co2, AscendC::RoundMode::CAST_NONE, group_size * head_dim);
-            o_que.EnQue(o_cast);
+            MulRowsNz(o_acc, o_scale, head_dim);
+            AscendC::Add(o_acc, o_acc, o_co2, m_pad * head_dim);
             o_co2_que.FreeTensor(o_co2);
+        }
+    }
+
+    __aicore__ inline void StoreO(AscendC::LocalTensor<acc_t>& o_acc, AscendC::LocalTensor<acc_t>& row_sum) {
+        // o_acc / row_sum, empty rows stay 0
+        {
+            AscendC::LocalTensor<acc_t> inv_sum = cur_sum_buf.Get<acc_t>(m_pad);
+            SyncVToS();
+            for (int i = 0; i < m_pad; ++i) {
+                acc_t sum = row_sum.GetValue(i);
+                inv_sum.SetValue(i, sum > 0.0f ? 1.0f / sum : 0.0f);
+            }
+            SyncSToV();
+            MulRowsNz(o_acc, inv_sum, head_dim);
+        }
+        // ub -> gm
+        {
+            AscendC::LocalTensor<scalar_t> o_cast = o_que.AllocTensor<scalar_t>();
+            Cast(o_cast, o_acc, AscendC::RoundMode::CAST_NONE, m_pad * head_dim);
+            o_que.EnQue(o_cast);
 
             AscendC::LocalTensor<scalar_t> o = o_que.DeQue<scalar_t>();
-            // nz -> nd
+            // nz -> nd, padded rows are dropped
             for (int i = 0; i < head_dim / 16; ++i) {
-                int src_offset = i * group_size * 16;
+                int src_offset = i * m_pad * 16;
                 int dst_offset = i * 16;
                 AscendC::DataCopy(o_gm[dst_offset], o[src_offset], { (uint16_t)group_size, 1, 0, uint16_t(head_dim / 16 - 1)});
             }
@@ -433,15 +715,17 @@ public:
     }
 };
 
-extern "C" __global__ __aicore__ void paged_attention_ex(GM_ADDR q, GM_ADDR key_cache, GM_ADDR value_cache, GM_ADDR block_tables, GM_ADDR context_lens, GM_ADDR o, GM_ADDR workspace, GM_ADDR tiling) {
+extern "C" __global__ __aicore__ void paged_attention_ex(GM_ADDR q, GM_ADDR key_cache, GM_ADDR value_cache, GM_ADDR block_tables, GM_ADDR context_lens, GM_ADDR key_scale, GM_ADDR value_scale, GM_ADDR alibi_slopes, GM_ADDR window_size, GM_ADDR o, GM_ADDR workspace, GM_ADDR tiling) {
     GET_TILING_DATA(tiling_data, tiling);
     using scalar_t = half;
     using acc_t = float;
 
-    // q/y: [bs, num_heads, head_dim]
+    // q/y: [bs * num_query_tokens, num_heads, head_dim], num_query_tokens > 1 verifies draft tokens
     // kv_cache: [num_pages, num_kv_heads * head_dim // 16, page_size, 16]
     // block_tables: [bs, ceil(max_seqlen / page_size)]
     // context_lens: [bs]
+    // key_scale/value_scale: [num_pages, num_kv_heads, page_size], only for int8 kv_cache
+    // alibi_slopes: [num_heads] fp32, window_size: [1] int32, both optional
 
 
     uint32_t num_heads = tiling_data.num_heads;
@@ -457,6 +741,8 @@ extern "C" __global__ __aicore__ void paged_attention_ex(GM_ADDR q, GM_ADDR key_
     int64_t stride_kv_p = tiling_data.stride_kv_p;
     int64_t stride_kv_h = tiling_data.stride_kv_h;
     int64_t stride_tables_bs = tiling_data.stride_tables_bs;
+    int64_t stride_scale_p = tiling_data.stride_scale_p;
+    int num_query_tokens = tiling_data.num_query_tokens;
 
     __gm__ scalar_t* q_ptr = reinterpret_cast<__gm__ scalar_t*>(q);
     __gm__ scalar_t* key_cache_ptr = reinterpret_cast<__gm__ scalar_t*>(key_cache);
@@ -464,8 +750,20 @@ extern "C" __global__ __aicore__ void paged_attention_ex(GM_ADDR q, GM_ADDR key_
     __gm__ int32_t* block_tables_ptr = reinterpret_cast<__gm__ int32_t*>(block_tables);
     __gm__ int32_t* context_lens_ptr = reinterpret_cast<__gm__ int32_t*>(context_lens);
     __gm__ scalar_t* o_ptr = reinterpret_cast<__gm__ scalar_t*>(o);
-
-    PagedAttention<scalar_t, acc_t> paged_attention(num_heads, num_kv_heads, head_dim, page_size, max_page_num_per_seq, scale, scale_log2);
-    paged_attention.Init(q_ptr, key_cache_ptr, value_cache_ptr, block_tables_ptr, context_lens_ptr, o_ptr, stride_qo_bs, stride_qo_h, stride_qo_d, stride_kv_p, stride_kv_h, stride_tables_bs);
-    paged_attention.Process();
+    __gm__ float* alibi_slopes_ptr = tiling_data.has_alibi ? reinterpret_cast<__gm__ float*>(alibi_slopes) : nullptr;
+    __gm__ int32_t* window_size_ptr = tiling_data.has_window ? reinterpret_cast<__gm__ int32_t*>(window_size) : nullptr;
+
+    if (tiling_data.kv_quant) {
+        PagedAttention<scalar_t, acc_t, true> paged_attention(num_heads, num_kv_heads, head_dim, page_size, max_page_num_per_seq, scale, scale_log2);
+        paged_attention.Init(q_ptr, key_cache_ptr, value_cache_ptr, block_tables_ptr, context_lens_ptr, o_ptr, stride_qo_bs, stride_qo_h, stride_qo_d, stride_kv_p, stride_kv_h, stride_tables_bs, num_query_tokens);
+        paged_attention.InitQuant(reinterpret_cast<__gm__ int8_t*>(key_cache), reinterpret_cast<__gm__ int8_t*>(value_cache),
+                                  reinterpret_cast<__gm__ scalar_t*>(key_scale), reinterpret_cast<__gm__ scalar_t*>(value_scale), stride_scale_p);
+        paged_attention.InitMask(alibi_slopes_ptr, window_size_ptr);
+        paged_attention.Process();
+    } else {
+        PagedAttention<scalar_t, acc_t> paged_attention(num_heads, num_kv_heads, head_dim, page_size, max_page_num_per_seq, scale, scale_log2);
+        paged_attention.Init(q_ptr, key_cache_ptr, value_cache_ptr, block_tables_ptr, context_lens_ptr, o_ptr, stride_qo_bs, stride_qo_h, stride_qo_d, stride_kv_p, stride_kv_h, stride_tables_bs, num_query_tokens);
+        paged_attention.InitMask(alibi_slopes_ptr, window_size_ptr);
+        paged_attention.Process();
+    }
 }
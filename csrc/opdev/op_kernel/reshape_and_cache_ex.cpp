@@ -1,7 +1,33 @@
 #include "kernel_operator.h"
 
+// symmetric int8 quantization of one [head_size] row, the scale goes to scale_ptr[0]
+// cache layout: [num_blocks, block_size (num_kv_heads * head_size / 16), nh16 (page_size), 16]
+template<typename scalar_t>
+__aicore__ inline void QuantizeHead(
+    __gm__ scalar_t *src, __gm__ int8_t *cache, __gm__ scalar_t *scale_ptr,
+    int head_offset, int head_size, int block, int block_size, int nh16, int nh16_idx) {
+    float absmax = 0.0f;
+    for (int d = 0; d < head_size; ++d) {
+        float v = static_cast<float>(src[d]);
+        absmax = (v > absmax) ? v : ((-v > absmax) ? -v : absmax);
+    }
+    // round the scale to fp16 first, so dequantization sees the same value
+    scalar_t scale_h = static_cast<scalar_t>(absmax > 0.0f ? absmax / 127.0f : 1.0f);
+    float inv_scale = 1.0f / static_cast<float>(scale_h);
+    scale_ptr[0] = scale_h;
+    for (int d = 0; d < head_size; ++d) {
+        float v = static_cast<float>(src[d]) * inv_scale;
+        int32_t q = static_cast<int32_t>(v + (v >= 0.0f ? 0.5f : -0.5f));
+        q = (q > 127) ? 127 : ((q < -127) ? -127 : q);
+        int idx = head_offset + d;
+        int cache_dst_offset = ((block * block_size + idx / 16) * nh16 + nh16_idx) * 16 + idx % 16;
+        cache[cache_dst_offset] = static_cast<int8_t>(q);
+    }
+}
+
 extern "C" __global__ __aicore__ void reshape_and_cache_ex(
-    GM_ADDR key, GM_ADDR value, GM_ADDR key_cache, GM_ADDR value_cache, GM_ADDR slot_indices, GM_ADDR workspace, GM_ADDR tiling) {
+    GM_ADDR key, GM_ADDR value, GM_ADDR key_cache, GM_ADDR value_cache, GM_ADDR slot_indices,
+    GM_ADDR key_scale, GM_ADDR value_scale, GM_ADDR workspace, GM_ADDR tiling) {
     GET_TILING_DATA(tiling_data, tiling);
     int num_tokens = tiling_data.num_tokens;
     int num_kv_heads = tiling_data.num_kv_heads;
@@ -11,6 +37,7 @@ extern "C" __global__ __aicore__ void reshape_and_cache_ex(
     int block_size = tiling_data.block_size;
     int nh16 = tiling_data.nh16;
     int h16 = tiling_data.h16;
+    bool kv_quant = tiling_data.kv_quant != 0;
 
     using scalar_t = half;
 
@@ -24,6 +51,34 @@ extern "C" __global__ __aicore__ void reshape_and_cache_ex(
     bool has_value = (value_ptr != nullptr);
     bool has_value_cache = (value_cache_ptr != nullptr);
 
+    if (kv_quant) {
+        // int8 cache, quantize on write with one scale per token per head
+        // key_scale/value_scale: [num_blocks, num_kv_heads, nh16]
+        __gm__ int8_t *key_cache_q = reinterpret_cast<__gm__ int8_t *>(key_cache);
+        __gm__ int8_t *value_cache_q = reinterpret_cast<__gm__ int8_t *>(value_cache);
+        __gm__ scalar_t *key_scale_ptr = reinterpret_cast<__gm__ scalar_t *>(key_scale);
+        __gm__ scalar_t *value_scale_ptr = reinterpret_cast<__gm__ scalar_t *>(value_scale);
+        bool has_value_scale = has_value && has_value_cache && (value_scale_ptr != nullptr);
+        for (int64_t i = 0; i < num_tokens; ++i) {
+            int32_t slot = slot_indices_ptr[i];
+            // kernel Bound check: slot must be in the valid range
+            if (slot < 0 || slot >= nh16 * num_blocks) continue;
+            int block = slot / nh16;
+            int nh16_idx = slot % nh16;
+            for (int h = 0; h < num_kv_heads; ++h) {
+                int src_offset = (i * num_kv_heads + h) * head_size;
+                int scale_offset = (block * num_kv_heads + h) * nh16 + nh16_idx;
+                QuantizeHead(key_ptr + src_offset, key_cache_q, key_scale_ptr + scale_offset,
+                             h * head_size, head_size, block, block_size, nh16, nh16_idx);
+                if (has_value_scale) {
+                    QuantizeHead(value_ptr + src_offset, value_cache_q, value_scale_ptr + scale_offset,
+                                 h * head_size, head_size, block, block_size, nh16, nh16_idx);
+                }
+            }
+        }
+        return;
+    }
+
     AscendC::TPipe pipe;
     AscendC::TQue<AscendC::QuePosition::VECIN, 1> key_que;
     AscendC::TQue<AscendC::QuePosition::VECIN, 1> value_que;
@@ -0,0 +1,304 @@
+#include "kernel_operator.h"
+
+// per sequence, l = penalize(logits) / temperature is kept in the workspace as fp32
+//   greedy (temperature <= 0 or top_k == 1): argmax(l)
+//   otherwise keep l >= max(t_k, t_p) and invert the cdf of exp(l - max(l)) at uniform
+// t_k is the top_k-th largest logit, t_p the smallest logit whose descending prefix holds top_p
+// of the top-k mass. Both are exact logit values found by a binary search over the ordered float
+// bits, one counting pass over the vocab per step, so no sort is needed. Ties at a threshold are kept.
+
+constexpr int CHUNK = 4096;
+
+// monotone map between floats and int32 keys
+__aicore__ inline int32_t FloatToKey(float f) {
+    int32_t bits = *reinterpret_cast<int32_t *>(&f);
+    return bits >= 0 ? bits : bits ^ 0x7fffffff;
+}
+
+__aicore__ inline float KeyToFloat(int32_t key) {
+    int32_t bits = key >= 0 ? key : key ^ 0x7fffffff;
+    return *reinterpret_cast<float *>(&bits);
+}
+
+class KernelSampling {
+public:
+    using scalar_t = half;
+    using acc_t = float;
+
+    __aicore__ inline KernelSampling() {}
+
+    __aicore__ inline void Init(
+        GM_ADDR logits, GM_ADDR temperature, GM_ADDR top_k, GM_ADDR top_p, GM_ADDR repetition_penalty,
+        GM_ADDR uniform, GM_ADDR penalty_token_ids, GM_ADDR token_ids, GM_ADDR workspace,
+        int batch_size, int vocab_size, int num_penalty_tokens, int core_num) {
+        this->batch_size = batch_size;
+        this->vocab_size = vocab_size;
+        this->num_penalty_tokens = num_penalty_tokens;
+        this->core_num = core_num;
+
+        logits_ptr = reinterpret_cast<__gm__ scalar_t *>(logits);
+        temperature_ptr = reinterpret_cast<__gm__ acc_t *>(temperature);
+        top_k_ptr = reinterpret_cast<__gm__ int32_t *>(top_k);
+        top_p_ptr = reinterpret_cast<__gm__ acc_t *>(top_p);
+        repetition_penalty_ptr = reinterpret_cast<__gm__ acc_t *>(repetition_penalty);
+        uniform_ptr = reinterpret_cast<__gm__ acc_t *>(uniform);
+        penalty_token_ids_ptr = reinterpret_cast<__gm__ int32_t *>(penalty_token_ids);
+        token_ids_ptr = reinterpret_cast<__gm__ int32_t *>(token_ids);
+        ws_ptr = reinterpret_cast<__gm__ acc_t *>(AscendC::GetUserWorkspace(workspace));
+
+        pipe.InitBuffer(x_que, 1, CHUNK * sizeof(scalar_t));
+        pipe.InitBuffer(l_que, 1, CHUNK * sizeof(acc_t));
+        pipe.InitBuffer(l_out_que, 1, CHUNK * sizeof(acc_t));
+        pipe.InitBuffer(x_f32_buf, CHUNK * sizeof(acc_t));
+        pipe.InitBuffer(exp_buf, CHUNK * sizeof(acc_t));
+        pipe.InitBuffer(sel_buf, CHUNK * sizeof(acc_t));
+        pipe.InitBuffer(ones_buf, CHUNK * sizeof(acc_t));
+        pipe.InitBuffer(work_buf, CHUNK * sizeof(acc_t));
+        pipe.InitBuffer(reduced_buf, 64 * sizeof(acc_t));
+        pipe.InitBuffer(mask_buf, CHUNK / 8);
+
+        AscendC::LocalTensor<acc_t> ones = ones_buf.Get<acc_t>(CHUNK);
+        AscendC::Duplicate(ones, 1.0f, CHUNK);
+    }
+
+    __aicore__ inline void Process() {
+        for (int64_t b = AscendC::GetBlockIdx(); b < batch_size; b += core_num) {
+            ProcessRow(b);
+        }
+    }
+
+private:
+    __aicore__ inline void ProcessRow(int64_t b) {
+        acc_t temperature = temperature_ptr[b];
+        int32_t top_k = top_k_ptr[b];
+        acc_t top_p = top_p_ptr[b];
+        acc_t penalty = repetition_penalty_ptr[b];
+        bool greedy = temperature <= 0.0f || top_k == 1;
+
+        logits_gm.SetGlobalBuffer(logits_ptr + b * vocab_size, vocab_size);
+        ws_gm.SetGlobalBuffer(ws_ptr + b * vocab_size, vocab_size);
+        Prepare(b, penalty, greedy ? 1.0f : 1.0f / temperature, !greedy);
+        if (greedy) {
+            token_ids_ptr[b] = argmax;
+            return;
+        }
+
+        acc_t threshold = row_min;
+        if (top_k > 0 && top_k < vocab_size) {
+            threshold = SearchThreshold<false>(row_min, static_cast<acc_t>(top_k));
+        }
+        if (top_p < 1.0f) {
+            acc_t t_p = SearchThreshold<true>(threshold, top_p * Reduce<true>(threshold));
+            threshold = (t_p > threshold) ? t_p : threshold;
+        }
+        int32_t token = Draw(threshold, uniform_ptr[b] * Reduce<true>(threshold));
+        // rounding left the target past the last kept token
+        token_ids_ptr[b] = (token >= 0) ? token : argmax;
+    }
+
+    // logits -> l in the workspace, tracks max, min and argmax of l
+    __aicore__ inline void Prepare(int64_t b, acc_t penalty, acc_t inv_temperature, bool store) {
+        AscendC::LocalTensor<acc_t> x_f32 = x_f32_buf.Get<acc_t>(CHUNK);
+        AscendC::LocalTensor<acc_t> work = work_buf.Get<acc_t>(CHUNK);
+        AscendC::LocalTensor<acc_t> reduced = reduced_buf.Get<acc_t>(64);
+        AscendC::LocalTensor<uint32_t> reduced_idx = reduced.ReinterpretCast<uint32_t>();
+        bool has_penalty = num_penalty_tokens > 0 && penalty != 1.0f;
+        row_max = 0.0f;
+        row_min = 0.0f;
+        argmax = -1;
+        for (int c = 0; c < vocab_size; c += CHUNK) {
+            int len = (vocab_size - c < CHUNK) ? vocab_size - c : CHUNK;
+            {
+                AscendC::LocalTensor<scalar_t> x_copy = x_que.AllocTensor<scalar_t>();
+                AscendC::DataCopy(x_copy, logits_gm[c], len);
+                x_que.EnQue(x_copy);
+                AscendC::LocalTensor<scalar_t> x = x_que.DeQue<scalar_t>();
+                Cast(x_f32, x, AscendC::RoundMode::CAST_NONE, len);
+                x_que.FreeTensor(x);
+            }
+            if (has_penalty) {
+                // recomputed from the original logit, repeated ids are penalized once
+                SyncVToS();
+                for (int i = 0; i < num_penalty_tokens; ++i) {
+                    int32_t token = penalty_token_ids_ptr[b * num_penalty_tokens + i];
+                    if (token < c || token >= c + len) continue;
+                    acc_t x = static_cast<acc_t>(logits_ptr[b * vocab_size + token]);
+                    x_f32.SetValue(token - c, x < 0.0f ? x * penalty : x / penalty);
+                }
+                SyncSToV();
+            }
+            AscendC::LocalTensor<acc_t> l = l_out_que.AllocTensor<acc_t>();
+            AscendC::Muls(l, x_f32, inv_temperature, len);
+
+            AscendC::ReduceMax(reduced, l, work, len, true);
+            SyncVToS();
+            acc_t chunk_max = reduced.GetValue(0);
+            int32_t chunk_argmax = c + static_cast<int32_t>(reduced_idx.GetValue(1));
+            if (argmax < 0 || chunk_max > row_max) {
+                row_max = chunk_max;
+                argmax = chunk_argmax;
+            }
+            AscendC::ReduceMin(reduced, l, work, len, false);
+            SyncVToS();
+            acc_t chunk_min = reduced.GetValue(0);
+            row_min = (c == 0 || chunk_min < row_min) ? chunk_min : row_min;
+
+            if (store) {
+                l_out_que.EnQue(l);
+                l = l_out_que.DeQue<acc_t>();
+                AscendC::DataCopy(ws_gm[c], l, len);
+            }
+            l_out_que.FreeTensor(l);
+        }
+        // workspace writes -> workspace reads
+        event_t event_id = static_cast<event_t>(pipe.FetchEventID(AscendC::HardEvent::MTE3_MTE2));
+        AscendC::SetFlag<AscendC::HardEvent::MTE3_MTE2>(event_id);
+        AscendC::WaitFlag<AscendC::HardEvent::MTE3_MTE2>(event_id);
+    }
+
+    // sel = exp(l - row_max) or 1 where l >= threshold, else 0
+    template<bool IS_MASS>
+    __aicore__ inline void Select(AscendC::LocalTensor<acc_t>& sel, AscendC::LocalTensor<acc_t>& l, acc_t threshold, int len) {
+        AscendC::LocalTensor<uint8_t> mask = mask_buf.Get<uint8_t>(CHUNK / 8);
+        AscendC::CompareScalar(mask, l, threshold, AscendC::CMPMODE::GE, len);
+        if (IS_MASS) {
+            AscendC::LocalTensor<acc_t> e = exp_buf.Get<acc_t>(CHUNK);
+            AscendC::Adds(e, l, -row_max, len);
+            AscendC::Exp(e, e, len);
+            AscendC::Select(sel, mask, e, 0.0f, AscendC::SELMODE::VSEL_TENSOR_SCALAR_MODE, len);
+        } else {
+            AscendC::LocalTensor<acc_t> ones = ones_buf.Get<acc_t>(CHUNK);
+            AscendC::Select(sel, mask, ones, 0.0f, AscendC::SELMODE::VSEL_TENSOR_SCALAR_MODE, len);
+        }
+    }
+
+    // count (or mass) of l >= threshold
+    template<bool IS_MASS>
+    __aicore__ inline acc_t Reduce(acc_t threshold) {
+        AscendC::LocalTensor<acc_t> sel = sel_buf.Get<acc_t>(CHUNK);
+        AscendC::LocalTensor<acc_t> work = work_buf.Get<acc_t>(CHUNK);
+        AscendC::LocalTensor<acc_t> reduced = reduced_buf.Get<acc_t>(64);
+        acc_t total = 0.0f;
+        for (int c = 0; c < vocab_size; c += CHUNK) {
+            int len = (vocab_size - c < CHUNK) ? vocab_size - c : CHUNK;
+            AscendC::LocalTensor<acc_t> l = LoadChunk(c, len);
+            Select<IS_MASS>(sel, l, threshold, len);
+            l_que.FreeTensor(l);
+            AscendC::ReduceSum(reduced, sel, work, len);
+            SyncVToS();
+            total += reduced.GetValue(0);
+            SyncSToV();
+        }
+        return total;
+    }
+
+    // largest logit t >= lo with Reduce<IS_MASS>(t) >= target
+    template<bool IS_MASS>
+    __aicore__ inline acc_t SearchThreshold(acc_t lo_value, acc_t target) {
+        int32_t lo = FloatToKey(lo_value);
+        int32_t hi = FloatToKey(row_max);
+        while (lo < hi) {
+            int32_t mid = lo + static_cast<int32_t>((static_cast<int64_t>(hi) - lo + 1) / 2);
+            if (Reduce<IS_MASS>(KeyToFloat(mid)) >= target) {
+                lo = mid;
+            } else {
+                hi = mid - 1;
+            }
+        }
+        return KeyToFloat(lo);
+    }
+
+    // first token whose inclusive prefix mass over l >= threshold exceeds target, -1 if none
+    __aicore__ inline int32_t Draw(acc_t threshold, acc_t target) {
+        AscendC::LocalTensor<acc_t> sel = sel_buf.Get<acc_t>(CHUNK);
+        AscendC::LocalTensor<acc_t> work = work_buf.Get<acc_t>(CHUNK);
+        AscendC::LocalTensor<acc_t> reduced = reduced_buf.Get<acc_t>(64);
+        acc_t acc = 0.0f;
+        for (int c = 0; c < vocab_size; c += CHUNK) {
+            int len = (vocab_size - c < CHUNK) ? vocab_size - c : CHUNK;
+            AscendC::LocalTensor<acc_t> l = LoadChunk(c, len);
+            Select<true>(sel, l, threshold, len);
+            l_que.FreeTensor(l);
+            AscendC::ReduceSum(reduced, sel, work, len);
+            SyncVToS();
+            acc_t chunk_mass = reduced.GetValue(0);
+            if (acc + chunk_mass > target) {
+                for (int j = 0; j < len; ++j) {
+                    acc += sel.GetValue(j);
+                    if (acc > target) {
+                        SyncSToV();
+                        return c + j;
+                    }
+                }
+            } else {
+                acc += chunk_mass;
+            }
+            SyncSToV();
+        }
+        return -1;
+    }
+
+    __aicore__ inline AscendC::LocalTensor<acc_t> LoadChunk(int c, int len) {
+        AscendC::LocalTensor<acc_t> l_copy = l_que.AllocTensor<acc_t>();
+        AscendC::DataCopy(l_copy, ws_gm[c], len);
+        l_que.EnQue(l_copy);
+        return l_que.DeQue<acc_t>();
+    }
+
+    // vector writes -> scalar reads
+    __aicore__ inline void SyncVToS() {
+        event_t event_id = static_cast<event_t>(pipe.FetchEventID(AscendC::HardEvent::V_S));
+        AscendC::SetFlag<AscendC::HardEvent::V_S>(event_id);
+        AscendC::WaitFlag<AscendC::HardEvent::V_S>(event_id);
+    }
+    // scalar writes -> vector reads
+    __aicore__ inline void SyncSToV() {
+        event_t event_id = static_cast<event_t>(pipe.FetchEventID(AscendC::HardEvent::S_V));
+        AscendC::SetFlag<AscendC::HardEvent::S_V>(event_id);
+        AscendC::WaitFlag<AscendC::HardEvent::S_V>(event_id);
+    }
+
+    AscendC::TPipe pipe;
+    AscendC::TQue<AscendC::QuePosition::VECIN, 1> x_que;
+    AscendC::TQue<AscendC::QuePosition::VECIN, 1> l_que;
+    AscendC::TQue<AscendC::QuePosition::VECOUT, 1> l_out_que;
+    AscendC::TBuf<AscendC::TPosition::VECCALC> x_f32_buf;
+    AscendC::TBuf<AscendC::TPosition::VECCALC> exp_buf;
+    AscendC::TBuf<AscendC::TPosition::VECCALC> sel_buf;
+    AscendC::TBuf<AscendC::TPosition::VECCALC> ones_buf;
+    AscendC::TBuf<AscendC::TPosition::VECCALC> work_buf;
+    AscendC::TBuf<AscendC::TPosition::VECCALC> reduced_buf;
+    AscendC::TBuf<AscendC::TPosition::VECCALC> mask_buf;
+
+    AscendC::GlobalTensor<scalar_t> logits_gm;
+    AscendC::GlobalTensor<acc_t> ws_gm;
+
+    __gm__ scalar_t *logits_ptr;
+    __gm__ acc_t *temperature_ptr;
+    __gm__ int32_t *top_k_ptr;
+    __gm__ acc_t *top_p_ptr;
+    __gm__ acc_t *repetition_penalty_ptr;
+    __gm__ acc_t *uniform_ptr;
+    __gm__ int32_t *penalty_token_ids_ptr;
+    __gm__ int32_t *token_ids_ptr;
+    __gm__ acc_t *ws_ptr;
+
+    int batch_size;
+    int vocab_size;
+    int num_penalty_tokens;
+    int core_num;
+
+    acc_t row_max;
+    acc_t row_min;
+    int32_t argmax;
+};
+
+extern "C" __global__ __aicore__ void sampling_ex(
+    GM_ADDR logits, GM_ADDR temperature, GM_ADDR top_k, GM_ADDR top_p, GM_ADDR repetition_penalty,
+    GM_ADDR uniform, GM_ADDR penalty_token_ids, GM_ADDR token_ids, GM_ADDR workspace, GM_ADDR tiling) {
+    GET_TILING_DATA(tiling_data, tiling);
+    KernelSampling op;
+    op.Init(logits, temperature, top_k, top_p, repetition_penalty, uniform, penalty_token_ids, token_ids, workspace,
+            tiling_data.batch_size, tiling_data.vocab_size, tiling_data.num_penalty_tokens, tiling_data.core_num);
+    op.Process();
+}
@@ -5,11 +5,11 @@ extern "C" __global__ __aicore__ void swi_glu_ex(GM_ADDR x, GM_ADDR y, GM_ADDR w
     int num_tokens = tiling_data.num_tokens;
     int dim = tiling_data.dim;
     int core_num = tiling_data.core_num;
+    // dim is a multiple of it, checked by the host
+    int BLOCK_SIZE_DIM = tiling_data.block_size;
 
     using scalar_t = half;
     using acc_t = float;
-    // FIXME: dim should be multiple of BLOCK_SIZE_DIM
-    constexpr int BLOCK_SIZE_DIM = 64;
     __gm__ scalar_t *x_ptr = reinterpret_cast<__gm__ scalar_t *>(x);
     __gm__ scalar_t *y_ptr = reinterpret_cast<__gm__ scalar_t *>(y);
 
@@ -31,7 +31,6 @@ extern "C" __global__ __aicore__ void swi_glu_ex(GM_ADDR x, GM_ADDR y, GM_ADDR w
         input_tensor.SetGlobalBuffer(x_ptr + dim * 2 * i, dim * 2);
         output_tensor.SetGlobalBuffer(y_ptr + dim * i, dim);
 
-        // FIXME: no bound check
         for (int dim_i = 0; dim_i < dim; dim_i += BLOCK_SIZE_DIM) {
             AscendC::LocalTensor<scalar_t> x0_copy = x0_que.AllocTensor<scalar_t>();
             AscendC::LocalTensor<scalar_t> x1_copy = x1_que.AllocTensor<scalar_t>();
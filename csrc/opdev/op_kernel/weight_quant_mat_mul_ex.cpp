@@ -0,0 +1,38 @@
+#include "kernel_operator.h"
+
+#include "matmul_core.h"
+
+extern "C" __global__ __aicore__ void weight_quant_mat_mul_ex(GM_ADDR x, GM_ADDR w, GM_ADDR scale, GM_ADDR y, GM_ADDR workspace, GM_ADDR tiling) {
+    GET_TILING_DATA(tiling_data, tiling);
+    using scalar_t = half;
+    using acc_t = float;
+    using index_t = int64_t;
+
+    // x: [num_tokens, dim]
+    // w: [inner_dim, dim] int8
+    // scale: [dim / group_size, inner_dim]
+    // y: [num_tokens, inner_dim]
+    int num_tokens = tiling_data.num_tokens;
+    int dim = tiling_data.dim;
+    int inner_dim = tiling_data.inner_dim;
+    int group_size = tiling_data.group_size;
+    int inner_dim_per_core = tiling_data.inner_dim_per_core;
+
+    __gm__ scalar_t *x_ptr = reinterpret_cast<__gm__ scalar_t *>(x);
+    __gm__ int8_t *w_ptr = reinterpret_cast<__gm__ int8_t *>(w);
+    __gm__ scalar_t *scale_ptr = reinterpret_cast<__gm__ scalar_t *>(scale);
+    __gm__ scalar_t *y_ptr = reinterpret_cast<__gm__ scalar_t *>(y);
+
+    // each core owns a slice of output channels, so decode (small num_tokens) still uses all cores
+    int n_start = AscendC::GetBlockIdx() * inner_dim_per_core;
+    if (n_start >= inner_dim) return;
+    int n_end = (n_start + inner_dim_per_core < inner_dim) ? (n_start + inner_dim_per_core) : inner_dim;
+
+    MatMulNTW8A16<scalar_t, acc_t, index_t> matmul;
+    matmul.InitPipe();
+    matmul.InitSize(num_tokens, n_end - n_start, dim);
+    matmul.InitLdc(inner_dim);
+    matmul.InitQuant(group_size, inner_dim);
+    matmul.InitBuffer(x_ptr, w_ptr + n_start * dim, scale_ptr + n_start, y_ptr + n_start);
+    matmul.Process();
+}
@@ -20,12 +20,20 @@ ATB_HOME_PATH = os.environ.get(
 SOC_VERSION = os.environ.get("SOC_VERSION", "Ascend910B")
 CMAKE_BUILD_TYPE = os.environ.get("CMAKE_BUILD_TYPE", "Release")
 MAX_JOBS = os.environ.get("MAX_JOBS", None)
+# OPS=rope_ex,paged_attention_ex compiles only these kernels, the others come from the kernel cache
+OPS = os.environ.get("OPS", "")
 VERBOSE = bool(int(os.environ.get("VERBOSE", "0")))
+# PROFILE_OPS=0 compiles the per-op counters of ascend910a_extras.profile out
+PROFILE_OPS = bool(int(os.environ.get("PROFILE_OPS", "1")))
 
 
 ROOT_DIR = Path(__file__).parent
 logger = logging.getLogger(__name__)
 
+# the opdev build scripts are plain modules of this dir
+sys.path.insert(0, str(ROOT_DIR / "csrc" / "opdev" / "cmake" / "util"))
+from ascendc_compile_cache import sync_tree  # noqa: E402
+
 
 class CMakeExtension(Extension):
     def __init__(self, name: str, cmake_lists_dir: str = ".", **kwa) -> None:
@@ -95,6 +103,9 @@ class cmake_build_ext(build_ext):
             f"-DTORCH_NPU_PATH={torch_npu_path}",
             f"-DASCEND_HOME_PATH={ASCEND_HOME_PATH}",
             f"-DATB_HOME_PATH={ATB_HOME_PATH}",
+            f"-DOPS={OPS}",
+            f"-DMAX_JOBS={self.compute_num_jobs()}",
+            f"-DPROFILE_OPS={'ON' if PROFILE_OPS else 'OFF'}",
         ]
 
         build_tool = []
@@ -167,11 +178,11 @@ class cmake_build_ext(build_ext):
         )
         src_opp_install = os.path.join(ROOT_DIR, "ascend910a_extras", "opp_install")
         if os.path.exists(build_opp_install):
-            if os.path.exists(src_opp_install):
-                shutil.rmtree(src_opp_install)
-                print(f"Remove: {src_opp_install}")
-            shutil.copytree(build_opp_install, src_opp_install)
-            print(f"Manually Copy: {build_opp_install} -> {src_opp_install}")
+            # only changed files, unchanged kernels keep their mtime
+            copied, removed = sync_tree(build_opp_install, src_opp_install)
+            print(
+                f"Sync: {build_opp_install} -> {src_opp_install}, {len(copied)} copied, {len(removed)} removed"
+            )
         else:
             print(f"build_opp_install: {build_opp_install} not found")
 